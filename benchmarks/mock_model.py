@@ -0,0 +1,73 @@
+"""A mock model that streams a canned response with configurable latency, so benchmarks can run offline.
+
+Usage:
+
+```python
+from benchmarks.mock_model import register
+
+register()
+model = llm.get_model("bench-mock")
+response = model.prompt("", first_token_delay=0.5, chunk_delay=0.01, chunks=200)
+```
+"""
+
+import time
+import typing as t
+
+import llm
+from llm.plugins import pm
+from pydantic import Field
+
+if t.TYPE_CHECKING:
+    from collections.abc import Callable, Iterator
+
+MODEL_ID = "bench-mock"
+
+WORDS = ("Some", " text", " with", " `code`", " and", " [brackets]", ".", "\n\n")
+"""The chunks of the canned response, repeated, so it is made of short paragraphs as model output usually is."""
+
+
+class LatencyMockModel(llm.Model):
+    """Streams `chunks` of `WORDS`, waiting before the first chunk and between each of the rest."""
+
+    model_id = MODEL_ID
+
+    class Options(llm.Options):
+        """How the canned response is streamed."""
+
+        first_token_delay: float = Field(description="Seconds to wait before the first chunk.", default=0.0, ge=0)
+        chunk_delay: float = Field(description="Seconds to wait before each later chunk.", default=0.0, ge=0)
+        chunks: int = Field(description="The number of chunks to stream.", default=100, ge=0)
+
+    def execute(
+        self,
+        prompt: llm.Prompt,
+        stream: bool,  # noqa: ARG002, FBT001
+        response: llm.Response,
+        conversation: llm.Conversation | None,  # noqa: ARG002
+    ) -> "Iterator[str]":
+        """Stream the canned response."""
+        options = t.cast("LatencyMockModel.Options", prompt.options)
+        start = time.perf_counter()
+        for i in range(options.chunks):
+            # Each chunk is due at a fixed time from the start, so oversleeping once does not delay every later chunk.
+            due = start + options.first_token_delay + options.chunk_delay * i
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            yield WORDS[i % len(WORDS)]
+        response.set_usage(input=len(prompt.prompt.split()), output=options.chunks)
+
+
+class _Plugin:
+    __name__ = "LatencyMockModelPlugin"
+
+    @llm.hookimpl
+    def register_models(self, register: "Callable[[llm.Model], None]") -> None:
+        register(LatencyMockModel())
+
+
+def register() -> None:
+    """Register the mock model with llm, if it is not already registered."""
+    if pm.get_plugin(_Plugin.__name__) is None:
+        pm.register(_Plugin(), name=_Plugin.__name__)
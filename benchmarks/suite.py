@@ -0,0 +1,278 @@
+"""Benchmark the hot paths of CLI-llm and compare them against a stored baseline.
+
+Everything runs offline, against synthetic tools and files and a mock model that streams with the configured latency.
+The results are written as JSON, and any benchmark that is slower than the baseline by more than the tolerance is
+reported as a regression, failing the run. Some benchmarks time the way a hot path used to work, e.g. compiling the
+prompt on every render, next to how it works now, to show what the change saved.
+
+Usage:
+
+`python -m benchmarks.suite --output results.json`
+
+`python -m benchmarks.suite --save-baseline`
+
+Each timing is stored as a ratio to the time of a fixed calibration loop of pure Python, so the baseline roughly
+carries over between machines. It is only a rough correction, as machines differ in more than the speed of the
+interpreter, so save the baseline again on the machine the benchmarks are compared on when precision matters.
+"""
+
+import argparse
+import io
+import json
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import typing as t
+from dataclasses import dataclass
+from pathlib import Path
+
+import jinja2
+import llm
+from rich.console import Console
+
+from benchmarks import mock_model
+from cli_llm import _logging, helpers, templates
+from cli_llm._cli_utils import ToolGatherer
+from cli_llm._discovery import load_tool_script
+from cli_llm._manifest import MANIFEST_FILE
+from cli_llm._stream import StreamWriter
+from cli_llm.config import ClmConfig
+from cli_llm.response import Response
+from cli_llm.run import _render
+from examples.readme import PROMPT
+
+if t.TYPE_CHECKING:
+    from collections.abc import Callable
+
+BASELINE = Path(__file__).with_name("baseline.json")
+RESULTS_FORMAT = 2
+"""The version of the results document, a baseline of another version is not comparable."""
+
+CALIBRATION = "calibration"
+
+TOOL = '''"""Synthetic tool {index}."""
+
+import click
+
+
+@click.group()
+def tool():
+    """The sub root of tool {index}."""
+
+
+@tool.command()
+@click.option("--text")
+def summarise(text):
+    """Summarise the text."""
+'''
+
+
+@dataclass(frozen=True)
+class Benchmark:
+    """A benchmark of one hot path."""
+
+    name: str
+    run: "Callable[[t.Any], object]"
+    setup: "Callable[[], t.Any]" = lambda: None
+    offset: float = 0.0
+    """Seconds to subtract from each timing, e.g. the latency of the mock model, to leave only our overhead."""
+
+
+def time_benchmark(benchmark: Benchmark, repeat: int) -> float:
+    """The fastest of the timings of the benchmark, as the least disturbed by the rest of the machine."""
+    timings = []
+    for _ in range(repeat):
+        arg = benchmark.setup()
+        start = time.perf_counter()
+        benchmark.run(arg)
+        timings.append(time.perf_counter() - start - benchmark.offset)
+    return min(timings)
+
+
+def calibrate(repeat: int) -> float:
+    """The fastest of the timings of a fixed loop of pure Python, the unit the benchmarks are measured in."""
+
+    def loop() -> int:
+        counts: dict[str, int] = {}
+        for i in range(200_000):
+            key = str(i % 97)
+            counts[key] = counts.get(key, 0) + i
+        return sum(counts.values())
+
+    return time_benchmark(Benchmark(CALIBRATION, lambda _: loop()), repeat)
+
+
+def _write_tools(directory: Path, count: int) -> None:
+    directory.mkdir(parents=True)
+    for index in range(count):
+        (directory / f"tool_{index}.py").write_text(TOOL.format(index=index))
+
+
+def _write_tree(root: Path, files: int, size: int, width: int = 8) -> None:
+    contents = ("def function(x: int) -> int:\n    return x + 1\n" * (size // 45 + 1))[:size]
+    for index in range(files):
+        directory = root.joinpath(*(f"package_{part}" for part in str(index // width).zfill(2)))
+        directory.mkdir(parents=True, exist_ok=True)
+        (directory / f"module_{index}.py").write_text(contents)
+        (directory / f"data_{index}.bin").write_bytes(b"\xff\xfe" * 64)
+
+
+def _config(root: Path) -> ClmConfig:
+    return ClmConfig(
+        tools_dir=root / "tools", cache_dir=root / "cache", ll_model=mock_model.MODEL_ID, run_history=False
+    )
+
+
+def _discover(config: ClmConfig) -> None:
+    ToolGatherer._discover(config)  # noqa: SLF001
+
+
+def _cold_config(root: Path) -> ClmConfig:
+    """A config as in a new process, without the manifest or the loaded tool scripts."""
+    (root / "cache" / MANIFEST_FILE).unlink(missing_ok=True)
+    # The scripts are loaded without being added to `sys.modules`, so only this cache keeps them.
+    load_tool_script.cache_clear()
+    return _config(root)
+
+
+def _console() -> Console:
+    return Console(file=io.StringIO(), force_terminal=True, width=100)
+
+
+def _print_each(chunks: list[str]) -> None:
+    """Print every chunk on its own, as responses were streamed before `StreamWriter`."""
+    console = _console()
+    for chunk in chunks:
+        console.print(chunk, end="")
+
+
+def _write_chunks(chunks: list[str]) -> None:
+    with StreamWriter(_console()) as writer:
+        for chunk in chunks:
+            writer.write(chunk)
+
+
+def _prompt(args: argparse.Namespace, *, latency: bool = False) -> Response:
+    options = {"chunks": args.chunks}
+    if latency:
+        options |= {"first_token_delay": args.first_token_delay, "chunk_delay": args.chunk_delay}
+    return Response(llm.get_model(mock_model.MODEL_ID).prompt("Benchmark", **options))
+
+
+def benchmarks(root: Path, args: argparse.Namespace) -> list[Benchmark]:
+    """The benchmarks, using synthetic tools and files written under the root."""
+    _write_tools(root / "tools", args.tools)
+    _write_tree(root / "tree", args.files, args.file_size)
+    files = helpers.gather_file_contents(search_path=root / "tree", pattern="*.py")
+    latency = args.first_token_delay + args.chunk_delay * max(args.chunks - 1, 0)
+    output = root / "response.md"
+    chunks = [mock_model.WORDS[i % len(mock_model.WORDS)] for i in range(args.chunks)]
+    # The shared environment compiles the prompt once, as it would for the first render of a run.
+    templates.render(PROMPT, {"files": [], "lang": "python"})
+    return [
+        Benchmark("config load", lambda _: _config(root)),
+        Benchmark("tool discovery cold", _discover, setup=lambda: _cold_config(root)),
+        Benchmark("tool discovery warm", _discover, setup=lambda: _config(root)),
+        Benchmark("render", lambda _: _render(PROMPT, {"files": files, "lang": "python"})),
+        Benchmark("render compiling every time", lambda _: jinja2.Template(PROMPT).render(files=files, lang="python")),
+        Benchmark(
+            "gather file contents", lambda _: helpers.gather_file_contents(search_path=root / "tree", pattern="*")
+        ),
+        Benchmark("stream", lambda response: response.stream(), setup=lambda: _prompt(args)),
+        Benchmark("stream markdown", lambda response: response.stream(markdown=True), setup=lambda: _prompt(args)),
+        Benchmark("stream writer", lambda _: _write_chunks(chunks)),
+        Benchmark("print every chunk", lambda _: _print_each(chunks)),
+        Benchmark("write to file", lambda response: response.write_to_file(output), setup=lambda: _prompt(args)),
+        Benchmark(
+            "stream overhead with latency",
+            lambda response: response.stream(),
+            setup=lambda: _prompt(args, latency=True),
+            offset=latency,
+        ),
+    ]
+
+
+def compare(results: dict[str, float], baseline: dict[str, float], tolerance: float) -> list[str]:
+    """The names of the benchmarks that are slower than the baseline by more than the tolerance."""
+    return [name for name, ratio in results.items() if name in baseline and ratio > baseline[name] * (1 + tolerance)]
+
+
+def _report(
+    seconds: dict[str, float], results: dict[str, float], baseline: dict[str, float], regressions: list[str]
+) -> None:
+    for name, ratio in results.items():
+        line = f"{name:>30}: {seconds[name] * 1000:10.3f} ms {ratio:10.4f} x calibration"
+        if name in baseline and baseline[name] > 0:
+            line += f" {ratio / baseline[name] - 1:+8.1%} vs baseline"
+        if name in regressions:
+            line += "  REGRESSION"
+        sys.stdout.write(f"{line}\n")
+
+
+def main() -> None:
+    """Run the benchmarks."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tools", type=int, default=200, help="The number of synthetic tools to discover.")
+    parser.add_argument("--files", type=int, default=500, help="The number of synthetic files to render and gather.")
+    parser.add_argument("--file-size", type=int, default=2000, help="The size of each synthetic file in bytes.")
+    parser.add_argument("--chunks", type=int, default=2000, help="The number of chunks the mock model streams.")
+    parser.add_argument("--first-token-delay", type=float, default=0.05, help="Seconds before the first chunk.")
+    parser.add_argument("--chunk-delay", type=float, default=0.0005, help="Seconds between each later chunk.")
+    parser.add_argument("--repeat", type=int, default=10, help="The number of times to time each benchmark.")
+    parser.add_argument("--output", type=Path, help="Write the results as JSON to this file.")
+    parser.add_argument("--baseline", type=Path, default=BASELINE, help="The baseline to compare against.")
+    parser.add_argument("--save-baseline", action="store_true", help="Replace the baseline with the results.")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.5, help="How much slower than the baseline is a regression, e.g. 0.5."
+    )
+    args = parser.parse_args()
+
+    mock_model.register()
+    # The responses are streamed to the terminal, which would otherwise be the bottleneck being measured.
+    _logging.console = Console(file=io.StringIO(), force_terminal=True, width=100)
+
+    root = Path(tempfile.mkdtemp(prefix="clm-bench-"))
+    try:
+        seconds = {benchmark.name: time_benchmark(benchmark, args.repeat) for benchmark in benchmarks(root, args)}
+    finally:
+        shutil.rmtree(root)
+    calibration = calibrate(args.repeat)
+    results = {name: timing / calibration for name, timing in seconds.items()}
+
+    parameters = {
+        name: getattr(args, name)
+        for name in ("tools", "files", "file_size", "chunks", "first_token_delay", "chunk_delay", "repeat")
+    }
+    document = {
+        "format": RESULTS_FORMAT,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": parameters,
+        "calibration_seconds": calibration,
+        "seconds": seconds,
+        "results": results,
+    }
+
+    baseline: dict[str, t.Any] = {}
+    if args.baseline.exists() and not args.save_baseline:
+        baseline = json.loads(args.baseline.read_text())
+        if baseline.get("format") != RESULTS_FORMAT or baseline.get("parameters") != parameters:
+            sys.stdout.write("The baseline was run with a different format or parameters, so it is not comparable.\n")
+            baseline = {}
+    regressions = compare(results, baseline.get("results", {}), args.tolerance)
+    _report(seconds, results, baseline.get("results", {}), regressions)
+
+    text = json.dumps(document, indent=2) + "\n"
+    if args.output is not None:
+        args.output.write_text(text)
+    if args.save_baseline:
+        args.baseline.write_text(text)
+    if regressions:
+        sys.stdout.write(f"{len(regressions)} benchmark(s) regressed by more than {args.tolerance:.0%}.\n")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,7 @@ from pathlib import Path
 import click
 
 from cli_llm import ClmConfig, helpers, run
+from cli_llm.compact import Compaction
 
 PROMPT = """
 - Below are some {{lang}} files from a library.
@@ -29,14 +30,33 @@ Filename: {{f}}
 @click.command()
 @click.argument("path", type=Path)
 @click.option("-l", "--lang", type=str, default="")
-@click.option("-p", "--pattern", type=str, default="*")
+@click.option("-p", "--pattern", type=str, multiple=True, default=("*",))
 @click.option("-o", "--output", type=Path, default=Path("README.md"))
+@click.option("--compact", is_flag=True, help="Strip comments and blank lines, and leave out lockfiles and licenses.")
+@click.option("--signatures", is_flag=True, help="Send only the signatures and docstrings of Python code.")
 @click.pass_obj
-def tool(config: ClmConfig, path: Path, lang: str, pattern: str, output: Path) -> None:
+def tool(  # noqa: PLR0913
+    config: ClmConfig,
+    path: Path,
+    lang: str,
+    pattern: tuple[str, ...],
+    output: Path,
+    *,
+    compact: bool,
+    signatures: bool,
+) -> None:
     """Write a README for a given library."""
-    file_contents = helpers.gather_file_contents(search_path=path, pattern=pattern)
+    # The files are rendered into the prompt as they are read.
+    compaction = Compaction(signatures=signatures) if compact or signatures else None
+    file_contents = helpers.iter_file_contents(
+        search_path=path,
+        pattern=pattern,
+        gitignore=True,
+        max_file_bytes=helpers.MAX_FILE_BYTES,
+        compact=compaction,
+    )
     data = {"files": file_contents, "lang": lang}
 
     ai_response = run(config, PROMPT, data)
 
-    ai_response.write_to_file(output)
+    ai_response.write_to_file(output, tee=True)
@@ -0,0 +1,43 @@
+"""Code review tool.
+
+Reviews the files changed in a git repository, by default the uncommitted changes.
+
+Example usage:
+
+`clm --since main --diff run review src/ -p "*.py"`
+"""
+
+from pathlib import Path
+
+import click
+
+from cli_llm import ClmConfig, helpers, run
+
+PROMPT = """
+- Below are the {{"diffs" if diff else "contents"}} of some files changed in a pull request.
+- Review the changes, pointing out bugs, unclear code and missing tests.
+
+{% for f, contents in files %}
+Filename: {{f}}
+
+```
+{{contents}}
+```
+{% endfor %}
+"""
+
+
+@click.command()
+@click.argument("path", type=Path, default=Path())
+@click.option("-p", "--pattern", type=str, multiple=True, default=("*",))
+@click.pass_obj
+def tool(config: ClmConfig, path: Path, pattern: tuple[str, ...]) -> None:
+    """Review the changed files."""
+    files = helpers.changed_file_contents(
+        config, search_path=path, pattern=pattern, max_file_bytes=helpers.MAX_FILE_BYTES
+    )
+    if not files:
+        click.echo("There are no changes to review.")
+        return
+
+    run(config, PROMPT, {"files": files, "diff": config.git_diff}).stream()
@@ -1,20 +1,24 @@
 """Summarisation tool.
 
+Each file is summarised on its own, then the summaries are combined. The summaries are cached, so running it again
+only summarises the files that have changed.
+
 Example usage:
 
-`clm run summarise src/ -l python -p "*.py"`
+`clm run summarise src/ -l python -p "*.py" -p "!tests" --compact`
 """
 
 from pathlib import Path
 
 import click
 
-from cli_llm import ClmConfig, helpers, run
+from cli_llm import ClmConfig, helpers, reduce_results
+from cli_llm.compact import Compaction
 
-PROMPT = """
+MAP_PROMPT = """
 - Below are some {{lang}} files from a library.
 - Each file will be listed with its name and then its content.
-- Summarise the code and make some suggestions for new features.
+- Summarise the code, noting anything that could be improved.
 
 {% for f, contents in files %}
 Filename: {{f}}
@@ -25,21 +29,41 @@ Filename: {{f}}
 {% endfor %}
 """
 
+REDUCE_PROMPT = """
+- Below are summaries of different parts of a {{lang}} library.
+- Combine them into a single summary of the library and make some suggestions for new features.
+
+{% for summary in results %}
+{{summary}}
+{% endfor %}
+"""
+
 
 @click.command()
 @click.argument("path", type=Path)
 @click.option("-l", "--lang", type=str, default="")
-@click.option("-p", "--pattern", type=str, default="*")
+@click.option("-p", "--pattern", type=str, multiple=True, default=("*",))
 @click.option("-o", "--output", type=Path, default=None)
+@click.option("--compact", is_flag=True, help="Strip comments and blank lines, and leave out lockfiles and licenses.")
 @click.pass_obj
-def tool(config: ClmConfig, path: Path, lang: str, pattern: str, output: Path | None) -> None:
+def tool(  # noqa: PLR0913
+    config: ClmConfig, path: Path, lang: str, pattern: tuple[str, ...], output: Path | None, *, compact: bool
+) -> None:
     """Summarise a given set of files."""
-    file_contents = helpers.gather_file_contents(search_path=path, pattern=pattern)
-    data = {"files": file_contents, "lang": lang}
-
-    ai_response = run(config, PROMPT, data)
+    summaries = helpers.digest_file_contents(
+        config,
+        MAP_PROMPT,
+        search_path=path,
+        pattern=pattern,
+        gitignore=True,
+        prompt_data={"lang": lang},
+        max_file_bytes=helpers.MAX_FILE_BYTES,
+        compact=Compaction() if compact else None,
+    )
+    results = [summary for _, summary in summaries]
+    ai_response = reduce_results(config, REDUCE_PROMPT, results, prompt_data={"lang": lang})
 
     if output is not None:
-        ai_response.write_to_file(output)
+        ai_response.write_to_file(output, tee=True)
     else:
         ai_response.stream()
@@ -1,7 +1,39 @@
 """Application for making it easy to build custom LLM tooling."""
 
-from cli_llm.config import ClmConfig
-from cli_llm.response import Response
-from cli_llm.run import run
+import importlib
+import typing as t
 
-__all__ = ["ClmConfig", "Response", "run"]
+from cli_llm.map_reduce import map_reduce, reduce_results
+from cli_llm.response import AsyncResponse, Response
+from cli_llm.run import arun, arun_many, run
+from cli_llm.tokens import fit_files
+
+if t.TYPE_CHECKING:
+    from cli_llm.config import ClmConfig
+
+__all__ = [
+    "AsyncResponse",
+    "ClmConfig",
+    "Response",
+    "arun",
+    "arun_many",
+    "fit_files",
+    "map_reduce",
+    "reduce_results",
+    "run",
+]
+
+# Names imported on first use, as importing them pulls in heavy dependencies that the CLI does not always need.
+_LAZY_IMPORTS = {"ClmConfig": "cli_llm.config"}
+
+
+def __getattr__(name: str) -> t.Any:
+    """Import the lazily imported parts of the public API."""
+    try:
+        module = _LAZY_IMPORTS[name]
+    except KeyError:
+        msg = f"module {__name__!r} has no attribute {name!r}"
+        raise AttributeError(msg) from None
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
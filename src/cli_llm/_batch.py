@@ -0,0 +1,282 @@
+"""Module for running a tool over many inputs concurrently.
+
+The tool is loaded once and invoked for each input from a pool of worker threads, in the same process, so each input
+only pays for the tool itself rather than for starting `clm`, loading the config and discovering the tools.
+
+What each input writes to stdout and stderr is held back until it finishes, so the output of inputs processed at the
+same time is not interleaved.
+"""
+
+import contextlib
+import contextvars
+import glob
+import io
+import random
+import sys
+import threading
+import time
+import typing as t
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+
+import click
+import llm
+
+from cli_llm import errors
+from cli_llm._history import tool_initializer
+from cli_llm._logging import ClmLogger, progress
+
+if t.TYPE_CHECKING:
+    from collections.abc import Callable, Iterable, Iterator
+
+log = ClmLogger()
+
+PERMANENT_ERRORS = (
+    click.ClickException,
+    click.Abort,
+    errors.CliLlmError,
+    llm.UnknownModelError,
+    llm.NeedsKeyException,
+    AttributeError,
+    ImportError,
+    NameError,
+    NotImplementedError,
+    TypeError,
+)
+"""Errors that would happen again if the tool was retried, e.g. bad arguments, a broken tool or a missing API key.
+Any other error, such as a network error or a rate limit, is assumed to be transient."""
+
+INPUT_PLACEHOLDER = "{}"
+"""Replaced by the input in the tool arguments, the input is appended to them if they do not contain it."""
+
+
+def expand_inputs(values: "Iterable[str]") -> list[str]:
+    """Expand the given glob patterns and `@file` lists of inputs, in order and without duplicates.
+
+    Args:
+        values: Glob patterns, which support `**`, or `@` followed by a file listing one input per line. `@-` reads
+            the list from stdin. Blank lines and lines starting with `#` are ignored.
+
+    Returns:
+        The inputs.
+    """
+    inputs: dict[str, None] = {}
+    for value in values:
+        if value.startswith("@"):
+            with click.open_file(value[1:]) as f:
+                lines = (line.strip() for line in f)
+                inputs.update(dict.fromkeys(line for line in lines if line and not line.startswith("#")))
+        else:
+            inputs.update(dict.fromkeys(sorted(glob.glob(value, recursive=True))))  # noqa: PTH207
+    return list(inputs)
+
+
+@dataclass(frozen=True)
+class BatchFailure:
+    """An input the tool failed on."""
+
+    input: str
+    error: str
+    attempts: int
+
+
+@dataclass
+class BatchSummary:
+    """The outcome of running a tool over many inputs."""
+
+    total: int
+    elapsed: float
+    failures: list[BatchFailure] = field(default_factory=list)
+    unfinished: int = 0
+    """The inputs left unprocessed because the run was interrupted."""
+
+    @property
+    def processed(self) -> int:
+        """The number of inputs the tool finished on, successfully or not."""
+        return self.total - self.unfinished
+
+    @property
+    def succeeded(self) -> int:
+        """The number of inputs the tool succeeded on."""
+        return self.processed - len(self.failures)
+
+    @property
+    def per_minute(self) -> float:
+        """The number of inputs processed per minute."""
+        return self.processed / self.elapsed * 60 if self.elapsed else 0.0
+
+    def report(self) -> None:
+        """Report the throughput and any failures."""
+        for failure in self.failures:
+            log.error("Failed on %s after %s attempt(s): %s", failure.input, failure.attempts, failure.error)
+        if self.unfinished:
+            log.warning("Interrupted, leaving %s of %s inputs unfinished", self.unfinished, self.total)
+        log.print(
+            f"Processed {self.processed} inputs in {self.elapsed:.1f}s ({self.per_minute:.1f} per minute): "
+            f"{self.succeeded} succeeded, {len(self.failures)} failed"
+        )
+
+
+def _describe(error: Exception) -> str:
+    if isinstance(error, click.ClickException):
+        return error.format_message()
+    return f"{type(error).__name__}: {error}"
+
+
+class _ThreadOutput:
+    """Stands in for stdout or stderr, sending the writes of any thread capturing its output to its own buffer.
+
+    The buffer is held in a context variable, so threads started in a copy of the capturing thread's context, such as
+    the stream writer's flush timer, write to it too.
+    """
+
+    def __init__(self, stream: t.TextIO) -> None:
+        self.stream = stream
+        self._buffer: contextvars.ContextVar[io.StringIO | None] = contextvars.ContextVar("buffer", default=None)
+
+    def __getattr__(self, name: str) -> t.Any:
+        return getattr(self.stream, name)
+
+    def _target(self) -> t.TextIO:
+        return self._buffer.get() or self.stream
+
+    def write(self, text: str) -> int:
+        return self._target().write(text)
+
+    def flush(self) -> None:
+        self._target().flush()
+
+    @contextlib.contextmanager
+    def capture(self, buffer: io.StringIO) -> "Iterator[None]":
+        """Capture what the current thread writes in the buffer until the context exits."""
+        token = self._buffer.set(buffer)
+        try:
+            yield
+        finally:
+            self._buffer.reset(token)
+
+
+@contextlib.contextmanager
+def _thread_output() -> "Iterator[tuple[_ThreadOutput, _ThreadOutput]]":
+    stdout, stderr = _ThreadOutput(sys.stdout), _ThreadOutput(sys.stderr)
+    sys.stdout, sys.stderr = stdout, stderr
+    try:
+        yield stdout, stderr
+    finally:
+        sys.stdout, sys.stderr = stdout.stream, stderr.stream
+
+
+class BatchRunner:
+    """Invokes a tool once per input from a pool of worker threads."""
+
+    def __init__(  # noqa: PLR0913
+        self,
+        ctx: click.Context,
+        name: str,
+        tool: click.Command,
+        tool_args: "Iterable[str]",
+        *,
+        concurrency: int,
+        retries: int,
+        backoff: float,
+        sleep: "Callable[[float], None]" = time.sleep,
+    ) -> None:
+        """Initialise the runner.
+
+        Args:
+            ctx: The context the tool is invoked under, providing the config.
+            name: The name of the tool.
+            tool: The tool command.
+            tool_args: The arguments to invoke the tool with, where `{}` is replaced by the input.
+            concurrency: The number of inputs to process at once.
+            retries: How many times to retry an input after a transient error.
+            backoff: The base delay in seconds before a retry, doubled after each failed attempt.
+            sleep: Function used to wait for the given number of seconds.
+        """
+        self.ctx = ctx
+        self.name = name
+        self.tool = tool
+        self.tool_args = list(tool_args)
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self._sleep = sleep
+        self._output_lock = threading.Lock()
+
+    def _args(self, item: str) -> list[str]:
+        if any(INPUT_PLACEHOLDER in arg for arg in self.tool_args):
+            return [arg.replace(INPUT_PLACEHOLDER, item) for arg in self.tool_args]
+        return [*self.tool_args, item]
+
+    def _invoke(self, item: str) -> None:
+        try:
+            with self.tool.make_context(self.name, self._args(item), parent=self.ctx) as ctx:
+                self.tool.invoke(ctx)
+        except errors.DryRunComplete:
+            return
+        except click.exceptions.Exit as e:
+            if e.exit_code:
+                msg = f"The tool exited with code {e.exit_code}"
+                raise click.ClickException(msg) from e
+
+    def process(self, item: str) -> BatchFailure | None:
+        """Invoke the tool on the input, retrying transient errors with exponential backoff and jitter."""
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                self._invoke(item)
+            except Exception as e:  # noqa: BLE001
+                if isinstance(e, PERMANENT_ERRORS) or attempt > self.retries:
+                    return BatchFailure(item, _describe(e), attempt)
+                delay = random.uniform(0, self.backoff * 2 ** (attempt - 1))  # noqa: S311
+                log.warning("Retrying %s in %.1fs after a transient error: %s", item, delay, _describe(e))
+                self._sleep(delay)
+            else:
+                return None
+
+    def _process_captured(self, output: tuple[_ThreadOutput, _ThreadOutput], item: str) -> BatchFailure | None:
+        stdout, stderr = output
+        out, err = io.StringIO(), io.StringIO()
+        try:
+            with stdout.capture(out), stderr.capture(err):
+                return self.process(item)
+        finally:
+            with self._output_lock:
+                sys.stdout.write(out.getvalue())
+                sys.stderr.write(err.getvalue())
+                sys.stdout.flush()
+                sys.stderr.flush()
+
+    def run(self, inputs: list[str]) -> BatchSummary:
+        """Invoke the tool on every input, showing the progress.
+
+        On Ctrl-C the inputs not yet started are cancelled, without waiting for those in flight, and the summary
+        counts them as unfinished.
+
+        Returns:
+            The summary of the run.
+        """
+        start = time.perf_counter()
+        failures = []
+        finished = 0
+        executor = ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix="clm-batch", initializer=tool_initializer()
+        )
+        try:
+            with _thread_output() as output, progress() as bar:
+                task = bar.add_task(f"Running {self.name}", total=len(inputs))
+                futures = [executor.submit(self._process_captured, output, item) for item in inputs]
+                for future in as_completed(futures):
+                    failure = future.result()
+                    if failure is not None:
+                        failures.append(failure)
+                    finished += 1
+                    bar.advance(task)
+        except KeyboardInterrupt:
+            executor.shutdown(wait=False, cancel_futures=True)
+        else:
+            executor.shutdown()
+        order = {item: i for i, item in enumerate(inputs)}
+        failures.sort(key=lambda failure: order[failure.input])
+        return BatchSummary(len(inputs), time.perf_counter() - start, failures, unfinished=len(inputs) - finished)
@@ -0,0 +1,319 @@
+"""Module for recording model responses as cassettes and replaying them offline, as done by `clm --record/--replay`.
+
+A cassette holds the rendered prompt, the model id, the options, each chunk of the response with the time since the
+one before it, and the token usage. Cassettes are keyed on the prompt, system prompt and options but not the model,
+so a session recorded against any model can be replayed by the `replay` model.
+
+The `replay` model is registered with `llm` by the `register_models` hook in this module, which is an `llm` plugin.
+"""
+
+import asyncio
+import hashlib
+import json
+import time
+import typing as t
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+import llm
+from llm.models import AsyncKeyModel, AsyncModel, KeyModel
+from pydantic import ConfigDict
+
+from cli_llm import errors
+from cli_llm._files import atomic_write_text
+from cli_llm._logging import ClmLogger
+
+if t.TYPE_CHECKING:
+    from collections.abc import AsyncGenerator, Callable, Iterator
+
+    from llm.models import AsyncResponse
+
+    from cli_llm._models import AnyModel
+
+log = ClmLogger()
+
+CASSETTE_FORMAT = 1
+
+REPLAY_MODEL_ID = "replay"
+
+
+def cassette_key(prompt: llm.Prompt) -> str:
+    """The key of the cassette for the prompt."""
+    options = {name: value for name, value in dict(prompt.options).items() if value is not None}
+    data = json.dumps([prompt.prompt, prompt.system, options], sort_keys=True, default=str)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+@dataclass
+class Cassette:
+    """A recorded response."""
+
+    model_id: str
+    prompt: str
+    system: str
+    options: dict[str, t.Any]
+    chunks: list[tuple[float, str]] = field(default_factory=list)
+    """Each chunk, with the seconds since the previous chunk, or since the prompt was sent for the first chunk."""
+    input_tokens: int | None = None
+    output_tokens: int | None = None
+
+    @classmethod
+    def start(cls, model_id: str, prompt: llm.Prompt) -> t.Self:
+        """Start a cassette of the response to the prompt."""
+        options = {name: value for name, value in dict(prompt.options).items() if value is not None}
+        return cls(model_id, prompt.prompt, prompt.system, options)
+
+    def save(self, path: Path) -> None:
+        """Write the cassette to the path."""
+        data = {"format": CASSETTE_FORMAT, **asdict(self)}
+        atomic_write_text(path, json.dumps(data, indent=2, default=str))
+
+    @classmethod
+    def load(cls, path: Path) -> t.Self:
+        """Read the cassette from the path.
+
+        Raises:
+            CassetteNotFoundError: If there is no readable cassette at the path.
+        """
+        try:
+            data = json.loads(path.read_text())
+            cassette_format = data.pop("format")
+            data["chunks"] = [(delay, chunk) for delay, chunk in data["chunks"]]
+            cassette = cls(**data)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            raise errors.CassetteNotFoundError(path, str(e)) from e
+        if cassette_format != CASSETTE_FORMAT:
+            raise errors.CassetteNotFoundError(path, f"unsupported format {cassette_format}")
+        return cassette
+
+    def record_usage(self, response: "llm.Response | AsyncResponse") -> None:
+        """Record the tokens used by the response, as reported by the model."""
+        self.input_tokens = response.input_tokens
+        self.output_tokens = response.output_tokens
+
+
+class _Clock:
+    """Measures the seconds between the chunks of a response."""
+
+    def __init__(self) -> None:
+        self.last = time.perf_counter()
+
+    def lap(self) -> float:
+        now = time.perf_counter()
+        lap, self.last = now - self.last, now
+        return lap
+
+
+def _copy_capabilities(
+    wrapper: llm.Model | AsyncModel, model: "llm.Model | KeyModel | AsyncModel | AsyncKeyModel"
+) -> None:
+    wrapper.model_id = model.model_id
+    wrapper.Options = model.Options
+    wrapper.can_stream = model.can_stream
+    wrapper.attachment_types = model.attachment_types
+    wrapper.supports_schema = model.supports_schema
+    wrapper.supports_tools = model.supports_tools
+
+
+class RecordingModel(llm.Model):
+    """Wraps a model, saving each of its responses as a cassette."""
+
+    def __init__(self, model: llm.Model | KeyModel, directory: Path) -> None:
+        """Initialise the wrapper.
+
+        Args:
+            model: The model to record.
+            directory: The directory to save the cassettes in.
+        """
+        self.model = model
+        self.directory = directory
+        _copy_capabilities(self, model)
+
+    def __str__(self) -> str:
+        """The wrapped model, noting that it is being recorded."""
+        return f"{self.model} (recording)"
+
+    def execute(
+        self,
+        prompt: llm.Prompt,
+        stream: bool,  # noqa: FBT001
+        response: llm.Response,
+        conversation: llm.Conversation | None,
+    ) -> "Iterator[str]":
+        """Prompt the wrapped model, recording its response."""
+        if isinstance(self.model, KeyModel):
+            chunks = self.model.execute(prompt, stream, response, conversation, key=self.model.get_key())
+        else:
+            chunks = self.model.execute(prompt, stream, response, conversation)
+        cassette = Cassette.start(self.model_id, prompt)
+        clock = _Clock()
+        for chunk in chunks:
+            cassette.chunks.append((clock.lap(), chunk))
+            yield chunk
+        cassette.record_usage(response)
+        _save(cassette, self.directory / f"{cassette_key(prompt)}.json")
+
+
+class AsyncRecordingModel(AsyncModel):
+    """Wraps an async model, saving each of its responses as a cassette."""
+
+    def __init__(self, model: "AsyncModel | AsyncKeyModel", directory: Path) -> None:
+        """Initialise the wrapper.
+
+        Args:
+            model: The model to record.
+            directory: The directory to save the cassettes in.
+        """
+        self.model = model
+        self.directory = directory
+        _copy_capabilities(self, model)
+
+    def __str__(self) -> str:
+        """The wrapped model, noting that it is being recorded."""
+        return f"{self.model} (recording)"
+
+    async def execute(
+        self,
+        prompt: llm.Prompt,
+        stream: bool,  # noqa: FBT001
+        response: "AsyncResponse",
+        conversation: llm.AsyncConversation | None,
+    ) -> "AsyncGenerator[str]":
+        """Prompt the wrapped model, recording its response."""
+        if isinstance(self.model, AsyncKeyModel):
+            chunks = self.model.execute(prompt, stream, response, conversation, key=self.model.get_key())
+        else:
+            chunks = self.model.execute(prompt, stream, response, conversation)
+        cassette = Cassette.start(self.model_id, prompt)
+        clock = _Clock()
+        async for chunk in chunks:
+            cassette.chunks.append((clock.lap(), chunk))
+            yield chunk
+        cassette.record_usage(response)
+        _save(cassette, self.directory / f"{cassette_key(prompt)}.json")
+
+
+def _save(cassette: Cassette, path: Path) -> None:
+    try:
+        cassette.save(path)
+    except OSError as e:
+        log.warning("Could not save the cassette %s: %s", path, e)
+    else:
+        log.info("Recorded the response in %s", path)
+
+
+def _load(directory: Path | None, prompt: llm.Prompt) -> Cassette:
+    if directory is None:
+        raise errors.CassetteNotFoundError(None)
+    return Cassette.load(directory / f"{cassette_key(prompt)}.json")
+
+
+def _delays(cassette: Cassette, speed: float) -> "Iterator[tuple[float, str]]":
+    """Each chunk with the seconds to wait before it, keeping to the recorded timing however long the wait takes."""
+    start = time.perf_counter()
+    due = 0.0
+    for delay, chunk in cassette.chunks:
+        due += delay * speed
+        yield max(due - (time.perf_counter() - start), 0), chunk
+
+
+class ReplayModel(llm.Model):
+    """Serves the responses saved in cassettes, with their recorded timing."""
+
+    model_id = REPLAY_MODEL_ID
+    can_stream = True
+
+    class Options(llm.Options):
+        """Any options, as the options of the recorded model are part of the key of its cassettes."""
+
+        model_config = ConfigDict(extra="allow")
+
+    def __init__(self, directory: Path | None = None, speed: float = 1.0) -> None:
+        """Initialise the model.
+
+        Args:
+            directory: The directory of the cassettes.
+            speed: The multiple of the recorded delays to wait, e.g. 0.5 replays twice as fast and 0 without delays.
+        """
+        self.directory = directory
+        self.speed = speed
+
+    def execute(
+        self,
+        prompt: llm.Prompt,
+        stream: bool,  # noqa: ARG002, FBT001
+        response: llm.Response,
+        conversation: llm.Conversation | None,  # noqa: ARG002
+    ) -> "Iterator[str]":
+        """Replay the cassette of the prompt."""
+        cassette = _load(self.directory, prompt)
+        for delay, chunk in _delays(cassette, self.speed):
+            if delay:
+                time.sleep(delay)
+            yield chunk
+        response.set_usage(input=cassette.input_tokens, output=cassette.output_tokens)
+
+
+class AsyncReplayModel(AsyncModel):
+    """Serves the responses saved in cassettes, with their recorded timing."""
+
+    model_id = REPLAY_MODEL_ID
+    can_stream = True
+
+    class Options(llm.Options):
+        """Any options, as the options of the recorded model are part of the key of its cassettes."""
+
+        model_config = ConfigDict(extra="allow")
+
+    def __init__(self, directory: Path | None = None, speed: float = 1.0) -> None:
+        """Initialise the model.
+
+        Args:
+            directory: The directory of the cassettes.
+            speed: The multiple of the recorded delays to wait, e.g. 0.5 replays twice as fast and 0 without delays.
+        """
+        self.directory = directory
+        self.speed = speed
+
+    async def execute(
+        self,
+        prompt: llm.Prompt,
+        stream: bool,  # noqa: ARG002, FBT001
+        response: "AsyncResponse",
+        conversation: llm.AsyncConversation | None,  # noqa: ARG002
+    ) -> "AsyncGenerator[str]":
+        """Replay the cassette of the prompt."""
+        cassette = _load(self.directory, prompt)
+        for delay, chunk in _delays(cassette, self.speed):
+            await asyncio.sleep(delay)
+            yield chunk
+        response.set_usage(input=cassette.input_tokens, output=cassette.output_tokens)
+
+
+@llm.hookimpl
+def register_models(register: "Callable[..., None]") -> None:
+    """Register the `replay` model with `llm`."""
+    register(ReplayModel(), AsyncReplayModel())
+
+
+def with_cassettes(
+    model: "AnyModel", *, record_dir: Path | None, replay_dir: Path | None, replay_speed: float
+) -> "AnyModel":
+    """The model, replaying from or recording to cassettes as configured.
+
+    Args:
+        model: The resolved model.
+        record_dir: The directory to record cassettes of the model's responses in, if any.
+        replay_dir: The directory of the cassettes served by the `replay` model.
+        replay_speed: The multiple of the recorded delays the `replay` model waits.
+
+    Returns:
+        The model to prompt.
+    """
+    if isinstance(model, ReplayModel | AsyncReplayModel):
+        return type(model)(replay_dir, replay_speed)
+    if record_dir is None:
+        return model
+    if isinstance(model, AsyncModel | AsyncKeyModel):
+        return AsyncRecordingModel(model, record_dir)
+    return RecordingModel(model, record_dir)
@@ -1,80 +1,155 @@
 import typing as t
-from functools import cache
-from importlib import util
-from pathlib import Path
-from types import ModuleType
 
 import click
+from click.utils import make_default_short_help
 
-from cli_llm import ClmConfig, errors
-from cli_llm._logging import ClmLogger
+from cli_llm import errors
+from cli_llm._discovery import discover_tools, load_tool_script
+from cli_llm._logging import ClmLogger, Transcript
+from cli_llm._manifest import MANIFEST_FILE, ToolEntry, ToolManifest, ToolStatus
+from cli_llm._timings import timings
 from cli_llm.types import RT, P
 
+if t.TYPE_CHECKING:
+    from pathlib import Path
+
+    from click.shell_completion import CompletionItem
+
+    from cli_llm.config import ClmConfig
+
 log = ClmLogger()
 
+CLI_SETTINGS_KEY = "cli_llm.cli_settings"
+
+PROFILE_KEY = "cli_llm.profile"
+
 
 def common_options(fn: t.Callable[P, RT]) -> t.Callable[P, RT]:
     """Common options for commands."""
     return click.option("-v", "--verbose", count=True)(click.option("-q", "--quiet", is_flag=True, default=False)(fn))
 
 
-@cache
-def load_tool_script(filepath: Path) -> ModuleType:
-    """Load the given filepath as a tool script."""
-    module_name = filepath.stem
-    tools_dir = filepath.parent
+def get_config(ctx: click.Context) -> "ClmConfig":
+    """Get the config of the invocation, building it the first time a command needs it.
+
+    Settings given on the command line are taken from `ctx.meta`. Commands that never need the config, and
+    `--help`, never pay for building it. If the config sets a `transcript`, the console is recorded from then on and
+    saved to it when the invocation finishes.
+    """
+    if ctx.obj is None:
+        from cli_llm.config import ClmConfig
 
-    log.info("Loading tool from: %s", filepath)
+        with timings.phase("config load"):
+            ctx.obj = config = ClmConfig(**ctx.meta.get(CLI_SETTINGS_KEY, {}))
+        if config.transcript is not None:
+            _record_transcript(ctx, config.transcript, config.transcript_max_lines)
+    return t.cast("ClmConfig", ctx.obj)
 
-    spec = util.spec_from_file_location("test", filepath)
-    if spec is None or spec.loader is None:  # pragma: no cover # Not sure how to trigger this scenario
-        raise errors.InvalidModuleError(module_name, tools_dir)
-    module = util.module_from_spec(spec)
-    try:
-        spec.loader.exec_module(module)
-    except FileNotFoundError as e:
-        raise errors.InvalidModuleError(module_name, tools_dir) from e
 
-    return module
+def _record_transcript(ctx: click.Context, path: "Path", max_lines: int) -> None:
+    transcript = Transcript(max_lines=max_lines)
+    root = ctx.find_root()
+    root.with_resource(transcript)
+    root.call_on_close(lambda: transcript.save(path))
 
 
 class ToolGatherer(click.MultiCommand):
-    """Click command for gathering all valid tools."""
+    """Click command for gathering all valid tools.
+
+    Listing the tools is served from the tool manifest, so only the scripts that changed since they were last
+    inspected are discovered again. Running a tool only imports that tool's script.
+    """
+
+    def tool_entries(self, ctx: click.Context) -> list[ToolEntry]:
+        """The manifest entries of every tool script, refreshed where stale."""
+        if "cli_llm.tool_entries" in ctx.meta:
+            return t.cast("list[ToolEntry]", ctx.meta["cli_llm.tool_entries"])
+
+        final_config = get_config(ctx)
+        with timings.phase("tool discovery"):
+            entries = self._discover(final_config)
+        ctx.meta["cli_llm.tool_entries"] = entries
+        return entries
+
+    @staticmethod
+    def _discover(final_config: "ClmConfig") -> list[ToolEntry]:
+        manifest = ToolManifest.load(final_config.cache_dir / MANIFEST_FILE)
+        cached = {}
+        stale = {}
+        for name, filepath in final_config.tool_files.items():
+            entry = manifest.lookup(filepath, filepath.stat(), final_config.discovery)
+            if entry is None:
+                stale[name] = filepath
+            else:
+                cached[name] = entry
+
+        discovered = discover_tools(stale, engine=final_config.discovery)
+        for entry in discovered.values():
+            # Import failures can depend on the environment rather than the script, so they are always retried.
+            if entry.status is not ToolStatus.FAILED or entry.engine == "static":
+                manifest.update(entry)
+
+        entries = [cached.get(name) or discovered[name] for name in final_config.tool_files]
+        for entry in entries:
+            entry.log_status()
+        manifest.retain(entry.path for entry in entries)
+        manifest.save()
+        return entries
+
+    def invoke(self, ctx: click.Context) -> t.Any:
+        """Invoke the tool, profiling it if `--profile` was given. A dry run ends once it has reported a prompt."""
+        try:
+            return self._invoke(ctx)
+        except errors.DryRunComplete:
+            return None
+
+    def _invoke(self, ctx: click.Context) -> t.Any:
+        mode = ctx.meta.get(PROFILE_KEY)
+        if mode is None:
+            return super().invoke(ctx)
+        from cli_llm._profile import PROFILE_DIR, profile
+
+        name = next(iter(ctx.protected_args), ctx.info_name or "run")
+        with profile(mode, get_config(ctx).cache_dir / PROFILE_DIR, name):
+            return super().invoke(ctx)
 
     def list_commands(self, ctx: click.Context) -> list[str]:
         """Dynamically get the list of tool commands."""
-        final_config: ClmConfig = ctx.obj
-        rv = []
-        for name, filepath in final_config.tool_files.items():
-            try:
-                module = load_tool_script(filepath)
-            except Exception as e:  # noqa: BLE001
-                log.warning("Failed to get the tool script from `%s` due to: %s", name, e)
-                continue
-            if not hasattr(module, "tool"):
-                log.warning("The module `%s` does not have an attribute `tool`", name)
-                continue
-            if module.tool is None:
-                log.debug("Skipping module `%s`", name)
-                continue
-            if not isinstance(module.tool, click.Command):
-                log.warning("The attribute `tool` in the module `%s` is not of type `click.Command`", name)
-                continue
-            rv.append(name)
-        rv.sort()
-
-        return rv
+        return sorted(entry.name for entry in self.tool_entries(ctx) if entry.is_command)
+
+    def format_commands(self, ctx: click.Context, formatter: click.HelpFormatter) -> None:
+        """List the tool commands using the help text recorded in the manifest."""
+        rows = [(entry.name, entry.help) for entry in self.tool_entries(ctx) if entry.is_command and not entry.hidden]
+        if not rows:
+            return
+        limit = formatter.width - 6 - max(len(name) for name, _ in rows)
+        with formatter.section("Commands"):
+            formatter.write_dl(sorted((name, make_default_short_help(help_, limit)) for name, help_ in rows))
+
+    def shell_complete(self, ctx: click.Context, incomplete: str) -> list["CompletionItem"]:
+        """Complete tool names using the help text recorded in the manifest."""
+        from click.shell_completion import CompletionItem
+
+        results = [
+            CompletionItem(entry.name, help=make_default_short_help(entry.help))
+            for entry in self.tool_entries(ctx)
+            if entry.is_command and not entry.hidden and entry.name.startswith(incomplete)
+        ]
+        results.extend(super(click.MultiCommand, self).shell_complete(ctx, incomplete))
+        return results
 
     def get_command(self, ctx: click.Context, name: str) -> click.Command:
         """Dynamically get the named tool command."""
-        final_config: ClmConfig = ctx.obj
-        try:
-            filepath = final_config.tool_files[name]
-        except KeyError:
-            msg = f"Unrecognized tool command `{name}`"
-            raise click.UsageError(msg) from None
-        module = load_tool_script(filepath)
-        if not isinstance(module.tool, click.Command):  # pragma: no cover # Should be filtered out in list_commands
-            msg = f"The attribute `tool` in the module :{module.__name__} is not of type `click.Command`"
+        final_config = get_config(ctx)
+        with timings.phase("tool discovery"):
+            try:
+                filepath = final_config.tool_files[name]
+            except KeyError:
+                msg = f"Unrecognized tool command `{name}`"
+                raise click.UsageError(msg) from None
+            module = load_tool_script(filepath)
+        tool = getattr(module, "tool", None)
+        if not isinstance(tool, click.Command):
+            msg = f"The attribute `tool` in the module `{name}` is not of type `click.Command`"
             raise errors.InvalidToolCommandError(msg)
-        return module.tool
+        return tool
@@ -0,0 +1,239 @@
+"""Module for discovering which tool scripts expose a tool.
+
+There are two discovery engines:
+
+- `import` executes each tool script and inspects the resulting `tool` attribute.
+- `static` parses each tool script with `ast` and never executes any tool code. Only bindings of `tool` that can be
+  recognised as click commands are listed.
+"""
+
+import ast
+import os
+import typing as t
+from dataclasses import replace
+from functools import cache
+from importlib import util
+from types import ModuleType
+
+import click
+
+from cli_llm import errors
+from cli_llm._logging import ClmLogger
+from cli_llm._manifest import ToolEntry, ToolStatus, cli_llm_version
+
+if t.TYPE_CHECKING:
+    from pathlib import Path
+
+log = ClmLogger()
+
+DiscoveryEngine = t.Literal["import", "static"]
+
+PARALLEL_THRESHOLD = 16
+"""The number of scripts to parse before it is worth starting a process pool."""
+
+CLICK_MODULES = frozenset({"click", "rich_click"})
+CLICK_DECORATORS = frozenset({"command", "group"})
+CLICK_CLASSES = frozenset({"Command", "Group", "MultiCommand", "CommandCollection"})
+
+
+@cache
+def load_tool_script(filepath: "Path") -> ModuleType:
+    """Load the given filepath as a tool script."""
+    module_name = filepath.stem
+    tools_dir = filepath.parent
+
+    log.info("Loading tool from: %s", filepath)
+
+    spec = util.spec_from_file_location("test", filepath)
+    if spec is None or spec.loader is None:  # pragma: no cover # Not sure how to trigger this scenario
+        raise errors.InvalidModuleError(module_name, tools_dir)
+    module = util.module_from_spec(spec)
+    try:
+        spec.loader.exec_module(module)
+    except FileNotFoundError as e:
+        raise errors.InvalidModuleError(module_name, tools_dir) from e
+
+    return module
+
+
+def _new_entry(name: str, filepath: "Path", engine: DiscoveryEngine) -> ToolEntry:
+    stat = filepath.stat()
+    return ToolEntry(
+        name, str(filepath), stat.st_mtime_ns, stat.st_size, cli_llm_version(), ToolStatus.VALID, engine=engine
+    )
+
+
+def inspect_tool_script(name: str, filepath: "Path") -> ToolEntry:
+    """Import the given tool script and describe the `tool` attribute it exposes."""
+    entry = _new_entry(name, filepath, "import")
+    try:
+        module = load_tool_script(filepath)
+    except Exception as e:  # noqa: BLE001
+        return replace(entry, status=ToolStatus.FAILED, error=str(e))
+    if not hasattr(module, "tool"):
+        return replace(entry, status=ToolStatus.MISSING)
+    if module.tool is None:
+        return replace(entry, status=ToolStatus.SKIPPED)
+    if not isinstance(module.tool, click.Command):
+        return replace(entry, status=ToolStatus.INVALID_TYPE)
+    return replace(entry, help=module.tool.short_help or module.tool.help or "", hidden=module.tool.hidden)
+
+
+class _ClickNames:
+    """The names a module binds to click and to its click commands."""
+
+    def __init__(self) -> None:
+        self.modules: set[str] = set()
+        self.decorators: set[str] = set()
+        self.classes: set[str] = set()
+        self.commands: dict[str, tuple[str, bool]] = {}
+
+    def record_import(self, node: ast.Import | ast.ImportFrom) -> None:
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.name in CLICK_MODULES:
+                    self.modules.add(alias.asname or alias.name)
+        elif node.module in CLICK_MODULES:
+            for alias in node.names:
+                if alias.name in CLICK_DECORATORS:
+                    self.decorators.add(alias.asname or alias.name)
+                elif alias.name in CLICK_CLASSES:
+                    self.classes.add(alias.asname or alias.name)
+
+    def is_decorator(self, node: ast.expr) -> bool:
+        """Whether the callee is a click command decorator factory, e.g. `click.command` or `group.command`."""
+        if isinstance(node, ast.Name):
+            return node.id in self.decorators
+        return (
+            isinstance(node, ast.Attribute)
+            and node.attr in CLICK_DECORATORS
+            and isinstance(node.value, ast.Name)
+            and (node.value.id in self.modules or node.value.id in self.commands)
+        )
+
+    def is_class(self, node: ast.expr) -> bool:
+        """Whether the callee is a click command class, e.g. `click.Group`."""
+        if isinstance(node, ast.Name):
+            return node.id in self.classes
+        return (
+            isinstance(node, ast.Attribute)
+            and node.attr in CLICK_CLASSES
+            and isinstance(node.value, ast.Name)
+            and node.value.id in self.modules
+        )
+
+
+def _keyword_help(call: ast.Call) -> tuple[str | None, bool]:
+    """Extract the listing help text and hidden flag passed to a click decorator or class."""
+    keywords = {
+        keyword.arg: keyword.value.value for keyword in call.keywords if isinstance(keyword.value, ast.Constant)
+    }
+    help_ = keywords.get("short_help") or keywords.get("help")
+    return (help_ if isinstance(help_, str) else None), bool(keywords.get("hidden", False))
+
+
+def _decorated_command(node: ast.FunctionDef | ast.AsyncFunctionDef, names: _ClickNames) -> tuple[str, bool] | None:
+    """The help text and hidden flag of a function turned into a click command, if it is one."""
+    for decorator in node.decorator_list:
+        call = decorator if isinstance(decorator, ast.Call) else None
+        callee = call.func if call is not None else decorator
+        if names.is_decorator(callee):
+            help_, hidden = _keyword_help(call) if call is not None else (None, False)
+            return (help_ if help_ is not None else ast.get_docstring(node) or ""), hidden
+    return None
+
+
+def _assigned_command(value: ast.expr, names: _ClickNames) -> tuple[str, bool] | None:
+    """The help text and hidden flag of an expression that evaluates to a click command, if it does."""
+    if isinstance(value, ast.Name):
+        return names.commands.get(value.id)
+    if not isinstance(value, ast.Call):
+        return None
+    if names.is_class(value.func):
+        help_, hidden = _keyword_help(value)
+        return help_ or "", hidden
+    # e.g. `click.command()(function)`
+    if isinstance(value.func, ast.Call) and names.is_decorator(value.func.func):
+        help_, hidden = _keyword_help(value.func)
+        return help_ or "", hidden
+    return None
+
+
+def _binds_tool(node: ast.stmt) -> ast.expr | None:
+    """The value bound to `tool` by an assignment statement, if it is one."""
+    if isinstance(node, ast.Assign) and any(
+        isinstance(target, ast.Name) and target.id == "tool" for target in node.targets
+    ):
+        return node.value
+    if isinstance(node, ast.AnnAssign) and isinstance(node.target, ast.Name) and node.target.id == "tool":
+        return node.value
+    return None
+
+
+def _assigned_status(value: ast.expr, names: _ClickNames) -> tuple[ToolStatus, tuple[str, bool] | None]:
+    """Classify the value bound to `tool` by an assignment."""
+    command = _assigned_command(value, names)
+    if command is not None:
+        return ToolStatus.VALID, command
+    if isinstance(value, ast.Constant) and value.value is None:
+        return ToolStatus.SKIPPED, None
+    if isinstance(value, ast.Constant | ast.List | ast.Tuple | ast.Dict | ast.Set | ast.Lambda):
+        return ToolStatus.INVALID_TYPE, None
+    return ToolStatus.UNRESOLVED, None
+
+
+def parse_tool_script(name: str, filepath: "Path") -> ToolEntry:
+    """Parse the given tool script and describe the `tool` it binds, without executing it."""
+    entry = _new_entry(name, filepath, "static")
+    try:
+        module = ast.parse(filepath.read_bytes(), filename=str(filepath))
+    except (OSError, SyntaxError, ValueError) as e:
+        return replace(entry, status=ToolStatus.FAILED, error=str(e))
+
+    names = _ClickNames()
+    status = ToolStatus.MISSING
+    command: tuple[str, bool] | None = None
+    for node in module.body:
+        if isinstance(node, ast.Import | ast.ImportFrom):
+            names.record_import(node)
+        elif isinstance(node, ast.FunctionDef | ast.AsyncFunctionDef):
+            decorated = _decorated_command(node, names)
+            if decorated is not None:
+                names.commands[node.name] = decorated
+            if node.name == "tool":
+                command = decorated
+                status = ToolStatus.VALID if decorated is not None else ToolStatus.INVALID_TYPE
+        elif isinstance(node, ast.ClassDef) and node.name == "tool":
+            status = ToolStatus.INVALID_TYPE
+        elif (value := _binds_tool(node)) is not None:
+            status, command = _assigned_status(value, names)
+
+    if command is None:
+        return replace(entry, status=status)
+    help_, hidden = command
+    return replace(entry, help=help_, hidden=hidden)
+
+
+def discover_tools(tool_files: dict[str, "Path"], *, engine: DiscoveryEngine) -> dict[str, ToolEntry]:
+    """Describe the tools exposed by the given tool scripts using the given discovery engine.
+
+    Args:
+        tool_files: Map of tool names to their script locations.
+        engine: The discovery engine to use.
+
+    Returns:
+        Map of tool names to the description of their tool script.
+    """
+    if engine == "import":
+        return {name: inspect_tool_script(name, filepath) for name, filepath in tool_files.items()}
+
+    if len(tool_files) < PARALLEL_THRESHOLD:
+        return {name: parse_tool_script(name, filepath) for name, filepath in tool_files.items()}
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    workers = min(len(tool_files) // PARALLEL_THRESHOLD + 1, os.cpu_count() or 1)
+    log.info("Parsing %s tool scripts across %s processes", len(tool_files), workers)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        entries = executor.map(parse_tool_script, tool_files, tool_files.values(), chunksize=PARALLEL_THRESHOLD)
+        return dict(zip(tool_files, entries, strict=True))
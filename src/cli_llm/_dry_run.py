@@ -0,0 +1,100 @@
+"""Module for reporting what a prompt would use of the model's context, instead of sending it, as shown by `--dry-run`.
+
+The tokens of each section of the prompt are estimated by rendering it again with that item of the prompt data left
+empty. The rest of the tokens are the template's own text.
+"""
+
+import typing as t
+from collections.abc import Iterator
+from dataclasses import dataclass
+
+from cli_llm import templates
+
+if t.TYPE_CHECKING:
+    from rich.table import Table
+
+    from cli_llm.tokens import Tokenizer
+    from cli_llm.types import StringDict
+
+TOP_FILES = 10
+"""The most files of a section listed on their own, the largest first."""
+
+
+@dataclass(frozen=True)
+class Section:
+    """Part of a rendered prompt."""
+
+    name: str
+    tokens: int
+    nested: bool = False
+    """Whether the section is part of the section above it, e.g. one of its files."""
+
+
+def materialize(prompt_data: "StringDict") -> "StringDict":
+    """The prompt data with each iterator, e.g. of files read as the prompt is rendered, turned into a list.
+
+    A list can be both rendered and itemised, where an iterator would be used up by rendering the prompt.
+    """
+    return {key: list(value) if isinstance(value, Iterator) else value for key, value in prompt_data.items()}
+
+
+def _empty(value: t.Any) -> t.Any:
+    """An empty value of the same type, to render the prompt without the value, or `None` if there is none."""
+    return type(value)() if isinstance(value, str | list | tuple | dict) else None
+
+
+def _is_files(value: t.Any) -> bool:
+    return isinstance(value, list | tuple) and all(
+        isinstance(item, tuple) and len(item) == 2 and isinstance(item[1], str)  # noqa: PLR2004
+        for item in value
+    )
+
+
+def sections(prompt: str, prompt_data: "StringDict", rendered_prompt: str, count: "Tokenizer") -> list[Section]:
+    """The tokens used by the template and by each item of the prompt data, with the largest files of file lists.
+
+    Items that the prompt can not be rendered without are counted as part of the template.
+    """
+    import jinja2
+
+    total = count(rendered_prompt)
+    found: list[Section] = []
+    for key, value in prompt_data.items():
+        empty = _empty(value)
+        if empty is None:
+            continue
+        try:
+            without = count(templates.render(prompt, prompt_data | {key: empty}))
+        except jinja2.TemplateError:
+            continue
+        found.append(Section(key, total - without))
+        if value and _is_files(value):
+            largest = sorted(((str(name), count(text)) for name, text in value), key=lambda file: -file[1])
+            found.extend(Section(name, tokens, nested=True) for name, tokens in largest[:TOP_FILES])
+            if len(largest) > TOP_FILES:
+                rest = sum(tokens for _, tokens in largest[TOP_FILES:])
+                found.append(Section(f"{len(largest) - TOP_FILES} more files", rest, nested=True))
+    template = total - sum(section.tokens for section in found if not section.nested)
+    return [Section("template", max(template, 0)), *found]
+
+
+def table(model_id: str, found: list[Section], total: int) -> "Table":
+    """A table of the tokens used by each section of the prompt."""
+    from rich.table import Table
+    from rich.text import Text
+
+    result = Table("section", "tokens", "share", title=f"Dry run of {model_id}")
+    for column in result.columns[1:]:
+        column.justify = "right"
+    for section in found:
+        share = f"{section.tokens / total:.0%}" if total else "-"
+        result.add_row(Text(f"  {section.name}" if section.nested else section.name), str(section.tokens), share)
+    return result
+
+
+def summary(total: int, context: int | None) -> str:
+    """The tokens used by the whole prompt, against the context of the model."""
+    if context is None:
+        return f"The prompt uses about {total} tokens, no context size is configured for the model"
+    fits = "fits in" if total <= context else "does not fit in"
+    return f"The prompt uses about {total} tokens, which {fits} the {context} token context of the model"
@@ -0,0 +1,164 @@
+"""Module for remembering the content hash of files, and the digests the model wrote of them, between runs.
+
+The index maps each file's path, size and modification time to the SHA-256 of its contents, so a file that has not
+changed is not read again to hash it. The digests are the model's responses to a per-file prompt, keyed on the
+content hash of the file, the model and a hash of the prompt, so only new or changed files are sent to the model.
+Both are tables in a SQLite database under the cache directory.
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import typing as t
+from pathlib import Path
+
+from cli_llm._logging import ClmLogger
+
+if t.TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+
+    from cli_llm.compact import Compaction
+    from cli_llm.types import StringDict
+
+log = ClmLogger()
+
+FILE_INDEX_FILE = "files.sqlite3"
+
+HASH_BLOCK_BYTES = 1024 * 1024
+"""How much of a file is read at a time to hash it."""
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS digests (
+    content_hash TEXT NOT NULL,
+    model_id TEXT NOT NULL,
+    prompt_hash TEXT NOT NULL,
+    text TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (content_hash, model_id, prompt_hash)
+);
+"""
+
+RACY_NANOSECONDS = 2_000_000_000
+"""How recently a file can have been modified and still be indexed, allowing for coarse modification times."""
+
+type Stat = tuple[int, int]
+"""The size and modification time in nanoseconds of a file."""
+
+
+def hash_file(path: Path) -> str | None:
+    """The SHA-256 of the file's contents, or `None` if it cannot be read."""
+    digest = hashlib.sha256()
+    try:
+        with path.open("rb") as file:
+            while block := file.read(HASH_BLOCK_BYTES):
+                digest.update(block)
+    except OSError as e:
+        log.info("Unable to hash %s due to: %s", path, e)
+        return None
+    return digest.hexdigest()
+
+
+def prompt_hash(
+    prompt: str, prompt_data: "StringDict", options: "StringDict", *, compaction: "Compaction | None" = None
+) -> str:
+    """The hash of a prompt, its data besides the file, the model's options and how the file is compacted."""
+    inputs = [prompt, prompt_data, options] if compaction is None else [prompt, prompt_data, options, compaction]
+    data = json.dumps(inputs, sort_keys=True, default=str)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def stat(path: Path) -> Stat | None:
+    """The size and modification time of the file, or `None` if it no longer exists."""
+    try:
+        result = path.stat()
+    except OSError:
+        return None
+    return result.st_size, result.st_mtime_ns
+
+
+class FileIndex:
+    """SQLite backed index of file content hashes and the digests of the files."""
+
+    def __init__(self, path: Path) -> None:
+        """Initialise the index stored at the given path."""
+        self.path = path
+
+    @contextlib.contextmanager
+    def _connect(self) -> "Iterator[sqlite3.Connection]":
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with contextlib.closing(sqlite3.connect(self.path, timeout=30)) as connection, connection:
+            connection.executescript(_SCHEMA)
+            yield connection
+
+    def known_hashes(self, files: "dict[Path, Stat]") -> dict[Path, str]:
+        """The indexed hashes of the files whose size and modification time have not changed since they were hashed."""
+        known = {}
+        try:
+            with self._connect() as connection:
+                for path, file_stat in files.items():
+                    row = connection.execute(
+                        "SELECT size, mtime_ns, hash FROM files WHERE path = ?", (os.fspath(path),)
+                    ).fetchone()
+                    if row is not None and tuple(row[:2]) == file_stat:
+                        known[path] = row[2]
+        except sqlite3.Error as e:
+            log.warning("Failed to read from the file index due to: %s", e)
+            return {}
+        return known
+
+    def update(self, hashes: "Iterable[tuple[Path, Stat, str]]") -> None:
+        """Index the hashes of the files, as they were when they had the given size and modification time.
+
+        Files modified in the last `RACY_NANOSECONDS` are left out, as they could change again without their
+        modification time changing, so they are hashed again next time.
+        """
+        racy = time.time_ns() - RACY_NANOSECONDS
+        rows = [
+            (os.fspath(path), size, mtime_ns, content_hash)
+            for path, (size, mtime_ns), content_hash in hashes
+            if mtime_ns < racy
+        ]
+        if not rows:
+            return
+        try:
+            with self._connect() as connection:
+                connection.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)", rows)
+        except sqlite3.Error as e:
+            log.warning("Failed to write to the file index due to: %s", e)
+
+    def digests(self, content_hashes: "Iterable[str]", model_id: str, prompt: str) -> dict[str, str]:
+        """The digests written by the model, for the prompt with the given hash, of the contents with the hashes."""
+        found = {}
+        try:
+            with self._connect() as connection:
+                for content_hash in set(content_hashes):
+                    row = connection.execute(
+                        "SELECT text FROM digests WHERE content_hash = ? AND model_id = ? AND prompt_hash = ?",
+                        (content_hash, model_id, prompt),
+                    ).fetchone()
+                    if row is not None:
+                        found[content_hash] = row[0]
+        except sqlite3.Error as e:
+            log.warning("Failed to read from the file index due to: %s", e)
+            return {}
+        return found
+
+    def set_digest(self, content_hash: str, model_id: str, prompt: str, text: str) -> None:
+        """Store the digest written by the model, for the prompt with the given hash, of the contents with the hash."""
+        try:
+            with self._connect() as connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?, ?)",
+                    (content_hash, model_id, prompt, text, time.time()),
+                )
+        except sqlite3.Error as e:
+            log.warning("Failed to write to the file index due to: %s", e)
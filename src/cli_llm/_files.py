@@ -0,0 +1,49 @@
+"""Module containing file system utilities."""
+
+import contextlib
+import os
+import stat
+import threading
+import typing as t
+from pathlib import Path
+
+
+@contextlib.contextmanager
+def _atomic_file(path: Path, mode: t.Literal["w", "wb"]) -> t.Iterator[t.IO[t.Any]]:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with tmp_path.open(mode) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        with contextlib.suppress(FileNotFoundError):
+            tmp_path.chmod(stat.S_IMODE(path.stat().st_mode))
+        tmp_path.replace(path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+@contextlib.contextmanager
+def atomic_writer(path: Path) -> t.Iterator[t.TextIO]:
+    """Open a file that replaces the path once it has been written without error.
+
+    The file is written next to the path and synced to disk before it replaces the path, so readers only ever see the
+    old or the new file, never a partial one. On any error, including an interrupt, the path is left untouched. The
+    permissions of the path are kept if it already exists.
+    """
+    with _atomic_file(path, "w") as f:
+        yield t.cast("t.TextIO", f)
+
+
+@contextlib.contextmanager
+def atomic_binary_writer(path: Path) -> t.Iterator[t.BinaryIO]:
+    """Open a binary file that replaces the path once it has been written without error, as `atomic_writer` does."""
+    with _atomic_file(path, "wb") as f:
+        yield t.cast("t.BinaryIO", f)
+
+
+def atomic_write_text(path: Path, contents: str) -> None:
+    """Write the contents to the path so that readers only ever see the old or the new file, never a partial one."""
+    with atomic_writer(path) as f:
+        f.write(contents)
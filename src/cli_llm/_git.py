@@ -0,0 +1,170 @@
+"""Module for listing the files changed in a git repository and reading their contents or diffs.
+
+The changed files are listed from git's index and object database, so the cost depends on the size of the change
+rather than the size of the tree. Files not yet tracked are included when the files are read from the working tree.
+Blobs are read through a single `git cat-file --batch` and the diffs of all the tracked files come from a single
+`git diff`.
+"""
+
+import os
+import re
+import subprocess
+import typing as t
+from dataclasses import dataclass
+from pathlib import Path
+
+from cli_llm import errors
+from cli_llm._logging import ClmLogger
+
+if t.TYPE_CHECKING:
+    from collections.abc import Sequence
+
+log = ClmLogger()
+
+DIFF_HEADER = re.compile(rb"^diff --git ", re.MULTILINE)
+"""The start of the diff of each file."""
+
+
+QUOTED_ESCAPES = {b"a": b"\a", b"b": b"\b", b"f": b"\f", b"n": b"\n", b"r": b"\r", b"t": b"\t", b"v": b"\v"}
+"""The escapes, other than octal ones, git uses when quoting a path."""
+
+
+def git(cwd: Path, *args: str, stdin: bytes | None = None, exit_codes: tuple[int, ...] = (0,)) -> bytes:
+    """Run git in the directory, returning what it wrote to stdout.
+
+    Raises:
+        GitError: If git is not installed or the command fails, exiting with a code not in `exit_codes`.
+    """
+    command = ["git", "--literal-pathspecs", *args]
+    log.debug("Running %s", command)
+    try:
+        result = subprocess.run(command, cwd=cwd, input=stdin, capture_output=True, check=False)  # noqa: S603
+    except FileNotFoundError as e:
+        raise errors.GitError(args, "git is not installed") from e
+    if result.returncode not in exit_codes:
+        raise errors.GitError(args, result.stderr.decode(errors="replace").strip())
+    return result.stdout
+
+
+@dataclass(frozen=True)
+class Revisions:
+    """Which changes to list, and where to read the changed files from."""
+
+    since: str | None = None
+    """The commit to list the changes since. Defaults to `HEAD`, or the parent of `at` if given."""
+    staged: bool = False
+    """Whether to list the staged changes and read the files from the index, rather than the working tree."""
+    at: str | None = None
+    """The commit to list the changes up to and read the files from, rather than the working tree."""
+
+    def __post_init__(self) -> None:
+        """Check the revisions can be compared."""
+        if self.staged and self.at is not None:
+            msg = "The staged changes can not be compared with a commit, give either `staged` or `at`"
+            raise ValueError(msg)
+
+    def diff_args(self) -> list[str]:
+        """The arguments to `git diff` that compare these revisions."""
+        if self.at is not None:
+            return [self.since or f"{self.at}^", self.at]
+        if self.staged:
+            return ["--cached", self.since or "HEAD"]
+        return [self.since or "HEAD"]
+
+    @property
+    def in_working_tree(self) -> bool:
+        """Whether the changed files are read from the working tree, rather than from blobs."""
+        return self.at is None and not self.staged
+
+    def object_name(self, path: str) -> str:
+        """The name of the blob of the file, in the commit `at` or in the index."""
+        return f"{self.at}:{path}" if self.at is not None else f":{path}"
+
+
+def repo_root(path: Path) -> Path:
+    """The top of the working tree of the repository containing the path."""
+    return Path(os.fsdecode(git(path, "rev-parse", "--show-toplevel").rstrip(b"\n")))
+
+
+def _diff(path: Path, revisions: Revisions, *args: str) -> bytes:
+    # Renames are listed as a deletion and an addition, and deleted files are left out, so each changed file is
+    # listed once, under the name it has after the change.
+    return git(path, "diff", "--no-renames", "--diff-filter=d", *args, *revisions.diff_args(), "--", ".")
+
+
+def untracked_paths(path: Path) -> list[str]:
+    """The paths, relative to the top of the repository, of the files under the path neither tracked nor ignored."""
+    output = git(path, "ls-files", "--others", "--exclude-standard", "--full-name", "-z", "--", ".")
+    return [os.fsdecode(name) for name in output.split(b"\0") if name]
+
+
+def changed_paths(path: Path, revisions: Revisions) -> list[str]:
+    """The paths, relative to the top of the repository, of the files under the path changed between the revisions.
+
+    The untracked files are included when the files are read from the working tree, as they are new.
+    """
+    names = [os.fsdecode(name) for name in _diff(path, revisions, "--name-only", "-z").split(b"\0") if name]
+    if revisions.in_working_tree:
+        return sorted({*names, *untracked_paths(path)})
+    return names
+
+
+def _unquote(name: bytes) -> bytes:
+    r"""Undo the C-style quoting git uses for paths with unusual characters, e.g. `"caf\303\251"`."""
+    if not name.startswith(b'"'):
+        return name
+    return re.sub(
+        rb"\\([0-7]{3}|.)",
+        lambda match: bytes([int(match[1], 8)]) if match[1].isdigit() else QUOTED_ESCAPES.get(match[1], match[1]),
+        name[1:-1],
+    )
+
+
+def _patches(output: bytes) -> dict[str, bytes]:
+    """Split the output of `git diff` into the diff of each file, keyed by its path from the diff header."""
+    starts = [match.start() for match in DIFF_HEADER.finditer(output)]
+    patches = {}
+    for start, end in zip(starts, [*starts[1:], len(output)], strict=True):
+        patch = output[start:end]
+        # Renames are not detected, so the header is `diff --git a/<path> b/<path>`, with both paths the same.
+        names = patch.split(b"\n", 1)[0].removeprefix(b"diff --git ")
+        patches[os.fsdecode(_unquote(names[: len(names) // 2]).removeprefix(b"a/"))] = patch
+    return patches
+
+
+def diffs(path: Path, revisions: Revisions) -> dict[str, bytes]:
+    """The unified diff of each tracked file under the path changed between the revisions, keyed by `changed_paths`."""
+    return _patches(_diff(path, revisions, "--no-color", "--no-ext-diff"))
+
+
+def new_file_diffs(root: Path, names: "Sequence[str]") -> dict[str, bytes]:
+    """The unified diff adding each untracked file, keyed by its path relative to the top of the repository."""
+    patches: dict[str, bytes] = {}
+    for name in names:
+        # git exits with 1 when the files differ, as they always do here.
+        output = git(
+            root, "diff", "--no-index", "--no-color", "--no-ext-diff", "--", "/dev/null", name, exit_codes=(0, 1)
+        )
+        patches |= _patches(output)
+    return patches
+
+
+def read_blobs(root: Path, names: "Sequence[str]") -> list[bytes | None]:
+    """Read the blobs with the names, e.g. `HEAD:README.md`, or `None` for any that do not exist."""
+    if not names:
+        return []
+    output = git(root, "cat-file", "--batch", stdin="".join(f"{name}\n" for name in names).encode())
+    blobs: list[bytes | None] = []
+    offset = 0
+    for _ in names:
+        end = output.index(b"\n", offset)
+        # Each object is `<oid> <type> <size>` then its contents, or `<name> missing` if it does not exist.
+        header = output[offset:end].split(b" ")
+        offset = end + 1
+        if len(header) != 3 or not header[2].isdigit():  # noqa: PLR2004
+            blobs.append(None)
+            continue
+        size = int(header[2])
+        blobs.append(output[offset : offset + size] if header[1] == b"blob" else None)
+        offset += size + 1
+    return blobs
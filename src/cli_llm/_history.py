@@ -0,0 +1,210 @@
+"""Module for recording the metrics of each run, to see how latency and throughput trend over time.
+
+Runs are appended to a SQLite database by a background thread, so recording a run never blocks on disk. Anything
+still queued when the process exits is written before it does.
+"""
+
+import atexit
+import contextlib
+import contextvars
+import functools
+import queue
+import sqlite3
+import threading
+import time
+import typing as t
+from dataclasses import astuple, dataclass, fields, replace
+from pathlib import Path
+
+import click
+
+from cli_llm._logging import ClmLogger
+from cli_llm.response import tokens_per_second
+
+if t.TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from cli_llm.response import ResponseMetrics
+
+log = ClmLogger()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    finished_at REAL NOT NULL,
+    tool TEXT,
+    model_id TEXT NOT NULL,
+    cached INTEGER NOT NULL,
+    error TEXT,
+    prompt_chars INTEGER NOT NULL,
+    prompt_tokens INTEGER,
+    output_chars INTEGER NOT NULL,
+    output_tokens INTEGER,
+    time_to_first_token REAL,
+    latency REAL
+);
+CREATE INDEX IF NOT EXISTS runs_finished_at ON runs (finished_at);
+"""
+
+
+@dataclass(frozen=True)
+class RunRecord:
+    """The metrics of a single run, as recorded in the history."""
+
+    finished_at: float
+    tool: str | None
+    model_id: str
+    cached: bool
+    error: str | None
+    prompt_chars: int
+    prompt_tokens: int | None
+    output_chars: int
+    output_tokens: int | None
+    time_to_first_token: float | None
+    latency: float | None
+
+    @property
+    def tokens_per_second(self) -> float | None:
+        """The output tokens generated per second after the first token arrived, if known."""
+        return tokens_per_second(self.output_tokens, self.latency, self.time_to_first_token)
+
+
+_COLUMNS = ", ".join(field.name for field in fields(RunRecord))
+
+
+_tool: contextvars.ContextVar[str | None] = contextvars.ContextVar("tool", default=None)
+
+
+def current_tool() -> str | None:
+    """The name of the tool being run, e.g. `example summarise`, if a tool is being run from the command line.
+
+    The click context naming the tool is only seen by the thread that entered it, so other threads see the name passed
+    on to them by `tool_initializer`.
+    """
+    ctx = click.get_current_context(silent=True)
+    if ctx is None:
+        return _tool.get()
+    names = []
+    while ctx is not None:
+        names.append(ctx.info_name or "")
+        ctx = ctx.parent
+    # The root is `clm` and the next is the command running the tool, e.g. `run` or `batch`.
+    return " ".join(reversed(names[:-2])) or None
+
+
+def tool_initializer() -> "Callable[[], object]":
+    """A thread pool initializer passing the name of the tool being run in this thread on to the threads of the pool."""
+    return functools.partial(_tool.set, current_tool())
+
+
+class RunHistory:
+    """An append-only history of runs, written by a background thread."""
+
+    def __init__(self, path: Path) -> None:
+        """Initialise the history stored at the given path."""
+        self.path = path
+        self._queue: queue.Queue[RunRecord | None] = queue.Queue()
+        self._writer: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path)
+        conn.executescript(_SCHEMA)
+        return conn
+
+    def record(self, record: RunRecord) -> None:
+        """Queue the run to be written, starting the writer if it is not already running."""
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="clm-history", daemon=True)
+                self._writer.start()
+                atexit.register(self.close)
+        self._queue.put(record)
+
+    def record_metrics(self, metrics: "ResponseMetrics", *, tool: str | None, model_id: str, cached: bool) -> None:
+        """Queue the run with the given metrics to be written."""
+        self.record(
+            RunRecord(
+                finished_at=time.time(),
+                tool=tool,
+                model_id=model_id,
+                cached=cached,
+                error=metrics.error,
+                prompt_chars=metrics.prompt_chars,
+                prompt_tokens=metrics.prompt_tokens,
+                output_chars=metrics.output_chars,
+                output_tokens=metrics.output_tokens,
+                time_to_first_token=metrics.time_to_first_token,
+                latency=metrics.latency,
+            )
+        )
+
+    def _write_loop(self) -> None:
+        while True:
+            records = [self._queue.get()]
+            with contextlib.suppress(queue.Empty):
+                while True:
+                    records.append(self._queue.get_nowait())
+            self._write([record for record in records if record is not None])
+            for _ in records:
+                self._queue.task_done()
+            if None in records:
+                return
+
+    def _write(self, records: list[RunRecord]) -> None:
+        if not records:
+            return
+        try:
+            with contextlib.closing(self._connect()) as conn, conn:
+                placeholders = ", ".join("?" * len(fields(RunRecord)))
+                conn.executemany(
+                    f"INSERT INTO runs ({_COLUMNS}) VALUES ({placeholders})",  # noqa: S608
+                    [astuple(record) for record in records],
+                )
+        except sqlite3.Error as e:
+            log.warning("Could not record %s run(s) in the history: %s", len(records), e)
+
+    def flush(self) -> None:
+        """Wait until every queued run has been written."""
+        self._queue.join()
+
+    def close(self) -> None:
+        """Write every queued run and stop the writer."""
+        with self._lock:
+            writer, self._writer = self._writer, None
+        if writer is None:
+            return
+        atexit.unregister(self.close)
+        self._queue.put(None)
+        writer.join()
+
+    def query(
+        self, *, since: float | None = None, tool: str | None = None, model_id: str | None = None
+    ) -> list[RunRecord]:
+        """The recorded runs, oldest first.
+
+        Args:
+            since: Only runs that finished at or after this time, in seconds since the epoch.
+            tool: Only runs of this tool.
+            model_id: Only runs of this model.
+
+        Returns:
+            The matching runs.
+        """
+        self.flush()
+        if not self.path.exists():
+            return []
+        conditions = {"finished_at >= ?": since, "tool = ?": tool, "model_id = ?": model_id}
+        where = " AND ".join(["1", *(condition for condition, value in conditions.items() if value is not None)])
+        with contextlib.closing(self._connect()) as conn:
+            rows = conn.execute(
+                f"SELECT {_COLUMNS} FROM runs WHERE {where} ORDER BY finished_at",  # noqa: S608
+                [value for value in conditions.values() if value is not None],
+            ).fetchall()
+        return [replace(RunRecord(*row), cached=bool(row[3])) for row in rows]
+
+
+@functools.cache
+def get_history(path: Path) -> RunHistory:
+    """The history stored at the given path, shared so that each process has one writer per history."""
+    return RunHistory(path)
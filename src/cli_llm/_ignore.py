@@ -0,0 +1,187 @@
+"""Module for matching paths against the rules of `.gitignore` style ignore files.
+
+The rules of each ignore file are compiled into a single regular expression, with the rules in reverse order so that
+the first alternative to match is the last rule that matches, which is the rule git uses.
+"""
+
+import re
+import typing as t
+from dataclasses import dataclass
+from pathlib import Path
+
+from cli_llm._logging import ClmLogger
+
+if t.TYPE_CHECKING:
+    from collections.abc import Iterable, Sequence
+
+log = ClmLogger()
+
+IGNORE_FILES = (".gitignore", ".ignore")
+"""The ignore files honoured by default, where the rules of `.ignore` take precedence over those of `.gitignore`."""
+
+
+def _class(pattern: str, start: int) -> tuple[str, int] | None:
+    """Translate the character class starting at the index, returning it and the index after it."""
+    i = start + 1
+    negated = i < len(pattern) and pattern[i] in "!^"
+    i += negated
+    # A `]` straight after the opening bracket is part of the class.
+    i += i < len(pattern) and pattern[i] == "]"
+    end = pattern.find("]", i)
+    if end == -1:
+        return None
+    members = pattern[start + 1 + negated : end].replace("\\", "\\\\")
+    return f"[{'^' if negated else ''}{members}]", end + 1
+
+
+def translate(pattern: str) -> str:
+    """Translate the glob pattern, as used in `.gitignore` files, into a regular expression.
+
+    `*` and `?` do not match `/`. A leading `**/` matches in all directories, a trailing `/**` matches everything
+    inside and `/**/` matches zero or more directories.
+    """
+    parts = []
+    i = 0
+    while i < len(pattern):
+        at_start = i == 0 or pattern[i - 1] == "/"
+        if at_start and pattern.startswith("**/", i):
+            parts.append("(?:.*/)?")
+            i += 3
+        elif at_start and pattern.startswith("**", i) and i + 2 == len(pattern):
+            parts.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            parts.append("[^/]*")
+            while i < len(pattern) and pattern[i] == "*":
+                i += 1
+        elif pattern[i] == "?":
+            parts.append("[^/]")
+            i += 1
+        elif pattern[i] == "[" and (translated := _class(pattern, i)) is not None:
+            parts.append(translated[0])
+            i = translated[1]
+        elif pattern[i] == "\\" and i + 1 < len(pattern):
+            parts.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            parts.append(re.escape(pattern[i]))
+            i += 1
+    return "".join(parts)
+
+
+@dataclass(frozen=True)
+class _Rule:
+    regex: str
+    negated: bool
+    dir_only: bool
+
+
+def _parse(line: str) -> _Rule | None:
+    line = line.rstrip("\n")
+    if not line.endswith("\\ "):
+        line = line.rstrip(" ")
+    if not line or line.startswith("#"):
+        return None
+    negated = line.startswith("!")
+    line = line.removeprefix("!")
+    dir_only = line.endswith("/")
+    line = line.rstrip("/")
+    # A pattern with a slash anywhere but the end is relative to the ignore file, the rest match at any depth.
+    anchored = "/" in line
+    regex = translate(line.removeprefix("/"))
+    return _Rule(regex if anchored else f"(?:.*/)?{regex}", negated, dir_only)
+
+
+def _compile(rules: "list[_Rule]") -> tuple[re.Pattern[str] | None, tuple[bool, ...]]:
+    rules = rules[::-1]
+    if not rules:
+        return None, ()
+    return re.compile("|".join(f"({rule.regex})" for rule in rules)), tuple(rule.negated for rule in rules)
+
+
+@dataclass(frozen=True)
+class IgnoreRules:
+    """The rules of an ignore file."""
+
+    base: str
+    """The directory of the ignore file relative to the root being walked, ending with `/` unless it is the root."""
+    prefix: str
+    """The root being walked relative to the directory of the ignore file, for ignore files above the root."""
+    files: re.Pattern[str] | None
+    negated_files: tuple[bool, ...]
+    dirs: re.Pattern[str] | None
+    negated_dirs: tuple[bool, ...]
+
+    @classmethod
+    def parse(cls, lines: "Iterable[str]", *, base: str = "", prefix: str = "") -> t.Self:
+        """Compile the rules from the lines of an ignore file.
+
+        Args:
+            lines: The lines of the ignore file.
+            base: The directory of the ignore file relative to the root being walked.
+            prefix: The root being walked relative to the directory of the ignore file.
+        """
+        rules = [rule for rule in map(_parse, lines) if rule is not None]
+        files, negated_files = _compile([rule for rule in rules if not rule.dir_only])
+        dirs, negated_dirs = _compile(rules)
+        return cls(base, prefix, files, negated_files, dirs, negated_dirs)
+
+    @classmethod
+    def load(cls, path: Path, *, base: str = "", prefix: str = "") -> t.Self | None:
+        """Compile the rules of the ignore file, if it can be read."""
+        try:
+            lines = path.read_text(errors="replace").splitlines()
+        except OSError as e:
+            log.info("Unable to read the ignore file %s due to: %s", path, e)
+            return None
+        return cls.parse(lines, base=base, prefix=prefix)
+
+    def match(self, relative: str, *, is_dir: bool) -> bool | None:
+        """Whether the rules ignore the path, relative to the root being walked, or `None` if no rule matches it."""
+        pattern, negated = (self.dirs, self.negated_dirs) if is_dir else (self.files, self.negated_files)
+        if pattern is None or not relative.startswith(self.base):
+            return None
+        match = pattern.fullmatch(self.prefix + relative[len(self.base) :])
+        if match is None or match.lastindex is None:
+            return None
+        return not negated[match.lastindex - 1]
+
+
+def is_ignored(rules: "Sequence[IgnoreRules]", relative: str, *, is_dir: bool) -> bool:
+    """Whether the path is ignored, by the rules of the deepest ignore file that has a rule matching it."""
+    for ignore in reversed(rules):
+        ignored = ignore.match(relative, is_dir=is_dir)
+        if ignored is not None:
+            return ignored
+    return False
+
+
+def ancestor_rules(root: Path, names: "Sequence[str]") -> list[IgnoreRules]:
+    """The rules of the ignore files in the directories above the root, up to the top of its git repository.
+
+    Args:
+        root: The directory being walked.
+        names: The names of the ignore files.
+
+    Returns:
+        The rules, outermost first, or none if the root is the top of a git repository or is not inside one.
+    """
+    root = root.resolve()
+    if (root / ".git").exists():
+        return []
+    ancestors = []
+    for directory in root.parents:
+        ancestors.append(directory)
+        if (directory / ".git").exists():
+            break
+    else:
+        return []
+    rules: list[IgnoreRules] = []
+    for directory in reversed(ancestors):
+        prefix = f"{root.relative_to(directory).as_posix()}/"
+        rules.extend(
+            ignore
+            for name in names
+            if (directory / name).is_file() and (ignore := IgnoreRules.load(directory / name, prefix=prefix))
+        )
+    return rules
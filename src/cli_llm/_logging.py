@@ -1,35 +1,215 @@
-"""Module defining the applications logging and other terminal feedback."""
+"""Module defining the applications logging and other terminal feedback.
 
+Rich is only imported once something is actually written to the terminal, so commands that never log or print do
+not pay for it.
+"""
+
+import contextlib
+import inspect
 import logging
+import sys
+import threading
 import typing as t
+from collections import deque
 from functools import wraps
+from types import TracebackType
 
 import click
-from rich.console import Console
-from rich.logging import RichHandler
 
 from cli_llm.types import RT
 
-console = Console(record=True, stderr=True)
+if t.TYPE_CHECKING:
+    from pathlib import Path
+
+    from rich.console import Console, ConsoleRenderable, RenderHook
+    from rich.progress import Progress
 
 FORMAT = "%(message)s"
-logging.basicConfig(
-    level="WARNING",
-    format=FORMAT,
-    datefmt="[%X]",
-    handlers=[RichHandler(rich_tracebacks=True, tracebacks_suppress=[click], console=console)],
-)
 
 NO_LOGGING = logging.ERROR
 
+TRANSCRIPT_MAX_LINES = 10_000
+"""The most lines a transcript keeps by default."""
+
+
+def get_console() -> "Console":
+    """The console used for all terminal feedback, created on first use."""
+    console = globals().get("console")
+    if console is None:
+        from rich.console import Console
+
+        console = globals()["console"] = Console(stderr=True)
+    return t.cast("Console", console)
+
+
+def __getattr__(name: str) -> t.Any:
+    """Create the console on first use when it is accessed as a module attribute."""
+    if name == "console":
+        return get_console()
+    msg = f"module {__name__!r} has no attribute {name!r}"
+    raise AttributeError(msg)
+
+
+class _DeferredRichHandler(logging.Handler):
+    """Logging handler that only creates the underlying rich handler once a record is emitted."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._handler: logging.Handler | None = None
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if self._handler is None:
+            from rich.logging import RichHandler
+
+            self._handler = RichHandler(rich_tracebacks=True, tracebacks_suppress=[click], console=get_console())
+            self._handler.setFormatter(self.formatter)
+        self._handler.emit(record)
+
+
+logging.basicConfig(level="WARNING", format=FORMAT, datefmt="[%X]", handlers=[_DeferredRichHandler()])
+
+
+def _rich_excepthook(exc_type: type[BaseException], exc_value: BaseException, traceback: TracebackType | None) -> None:
+    from rich.traceback import Traceback
+
+    get_console().print(Traceback.from_exception(exc_type, exc_value, traceback, show_locals=True, suppress=[click]))
+
+
+def install_tracebacks() -> None:
+    """Render uncaught exceptions with rich, only importing it if an exception is actually raised."""
+    sys.excepthook = _rich_excepthook
+
+
+class Transcript:
+    """Keeps the most recent lines written to a console, so memory use stays flat however much is written.
+
+    Everything printed or logged to the console is rendered as plain text, without wrapping, while the transcript is
+    started. Spinners and progress bars are not kept, as they are only rendered after the transcript has seen what
+    was printed.
+    """
+
+    def __init__(self, console: "Console | None" = None, *, max_lines: int = TRANSCRIPT_MAX_LINES) -> None:
+        """Initialise the transcript.
+
+        Args:
+            console: The console to record, defaults to the application console.
+            max_lines: The most lines to keep, older lines are dropped as new ones are written.
+        """
+        self.console = console or get_console()
+        self._lines: deque[str] = deque(maxlen=max_lines)
+        self._line: list[str] = []
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> t.Self:
+        """Start recording the console."""
+        self.console.push_render_hook(t.cast("RenderHook", self))
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        """Stop recording the console."""
+        self.console.pop_render_hook()
+
+    def process_renderables(self, renderables: list["ConsoleRenderable"]) -> list["ConsoleRenderable"]:
+        """Record the renderables about to be written to the console, leaving them unchanged."""
+        from rich.segment import Segment
+
+        options = self.console.options.update(no_wrap=True, overflow="ignore")
+        text = "".join(
+            segment.text
+            for renderable in renderables
+            for segment in Segment.filter_control(self.console.render(renderable, options))
+        )
+        self.write(text)
+        return renderables
+
+    def write(self, text: str) -> None:
+        """Add the text to the transcript."""
+        first, *lines = text.split("\n")
+        with self._lock:
+            self._line.append(first)
+            for line in lines:
+                self._lines.append("".join(self._line))
+                self._line = [line]
+
+    def text(self) -> str:
+        """The recorded text."""
+        with self._lock:
+            return "\n".join([*self._lines, "".join(self._line)])
+
+    def save(self, path: "Path") -> None:
+        """Write the recorded text to the path."""
+        from cli_llm._files import atomic_write_text
+
+        atomic_write_text(path, self.text())
+
+
+live_slot = threading.BoundedSemaphore(1)
+"""Only one spinner or progress bar can be shown at once, any started while one is shown are not displayed."""
+
+
+@contextlib.contextmanager
+def status(message: str) -> t.Iterator[None]:
+    """Show a rich spinner with the given message, unless another spinner or progress bar is already shown."""
+    if not live_slot.acquire(blocking=False):
+        yield
+        return
+    try:
+        with get_console().status(message):
+            yield
+    finally:
+        live_slot.release()
+
+
+@contextlib.contextmanager
+def progress() -> t.Iterator["Progress"]:
+    """Show a rich progress bar with an ETA, unless quiet or another spinner or progress bar is already shown."""
+    from rich.progress import (
+        BarColumn,
+        MofNCompleteColumn,
+        Progress,
+        SpinnerColumn,
+        TaskProgressColumn,
+        TextColumn,
+        TimeElapsedColumn,
+        TimeRemainingColumn,
+    )
+
+    shown = ClmLogger().verbose < NO_LOGGING and live_slot.acquire(blocking=False)
+    try:
+        with Progress(
+            SpinnerColumn(),
+            TextColumn("[progress.description]{task.description}"),
+            BarColumn(),
+            MofNCompleteColumn(),
+            TaskProgressColumn(),
+            TimeElapsedColumn(),
+            TextColumn("ETA"),
+            TimeRemainingColumn(),
+            console=get_console(),
+            disable=not shown,
+        ) as bar:
+            yield bar
+    finally:
+        if shown:
+            live_slot.release()
+
 
 def spinner(message: str) -> t.Callable[[t.Callable[..., RT]], t.Callable[..., RT]]:
-    """Runs the decorated function with a rich spinner using the given message."""
+    """Runs the decorated function, or coroutine function, with a rich spinner using the given message."""
 
     def decorator(func: t.Callable[..., RT]) -> t.Callable[..., RT]:
+        if inspect.iscoroutinefunction(func):
+
+            @wraps(func)
+            async def async_wrapper(*args: t.Any, **kwargs: t.Any) -> t.Any:
+                with status(message):
+                    return await func(*args, **kwargs)
+
+            return t.cast("t.Callable[..., RT]", async_wrapper)
+
         @wraps(func)
         def wrapper(*args: t.Any, **kwargs: t.Any) -> RT:
-            with console.status(message):
+            with status(message):
                 return func(*args, **kwargs)
 
         return wrapper
@@ -54,7 +234,9 @@ class ClmLogger:
         return cls._instance
 
     def __init__(self) -> None:
-        """Initialise with default verbosity."""
+        """Initialise with default verbosity, unless already initialised."""
+        if hasattr(self, "_log"):
+            return
         self.verbose = 30
         self._log = logging.getLogger("cli-llm")
         self.debug = self._log.debug
@@ -75,4 +257,4 @@ class ClmLogger:
     def print(self, *objects: t.Any, sep: str = " ", end: str = "\n") -> None:
         """Print if not quiet."""
         if self.verbose < NO_LOGGING:
-            console.print(*objects, sep=sep, end=end)
+            get_console().print(*objects, sep=sep, end=end)
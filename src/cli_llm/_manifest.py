@@ -0,0 +1,158 @@
+"""Module defining the on-disk manifest of discovered tools.
+
+The manifest records what was learnt about each tool script the last time it was inspected, so listing the available
+tools only has to re-inspect the scripts that have changed since.
+"""
+
+import enum
+import json
+import os
+import typing as t
+from dataclasses import asdict, dataclass
+from functools import cache
+
+from cli_llm._files import atomic_write_text
+from cli_llm._logging import ClmLogger
+
+if t.TYPE_CHECKING:
+    from pathlib import Path
+
+log = ClmLogger()
+
+MANIFEST_FILE = "tool_manifest.json"
+MANIFEST_FORMAT = 1
+
+
+@cache
+def cli_llm_version() -> str:
+    """The installed version of this package, used to invalidate manifests written by other versions."""
+    from importlib import metadata
+
+    try:
+        return metadata.version("cli-llm")
+    except metadata.PackageNotFoundError:  # pragma: no cover # The package is always installed when testing
+        return "unknown"
+
+
+class ToolStatus(enum.StrEnum):
+    """The outcome of inspecting a tool script."""
+
+    VALID = "valid"
+    SKIPPED = "skipped"
+    MISSING = "missing"
+    INVALID_TYPE = "invalid_type"
+    UNRESOLVED = "unresolved"
+    FAILED = "failed"
+
+
+@dataclass(frozen=True)
+class ToolEntry:
+    """What is known about a single tool script."""
+
+    name: str
+    path: str
+    mtime_ns: int
+    size: int
+    version: str
+    status: ToolStatus
+    help: str = ""
+    hidden: bool = False
+    error: str = ""
+    engine: str = "import"
+
+    @property
+    def is_command(self) -> bool:
+        """Whether the `tool` attribute of the script is a valid `click.Command`."""
+        return self.status is ToolStatus.VALID
+
+    def is_fresh(self, stat: os.stat_result, engine: str) -> bool:
+        """Whether this entry still describes a script with the given file status, as seen by the given engine."""
+        return (
+            self.mtime_ns == stat.st_mtime_ns
+            and self.size == stat.st_size
+            and self.version == cli_llm_version()
+            and self.engine == engine
+        )
+
+    def log_status(self) -> None:
+        """Report the outcome of the inspection in the same way regardless of whether it was cached."""
+        match self.status:
+            case ToolStatus.FAILED:
+                log.warning("Failed to get the tool script from `%s` due to: %s", self.name, self.error)
+            case ToolStatus.MISSING:
+                log.warning("The module `%s` does not have an attribute `tool`", self.name)
+            case ToolStatus.SKIPPED:
+                log.debug("Skipping module `%s`", self.name)
+            case ToolStatus.INVALID_TYPE:
+                log.warning("The attribute `tool` in the module `%s` is not of type `click.Command`", self.name)
+            case ToolStatus.UNRESOLVED:
+                log.warning(
+                    "The attribute `tool` in the module `%s` could not be statically resolved to a `click.Command`",
+                    self.name,
+                )
+
+
+class ToolManifest:
+    """Persistent map of tool script paths to their last known inspection result."""
+
+    def __init__(self, path: "Path", entries: dict[str, ToolEntry] | None = None) -> None:
+        """Initialise the manifest.
+
+        Args:
+            path: Where the manifest is stored.
+            entries: The entries keyed by the absolute path of the tool script.
+        """
+        self.path = path
+        self._entries = entries or {}
+        self._dirty = False
+
+    @classmethod
+    def load(cls, path: "Path") -> t.Self:
+        """Load the manifest at the given path, starting afresh if it is missing or unreadable."""
+        try:
+            data = json.loads(path.read_text())
+            if data["format"] != MANIFEST_FORMAT:
+                log.debug("Ignoring tool manifest with an unknown format: %s", path)
+                return cls(path)
+            entries = {
+                key: ToolEntry(**(value | {"status": ToolStatus(value["status"])}))
+                for key, value in data["entries"].items()
+            }
+        except FileNotFoundError:
+            return cls(path)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            log.debug("Ignoring unreadable tool manifest %s due to: %s", path, e)
+            return cls(path)
+        return cls(path, entries)
+
+    def lookup(self, filepath: "Path", stat: os.stat_result, engine: str) -> ToolEntry | None:
+        """Get the cached entry for the given tool script, if it is still fresh for the given discovery engine."""
+        entry = self._entries.get(str(filepath))
+        if entry is None or not entry.is_fresh(stat, engine):
+            return None
+        return entry
+
+    def update(self, entry: ToolEntry) -> None:
+        """Add or replace the entry for a tool script."""
+        self._entries[entry.path] = entry
+        self._dirty = True
+
+    def retain(self, paths: t.Iterable[str]) -> None:
+        """Drop the entries of any tool scripts that are no longer present."""
+        keep = set(paths)
+        stale = self._entries.keys() - keep
+        for key in stale:
+            del self._entries[key]
+        self._dirty |= bool(stale)
+
+    def save(self) -> None:
+        """Atomically write the manifest back to disk if anything changed."""
+        if not self._dirty:
+            return
+        data = {"format": MANIFEST_FORMAT, "entries": {key: asdict(entry) for key, entry in self._entries.items()}}
+        try:
+            atomic_write_text(self.path, json.dumps(data))
+        except OSError as e:
+            log.debug("Failed to write the tool manifest to %s due to: %s", self.path, e)
+            return
+        self._dirty = False
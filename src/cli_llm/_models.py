@@ -0,0 +1,250 @@
+"""Module for resolving model ids to `llm` models.
+
+Asking `llm` for a model calls the `register_models` hook of every installed plugin, some of which make network
+requests, e.g. `llm-ollama` asks the Ollama server for its models. To avoid that on every run, resolved models are
+memoised in-process and the plugin that serves each model id is remembered on disk. Later runs build the model
+directly from its recorded class, when the class builds an equal model from the model id alone, or else only call
+that plugin's hook, falling back to full discovery when the record is missing, expired or wrong.
+"""
+
+import functools
+import importlib
+import json
+import time
+import typing as t
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+import llm
+from llm.models import AsyncModel, Model
+from llm.plugins import load_plugins, pm
+
+from cli_llm._files import atomic_write_text
+from cli_llm._logging import ClmLogger
+
+log = ClmLogger()
+
+MODEL_REGISTRY_FILE = "model_registry.json"
+MODEL_REGISTRY_FORMAT = 2
+
+type AnyModel = Model | AsyncModel
+
+_memo: dict[tuple[str, bool], AnyModel] = {}
+
+
+def clear_memo() -> None:
+    """Forget the models resolved by this process."""
+    _memo.clear()
+
+
+def _class_path(model: AnyModel) -> str:
+    return f"{type(model).__module__}.{type(model).__qualname__}"
+
+
+def _factory(model: AnyModel | None) -> str | None:
+    """The class of the model, as `module:qualname`, if it builds an equal model from the model id alone."""
+    if model is None or "<locals>" in type(model).__qualname__:
+        return None
+    try:
+        rebuilt = type(model)(model.model_id)  # type: ignore[call-arg]
+    except Exception:  # noqa: BLE001
+        return None
+    return f"{type(model).__module__}:{type(model).__qualname__}" if vars(rebuilt) == vars(model) else None
+
+
+def _build(factory: str, model_id: str, *, async_: bool) -> AnyModel | None:
+    """Build the model from the class recorded by `_factory`, or `None` if that fails."""
+    module, _, qualname = factory.partition(":")
+    try:
+        cls: t.Any = functools.reduce(getattr, qualname.split("."), importlib.import_module(module))
+        model = cls(model_id)
+    except Exception as e:  # noqa: BLE001
+        log.debug("Failed to build the model %s from %s due to: %s", model_id, factory, e)
+        return None
+    return model if isinstance(model, AsyncModel if async_ else Model) else None
+
+
+@dataclass(frozen=True)
+class _Registration:
+    plugin: str
+    model: Model | None
+    async_model: AsyncModel | None
+    aliases: tuple[str, ...]
+
+    @property
+    def model_id(self) -> str:
+        model = self.model or self.async_model
+        return model.model_id if model is not None else ""
+
+    @property
+    def model_class(self) -> str:
+        model = self.model or self.async_model
+        return _class_path(model) if model is not None else ""
+
+    def variant(self, *, async_: bool) -> AnyModel | None:
+        return self.async_model if async_ else self.model
+
+    def record(self, resolved_at: float) -> "ModelRecord":
+        return ModelRecord(
+            self.plugin,
+            self.model_id,
+            self.model_class,
+            resolved_at,
+            model_factory=_factory(self.model),
+            async_model_factory=_factory(self.async_model),
+        )
+
+
+@dataclass(frozen=True)
+class ModelRecord:
+    """Which plugin serves a model id, as of when it was resolved."""
+
+    plugin: str
+    model_id: str
+    model_class: str
+    resolved_at: float
+    model_factory: str | None = None
+    """The class that builds the model from the model id alone, so the plugin need not be asked for it."""
+    async_model_factory: str | None = None
+    """The class that builds the async model from the model id alone."""
+
+    def factory(self, *, async_: bool) -> str | None:
+        """The class that builds the model, or its async variant, from the model id alone, if any."""
+        return self.async_model_factory if async_ else self.model_factory
+
+
+def _registrations(plugin: str | None = None) -> list[_Registration]:
+    """Call the `register_models` hook of every plugin, or only the named plugin, recording who registered what."""
+    load_plugins()  # type: ignore[no-untyped-call]
+    registrations: list[_Registration] = []
+    for hookimpl in pm.hook.register_models.get_hookimpls():
+        if plugin is not None and hookimpl.plugin_name != plugin:
+            continue
+
+        def register(
+            model: Model | None,
+            async_model: AsyncModel | None = None,
+            aliases: t.Iterable[str] | None = None,
+            *,
+            plugin_name: str = hookimpl.plugin_name,
+        ) -> None:
+            registrations.append(_Registration(plugin_name, model, async_model, tuple(aliases or ())))
+
+        hookimpl.function(register=register)
+    return registrations
+
+
+def _find(name: str, registrations: list[_Registration]) -> _Registration | None:
+    for registration in registrations:
+        if name == registration.model_id or name in registration.aliases:
+            return registration
+    return None
+
+
+class ModelRegistry:
+    """Resolves model ids, and aliases, to `llm` models."""
+
+    def __init__(self, path: Path, *, ttl: float) -> None:
+        """Initialise the registry.
+
+        Args:
+            path: Where the records of which plugin serves each model id are stored.
+            ttl: How many seconds a record can be used for before the model is discovered afresh.
+        """
+        self.path = path
+        self.ttl = ttl
+
+    def _load(self) -> dict[str, ModelRecord]:
+        try:
+            data = json.loads(self.path.read_text())
+            if data["format"] != MODEL_REGISTRY_FORMAT:
+                return {}
+            return {name: ModelRecord(**record) for name, record in data["records"].items()}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            log.debug("Ignoring unreadable model registry %s due to: %s", self.path, e)
+            return {}
+
+    def _save(self, records: dict[str, ModelRecord]) -> None:
+        data = {"format": MODEL_REGISTRY_FORMAT, "records": {name: asdict(record) for name, record in records.items()}}
+        try:
+            atomic_write_text(self.path, json.dumps(data))
+        except OSError as e:
+            log.debug("Failed to write the model registry to %s due to: %s", self.path, e)
+
+    def _from_record(self, record: ModelRecord, *, async_: bool) -> AnyModel | None:
+        """Resolve the model from its recorded class, or else by only asking the plugin that served it last time."""
+        if time.time() - record.resolved_at > self.ttl:
+            log.debug("The model registry record for %s has expired", record.model_id)
+            return None
+        if (factory := record.factory(async_=async_)) is not None:
+            return _build(factory, record.model_id, async_=async_)
+        registration = _find(record.model_id, _registrations(record.plugin))
+        if registration is None or registration.model_class != record.model_class:
+            model = None
+        else:
+            model = registration.variant(async_=async_)
+        if model is None:
+            log.debug("The model registry record for %s is out of date", record.model_id)
+        return model
+
+    def _discover(self, name: str, *, async_: bool) -> AnyModel:
+        """Resolve the model by asking every plugin, recording who serves it."""
+        registrations = _registrations()
+        registration = _find(name, registrations)
+        if registration is None:
+            # Let `llm` handle anything else it knows about, such as user defined aliases, and its errors.
+            model: AnyModel = llm.get_async_model(name) if async_ else llm.get_model(name)
+            registration = _find(model.model_id, registrations)
+        else:
+            found = registration.variant(async_=async_)
+            if found is None:
+                kind = "async model (sync model exists)" if async_ else "model (async model exists)"
+                msg = f"Unknown {kind}: {name}"
+                raise llm.UnknownModelError(msg)
+            model = found
+
+        if registration is not None and self.ttl > 0:
+            records = self._load()
+            records[name] = registration.record(time.time())
+            self._save(records)
+        return model
+
+    def resolve(self, name: str, *, async_: bool = False) -> AnyModel:
+        """Resolve the model id, or alias, to a model.
+
+        Args:
+            name: The model id or alias.
+            async_: Whether to resolve the async variant of the model.
+
+        Returns:
+            The model.
+        """
+        if (name, async_) in _memo:
+            return _memo[name, async_]
+
+        record = self._load().get(name)
+        model = self._from_record(record, async_=async_) if record is not None else None
+        if model is None:
+            log.info("Discovering the plugin that serves the model: %s", name)
+            model = self._discover(name, async_=async_)
+
+        _memo[name, async_] = model
+        return model
+
+    def refresh(self) -> int:
+        """Forget all previously resolved models and record which plugin serves every registered model.
+
+        Returns:
+            The number of model ids and aliases recorded.
+        """
+        clear_memo()
+        now = time.time()
+        records: dict[str, ModelRecord] = {}
+        for registration in _registrations():
+            record = registration.record(now)
+            for name in (registration.model_id, *registration.aliases):
+                records.setdefault(name, record)
+        self._save(records)
+        return len(records)
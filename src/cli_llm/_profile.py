@@ -0,0 +1,230 @@
+"""Module for profiling tool runs, as done by `clm --profile`.
+
+Each profile is written as a pstats file, for `python -m pstats` or snakeviz, and as collapsed stacks, one
+`frame;frame;frame microseconds` line per stack, for flamegraph tools such as flamegraph.pl, inferno or speedscope.
+
+Time spent waiting for the model is attributed to the `waiting_for_model_stream` frame.
+"""
+
+import contextlib
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+import typing as t
+from collections import defaultdict
+from pathlib import Path
+
+from cli_llm._logging import ClmLogger
+
+if t.TYPE_CHECKING:
+    from collections.abc import Iterator
+    from types import FrameType
+
+log = ClmLogger()
+
+PROFILE_DIR = "profiles"
+
+SAMPLE_INTERVAL = 0.005
+"""The seconds between each sample taken by the sampling profiler."""
+
+MAX_DEPTH = 128
+"""The deepest stack reconstructed from a call graph."""
+
+MIN_FRACTION = 1e-3
+"""Stacks reconstructed from a call graph that take less than this fraction of the profiled time are left out."""
+
+type FunctionKey = tuple[str, int, str]
+type FunctionStats = tuple[int, int, float, float, dict[FunctionKey, tuple[int, int, float, float]]]
+type Stacks = dict[tuple[FunctionKey, ...], float]
+
+
+def frame_label(key: FunctionKey) -> str:
+    """The label of a function in the collapsed stacks."""
+    filename, line, name = key
+    if filename == "~":
+        return name.replace(";", ":")
+    return f"{name} ({Path(filename).name}:{line})".replace(";", ":")
+
+
+def collapse(stacks: Stacks) -> str:
+    """Format the seconds spent in each stack, outermost frame first, as collapsed stacks in microseconds."""
+    lines = [
+        f"{';'.join(frame_label(key) for key in stack)} {round(seconds * 1_000_000)}"
+        for stack, seconds in sorted(stacks.items())
+    ]
+    return "".join(f"{line}\n" for line in lines if not line.endswith(" 0"))
+
+
+class CallGraphProfiler(cProfile.Profile):
+    """Deterministic profiler, whose stacks are reconstructed from the call graph it records.
+
+    cProfile only records which function called which, so the time of a function called from several places is
+    split between them in proportion to the time spent in each call. Splitting the time of every function down every
+    path it could have been called through grows quickly with the size of the call graph, so the smallest stacks are
+    left out.
+    """
+
+    def stacks(self) -> Stacks:
+        """The seconds spent in each stack."""
+        self.create_stats()
+        self._graph = t.cast("dict[FunctionKey, FunctionStats]", self.stats)
+        self._min_seconds = sum(entry[2] for entry in self._graph.values()) * MIN_FRACTION
+        stacks: Stacks = defaultdict(float)
+        for key, (_, _, own_time, _, _) in self._graph.items():
+            if own_time > 0 and own_time >= self._min_seconds:
+                for stack, seconds in self._stacks_to((key,), own_time):
+                    stacks[stack] += seconds
+        return stacks
+
+    def _stacks_to(
+        self, stack: tuple[FunctionKey, ...], seconds: float
+    ) -> "Iterator[tuple[tuple[FunctionKey, ...], float]]":
+        callers = {
+            caller: edge[3]
+            for caller, edge in self._graph[stack[0]][4].items()
+            if caller not in stack and caller in self._graph
+        }
+        total = sum(callers.values())
+        if not callers or total <= 0 or len(stack) >= MAX_DEPTH:
+            yield stack, seconds
+            return
+        for caller, caller_time in callers.items():
+            share = seconds * caller_time / total
+            if share >= self._min_seconds:
+                yield from self._stacks_to((caller, *stack), share)
+
+
+class SamplingProfiler:
+    """Statistical profiler, which samples the stack of the thread it was enabled on at a fixed interval.
+
+    It only slows the profiled code down by the cost of each sample, so it is better suited to long runs.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL) -> None:
+        """Initialise the profiler.
+
+        Args:
+            interval: The seconds between each sample.
+        """
+        self.interval = interval
+        self.stats: dict[FunctionKey, FunctionStats] = {}
+        self._samples: Stacks = defaultdict(float)
+        self._counts: dict[tuple[FunctionKey, ...], int] = defaultdict(int)
+        self._stopped = threading.Event()
+        self._sampler: threading.Thread | None = None
+
+    def enable(self) -> None:
+        """Start sampling the calling thread."""
+        self._stopped.clear()
+        self._sampler = threading.Thread(
+            target=self._sample, args=(threading.get_ident(),), name="clm-profiler", daemon=True
+        )
+        self._sampler.start()
+
+    def disable(self) -> None:
+        """Stop sampling."""
+        self._stopped.set()
+        if self._sampler is not None:
+            self._sampler.join()
+            self._sampler = None
+
+    def _sample(self, thread_id: int) -> None:
+        last = time.perf_counter()
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)  # noqa: SLF001
+            now = time.perf_counter()
+            if frame is not None:
+                stack = _stack(frame)
+                self._samples[stack] += now - last
+                self._counts[stack] += 1
+            last = now
+
+    def stacks(self) -> Stacks:
+        """The seconds spent in each stack."""
+        return dict(self._samples)
+
+    def create_stats(self) -> None:
+        """Build the pstats of the samples, where each call is a sample the function was on the stack for."""
+        stats: dict[FunctionKey, list[t.Any]] = {}
+        for stack, seconds in self._samples.items():
+            count = self._counts[stack]
+            for depth, key in enumerate(stack):
+                entry = stats.setdefault(key, [0, 0, 0.0, 0.0, {}])
+                if key in stack[:depth]:
+                    continue
+                entry[0] += count
+                entry[1] += count
+                entry[3] += seconds
+                if depth:
+                    caller = entry[4].setdefault(stack[depth - 1], [0, 0, 0.0, 0.0])
+                    caller[0] += count
+                    caller[1] += count
+                    caller[3] += seconds
+            stats[stack[-1]][2] += seconds
+        for entry in stats.values():
+            for edge in entry[4].values():
+                edge[2] = entry[2] * edge[3] / entry[3]
+            entry[4] = {caller: tuple(edge) for caller, edge in entry[4].items()}
+        self.stats = {key: t.cast("FunctionStats", tuple(entry)) for key, entry in stats.items()}
+
+
+def _stack(frame: "FrameType | None") -> tuple[FunctionKey, ...]:
+    keys = []
+    while frame is not None:
+        code = frame.f_code
+        keys.append((code.co_filename, code.co_firstlineno, code.co_name))
+        frame = frame.f_back
+    return tuple(reversed(keys))
+
+
+PROFILERS: dict[str, type[CallGraphProfiler | SamplingProfiler]] = {
+    "cprofile": CallGraphProfiler,
+    "sampling": SamplingProfiler,
+}
+
+
+def write_profile(
+    profiler: CallGraphProfiler | SamplingProfiler, directory: Path, name: str
+) -> tuple[Path, Path] | None:
+    """Write the profile as pstats and collapsed stacks.
+
+    Returns:
+        The paths of the pstats and the collapsed stacks files, or `None` if nothing was profiled.
+    """
+    from cli_llm._files import atomic_write_text
+
+    stacks = profiler.stacks()
+    if not stacks:
+        return None
+    stem = f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+    pstats_path = directory / f"{stem}.pstats"
+    collapsed_path = directory / f"{stem}.collapsed"
+    directory.mkdir(parents=True, exist_ok=True)
+    atomic_write_text(collapsed_path, collapse(stacks))
+    pstats.Stats(t.cast("cProfile.Profile", profiler)).dump_stats(pstats_path)
+    return pstats_path, collapsed_path
+
+
+@contextlib.contextmanager
+def profile(mode: str, directory: Path, name: str) -> "Iterator[None]":
+    """Profile the code run within the context, writing the profile to the directory once it finishes.
+
+    Args:
+        mode: The name of the profiler in `PROFILERS`.
+        directory: The directory to write the profile to.
+        name: The name of what is being profiled, used in the file names.
+    """
+    profiler = PROFILERS[mode]()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        paths = write_profile(profiler, directory, name)
+        if paths is None:
+            log.warning("Nothing was profiled, the run was too short to take any samples")
+        else:
+            log.print(f"Wrote the profile to {paths[0]} and {paths[1]}")
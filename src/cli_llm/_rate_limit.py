@@ -0,0 +1,56 @@
+"""Module for limiting how many requests are sent to the model per minute, e.g. to stay within a provider's quota."""
+
+import threading
+import time
+import typing as t
+
+if t.TYPE_CHECKING:
+    from collections.abc import Callable
+
+
+class RateLimiter:
+    """Spaces out the requests so that no more than the given number start per minute, across threads."""
+
+    def __init__(
+        self,
+        per_minute: float | None,
+        *,
+        clock: "Callable[[], float]" = time.monotonic,
+        sleep: "Callable[[float], None]" = time.sleep,
+    ) -> None:
+        """Initialise the rate limiter.
+
+        Args:
+            per_minute: The most requests to start per minute, `None` for no limit.
+            clock: Monotonic clock measuring seconds.
+            sleep: Function used to wait for the given number of seconds.
+        """
+        self.interval = 60 / per_minute if per_minute else 0.0
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def _reserve(self) -> float:
+        """Take the next slot, returning how many seconds to wait for it."""
+        if not self.interval:
+            return 0.0
+        with self._lock:
+            now = self._clock()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        return start - now
+
+    def wait(self) -> None:
+        """Wait until the next request is allowed to start."""
+        delay = self._reserve()
+        if delay > 0:
+            self._sleep(delay)
+
+    async def async_wait(self) -> None:
+        """Wait until the next request is allowed to start, without blocking the event loop."""
+        import asyncio
+
+        delay = self._reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
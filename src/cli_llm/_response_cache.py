@@ -0,0 +1,186 @@
+"""Module for caching LLM responses on disk.
+
+Responses are keyed on the model id, the prompt options and the fully rendered prompt, so any change to the inputs
+is a cache miss. The cache is a SQLite database that is kept under a size limit by evicting the least recently used
+responses, and responses older than the time to live are never served.
+"""
+
+import contextlib
+import hashlib
+import json
+import sqlite3
+import time
+import typing as t
+from pathlib import Path
+
+from cli_llm._logging import ClmLogger
+
+if t.TYPE_CHECKING:
+    import llm
+    from llm.models import AsyncResponse
+
+log = ClmLogger()
+
+RESPONSE_CACHE_FILE = "responses.sqlite3"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model_id TEXT NOT NULL,
+    text TEXT NOT NULL,
+    response_json TEXT,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at);
+"""
+
+
+class CachedResponse:
+    """A response served from the cache, with the same interface as the parts of `llm.Response` that are used."""
+
+    input_tokens: int | None = None
+    """Token usage is not cached."""
+    output_tokens: int | None = None
+
+    def __init__(self, model_id: str, text: str, response_json: t.Any = None) -> None:
+        """Initialise with the cached response contents."""
+        self.model_id = model_id
+        self._text = text
+        self._response_json = response_json
+
+    def __iter__(self) -> t.Iterator[str]:
+        """The whole response is available immediately, so it is a single chunk."""
+        if self._text:
+            yield self._text
+
+    def text(self) -> str:
+        """The full text of the response."""
+        return self._text
+
+    def json(self) -> t.Any:
+        """The raw JSON returned by the model, if any."""
+        return self._response_json
+
+    def __repr__(self) -> str:
+        """String representation of this class instance."""
+        return f"<CachedResponse model_id={self.model_id!r} text={self._text!r}>"
+
+
+class AsyncCachedResponse:
+    """A response served from the cache, with the same interface as the parts of `llm.AsyncResponse` that are used."""
+
+    input_tokens: int | None = None
+    """Token usage is not cached."""
+    output_tokens: int | None = None
+
+    def __init__(self, cached: CachedResponse) -> None:
+        """Initialise with the cached response."""
+        self._cached = cached
+        self.model_id = cached.model_id
+
+    async def __aiter__(self) -> t.AsyncIterator[str]:
+        """The whole response is available immediately, so it is a single chunk."""
+        for chunk in self._cached:
+            yield chunk
+
+    async def text(self) -> str:
+        """The full text of the response."""
+        return self._cached.text()
+
+    async def json(self) -> t.Any:
+        """The raw JSON returned by the model, if any."""
+        return self._cached.json()
+
+    def __repr__(self) -> str:
+        """String representation of this class instance."""
+        return f"<AsyncCachedResponse model_id={self.model_id!r} text={self._cached.text()!r}>"
+
+
+class ResponseCache:
+    """SQLite backed cache of LLM responses."""
+
+    def __init__(self, path: Path, *, ttl: float, max_bytes: int) -> None:
+        """Initialise the cache.
+
+        Args:
+            path: The location of the SQLite database.
+            ttl: How many seconds a response can be served from the cache for.
+            max_bytes: The total size of the cached responses to keep, evicting the least recently used beyond it.
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key(model_id: str, options: dict[str, t.Any], prompt: str) -> str:
+        """The cache key for a prompt to a model with the given options."""
+        data = json.dumps([model_id, options, prompt], sort_keys=True, default=str)
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    @contextlib.contextmanager
+    def _connect(self) -> t.Iterator[sqlite3.Connection]:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with contextlib.closing(sqlite3.connect(self.path, timeout=30)) as connection, connection:
+            connection.executescript(_SCHEMA)
+            yield connection
+
+    def get(self, key: str) -> CachedResponse | None:
+        """Get the cached response for the key, if there is one that has not expired."""
+        now = time.time()
+        try:
+            with self._connect() as connection:
+                row = connection.execute(
+                    "SELECT model_id, text, response_json FROM responses WHERE key = ? AND created_at >= ?",
+                    (key, now - self.ttl),
+                ).fetchone()
+                if row is None:
+                    return None
+                connection.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        except sqlite3.Error as e:
+            log.warning("Failed to read from the response cache due to: %s", e)
+            return None
+        model_id, text, response_json = row
+        return CachedResponse(model_id, text, json.loads(response_json) if response_json is not None else None)
+
+    def set(self, key: str, model_id: str, text: str, response_json: t.Any = None) -> None:
+        """Store a response, evicting expired and least recently used responses as needed."""
+        now = time.time()
+        response_json = json.dumps(response_json, default=str) if response_json is not None else None
+        size = len(text.encode()) + len((response_json or "").encode())
+        try:
+            with self._connect() as connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, model_id, text, response_json, size, now, now),
+                )
+                connection.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+                connection.execute(
+                    """
+                    DELETE FROM responses WHERE key IN (
+                        SELECT key FROM (
+                            SELECT key, SUM(size) OVER (ORDER BY accessed_at DESC, key) AS total FROM responses
+                        ) WHERE total > ?
+                    )
+                    """,
+                    (self.max_bytes,),
+                )
+        except sqlite3.Error as e:
+            log.warning("Failed to write to the response cache due to: %s", e)
+
+    def store_on_done(self, key: str, response: "llm.Response") -> None:
+        """Store the response in the cache once it has been fully received."""
+
+        def store(done: "llm.Response") -> None:
+            self.set(key, done.model.model_id, done.text(), done.json())
+
+        response.on_done(store)  # type: ignore[no-untyped-call]
+
+    async def astore_on_done(self, key: str, response: "AsyncResponse") -> None:
+        """Store the async response in the cache once it has been fully received."""
+
+        async def store(done: "AsyncResponse") -> None:
+            self.set(key, done.model.model_id, done.text_or_raise(), await done.json())
+
+        await response.on_done(store)  # type: ignore[no-untyped-call]
@@ -0,0 +1,171 @@
+"""Module for summarising the run history, as shown by `clm stats`."""
+
+import datetime as dt
+import typing as t
+from dataclasses import dataclass, field
+
+if t.TYPE_CHECKING:
+    from collections.abc import Callable, Iterable
+    from pathlib import Path
+
+    from rich.table import Table
+
+    from cli_llm._history import RunRecord
+
+GROUPS: "dict[str, Callable[[RunRecord], str]]" = {
+    "tool": lambda record: record.tool or "-",
+    "model": lambda record: record.model_id,
+    "day": lambda record: dt.datetime.fromtimestamp(record.finished_at).date().isoformat(),  # noqa: DTZ006
+}
+"""How runs can be grouped, by the key of each run's group."""
+
+QUANTILES = (0.5, 0.95)
+
+PROMETHEUS_GROUPS = ("tool", "model")
+"""The groups kept as labels in the Prometheus output. `day` is left out, as each day would be a new time series."""
+
+
+def percentile(values: "list[float]", fraction: float) -> float | None:
+    """The value below which the given fraction of the values lie, interpolating between the nearest values.
+
+    Args:
+        values: The values, which do not need to be sorted.
+        fraction: The fraction, between 0 and 1.
+
+    Returns:
+        The percentile, or `None` if there are no values.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+@dataclass
+class GroupStats:
+    """The summary of a group of runs."""
+
+    runs: int = 0
+    errors: int = 0
+    cache_hits: int = 0
+    latencies: list[float] = field(default_factory=list)
+    times_to_first_token: list[float] = field(default_factory=list)
+    tokens_per_second: list[float] = field(default_factory=list)
+
+    def add(self, record: "RunRecord") -> None:
+        """Add the run to the group."""
+        self.runs += 1
+        self.errors += record.error is not None
+        self.cache_hits += record.cached
+        if record.latency is not None:
+            self.latencies.append(record.latency)
+        if record.time_to_first_token is not None:
+            self.times_to_first_token.append(record.time_to_first_token)
+        if record.tokens_per_second is not None:
+            self.tokens_per_second.append(record.tokens_per_second)
+
+
+def summarise(records: "Iterable[RunRecord]", by: "Iterable[str]") -> dict[tuple[str, ...], GroupStats]:
+    """Summarise the runs in groups.
+
+    Args:
+        records: The runs.
+        by: The names of the `GROUPS` to group the runs by.
+
+    Returns:
+        The summary of each group, in order of the group keys.
+    """
+    keys = [GROUPS[name] for name in by]
+    groups: dict[tuple[str, ...], GroupStats] = {}
+    for record in records:
+        groups.setdefault(tuple(key(record) for key in keys), GroupStats()).add(record)
+    return dict(sorted(groups.items()))
+
+
+def _format(value: float | None, template: str) -> str:
+    return "-" if value is None else template.format(value)
+
+
+def table(groups: dict[tuple[str, ...], GroupStats], by: "Iterable[str]") -> "Table":
+    """A table of the summary of each group, with the percentiles of the latency and throughput."""
+    from rich.table import Table
+
+    by = list(by)
+    columns = [*by, "runs", "errors", "cached"]
+    for name in ("latency", "ttft", "tok/s"):
+        columns.extend(f"{name} p{round(quantile * 100)}" for quantile in QUANTILES)
+    result = Table(*columns, title="Run history")
+    for column in result.columns[len(by) :]:
+        column.justify = "right"
+    for key, stats in groups.items():
+        result.add_row(
+            *key,
+            str(stats.runs),
+            str(stats.errors),
+            f"{stats.cache_hits / stats.runs:.0%}",
+            *(_format(percentile(stats.latencies, quantile), "{:.2f}s") for quantile in QUANTILES),
+            *(_format(percentile(stats.times_to_first_token, quantile), "{:.2f}s") for quantile in QUANTILES),
+            *(_format(percentile(stats.tokens_per_second, quantile), "{:.1f}") for quantile in QUANTILES),
+        )
+    return result
+
+
+def _labels(by: "Iterable[str]", key: tuple[str, ...], **extra: str) -> str:
+    labels = {**dict(zip(by, key, strict=True)), **extra}
+    values = ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items())
+    return f"{{{values}}}" if values else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def prometheus(groups: dict[tuple[str, ...], GroupStats], by: "Iterable[str]") -> str:
+    """The summary of each group in the Prometheus text format, for the node exporter's textfile collector.
+
+    Every metric is a gauge, as the summary is of the runs still in the history, which may be limited to recent days,
+    so the values can fall as well as rise.
+    """
+    by = list(by)
+    totals: dict[str, tuple[str, Callable[[GroupStats], int]]] = {
+        "clm_runs": ("Runs in the history.", lambda stats: stats.runs),
+        "clm_run_errors": ("Runs in the history that failed.", lambda stats: stats.errors),
+        "clm_run_cache_hits": ("Runs in the history served from the response cache.", lambda stats: stats.cache_hits),
+    }
+    quantiles: dict[str, tuple[str, Callable[[GroupStats], list[float]]]] = {
+        "clm_run_latency_seconds": ("Time to receive the whole response.", lambda stats: stats.latencies),
+        "clm_run_time_to_first_token_seconds": (
+            "Time to receive the first token.",
+            lambda stats: stats.times_to_first_token,
+        ),
+        "clm_run_output_tokens_per_second": (
+            "Output tokens generated per second after the first token.",
+            lambda stats: stats.tokens_per_second,
+        ),
+    }
+    lines = []
+    for name, (help_, count) in totals.items():
+        lines.extend([f"# HELP {name} {help_}", f"# TYPE {name} gauge"])
+        lines.extend(f"{name}{_labels(by, key)} {count(stats)}" for key, stats in groups.items())
+    for name, (help_, values) in quantiles.items():
+        lines.extend([f"# HELP {name} {help_}", f"# TYPE {name} gauge"])
+        for key, stats in groups.items():
+            for quantile in QUANTILES:
+                value = percentile(values(stats), quantile)
+                if value is not None:
+                    lines.append(f"{name}{_labels(by, key, quantile=str(quantile))} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path: "Path", records: "Iterable[RunRecord]", by: "Iterable[str]") -> None:
+    """Write the summary of the runs to the path, grouped by those of the groups in `PROMETHEUS_GROUPS`.
+
+    The file is replaced atomically, so the node exporter never reads a partial file.
+    """
+    from cli_llm._files import atomic_write_text
+
+    by = [name for name in by if name in PROMETHEUS_GROUPS]
+    atomic_write_text(path, prometheus(summarise(records, by), by))
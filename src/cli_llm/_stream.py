@@ -0,0 +1,174 @@
+"""Module for writing streamed model output to the terminal.
+
+Printing every chunk with `Console.print` parses it for markup and runs it through rich's render pipeline, which
+becomes the bottleneck with fast models. Chunks are instead buffered and written together, as raw text, once enough
+have arrived or enough time has passed, even if the model pauses before sending the next chunk.
+
+Markdown is rendered a block at a time. Blocks are printed once they are finished, and only the trailing unfinished
+block is re-rendered as more of it arrives.
+"""
+
+import contextvars
+import threading
+import time
+import typing as t
+
+from cli_llm._logging import get_console, live_slot
+
+if t.TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from rich.console import Console
+    from rich.live import Live
+
+MAX_DELAY = 0.05
+"""The longest, in seconds, that a chunk is buffered before it is written."""
+
+MAX_CHARS = 4096
+"""The most characters buffered before they are written."""
+
+FENCES = ("```", "~~~")
+
+
+def split_finished_blocks(text: str) -> tuple[str, str]:
+    """Split Markdown into the blocks that are finished and the trailing block that may still be added to.
+
+    A block is finished once it is followed by a blank line outside of a fenced code block.
+    """
+    in_fence = False
+    boundary = 0
+    position = 0
+    for line in text.splitlines(keepends=True):
+        position += len(line)
+        stripped = line.strip()
+        if stripped.startswith(FENCES):
+            in_fence = not in_fence
+        elif not stripped and not in_fence and line.endswith("\n"):
+            boundary = position
+    return text[:boundary], text[boundary:]
+
+
+class StreamWriter:
+    """Writes streamed model output to the console, coalescing the chunks."""
+
+    def __init__(
+        self,
+        console: "Console | None" = None,
+        *,
+        markdown: bool = False,
+        max_delay: float = MAX_DELAY,
+        max_chars: int = MAX_CHARS,
+        clock: "Callable[[], float]" = time.monotonic,
+    ) -> None:
+        """Initialise the writer.
+
+        Args:
+            console: The console to write to, defaults to the application console.
+            markdown: Whether to render the output as Markdown.
+            max_delay: The longest, in seconds, that a chunk is buffered before it is written.
+            max_chars: The most characters buffered before they are written.
+            clock: Monotonic clock measuring seconds.
+        """
+        self.console = console or get_console()
+        self.markdown = markdown
+        self.max_delay = max_delay
+        self.max_chars = max_chars
+        self._clock = clock
+        self._buffer: list[str] = []
+        self._buffered = 0
+        self._flushed_at = clock()
+        self._lock = threading.RLock()
+        self._timer: threading.Timer | None = None
+        self._pending = ""
+        self._printed_blocks = False
+        self._live: Live | None = None
+        self._live_shown = False
+
+    def __enter__(self) -> t.Self:
+        """Start writing."""
+        if self.markdown:
+            from rich.live import Live
+
+            self._live_shown = live_slot.acquire(blocking=False)
+            if self._live_shown:
+                self._live = Live(console=self.console, auto_refresh=False, transient=True)
+                self._live.start()
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        """Write anything still buffered and stop writing."""
+        self.close()
+
+    def write(self, chunk: str) -> None:
+        """Buffer the chunk, writing the buffer if it is large or old enough, or else once it is old enough."""
+        if not chunk:
+            return
+        with self._lock:
+            self._buffer.append(chunk)
+            self._buffered += len(chunk)
+            if self._buffered >= self.max_chars or self._clock() - self._flushed_at >= self.max_delay:
+                self.flush()
+            elif self._timer is None:
+                self._schedule_flush()
+
+    def _schedule_flush(self) -> None:
+        # The timer runs in a copy of the current context, so it writes wherever this thread's output is captured.
+        self._timer = threading.Timer(self.max_delay, contextvars.copy_context().run, args=(self._flush_overdue,))
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _flush_overdue(self) -> None:
+        # The timer is left running when the buffer is written early, rather than restarted after every write, so at
+        # most one is started each interval however fast the chunks arrive.
+        with self._lock:
+            self._timer = None
+            self.flush()
+
+    def flush(self) -> None:
+        """Write everything buffered."""
+        with self._lock:
+            self._flushed_at = self._clock()
+            if not self._buffer:
+                return
+            text = "".join(self._buffer)
+            self._buffer.clear()
+            self._buffered = 0
+            if self.markdown:
+                self._render_markdown(text)
+            else:
+                self.console.out(text, end="", highlight=False)
+
+    def _render_markdown(self, text: str) -> None:
+        from rich.markdown import Markdown
+
+        finished, self._pending = split_finished_blocks(self._pending + text)
+        if finished:
+            self._print_blocks(finished)
+        if self._live is not None:
+            self._live.update(Markdown(self._pending), refresh=True)
+
+    def close(self) -> None:
+        """Write everything buffered, and the trailing Markdown block."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self.flush()
+        if self._live is not None:
+            self._live.stop()
+            self._live = None
+        if self._live_shown:
+            live_slot.release()
+            self._live_shown = False
+        if self._pending:
+            self._print_blocks(self._pending)
+            self._pending = ""
+
+    def _print_blocks(self, blocks: str) -> None:
+        from rich.markdown import Markdown
+
+        if self._printed_blocks:
+            # Keep the blank line that separates these blocks from the ones already printed.
+            self.console.line()
+        self.console.print(Markdown(blocks))
+        self._printed_blocks = True
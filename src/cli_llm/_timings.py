@@ -0,0 +1,71 @@
+"""Module for timing the phases of an invocation, reported by `clm --timings`.
+
+Phases are only timed once timing has been started, so they cost next to nothing otherwise. Phases that run more than
+once, e.g. rendering each prompt of a batch, are added up.
+"""
+
+import contextlib
+import threading
+import time
+import typing as t
+
+from cli_llm._logging import get_console
+
+PHASES = ("config load", "tool discovery", "render", "model resolution", "first token", "completion")
+"""The phases of a run, in the order they happen."""
+
+
+class Timings:
+    """Adds up how long each phase of the invocation took."""
+
+    def __init__(self) -> None:
+        """Initialise without timing anything."""
+        self.enabled = False
+        self._started = 0.0
+        self._phases: dict[str, list[float]] = {}
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Start timing the phases."""
+        self.enabled = True
+        self._started = time.perf_counter()
+        self._phases.clear()
+
+    def record(self, name: str, seconds: float) -> None:
+        """Add the time taken by one run of the phase."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._phases.setdefault(name, []).append(seconds)
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> t.Iterator[None]:
+        """Time the phase run within the context."""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def finish(self) -> None:
+        """Print the breakdown of the phases and stop timing."""
+        from rich.table import Table
+
+        total = time.perf_counter() - self._started
+        table = Table("Phase", "Runs", "Seconds", "Share", title="Timings")
+        names = [*PHASES, *sorted(self._phases.keys() - set(PHASES))]
+        for name in names:
+            runs = self._phases.get(name, [])
+            seconds = sum(runs)
+            table.add_row(name, str(len(runs)), f"{seconds:.3f}", f"{seconds / total:.0%}")
+        table.add_section()
+        table.add_row("total", "", f"{total:.3f}", "")
+        get_console().print(table)
+        self.enabled = False
+
+
+timings = Timings()
+"""The timings of the current invocation."""
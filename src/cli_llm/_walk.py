@@ -0,0 +1,95 @@
+"""Module for walking directory trees without descending into ignored directories."""
+
+import fnmatch
+import os
+import re
+import typing as t
+from pathlib import Path
+
+from cli_llm._ignore import IgnoreRules, ancestor_rules, is_ignored
+from cli_llm._logging import ClmLogger
+
+log = ClmLogger()
+
+
+def compile_exclude(exclude: t.Sequence[str]) -> re.Pattern[str] | None:
+    """Compile the glob patterns into one regular expression, so each entry is matched once rather than per pattern."""
+    if not exclude:
+        return None
+    return re.compile("|".join(fnmatch.translate(pattern) for pattern in exclude))
+
+
+def _load_rules(directory: Path, prefix: str, names: set[str], ignore_files: t.Sequence[str]) -> list[IgnoreRules]:
+    """Load the rules of the ignore files in the directory, given the names of its entries."""
+    return [
+        ignore for name in ignore_files if name in names and (ignore := IgnoreRules.load(directory / name, base=prefix))
+    ]
+
+
+def _is_skipped(
+    name: str,
+    relative: str,
+    *,
+    is_dir: bool,
+    excluded: re.Pattern[str] | None,
+    rules: t.Sequence[IgnoreRules] | None,
+) -> bool:
+    """Whether the entry is excluded, or ignored if the rules of ignore files are being honoured."""
+    if excluded is not None and (excluded.match(name) or excluded.match(relative)):
+        return True
+    if rules is None:
+        return False
+    return (is_dir and name == ".git") or is_ignored(rules, relative, is_dir=is_dir)
+
+
+def walk_files(
+    root: Path,
+    *,
+    suffix: str = "",
+    exclude: t.Sequence[str] = (),
+    max_depth: int | None = None,
+    ignore_files: t.Sequence[str] = (),
+) -> t.Iterator[Path]:
+    """Walk the files under the root directory in a deterministic order.
+
+    Excluded and ignored directories are pruned rather than filtered afterwards, so their contents are never listed.
+
+    Args:
+        root: The directory to walk.
+        suffix: Only yield files with this suffix.
+        exclude: Glob patterns matched against the name and root-relative path of each file and directory.
+        max_depth: How many levels of subdirectories to descend into. `None` means no limit.
+        ignore_files: The names of `.gitignore` style files whose rules are honoured, in the directories walked and
+            those above the root up to the top of its git repository. The `.git` directory is skipped if any are given.
+
+    Yields:
+        The paths of the matching files.
+    """
+    excluded = compile_exclude(exclude)
+    rules: tuple[IgnoreRules, ...] = tuple(ancestor_rules(root, ignore_files)) if ignore_files else ()
+    stack = [(root, "", 0, rules)]
+    while stack:
+        directory, prefix, depth, rules = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError as e:
+            log.info("Unable to search %s due to: %s", directory, e)
+            continue
+        if ignore_files:
+            rules += tuple(_load_rules(directory, prefix, {entry.name for entry in entries}, ignore_files))
+        subdirectories = []
+        for entry in entries:
+            relative = f"{prefix}{entry.name}"
+            is_dir = entry.is_dir(follow_symlinks=False)
+            if not is_dir and not (entry.name.endswith(suffix) and entry.is_file()):
+                continue
+            if _is_skipped(
+                entry.name, relative, is_dir=is_dir, excluded=excluded, rules=rules if ignore_files else None
+            ):
+                continue
+            if not is_dir:
+                yield Path(entry.path)
+            elif max_depth is None or depth < max_depth:
+                subdirectories.append((Path(entry.path), f"{relative}/", depth + 1, rules))
+        stack.extend(reversed(subdirectories))
@@ -4,30 +4,114 @@ import typing as t
 from pathlib import Path
 
 import click
-from rich.traceback import install
 
-from cli_llm import ClmConfig
-from cli_llm._cli_utils import ToolGatherer, common_options
-from cli_llm._logging import ClmLogger
+from cli_llm._cli_utils import CLI_SETTINGS_KEY, PROFILE_KEY, ToolGatherer, common_options, get_config
+from cli_llm._logging import ClmLogger, install_tracebacks
 
 log = ClmLogger()
 
 
 @click.group()
 @click.option("-m", "--ll-model", default=None, help="The LLM to use.")
+@click.option("--cache/--no-cache", default=None, help="Whether to use the response cache.")
+@click.option("--refresh", is_flag=True, default=False, help="Fetch fresh responses and update the response cache.")
+@click.option(
+    "--transcript",
+    type=click.Path(dir_okay=False, path_type=Path),
+    default=None,
+    help="Save the most recent lines of terminal output to this file.",
+)
+@click.option(
+    "--profile",
+    type=click.Choice(["cprofile", "sampling"]),
+    default=None,
+    help="Profile the tool, writing pstats and collapsed stacks for flamegraphs under the cache dir.",
+)
+@click.option(
+    "--record",
+    type=click.Path(file_okay=False, path_type=Path),
+    default=None,
+    help="Save each response as a cassette in this directory, to replay later.",
+)
+@click.option(
+    "--replay",
+    type=click.Path(exists=True, file_okay=False, path_type=Path),
+    default=None,
+    help="Serve the responses from the cassettes in this directory, using the `replay` model.",
+)
+@click.option(
+    "--replay-speed",
+    type=click.FloatRange(min=0),
+    default=None,
+    help="The multiple of the recorded delays to wait when replaying, 0 for none. Defaults to 1.",
+)
+@click.option(
+    "--since", default=None, metavar="REF", help="Tools gathering changed files gather those changed since this commit."
+)
+@click.option("--staged", is_flag=True, default=False, help="Tools gathering changed files gather the staged changes.")
+@click.option(
+    "--diff", is_flag=True, default=False, help="Tools gathering changed files gather their diffs instead of contents."
+)
+@click.option(
+    "--dry-run",
+    is_flag=True,
+    default=False,
+    help="Report the tokens each prompt would use, by section, instead of sending it.",
+)
+@click.option("--timings", is_flag=True, default=False, help="Print how long each phase took once the command exits.")
 @common_options
 @click.pass_context
-def cli(ctx: click.Context, *, ll_model: str, verbose: int, quiet: bool) -> None:
+def cli(  # noqa: PLR0913
+    ctx: click.Context,
+    *,
+    ll_model: str,
+    cache: bool | None,
+    refresh: bool,
+    transcript: Path | None,
+    profile: str | None,
+    record: Path | None,
+    replay: Path | None,
+    replay_speed: float | None,
+    since: str | None,
+    staged: bool,
+    diff: bool,
+    dry_run: bool,
+    timings: bool,
+    verbose: int,
+    quiet: bool,
+) -> None:
     """Welcome to the CLI-llm tool!"""
-    install(show_locals=True, suppress=[click])
+    install_tracebacks()
     log.set_verbosity(verbose=verbose, quiet=quiet)
+    if timings:
+        from cli_llm._timings import timings as phase_timings
+
+        phase_timings.start()
+        ctx.call_on_close(phase_timings.finish)
     cli_settings: dict[str, t.Any] = {}
     if ll_model:
         cli_settings["ll_model"] = ll_model
+    if refresh:
+        cli_settings["response_cache_refresh"] = True
+    if cache is not None or refresh:
+        cli_settings["response_cache"] = cache is not False
+    if transcript:
+        cli_settings["transcript"] = transcript
+    if record:
+        cli_settings["record_dir"] = record
+    if replay:
+        from cli_llm._cassettes import REPLAY_MODEL_ID
 
-    final_config = ClmConfig(**cli_settings)
+        cli_settings["replay_dir"] = replay
+        cli_settings.setdefault("ll_model", REPLAY_MODEL_ID)
+    if replay_speed is not None:
+        cli_settings["replay_speed"] = replay_speed
+    optional_settings = {"git_since": since, "git_staged": staged, "git_diff": diff, "dry_run": dry_run}
+    cli_settings.update({name: value for name, value in optional_settings.items() if value})
 
-    ctx.obj = final_config
+    # The config is built from these settings by the first command that needs it.
+    ctx.meta[CLI_SETTINGS_KEY] = cli_settings
+    ctx.meta[PROFILE_KEY] = profile
 
 
 @cli.command(cls=ToolGatherer)
@@ -35,6 +119,203 @@ def run() -> None:
     """Runs the specified CLI-llm tool."""
 
 
+@cli.command(context_settings={"ignore_unknown_options": True})
+@click.argument("tool_name")
+@click.argument("tool_args", nargs=-1, type=click.UNPROCESSED)
+@click.option(
+    "-i",
+    "--inputs",
+    "input_patterns",
+    multiple=True,
+    required=True,
+    help="Glob pattern matching the inputs, or @FILE listing them one per line. Can be repeated.",
+)
+@click.option(
+    "-j",
+    "--concurrency",
+    type=click.IntRange(min=1),
+    default=None,
+    help="The number of inputs to process at once. Defaults to `max_concurrency`.",
+)
+@click.option(
+    "--rpm",
+    type=click.FloatRange(min=0, min_open=True),
+    default=None,
+    help="The most requests to send to the model per minute, across all inputs. Defaults to `requests_per_minute`.",
+)
+@click.option(
+    "--retries", type=click.IntRange(min=0), default=3, show_default=True, help="Retries after a transient error."
+)
+@click.option(
+    "--backoff",
+    type=click.FloatRange(min=0),
+    default=1.0,
+    show_default=True,
+    help="Base delay in seconds before retrying, doubled after each failed attempt.",
+)
+@click.pass_context
+def batch(  # noqa: PLR0913
+    ctx: click.Context,
+    *,
+    tool_name: str,
+    tool_args: tuple[str, ...],
+    input_patterns: tuple[str, ...],
+    concurrency: int | None,
+    rpm: float | None,
+    retries: int,
+    backoff: float,
+) -> None:
+    """Runs the specified CLI-llm tool once for each input.
+
+    TOOL_ARGS are passed on to the tool, with `{}` replaced by the input. If they do not contain `{}`, the input is
+    passed as the last argument. Use `--` before TOOL_ARGS that clash with the options of this command.
+    """
+    from cli_llm._batch import BatchRunner, expand_inputs
+
+    inputs = expand_inputs(input_patterns)
+    if not inputs:
+        msg = f"No inputs matched: {' '.join(input_patterns)}"
+        raise click.UsageError(msg)
+
+    if rpm is not None:
+        ctx.meta.setdefault(CLI_SETTINGS_KEY, {})["requests_per_minute"] = rpm
+    config = get_config(ctx)
+    tool = t.cast("ToolGatherer", run).get_command(ctx, tool_name)
+    runner = BatchRunner(
+        ctx,
+        tool_name,
+        tool,
+        tool_args,
+        concurrency=concurrency or config.max_concurrency,
+        retries=retries,
+        backoff=backoff,
+    )
+    summary = runner.run(inputs)
+    summary.report()
+    if summary.unfinished:
+        raise click.Abort
+    if summary.failures:
+        ctx.exit(1)
+
+
+@cli.command()
+@click.option(
+    "--by",
+    "group_by",
+    type=click.Choice(["tool", "model", "day"]),
+    multiple=True,
+    default=("tool", "model"),
+    show_default=True,
+    help="Group the runs by these. Can be repeated.",
+)
+@click.option("--tool", default=None, help="Only include runs of this tool.")
+@click.option("--model", "model_id", default=None, help="Only include runs of this model.")
+@click.option("--days", type=click.FloatRange(min=0, min_open=True), default=None, help="Only include recent runs.")
+@click.option(
+    "--prometheus",
+    type=click.Path(dir_okay=False, path_type=Path),
+    default=None,
+    help="Also write the stats to this file in the Prometheus textfile format, for the node exporter.",
+)
+@click.pass_context
+def stats(  # noqa: PLR0913
+    ctx: click.Context,
+    *,
+    group_by: tuple[str, ...],
+    tool: str | None,
+    model_id: str | None,
+    days: float | None,
+    prometheus: Path | None,
+) -> None:
+    """Shows the latency and throughput percentiles of the recorded runs."""
+    import time
+
+    from cli_llm._history import get_history
+    from cli_llm._stats import summarise, table, write_prometheus
+
+    history = get_history(get_config(ctx).run_history_file)
+    since = time.time() - days * 24 * 60 * 60 if days else None
+    records = history.query(since=since, tool=tool, model_id=model_id)
+    groups = summarise(records, group_by)
+    if prometheus is not None:
+        write_prometheus(prometheus, records, group_by)
+    if not groups:
+        log.print("No runs have been recorded")
+        return
+    log.print(table(groups, group_by))
+
+
+@cli.group()
+def models() -> None:
+    """Manages how models are resolved."""
+
+
+@models.command()
+@click.pass_context
+def refresh(ctx: click.Context) -> None:
+    """Forgets which plugin serves each model and discovers them all afresh."""
+    count = get_config(ctx).ll_model_registry().refresh()
+    log.print(f"Recorded the plugins serving {count} model ids and aliases")
+
+
+@cli.group()
+def index() -> None:
+    """Manages the indexes of file chunks used to retrieve the parts of a codebase relevant to a question."""
+
+
+@index.command()
+@click.argument("search_path", type=click.Path(exists=True, file_okay=False, path_type=Path), default=Path())
+@click.option(
+    "-p", "--pattern", multiple=True, default=("*",), help="Glob pattern of the files to index, `!` to exclude."
+)
+@click.option("-n", "--name", default="default", show_default=True, help="The name of the index.")
+@click.option("--batch-size", type=click.IntRange(min=1), default=None, help="The most chunks to embed at once.")
+@click.pass_context
+def build(
+    ctx: click.Context, *, search_path: Path, pattern: tuple[str, ...], name: str, batch_size: int | None
+) -> None:
+    """Chunks and embeds the files under SEARCH_PATH, only embedding the files changed since the last build."""
+    from cli_llm.helpers import MAX_FILE_BYTES, gather_file_contents
+    from cli_llm.index import Index
+    from cli_llm.tokens import get_tokenizer
+
+    config = get_config(ctx)
+    files = gather_file_contents(
+        search_path=search_path, pattern=pattern, gitignore=True, max_file_bytes=MAX_FILE_BYTES
+    )
+    model = config.embedding()
+    result = Index.from_config(config, name).build(
+        files,
+        model,
+        chunk_tokens=config.index_chunk_tokens,
+        count=get_tokenizer(model.model_id),
+        batch_size=batch_size,
+    )
+    log.print(
+        f"Indexed {result.files} files: embedded {result.embedded} chunks, reused {result.reused} chunks and "
+        f"removed {result.removed} files"
+    )
+
+
+@index.command()
+@click.argument("question")
+@click.option("-k", type=click.IntRange(min=1), default=5, show_default=True, help="The number of chunks to find.")
+@click.option("-n", "--name", default="default", show_default=True, help="The name of the index.")
+@click.option("--text", is_flag=True, default=False, help="Print the text of each chunk too.")
+@click.pass_context
+def query(ctx: click.Context, *, question: str, k: int, name: str, text: bool) -> None:
+    """Finds the chunks most relevant to QUESTION."""
+    from rich.text import Text
+
+    from cli_llm.index import Index
+
+    for hit in Index.from_config(get_config(ctx), name).query(question, k):
+        # Text is printed as is, rather than parsed for markup.
+        log.print(Text(f"{hit.score:.3f} {hit.chunk.label}"))
+        if text:
+            log.print(Text(hit.chunk.text.rstrip("\n")))
+
+
 @cli.command()
 @click.argument("name")
 @click.option("-d", "--dest", type=click.Path(path_type=Path), default=Path.cwd())
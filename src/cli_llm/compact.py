@@ -0,0 +1,332 @@
+"""Module for compacting the contents of gathered files, to cut the tokens spent on what the model does not need.
+
+Most of a codebase sent to a model is whitespace, comments, license headers, lockfiles and long docstrings. A tool
+chooses how much of that to cut by passing a `Compaction` to the helpers that gather files:
+
+```python
+from cli_llm.compact import Compaction
+
+files = helpers.gather_file_contents(search_path=path, pattern="*.py", compact=Compaction(signatures=True))
+```
+
+Comments are stripped by a minifier for the language of each file, chosen by its suffix. Files in other languages
+only have their blank lines collapsed. Stripping is conservative: Python is tokenized, and in other languages what may
+contain a comment marker is kept as is, such as strings, JavaScript regex literals, unquoted stylesheet URLs, YAML
+block scalars and heredocs. A Python file that cannot be tokenized, e.g. because it was truncated, keeps its comments.
+"""
+
+import ast
+import fnmatch
+import hashlib
+import inspect
+import io
+import re
+import tokenize
+import typing as t
+from dataclasses import dataclass, field
+
+from cli_llm._logging import ClmLogger
+from cli_llm.tokens import count_bytes
+
+if t.TYPE_CHECKING:
+    from collections.abc import Callable
+    from pathlib import Path
+
+log = ClmLogger()
+
+DROPPED_FILES = (
+    "*.lock",
+    "package-lock.json",
+    "npm-shrinkwrap.json",
+    "pnpm-lock.yaml",
+    "go.sum",
+    "*.min.js",
+    "*.min.css",
+    "*.map",
+    "LICENSE*",
+    "LICENCE*",
+    "COPYING*",
+)
+"""The names of the files left out by default: lockfiles, minified and source map files, and licenses."""
+
+DUPLICATE_MARKER = "[... identical to {path} ...]\n"
+
+LICENSE = re.compile(r"copyright|licen[cs]e|spdx-license-identifier", re.IGNORECASE)
+"""Whether a leading comment is a license header."""
+
+
+def _sub_comments(pattern: re.Pattern[str]) -> "Callable[[str], str]":
+    """A minifier removing the matches of the pattern, apart from what its first group matches, e.g. strings."""
+    return lambda text: pattern.sub(lambda match: match.group(1) or "", text)
+
+
+def _comments(kept: "list[str]", comments: str) -> re.Pattern[str]:
+    """A pattern matching the comments, or first what is kept as is, e.g. strings, in its first group."""
+    return re.compile(rf"({'|'.join(kept)})|{comments}" if kept else rf"(){comments}", re.DOTALL | re.MULTILINE)
+
+
+# What may contain a comment marker is matched so that it is kept.
+_STRINGS = r""""(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*'"""
+_TEMPLATE_STRING = r"`(?:\\.|[^`\\])*`"
+# A `/` starts a regex literal, rather than a division, after an operator, an opening bracket or `return`.
+_REGEX_LITERAL = r"(?:(?<=[(,=:\[!&|?{};])|(?<=return))[ \t]*/(?![/*])(?:\\.|\[(?:\\.|[^\]\\\n])*\]|[^/\\\n\[])+/[a-z]*"
+_UNQUOTED_URL = r"url\([^)\n]*\)"
+_MULTILINE_STRINGS = r'""".*?"""' + r"|'''.*?'''"
+_HEREDOC = r"""<<[~-]?[ \t]*(?P<quote>['"]?)(?P<tag>[A-Za-z_]\w*)(?P=quote)[^\n]*\n.*?^[ \t]*(?P=tag)[ \t]*$"""
+
+# Comments on lines of their own are removed along with the line.
+_SLASH_COMMENTS = r"^[ \t]*//[^\n]*\n|//[^\n]*|^[ \t]*/\*.*?\*/[ \t]*\n|/\*.*?\*/"
+_C_STYLE = _comments([_STRINGS, _TEMPLATE_STRING], _SLASH_COMMENTS)
+_JAVASCRIPT = _comments([_STRINGS, _TEMPLATE_STRING, _REGEX_LITERAL], _SLASH_COMMENTS)
+_STYLESHEET = _comments([_STRINGS, _UNQUOTED_URL], _SLASH_COMMENTS)
+_BLOCK_ONLY = _comments([_STRINGS], r"^[ \t]*/\*.*?\*/[ \t]*\n|/\*.*?\*/")
+# Only whole line comments, apart from `#!` lines, as `#` can start other things part way through a line.
+_HASH_COMMENTS = r"^[ \t]*#(?!!)[^\n]*(?:\n|$)"
+_HASH = _comments([], _HASH_COMMENTS)
+_HASH_OUTSIDE_STRINGS = _comments([_MULTILINE_STRINGS], _HASH_COMMENTS)
+_HASH_OUTSIDE_HEREDOCS = _comments([_HEREDOC], _HASH_COMMENTS)
+_MARKUP = _comments([], r"^[ \t]*<!--.*?-->[ \t]*\n|<!--.*?-->")
+# A line ending with a block scalar indicator, e.g. `key: |`, `- >-` or `key: |2 # comment`.
+_YAML_BLOCK_SCALAR = re.compile(r"(?:^[ \t]*|[:-][ \t]+)[|>][-+0-9]*[ \t]*(?:#[^\n]*)?$")
+
+
+def strip_yaml_comments(text: str) -> str:
+    """Remove the whole line comments from YAML, apart from those in block scalars, where they are part of the value.
+
+    A block scalar is every blank or more indented line after a line ending with `|` or `>`.
+    """
+    lines = []
+    block_indent = None
+    for line in text.splitlines(keepends=True):
+        indent = len(line) - len(line.lstrip(" \t"))
+        if block_indent is not None and (not line.strip() or indent > block_indent):
+            lines.append(line)
+            continue
+        block_indent = None
+        if line.lstrip(" \t").startswith("#"):
+            continue
+        if _YAML_BLOCK_SCALAR.search(line.rstrip("\r\n")):
+            block_indent = indent
+        lines.append(line)
+    return "".join(lines)
+
+
+def strip_python_comments(text: str) -> str:
+    """Remove the comments from Python source, apart from a `#!` line, leaving it as is if it cannot be tokenized."""
+    try:
+        comments = [
+            token.start
+            for token in tokenize.generate_tokens(io.StringIO(text).readline)
+            if token.type == tokenize.COMMENT and not (token.start == (1, 0) and token.string.startswith("#!"))
+        ]
+    except (tokenize.TokenError, SyntaxError):
+        return text
+    lines = text.splitlines(keepends=True)
+    for row, column in comments:
+        line = lines[row - 1]
+        kept = line[:column].rstrip()
+        # A line that was only a comment is removed.
+        lines[row - 1] = kept + line[len(line.rstrip("\r\n")) :] if kept else ""
+    return "".join(lines)
+
+
+def _summary(docstring: str) -> str:
+    """The first paragraph of the docstring."""
+    return inspect.cleandoc(docstring).split("\n\n")[0]
+
+
+type _Documented = ast.Module | ast.ClassDef | ast.FunctionDef | ast.AsyncFunctionDef
+
+
+def _summarise_docstring[T: _Documented](node: T) -> T:
+    """Replace the docstring of the node, if it has one, with its first paragraph."""
+    docstring = ast.get_docstring(node, clean=False)
+    if docstring is not None:
+        node.body[0] = ast.Expr(ast.Constant(_summary(docstring)))
+    return node
+
+
+class _Signatures(ast.NodeTransformer):
+    """Replace the body of each function with `...`, and each docstring with its first paragraph."""
+
+    def visit_Module(self, node: ast.Module) -> ast.Module:  # noqa: N802
+        self.generic_visit(node)
+        return _summarise_docstring(node)
+
+    def visit_ClassDef(self, node: ast.ClassDef) -> ast.ClassDef:  # noqa: N802
+        self.generic_visit(node)
+        return _summarise_docstring(node)
+
+    def visit_FunctionDef(self, node: ast.FunctionDef) -> ast.FunctionDef:  # noqa: N802
+        return self._drop_body(node)
+
+    def visit_AsyncFunctionDef(self, node: ast.AsyncFunctionDef) -> ast.AsyncFunctionDef:  # noqa: N802
+        return self._drop_body(node)
+
+    def _drop_body[T: ast.FunctionDef | ast.AsyncFunctionDef](self, node: T) -> T:
+        docstring = ast.get_docstring(node, clean=False)
+        node.body = [ast.Expr(ast.Constant(...))]
+        if docstring is not None:
+            node.body.insert(0, ast.Expr(ast.Constant(_summary(docstring))))
+        return node
+
+
+def python_signatures(text: str) -> str | None:
+    """Python source with the bodies of its functions dropped, keeping their signatures and docstring summaries.
+
+    Returns:
+        The source, without comments, or `None` if it cannot be parsed.
+    """
+    try:
+        tree = ast.parse(text)
+    except (SyntaxError, ValueError):
+        return None
+    return ast.unparse(_Signatures().visit(tree)) + "\n"
+
+
+MINIFIERS: "dict[str, Callable[[str], str]]" = {
+    **dict.fromkeys((".py", ".pyi"), strip_python_comments),
+    **dict.fromkeys(
+        (".c", ".h", ".cc", ".cpp", ".hpp", ".cs", ".java", ".go", ".rs", ".swift", ".kt", ".kts", ".scala", ".dart"),
+        _sub_comments(_C_STYLE),
+    ),
+    **dict.fromkeys((".js", ".jsx", ".mjs", ".cjs", ".ts", ".tsx"), _sub_comments(_JAVASCRIPT)),
+    ".php": _sub_comments(_C_STYLE),
+    **dict.fromkeys((".scss", ".less"), _sub_comments(_STYLESHEET)),
+    ".css": _sub_comments(_BLOCK_ONLY),
+    **dict.fromkeys((".yaml", ".yml"), strip_yaml_comments),
+    ".toml": _sub_comments(_HASH_OUTSIDE_STRINGS),
+    **dict.fromkeys((".sh", ".bash", ".zsh", ".rb", ".pl", "Dockerfile"), _sub_comments(_HASH_OUTSIDE_HEREDOCS)),
+    **dict.fromkeys((".r", ".cfg", "Makefile", ".gitignore", ".dockerignore"), _sub_comments(_HASH)),
+    **dict.fromkeys((".html", ".htm", ".xml", ".svg", ".vue"), _sub_comments(_MARKUP)),
+}
+"""The minifier that strips the comments of each language, by file suffix or, for files without one, by name."""
+
+
+def _minifier(path: "Path") -> "Callable[[str], str] | None":
+    return MINIFIERS.get(path.suffix or path.name)
+
+
+def collapse_blank_lines(text: str) -> str:
+    """Remove trailing whitespace and leading and trailing blank lines, and collapse runs of blank lines into one."""
+    lines: list[str] = []
+    for line in text.splitlines():
+        stripped = line.rstrip()
+        if stripped or (lines and lines[-1]):
+            lines.append(stripped)
+    while lines and not lines[-1]:
+        lines.pop()
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+_HEADER = re.compile(
+    r"\A(?:#![^\n]*\n)?(?P<header>[ \t]*/\*.*?\*/[ \t]*\n?|[ \t]*<!--.*?-->[ \t]*\n?|(?:[ \t]*(?:#|//)[^\n]*\n?)+)",
+    re.DOTALL,
+)
+
+
+def strip_license_header(text: str) -> str:
+    """Remove the comment at the top of source code, after any `#!` line, if it is a license header."""
+    match = _HEADER.match(text)
+    if match is None or not LICENSE.search(match["header"]):
+        return text
+    return text[: match.start("header")] + text[match.end("header") :].lstrip("\r\n")
+
+
+@dataclass(frozen=True)
+class Compaction:
+    """How to compact the contents of files."""
+
+    blank_lines: bool = True
+    """Whether to remove trailing whitespace and collapse runs of blank lines."""
+    comments: bool = True
+    """Whether to strip comments, in the languages that have a minifier."""
+    license_headers: bool = True
+    """Whether to strip a license header at the top of files in those languages, even if comments are kept."""
+    signatures: bool = False
+    """Whether to drop the bodies of Python functions, keeping their signatures and docstring summaries."""
+    dedupe: bool = True
+    """Whether to give the contents of identical files only once, the rest saying which file they match."""
+    drop: tuple[str, ...] = DROPPED_FILES
+    """The names, as glob patterns, of the files to leave out."""
+
+    def keeps(self, path: "Path") -> bool:
+        """Whether the file is gathered at all."""
+        return not any(fnmatch.fnmatchcase(path.name, pattern) for pattern in self.drop)
+
+    def minify(self, path: "Path", text: str, *, complete: bool = True) -> str:
+        """Compact the contents of the file.
+
+        Args:
+            path: The path of the file, whose suffix chooses the minifier.
+            text: The contents of the file.
+            complete: Whether the text is the whole file, rather than truncated, so it can be parsed.
+        """
+        minifier = _minifier(path)
+        if minifier is not None and self.license_headers:
+            text = strip_license_header(text)
+        signatures = (
+            python_signatures(text) if self.signatures and complete and minifier is strip_python_comments else None
+        )
+        if signatures is not None:
+            text = signatures
+        elif minifier is not None and self.comments:
+            text = minifier(text)
+        return collapse_blank_lines(text) if self.blank_lines else text
+
+
+@dataclass
+class CompactionStats:
+    """What compacting the files saved."""
+
+    files: int = 0
+    dropped: int = 0
+    duplicates: int = 0
+    bytes_before: int = 0
+    bytes_after: int = 0
+    tokens_before: int = 0
+    tokens_after: int = 0
+
+    def report(self) -> None:
+        """Log what was saved."""
+        log.info(
+            "Compacted %s files from %s to %s bytes, saving about %s tokens, leaving out %s files and %s duplicates",
+            self.files,
+            self.bytes_before,
+            self.bytes_after,
+            self.tokens_before - self.tokens_after,
+            self.dropped,
+            self.duplicates,
+        )
+
+
+@dataclass
+class Compactor:
+    """Compacts the files gathered by one call, remembering their contents to find duplicates."""
+
+    compaction: Compaction
+    stats: CompactionStats = field(default_factory=CompactionStats)
+    _seen: "dict[str, Path]" = field(default_factory=dict, init=False, repr=False)
+
+    def keeps(self, path: "Path") -> bool:
+        """Whether the file is gathered at all, counting those that are not."""
+        kept = self.compaction.keeps(path)
+        self.stats.dropped += not kept
+        return kept
+
+    def compact(self, path: "Path", text: str, *, complete: bool = True) -> str:
+        """Compact the contents of the file, or say which earlier file it is identical to."""
+        original = None
+        if self.compaction.dedupe and text:
+            original = self._seen.setdefault(hashlib.sha256(text.encode()).hexdigest(), path)
+        if original is not None and original != path:
+            compacted = DUPLICATE_MARKER.format(path=original)
+            self.stats.duplicates += 1
+        else:
+            compacted = self.compaction.minify(path, text, complete=complete)
+        self.stats.files += 1
+        self.stats.bytes_before += len(text.encode())
+        self.stats.bytes_after += len(compacted.encode())
+        self.stats.tokens_before += count_bytes(text)
+        self.stats.tokens_after += count_bytes(compacted)
+        return compacted
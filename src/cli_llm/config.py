@@ -1,11 +1,12 @@
 """Configuration for CLI-LLM."""
 
+import fnmatch
 import typing as t
+from functools import cached_property
 from pathlib import Path
 
-import llm
 from platformdirs import PlatformDirs
-from pydantic import Field
+from pydantic import Field, field_validator
 from pydantic_settings import (
     BaseSettings,
     PydanticBaseSettingsSource,
@@ -14,39 +15,86 @@ from pydantic_settings import (
     TomlConfigSettingsSource,
 )
 
-from cli_llm._logging import ClmLogger
+from cli_llm import errors
+from cli_llm._discovery import DiscoveryEngine
+from cli_llm._logging import TRANSCRIPT_MAX_LINES, ClmLogger
+from cli_llm._walk import walk_files
+
+if t.TYPE_CHECKING:
+    import llm
+    from llm.models import AsyncModel, EmbeddingModel
+
+    from cli_llm._file_index import FileIndex
+    from cli_llm._history import RunHistory
+    from cli_llm._models import AnyModel, ModelRegistry
+    from cli_llm._rate_limit import RateLimiter
+    from cli_llm._response_cache import ResponseCache
 
 log = ClmLogger()
 
 DIRS = PlatformDirs("cli-llm", "BAG")
 
+DEFAULT_TOOLS_EXCLUDE = (
+    ".git",
+    ".hg",
+    ".svn",
+    ".venv",
+    "venv",
+    ".tox",
+    ".nox",
+    "node_modules",
+    "site-packages",
+    "__pycache__",
+    ".mypy_cache",
+    ".pytest_cache",
+    ".ruff_cache",
+    "*.egg-info",
+)
+
 
 class ClmConfig(BaseSettings):
     """Config class for the application."""
 
     ll_model: str = Field(default="llama3.2:latest", frozen=True)
     tools_dir: Path | list[Path] = Field(default=DIRS.user_data_path, frozen=True)
+    cache_dir: Path = Field(default=DIRS.user_cache_path, frozen=True)
+    discovery: DiscoveryEngine = Field(default="import", frozen=True)
+    tools_exclude: list[str] = Field(default=[], frozen=True)
+    tools_max_depth: int | None = Field(default=None, ge=0, frozen=True)
+    tool_collisions: t.Literal["first", "last", "error"] = Field(default="last", frozen=True)
+    ll_model_cache_ttl: float = Field(default=24 * 60 * 60, ge=0, frozen=True)
+    ll_model_context_tokens: dict[str, int] = Field(default={}, frozen=True)
+    template_bytecode_cache: bool = Field(default=False, frozen=True)
+    max_concurrency: int = Field(default=4, ge=1, frozen=True)
+    map_reduce_chunk_tokens: int = Field(default=8000, ge=1, frozen=True)
+    response_cache: bool = Field(default=False, frozen=True)
+    response_cache_refresh: bool = Field(default=False, frozen=True)
+    response_cache_ttl: float = Field(default=7 * 24 * 60 * 60, ge=0, frozen=True)
+    response_cache_max_bytes: int = Field(default=100 * 1024 * 1024, ge=0, frozen=True)
+    run_history: bool = Field(default=True, frozen=True)
+    run_history_file: Path = Field(default=DIRS.user_data_path / "history.sqlite3", frozen=True)
+    transcript: Path | None = Field(default=None, frozen=True)
+    transcript_max_lines: int = Field(default=TRANSCRIPT_MAX_LINES, ge=1, frozen=True)
+    record_dir: Path | None = Field(default=None, frozen=True)
+    replay_dir: Path | None = Field(default=None, frozen=True)
+    replay_speed: float = Field(default=1.0, ge=0, frozen=True)
+    git_since: str | None = Field(default=None, frozen=True)
+    git_staged: bool = Field(default=False, frozen=True)
+    git_diff: bool = Field(default=False, frozen=True)
+    embedding_model: str | None = Field(default=None, frozen=True)
+    index_chunk_tokens: int = Field(default=256, ge=1, frozen=True)
+    dry_run: bool = Field(default=False, frozen=True)
+    requests_per_minute: float | None = Field(default=None, gt=0, frozen=True)
 
     model_config = SettingsConfigDict(
         pyproject_toml_table_header=("tool", "cli-llm"),
         toml_file=DIRS.user_config_path / "cli_llm.toml",
     )
 
-    def model_post_init(self, _context: t.Any) -> None:
-        """Initialise the map of potential tool files.
-
-        Currently does not handle name collisions and just overwrites existing tool files.
-        """
-        tool_files: dict[str, Path] = {}
-        tools_dir = [self.tools_dir] if isinstance(self.tools_dir, Path) else self.tools_dir
-        for directory in tools_dir:
-            dir_ = directory.expanduser().absolute()
-            log.info("Looking for tools in: %s", dir_)
-            files = {f.stem: f for f in dir_.rglob("*.py")}
-            log.info("Found the following tool files %s", files)
-            tool_files |= files
-
-        self._tool_files = dict(sorted(tool_files.items()))
+    @field_validator("cache_dir", "run_history_file")
+    @classmethod
+    def _expand_user(cls, path: Path) -> Path:
+        return path.expanduser()
 
     @classmethod
     def settings_customise_sources(
@@ -66,11 +114,122 @@ class ClmConfig(BaseSettings):
             PyprojectTomlConfigSettingsSource(settings_cls),
         )
 
-    def model(self) -> llm.Model:
-        """The actual LLM Model."""
-        return llm.get_model(self.ll_model)
+    def ll_model_registry(self) -> "ModelRegistry":
+        """The registry used to resolve the model ids."""
+        from cli_llm._models import MODEL_REGISTRY_FILE, ModelRegistry
+
+        return ModelRegistry(self.cache_dir / MODEL_REGISTRY_FILE, ttl=self.ll_model_cache_ttl)
+
+    def context_tokens(self, model_id: str) -> int | None:
+        """The context size of the model from `ll_model_context_tokens`, if configured.
+
+        The model id is looked up as is, then matched against the keys as glob patterns, e.g. `llama3*`.
+        """
+        if model_id in self.ll_model_context_tokens:
+            return self.ll_model_context_tokens[model_id]
+        return next(
+            (
+                tokens
+                for pattern, tokens in self.ll_model_context_tokens.items()
+                if fnmatch.fnmatchcase(model_id, pattern)
+            ),
+            None,
+        )
+
+    def response_store(self) -> "ResponseCache | None":
+        """The cache of LLM responses, if enabled."""
+        if not self.response_cache:
+            return None
+        from cli_llm._response_cache import RESPONSE_CACHE_FILE, ResponseCache
+
+        return ResponseCache(
+            self.cache_dir / RESPONSE_CACHE_FILE, ttl=self.response_cache_ttl, max_bytes=self.response_cache_max_bytes
+        )
+
+    def file_index(self) -> "FileIndex":
+        """The index of file content hashes and of the digests the model wrote of the files."""
+        from cli_llm._file_index import FILE_INDEX_FILE, FileIndex
+
+        return FileIndex(self.cache_dir / FILE_INDEX_FILE)
+
+    def history_store(self) -> "RunHistory | None":
+        """The history of runs, if enabled."""
+        if not self.run_history:
+            return None
+        from cli_llm._history import get_history
+
+        return get_history(self.run_history_file)
+
+    def model(self) -> "llm.Model":
+        """The actual LLM Model, recording or replaying cassettes if configured to."""
+        return t.cast("llm.Model", self._with_cassettes(self.ll_model_registry().resolve(self.ll_model)))
+
+    def async_model(self) -> "AsyncModel":
+        """The async variant of the actual LLM Model, recording or replaying cassettes if configured to."""
+        model = self.ll_model_registry().resolve(self.ll_model, async_=True)
+        return t.cast("AsyncModel", self._with_cassettes(model))
+
+    def embedding(self) -> "EmbeddingModel":
+        """The embedding model used to index files, or `llm`'s default embedding model if none is configured.
+
+        Raises:
+            NoEmbeddingModelError: If no embedding model is configured and `llm` has no default.
+        """
+        import llm
+
+        model_id = self.embedding_model or llm.get_default_embedding_model()  # type: ignore[no-untyped-call]
+        if model_id is None:
+            raise errors.NoEmbeddingModelError
+        return t.cast("EmbeddingModel", llm.get_embedding_model(model_id))  # type: ignore[no-untyped-call]
+
+    def _with_cassettes(self, model: "AnyModel") -> "AnyModel":
+        from cli_llm._cassettes import with_cassettes
+
+        return with_cassettes(
+            model, record_dir=self.record_dir, replay_dir=self.replay_dir, replay_speed=self.replay_speed
+        )
+
+    @cached_property
+    def rate_limiter(self) -> "RateLimiter":
+        """Limits the requests to the model to `requests_per_minute`, shared by every run with this config."""
+        from cli_llm._rate_limit import RateLimiter
 
-    @property
+        return RateLimiter(self.requests_per_minute)
+
+    @cached_property
     def tool_files(self) -> dict[str, Path]:
-        """Map of tools to their script locations."""
-        return self._tool_files
+        """Map of tools to their script locations.
+
+        The tool directories are only searched the first time this is needed. Directories matching the default or
+        configured exclude patterns are not searched, and neither are directories deeper than `tools_max_depth`.
+        Tools with the same name are resolved according to `tool_collisions`.
+        """
+        tool_files: dict[str, Path] = {}
+        tools_dir = [self.tools_dir] if isinstance(self.tools_dir, Path) else self.tools_dir
+        exclude = (*DEFAULT_TOOLS_EXCLUDE, *self.tools_exclude)
+        for directory in tools_dir:
+            dir_ = directory.expanduser().absolute()
+            log.info("Looking for tools in: %s", dir_)
+            files = list(walk_files(dir_, suffix=".py", exclude=exclude, max_depth=self.tools_max_depth))
+            log.info("Found the following tool files %s", files)
+            for f in files:
+                self._add_tool_file(tool_files, f)
+
+        return dict(sorted(tool_files.items()))
+
+    def _add_tool_file(self, tool_files: dict[str, Path], filepath: Path) -> None:
+        existing = tool_files.get(filepath.stem)
+        if existing is None:
+            tool_files[filepath.stem] = filepath
+            return
+        if self.tool_collisions == "error":
+            raise errors.ToolNameCollisionError(filepath.stem, existing, filepath)
+        log.warning(
+            "The tool `%s` is defined by both %s and %s, using the %s",
+            filepath.stem,
+            existing,
+            filepath,
+            self.tool_collisions,
+        )
+        if self.tool_collisions == "last":
+            tool_files[filepath.stem] = filepath
@@ -3,6 +3,7 @@
 from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
+    from collections.abc import Sequence
     from pathlib import Path
 
 
@@ -10,6 +11,61 @@ class CliLlmError(Exception):
     """Base exception for all exceptions raised by this package."""
 
 
+class CassetteNotFoundError(CliLlmError):
+    """Raised when the replay model has no cassette to serve for a prompt."""
+
+    def __init__(self, path: "Path | None", reason: str = "") -> None:
+        """Initialise the exception with where the cassette was looked for.
+
+        Args:
+            path: The path of the cassette, or `None` if no directory of cassettes was given.
+            reason: Why the cassette could not be read.
+        """
+        if path is None:
+            super().__init__("The replay model needs a directory of cassettes, given by `--replay DIR`")
+        else:
+            super().__init__(
+                f"No cassette of this prompt could be read from {path}, record one with `--record DIR`: {reason}"
+            )
+
+
+class DryRunComplete(CliLlmError):  # noqa: N818
+    """Raised once a dry run has reported the tokens of a prompt, to stop the tool before it uses a response."""
+
+    def __init__(self, model_id: str) -> None:
+        """Initialise the exception with the model the prompt was for.
+
+        Args:
+            model_id: The id of the model.
+        """
+        super().__init__(f"The dry run reported the prompt for {model_id} instead of sending it")
+
+
+class GitError(CliLlmError):
+    """Raised when git fails to list or read the changed files."""
+
+    def __init__(self, command: "Sequence[str]", reason: str) -> None:
+        """Initialise the exception with the failed git command.
+
+        Args:
+            command: The arguments passed to git.
+            reason: Why the command failed, e.g. what it wrote to stderr.
+        """
+        super().__init__(f"`git {' '.join(command)}` failed: {reason}")
+
+
+class IndexNotFoundError(CliLlmError):
+    """Raised when querying a retrieval index that has not been built."""
+
+    def __init__(self, name: str) -> None:
+        """Initialise the exception with the name of the index.
+
+        Args:
+            name: The name of the index.
+        """
+        super().__init__(f"The index `{name}` has not been built, build it with `clm index build`")
+
+
 class InvalidModuleError(CliLlmError):
     """Raised when an invalid module is specified."""
 
@@ -27,3 +83,75 @@ class InvalidModuleError(CliLlmError):
 
 class InvalidToolCommandError(CliLlmError):
     """Raised when and Invalid Tool command is specified."""
+
+
+class MissingDependencyError(CliLlmError):
+    """Raised when an optional dependency of a feature is not installed."""
+
+    def __init__(self, package: str, extra: str) -> None:
+        """Initialise the exception with the missing package.
+
+        Args:
+            package: The package that is not installed.
+            extra: The extra of `cli-llm` that installs it.
+        """
+        super().__init__(f"{package} is not installed, install it with `pip install cli-llm[{extra}]`")
+
+
+class NoEmbeddingModelError(CliLlmError):
+    """Raised when no embedding model is configured and `llm` has no default embedding model."""
+
+    def __init__(self) -> None:
+        """Initialise the exception."""
+        super().__init__("No embedding model is configured, set `embedding_model` or run `llm embed-models default`")
+
+
+class PromptTooLargeError(CliLlmError):
+    """Raised when a prompt does not fit in the context of the model, rather than sending it to fail or be truncated."""
+
+    def __init__(self, tokens: int, context: int, model_id: str) -> None:
+        """Initialise the exception with the size of the prompt and of the context.
+
+        Args:
+            tokens: The estimated tokens in the prompt.
+            context: The context size of the model.
+            model_id: The id of the model.
+        """
+        super().__init__(
+            f"The prompt needs about {tokens} tokens, more than the {context} token context of {model_id}, "
+            "use `--dry-run` to see what uses them"
+        )
+
+
+class TokenBudgetError(CliLlmError):
+    """Raised when a prompt leaves no room for items, or results can not be reduced, within the token budget."""
+
+    def __init__(self, needed: int, budget: int, *, results: bool = False) -> None:
+        """Initialise the exception with the tokens needed by the prompt.
+
+        Args:
+            needed: The estimated tokens used by the prompt template without any items, or by the prompt combining the
+                results.
+            budget: The token budget of each prompt.
+            results: Whether it is results that can not be reduced to fit the budget, as each is too large to be
+                combined with another.
+        """
+        if results:
+            msg = f"The results need about {needed} tokens and can not be reduced to fit the {budget} budget"
+        else:
+            msg = f"The prompt template alone needs about {needed} tokens, leaving none of the {budget} budget"
+        super().__init__(msg)
+
+
+class ToolNameCollisionError(CliLlmError):
+    """Raised when two tool scripts have the same name and collisions are configured to be an error."""
+
+    def __init__(self, name: str, first: "Path", second: "Path") -> None:
+        """Initialise the exception with the colliding tool scripts.
+
+        Args:
+            name: The name shared by the tool scripts.
+            first: The tool script found first.
+            second: The tool script found second.
+        """
+        super().__init__(f"The tool `{name}` is defined by both {first} and {second}")
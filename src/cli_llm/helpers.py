@@ -1,24 +1,436 @@
 """Module containing useful helper functions."""
 
-import contextlib
+import codecs
+import collections
+import dataclasses
+import os
+import re
+import typing as t
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+from cli_llm._file_index import FileIndex, hash_file, prompt_hash, stat
+from cli_llm._git import Revisions, changed_paths, diffs, new_file_diffs, read_blobs, repo_root
+from cli_llm._history import tool_initializer
+from cli_llm._ignore import IGNORE_FILES, translate
+from cli_llm._logging import ClmLogger, progress
+from cli_llm._walk import compile_exclude, walk_files
+from cli_llm.run import run
 
-def gather_file_contents(*, search_path: Path, pattern: str) -> list[tuple[Path, str]]:
+if t.TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+    from concurrent.futures import Future
+
+    from cli_llm.compact import Compaction, Compactor
+    from cli_llm.config import ClmConfig
+    from cli_llm.types import StringDict
+
+log = ClmLogger()
+
+SNIFF_BYTES = 8192
+"""How much of each file is read to tell whether it is binary, before the rest is read."""
+
+MAX_FILE_BYTES = 1024 * 1024
+"""A cap on the bytes gathered of each file, for tools to pass as `max_file_bytes`."""
+
+MAX_PENDING_READS = 64
+"""The most files read ahead of the one being yielded."""
+
+TRUNCATION_MARKER = "\n[... truncated, {omitted} more bytes ...]\n"
+
+type _Read = tuple[str, int, int] | None
+
+
+def _read_text(path: Path, limit: int | None) -> _Read:
+    """Read the file as UTF-8, up to the limit in bytes.
+
+    Returns:
+        The text, the bytes read and the bytes left unread, or `None` if the file is binary or cannot be read.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        with path.open("rb") as file:
+            head = file.read(SNIFF_BYTES if limit is None else min(SNIFF_BYTES, limit))
+            if b"\x00" in head:
+                return None
+            # Binary files are almost never valid UTF-8, so they are skipped without reading the rest of them.
+            text = decoder.decode(head)
+            rest = file.read(-1 if limit is None else limit - len(head))
+            size = os.fstat(file.fileno()).st_size
+        read = len(head) + len(rest)
+        # A truncated file can end part way through a character, which is left out rather than an error.
+        text += decoder.decode(rest, final=read >= size)
+    except UnicodeDecodeError:
+        return None
+    except OSError as e:
+        log.info("Unable to read %s due to: %s", path, e)
+        return None
+    partial = len(decoder.getstate()[0])
+    return text, read - partial, max(size - read, 0) + partial
+
+
+def _decode(data: bytes, limit: int | None) -> _Read:
+    """Decode the contents of a file as UTF-8, up to the limit in bytes, as `_read_text` reads them."""
+    if b"\x00" in data[: SNIFF_BYTES if limit is None else min(SNIFF_BYTES, limit)]:
+        return None
+    kept = data if limit is None else data[:limit]
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        text = decoder.decode(kept, final=len(kept) >= len(data))
+    except UnicodeDecodeError:
+        return None
+    partial = len(decoder.getstate()[0])
+    return text, len(kept) - partial, len(data) - len(kept) + partial
+
+
+def _read_ahead(pool: ThreadPoolExecutor, paths: "Iterable[Path]", limit: int | None) -> "Iterator[tuple[Path, _Read]]":
+    """Read the files in the pool, yielding them in the order of the paths."""
+    pending: collections.deque[tuple[Path, Future[_Read]]] = collections.deque()
+    for path in paths:
+        pending.append((path, pool.submit(_read_text, path, limit)))
+        if len(pending) >= MAX_PENDING_READS:
+            done, future = pending.popleft()
+            yield done, future.result()
+    while pending:
+        done, future = pending.popleft()
+        yield done, future.result()
+
+
+def _split_patterns(pattern: "str | Iterable[str]") -> tuple[list[str], list[str]]:
+    """Split the patterns into those to include and those, starting with `!`, to exclude."""
+    patterns = [pattern] if isinstance(pattern, str) else list(pattern)
+    include = [p for p in patterns if not p.startswith("!")]
+    exclude = [p.removeprefix("!") for p in patterns if p.startswith("!")]
+    return include or ["*"], exclude
+
+
+def _path_matcher(patterns: "Iterable[str]") -> re.Pattern[str]:
+    """Compile the glob patterns into one test of whether a relative path ends with any of them.
+
+    A pattern starting with `/` must match the whole path instead.
+    """
+    regexes = (
+        translate(pattern.removeprefix("/")) if pattern.startswith("/") else f"(?:.*/)?{translate(pattern)}"
+        for pattern in patterns
+    )
+    return re.compile("|".join(regexes))
+
+
+def _matching_paths(root: Path, pattern: "str | Iterable[str]", *, gitignore: bool) -> "Iterator[Path]":
+    """The files under the root matching the patterns, in the order they are walked."""
+    include, exclude = _split_patterns(pattern)
+    match = _path_matcher(include).fullmatch
+    # The paths are all under the root, so slicing off its prefix is a cheaper `relative_to`. Paths under `.` have none.
+    prefix = 0 if root == Path() else len(os.path.join(root, ""))  # noqa: PTH118
+    walk = walk_files(root, exclude=exclude, ignore_files=IGNORE_FILES if gitignore else ())
+    return (path for path in walk if match(str(path)[prefix:].replace(os.sep, "/")))
+
+
+def _truncate(text: str, limit: int) -> tuple[str, int]:
+    """Cut the text down to the limit in bytes, returning it and the bytes cut."""
+    data = text.encode()
+    return data[:limit].decode(errors="ignore"), max(len(data) - limit, 0)
+
+
+def _compactor(compact: "Compaction | None") -> "Compactor | None":
+    if compact is None:
+        return None
+    from cli_llm.compact import Compactor
+
+    return Compactor(compact)
+
+
+def iter_file_contents(  # noqa: PLR0913
+    *,
+    search_path: Path,
+    pattern: "str | Iterable[str]" = "*",
+    gitignore: bool = False,
+    max_file_bytes: int | None = None,
+    max_total_bytes: int | None = None,
+    workers: int | None = None,
+    compact: "Compaction | None" = None,
+) -> "Iterator[tuple[Path, str]]":
+    """Yield the contents of each file matching a pattern under the search path, as they are read.
+
+    With `gitignore`, files and directories ignored by `.gitignore` and `.ignore` files are skipped, as is `.git`.
+    Ignored or excluded directories are never searched. Files are read in a thread pool but yielded in a deterministic
+    order, the files of each directory by name and then those of its subdirectories. Binary files are skipped after
+    reading their first few KB. Files longer than the caps are truncated, ending with a marker saying how much was
+    left out, and no more files are gathered once the total cap is reached. Compacted files count towards the total
+    cap by their compacted size.
+
+    Args:
+        search_path: The directory to search for files.
+        pattern: The glob patterns to match, e.g. `*.py`, `src/**/*.py` or `["*.py", "*.md"]`, against the end of each
+            file's root-relative path, or the whole of it if the pattern starts with `/`. Patterns starting with `!`
+            exclude the files and directories whose name or path match the rest of them, e.g. `!tests` or `!*.lock`.
+        gitignore: Whether to honour `.gitignore` and `.ignore` files.
+        max_file_bytes: The most bytes to gather from each file. `None` means no limit.
+        max_total_bytes: The most bytes to gather from all the files. `None` means no limit.
+        workers: The most files to read at once. Defaults to the default of `ThreadPoolExecutor`.
+        compact: How to compact the contents of the files, see `cli_llm.compact`. `None` gathers them as they are.
+
+    Yields:
+        The path of each file and its content as a string.
+    """
+    paths = _matching_paths(Path(search_path), pattern, gitignore=gitignore)
+    compactor = _compactor(compact)
+    if compactor is not None:
+        paths = filter(compactor.keeps, paths)
+    total = 0
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="clm-gather")
+    try:
+        for path, read in _read_ahead(pool, paths, max_file_bytes):
+            if read is None:
+                continue
+            text, size, omitted = read
+            if compactor is not None:
+                text = compactor.compact(path, text, complete=not omitted)
+                size = len(text.encode())
+            remaining = None if max_total_bytes is None else max_total_bytes - total
+            if remaining is not None and size > remaining:
+                text, cut = _truncate(text, remaining)
+                size, omitted = remaining, omitted + cut
+            if omitted:
+                text += TRUNCATION_MARKER.format(omitted=omitted)
+            total += size
+            yield path, text
+            if max_total_bytes is not None and total >= max_total_bytes:
+                log.warning(
+                    "Stopped gathering files after %s, having reached the limit of %s bytes", path, max_total_bytes
+                )
+                return
+    finally:
+        pool.shutdown(cancel_futures=True)
+        if compactor is not None:
+            compactor.stats.report()
+
+
+def gather_file_contents(  # noqa: PLR0913
+    *,
+    search_path: Path,
+    pattern: "str | Iterable[str]" = "*",
+    gitignore: bool = False,
+    max_file_bytes: int | None = None,
+    max_total_bytes: int | None = None,
+    workers: int | None = None,
+    compact: "Compaction | None" = None,
+) -> list[tuple[Path, str]]:
     """Gather the contents of all files matching a pattern under the search path.
 
+    See `iter_file_contents` for how the files are read, which also allows rendering to start before they all are.
+
     Args:
         search_path: The search path to use when searching for the file contents.
-        pattern: The pattern to use when searching for the file contents.
+        pattern: The glob patterns to match, with those starting with `!` excluding files.
+        gitignore: Whether to honour `.gitignore` and `.ignore` files.
+        max_file_bytes: The most bytes to gather from each file. `None` means no limit.
+        max_total_bytes: The most bytes to gather from all the files. `None` means no limit.
+        workers: The most files to read at once. Defaults to the default of `ThreadPoolExecutor`.
+        compact: How to compact the contents of the files, see `cli_llm.compact`. `None` gathers them as they are.
 
     Returns:
         A list of tuples containing the file path and its content as a string.
     """
-    files = [p for p in Path(search_path).rglob(pattern) if p.is_file()]
-    file_contents = []
-    for f in files:
-        with contextlib.suppress(UnicodeDecodeError):
-            contents = f.read_text()
-            file_contents.append((f, contents))
-
-    return file_contents
+    return list(
+        iter_file_contents(
+            search_path=search_path,
+            pattern=pattern,
+            gitignore=gitignore,
+            max_file_bytes=max_file_bytes,
+            max_total_bytes=max_total_bytes,
+            workers=workers,
+            compact=compact,
+        )
+    )
+
+
+def _content_hashes(index: FileIndex, paths: "Iterable[Path]") -> dict[Path, str]:
+    """The content hash of each file, only hashing those that are new or have changed since they were indexed."""
+    stats = {path: file_stat for path in paths if (file_stat := stat(path)) is not None}
+    hashes = index.known_hashes(stats)
+    changed = [path for path in stats if path not in hashes]
+    log.info("Hashing %s new or changed files of %s", len(changed), len(stats))
+    with ThreadPoolExecutor(thread_name_prefix="clm-hash") as pool:
+        new = {
+            path: content_hash
+            for path, content_hash in zip(changed, pool.map(hash_file, changed), strict=True)
+            if content_hash
+        }
+    index.update((path, stats[path], content_hash) for path, content_hash in new.items())
+    return hashes | new
+
+
+def _file_text(path: Path, read: _Read, compactor: "Compactor | None") -> str | None:
+    """The contents of a file, compacted if asked to, ending with a marker if they were truncated."""
+    if read is None:
+        return None
+    text, _, omitted = read
+    if compactor is not None:
+        text = compactor.compact(path, text, complete=not omitted)
+    if omitted:
+        text += TRUNCATION_MARKER.format(omitted=omitted)
+    return text
+
+
+def digest_file_contents(  # noqa: PLR0913
+    config: "ClmConfig",
+    prompt: str,
+    *,
+    search_path: Path,
+    pattern: "str | Iterable[str]" = "*",
+    gitignore: bool = False,
+    prompt_data: "StringDict | None" = None,
+    options: "StringDict | None" = None,
+    max_file_bytes: int | None = None,
+    concurrency: int | None = None,
+    compact: "Compaction | None" = None,
+) -> list[tuple[Path, str]]:
+    """Run the prompt on each file matching a pattern under the search path, reusing the digests of earlier runs.
+
+    The digest of each file is the model's response to the prompt rendered with the file as `files`, a list of one
+    `(path, contents)` pair, so the same prompt can be used as the map prompt of `map_reduce`. Digests are cached by
+    the file's content hash, the model and a hash of the prompt, the prompt data and the options, so only new or
+    changed files are read and sent to the model. Files that have not changed since they were last hashed, by size
+    and modification time, are not read at all. The digests can be combined with `reduce_results`.
+
+    Args:
+        config: The LLM configuration object, whose cache directory holds the index.
+        prompt: The prompt to run on each file.
+        search_path: The directory to search for files.
+        pattern: The glob patterns to match, with those starting with `!` excluding files.
+        gitignore: Whether to honour `.gitignore` and `.ignore` files.
+        prompt_data: Extra data to render the prompt with.
+        options: Options passed on to the model, e.g. `temperature`.
+        max_file_bytes: The most bytes to send of each file. `None` means no limit.
+        concurrency: The most prompts to have in flight at once. Defaults to `max_concurrency` from the config.
+        compact: How to compact the contents of the files, see `cli_llm.compact`. Identical files already share a
+            digest, so they are not deduplicated.
+
+    Returns:
+        The path of each file and its digest, in the order the files are gathered. Binary files are left out.
+    """
+    prompt_data = prompt_data or {}
+    options = options or {}
+    index = config.file_index()
+    compaction = None if compact is None else dataclasses.replace(compact, dedupe=False)
+    compactor = _compactor(compaction)
+    paths = list(_matching_paths(Path(search_path), pattern, gitignore=gitignore))
+    if compactor is not None:
+        paths = [path for path in paths if compactor.keeps(path)]
+    hashes = _content_hashes(index, paths)
+    model_id = config.model().model_id
+    key = prompt_hash(prompt, prompt_data, options, compaction=compaction)
+    digests = index.digests(hashes.values(), model_id, key)
+    missing = [path for path in paths if path in hashes and hashes[path] not in digests]
+    log.info("Reusing the digests of %s files, digesting %s", len(hashes) - len(missing), len(missing))
+
+    def digest(path: Path, text: str | None) -> None:
+        if text is None:
+            return
+        response = run(config, prompt, prompt_data | {"files": [(path, text)]}, options=options).text()
+        index.set_digest(hashes[path], model_id, key, response)
+        digests[hashes[path]] = response
+
+    with (
+        progress() as bar,
+        ThreadPoolExecutor(thread_name_prefix="clm-gather") as readers,
+        ThreadPoolExecutor(
+            max_workers=concurrency or config.max_concurrency,
+            thread_name_prefix="clm-map",
+            initializer=tool_initializer(),
+        ) as pool,
+    ):
+        task = bar.add_task("Digesting files", total=len(missing))
+        futures = [
+            pool.submit(digest, path, _file_text(path, read, compactor))
+            for path, read in _read_ahead(readers, missing, max_file_bytes)
+        ]
+        for future in futures:
+            future.result()
+            bar.advance(task)
+    if compactor is not None:
+        compactor.stats.report()
+    return [(path, digests[hashes[path]]) for path in paths if hashes.get(path) in digests]
+
+
+def _is_excluded(relative: str, excluded: re.Pattern[str] | None) -> bool:
+    """Whether the file, or any directory it is in, is excluded by name or path, as `walk_files` prunes them."""
+    if excluded is None:
+        return False
+    parts = relative.split("/")
+    return any(excluded.match(parts[i]) or excluded.match("/".join(parts[: i + 1])) for i in range(len(parts)))
+
+
+def changed_file_contents(  # noqa: PLR0913
+    config: "ClmConfig",
+    *,
+    search_path: Path = Path(),
+    pattern: "str | Iterable[str]" = "*",
+    since: str | None = None,
+    staged: bool | None = None,
+    at: str | None = None,
+    diff: bool | None = None,
+    max_file_bytes: int | None = None,
+) -> list[tuple[Path, str]]:
+    """Gather the contents, or the diffs, of the files under the search path changed in its git repository.
+
+    The changed files are listed by git rather than by walking the tree, and only they are read, so the cost depends
+    on the size of the change. Files are read from the working tree, where new files not yet tracked or ignored by
+    git count as changed, from the index if `staged`, or from the commit `at`. Deleted and binary files are left out,
+    and renamed files are listed under their new name. Unset options are taken from `git_since`, `git_staged` and
+    `git_diff` in the config, which `clm --since/--staged/--diff` set.
+
+    Args:
+        config: The LLM configuration object.
+        search_path: A directory in the git repository, whose changed files are gathered.
+        pattern: The glob patterns to match, with those starting with `!` excluding files, as in `gather_file_contents`.
+        since: The commit to list the changes since. Defaults to `HEAD`, or the parent of `at` if given.
+        staged: Whether to gather the staged changes, reading the files from the index.
+        at: The commit to list the changes up to and read the files from, rather than the working tree.
+        diff: Whether to gather the unified diff of each file instead of its contents.
+        max_file_bytes: The most bytes to gather from each file. `None` means no limit.
+
+    Returns:
+        The path of each changed file, under the search path, and its content or diff, in path order.
+
+    Raises:
+        GitError: If git is not installed, the search path is not in a git repository or a commit does not exist.
+    """
+    revisions = Revisions(
+        since=config.git_since if since is None else since,
+        staged=config.git_staged if staged is None else staged,
+        at=at,
+    )
+    search_path = Path(search_path)
+    root = repo_root(search_path)
+    names = changed_paths(search_path, revisions)
+    include, exclude = _split_patterns(pattern)
+    match = _path_matcher(include).fullmatch
+    excluded = compile_exclude(exclude)
+    base = search_path.resolve()
+    selected = {}
+    for i, name in enumerate(names):
+        relative = Path(os.path.relpath(root / name, base)).as_posix()
+        if match(relative) and not _is_excluded(relative, excluded):
+            selected[i] = search_path / relative
+    log.info("Gathering %s of the %s changed files", len(selected), len(names))
+
+    if config.git_diff if diff is None else diff:
+        data = diffs(search_path, revisions)
+        data |= new_file_diffs(root, [names[i] for i in selected if names[i] not in data])
+        reads = [_decode(data[names[i]], max_file_bytes) for i in selected]
+    elif revisions.in_working_tree:
+        with ThreadPoolExecutor(thread_name_prefix="clm-gather") as pool:
+            reads = [read for _, read in _read_ahead(pool, selected.values(), max_file_bytes)]
+    else:
+        blobs = read_blobs(root, [revisions.object_name(names[i]) for i in selected])
+        reads = [None if blob is None else _decode(blob, max_file_bytes) for blob in blobs]
+
+    contents = []
+    for path, read in zip(selected.values(), reads, strict=True):
+        if read is None:
+            continue
+        text, _, omitted = read
+        contents.append((path, text + TRUNCATION_MARKER.format(omitted=omitted) if omitted else text))
+    return contents
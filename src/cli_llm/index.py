@@ -0,0 +1,340 @@
+"""Module for retrieving the chunks of files most relevant to a question, from a local index of their embeddings.
+
+Rather than putting a whole codebase in a prompt, a tool can put in the few chunks most relevant to the question:
+
+```python
+from cli_llm.index import retrieve
+
+run(config, PROMPT, {"files": retrieve(config, question, k=5)})
+```
+
+The index is built by `clm index build`, which splits the gathered files into chunks of whole lines, sized by the
+tokenizer of the embedding model, embeds them in batches with an `llm` embedding model and stores the vectors,
+normalised to unit length, as rows of float32 in a file. A SQLite table describes the chunk of each row. Only the
+files whose content hash has changed are embedded again. A query embeds the question and ranks every chunk by cosine
+similarity with one product of the memory-mapped vectors, which is fast enough for the hundreds of thousands of
+chunks of a large codebase.
+
+NumPy is needed, which the `index` extra installs.
+"""
+
+import contextlib
+import hashlib
+import sqlite3
+import typing as t
+from dataclasses import dataclass
+from pathlib import Path
+
+from cli_llm import errors
+from cli_llm._files import atomic_binary_writer
+from cli_llm._logging import ClmLogger
+from cli_llm.tokens import count_bytes
+
+if t.TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+    from types import ModuleType
+
+    import numpy as np
+    import numpy.typing as npt
+    from llm.models import EmbeddingModel
+
+    from cli_llm.config import ClmConfig
+    from cli_llm.tokens import Tokenizer
+
+type Vectors = npt.NDArray[np.float32]
+"""Rows of float32 vectors."""
+
+log = ClmLogger()
+
+INDEX_DIR = "indexes"
+"""The directory under the cache directory holding an index in each subdirectory."""
+
+DEFAULT_INDEX = "default"
+
+CHUNKS_FILE = "chunks.sqlite3"
+
+VECTORS_FILE = "vectors.{generation}.f32"
+"""The vectors file of each build, numbered by the `generation` in the meta table, committed with the chunks."""
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    row INTEGER PRIMARY KEY,
+    path TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    start_line INTEGER NOT NULL,
+    end_line INTEGER NOT NULL,
+    text TEXT NOT NULL
+);
+"""
+
+
+def _numpy() -> "ModuleType":
+    try:
+        import numpy as np
+    except ImportError as e:
+        raise errors.MissingDependencyError(package="numpy", extra="index") from e
+    return np
+
+
+@dataclass(frozen=True)
+class Chunk:
+    """Consecutive lines of a file."""
+
+    path: str
+    start_line: int
+    end_line: int
+    text: str
+
+    @property
+    def label(self) -> str:
+        """The path and lines of the chunk, e.g. `src/main.py:10-42`."""
+        return f"{self.path}:{self.start_line}-{self.end_line}"
+
+
+@dataclass(frozen=True)
+class Hit:
+    """A chunk found by a query, with its cosine similarity to the question."""
+
+    chunk: Chunk
+    score: float
+
+
+@dataclass(frozen=True)
+class BuildStats:
+    """What building the index did."""
+
+    files: int
+    embedded: int
+    """The chunks embedded, of the new and changed files."""
+    reused: int
+    """The chunks of unchanged files, whose vectors were kept."""
+    removed: int
+    """The files no longer gathered, whose chunks were dropped."""
+
+
+def _split_line(line: str, size: int, count: "Tokenizer") -> list[str]:
+    """Split a line longer than `size` tokens into parts of at most `size` tokens, or single characters."""
+    tokens = count(line)
+    if tokens <= size or len(line) == 1:
+        return [line]
+    width = max(len(line) * size // tokens, 1)
+    return [part for i in range(0, len(line), width) for part in _split_line(line[i : i + width], size, count)]
+
+
+def split_lines(path: str, text: str, size: int, count: "Tokenizer" = len) -> list[Chunk]:
+    """Split the text into chunks of whole lines of at most `size` tokens, splitting longer lines.
+
+    Args:
+        path: The path of the file, recorded in each chunk.
+        text: The contents of the file.
+        size: The most tokens in each chunk.
+        count: Counts the tokens of a line, characters by default. A chunk's tokens are the sum of its lines'.
+    """
+    chunks: list[Chunk] = []
+    parts: list[str] = []
+    length = start = end = 0
+    for number, line in enumerate(text.splitlines(keepends=True), start=1):
+        for part in _split_line(line, size, count):
+            tokens = count(part)
+            if parts and length + tokens > size:
+                chunks.append(Chunk(path, start, end, "".join(parts)))
+                parts, length = [], 0
+            if not parts:
+                start = number
+            parts.append(part)
+            length += tokens
+            end = number
+    if parts:
+        chunks.append(Chunk(path, start, end, "".join(parts)))
+    return chunks
+
+
+def _hash(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def _normalise(np: "ModuleType", vectors: Vectors) -> Vectors:
+    """Scale the vectors to unit length, so their dot product is their cosine similarity."""
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return t.cast("Vectors", vectors / np.where(norms == 0, 1, norms))
+
+
+class Index:
+    """A retrieval index of the chunks of files, stored in a directory."""
+
+    def __init__(self, directory: Path, name: str = DEFAULT_INDEX) -> None:
+        """Initialise the index stored in the directory.
+
+        Args:
+            directory: The directory holding the chunks table and the vectors file.
+            name: The name of the index, for messages.
+        """
+        self.directory = directory
+        self.name = name
+
+    @classmethod
+    def from_config(cls, config: "ClmConfig", name: str = DEFAULT_INDEX) -> t.Self:
+        """The index with the given name under the cache directory."""
+        return cls(config.cache_dir / INDEX_DIR / name, name)
+
+    @contextlib.contextmanager
+    def _connect(self) -> "Iterator[sqlite3.Connection]":
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with contextlib.closing(sqlite3.connect(self.directory / CHUNKS_FILE, timeout=30)) as connection, connection:
+            connection.executescript(_SCHEMA)
+            yield connection
+
+    def _vectors(self, np: "ModuleType", meta: dict[str, str]) -> Vectors:
+        """The memory-mapped vectors, one row per chunk."""
+        shape = (int(meta.get("rows", 0)), int(meta.get("dimensions", 0)))
+        if 0 in shape:
+            return t.cast("Vectors", np.zeros(shape, dtype=np.float32))
+        path = self.directory / VECTORS_FILE.format(generation=meta["generation"])
+        return t.cast("Vectors", np.memmap(path, dtype=np.float32, mode="r", shape=shape))
+
+    def _remove_vectors_except(self, name: str) -> None:
+        """Remove the vectors files of other generations, left by earlier or interrupted builds."""
+        for path in self.directory.glob(VECTORS_FILE.format(generation="*")):
+            if path.name != name:
+                path.unlink(missing_ok=True)
+
+    def build(
+        self,
+        files: "Iterable[tuple[Path | str, str]]",
+        model: "EmbeddingModel",
+        *,
+        chunk_tokens: int,
+        count: "Tokenizer" = count_bytes,
+        batch_size: int | None = None,
+    ) -> BuildStats:
+        """Index the files, replacing any files indexed before, only embedding the new and changed files.
+
+        Everything is embedded again if the model or the chunk size has changed. The vectors are written to a new file,
+        which the chunks table only refers to once its transaction commits, so an interrupted build leaves the index
+        as it was.
+
+        Args:
+            files: The `(path, contents)` pairs to index, e.g. from `helpers.gather_file_contents`.
+            model: The embedding model.
+            chunk_tokens: The most tokens in each chunk.
+            count: Counts the tokens of the text, e.g. `tokens.get_tokenizer` of the model.
+            batch_size: The most chunks to embed at once. Defaults to the model's batch size.
+
+        Returns:
+            What was embedded, reused and removed.
+        """
+        np = _numpy()
+        with self._connect() as connection:
+            meta = dict(connection.execute("SELECT key, value FROM meta").fetchall())
+            settings = {"model_id": model.model_id, "chunk_tokens": str(chunk_tokens)}
+            compatible = all(meta.get(key) == value for key, value in settings.items())
+            indexed: dict[str, tuple[str, list[tuple[int, Chunk]]]] = {}
+            rows = connection.execute("SELECT row, path, content_hash, start_line, end_line, text FROM chunks")
+            for row, path, content_hash, start, end, text in rows if compatible else ():
+                indexed.setdefault(path, (content_hash, []))[1].append((row, Chunk(path, start, end, text)))
+
+            kept: list[tuple[int, Chunk, str]] = []
+            new: list[tuple[Chunk, str]] = []
+            gathered = set()
+            for path, text in files:
+                name, content_hash = str(path), _hash(text)
+                gathered.add(name)
+                previous = indexed.get(name)
+                if previous is not None and previous[0] == content_hash:
+                    kept.extend((row, chunk, content_hash) for row, chunk in previous[1])
+                else:
+                    new.extend((chunk, content_hash) for chunk in split_lines(name, text, chunk_tokens, count))
+
+            log.info("Embedding %s chunks with %s, reusing %s", len(new), model.model_id, len(kept))
+            texts = [chunk.text for chunk, _ in new]
+            embedded = np.array(list(model.embed_multi(texts, batch_size)) if texts else [], dtype=np.float32)
+            dimensions = embedded.shape[1] if new else int(meta.get("dimensions", 0))
+            reused = self._vectors(np, meta)[[row for row, _, _ in kept]] if kept else np.zeros((0, dimensions))
+            vectors = np.concatenate([reused, _normalise(np, embedded.reshape(len(new), dimensions))])
+            generation = int(meta.get("generation", 0)) + 1
+            vectors_file = VECTORS_FILE.format(generation=generation)
+            with atomic_binary_writer(self.directory / vectors_file) as f:
+                vectors.astype(np.float32).tofile(f)
+
+            chunks = [(chunk, content_hash) for _, chunk, content_hash in kept] + new
+            connection.execute("DELETE FROM chunks")
+            connection.executemany(
+                "INSERT INTO chunks VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (row, chunk.path, content_hash, chunk.start_line, chunk.end_line, chunk.text)
+                    for row, (chunk, content_hash) in enumerate(chunks)
+                ],
+            )
+            connection.executemany(
+                "INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                [
+                    *settings.items(),
+                    ("dimensions", str(dimensions)),
+                    ("rows", str(len(chunks))),
+                    ("generation", str(generation)),
+                ],
+            )
+        self._remove_vectors_except(vectors_file)
+        return BuildStats(
+            files=len(gathered), embedded=len(new), reused=len(kept), removed=len(indexed.keys() - gathered)
+        )
+
+    def query(self, question: str, k: int = 5) -> list[Hit]:
+        """Find the chunks most similar to the question, embedding it with the model the index was built with.
+
+        Args:
+            question: The question to find the relevant chunks for.
+            k: The most chunks to find.
+
+        Returns:
+            The chunks, most similar first.
+
+        Raises:
+            IndexNotFoundError: If the index has not been built.
+        """
+        import llm
+
+        np = _numpy()
+        if not (self.directory / CHUNKS_FILE).exists():
+            raise errors.IndexNotFoundError(self.name)
+        with self._connect() as connection:
+            meta = dict(connection.execute("SELECT key, value FROM meta").fetchall())
+            if "model_id" not in meta:
+                raise errors.IndexNotFoundError(self.name)
+            vectors = self._vectors(np, meta)
+            k = min(k, len(vectors))
+            if k <= 0:
+                return []
+            model = llm.get_embedding_model(meta["model_id"])  # type: ignore[no-untyped-call]
+            query = _normalise(np, np.asarray(model.embed(question), dtype=np.float32))
+            scores = vectors @ query
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            chunks = {
+                row: Chunk(path, start, end, text)
+                for row, path, start, end, text in connection.execute(
+                    f"SELECT row, path, start_line, end_line, text FROM chunks WHERE row IN ({','.join('?' * k)})",  # noqa: S608
+                    [int(row) for row in top],
+                )
+            }
+        return [Hit(chunks[int(row)], float(scores[row])) for row in top]
+
+
+def retrieve(config: "ClmConfig", question: str, *, k: int = 5, name: str = DEFAULT_INDEX) -> list[tuple[str, str]]:
+    """The chunks of the index most relevant to the question, to render into a prompt.
+
+    Args:
+        config: The LLM configuration object, whose cache directory holds the index.
+        question: The question to find the relevant chunks for.
+        k: The most chunks to retrieve.
+        name: The name of the index, as given to `clm index build`.
+
+    Returns:
+        The label, e.g. `src/main.py:10-42`, and the text of each chunk, most relevant first, so they can be rendered
+        like the files from `helpers.gather_file_contents`.
+    """
+    return [(hit.chunk.label, hit.chunk.text) for hit in Index.from_config(config, name).query(question, k)]
@@ -0,0 +1,255 @@
+"""Module for running prompts over inputs that do not fit in the model's context.
+
+The items, e.g. the files gathered by `helpers.gather_file_contents`, are packed into chunks that fit a token budget.
+The map prompt is run on each chunk concurrently, then the results are reduced with the reduce prompt. When the
+results are too large to reduce at once, they are reduced in groups that fit the budget, and the results of those
+reduced again, until they fit. Results too large to be combined with each other raise a `TokenBudgetError`.
+
+Tokens are counted by the tokenizer of the model, see `cli_llm.tokens`, and the budget is capped by its context size.
+"""
+
+import typing as t
+
+from cli_llm import errors, templates
+from cli_llm._logging import ClmLogger, progress
+from cli_llm.run import run
+from cli_llm.tokens import BYTES_PER_TOKEN, chunk_budget, get_tokenizer
+
+if t.TYPE_CHECKING:
+    from collections.abc import Callable, Sequence
+    from pathlib import Path
+
+    from cli_llm.config import ClmConfig
+    from cli_llm.response import Response
+    from cli_llm.tokens import Tokenizer
+    from cli_llm.types import StringDict
+
+log = ClmLogger()
+
+type FileItem = tuple["Path | str", str]
+
+
+def pack[T](items: "Sequence[T]", cost: "Callable[[T], int]", budget: int) -> list[list[T]]:
+    """Pack the items, in order, into groups whose total cost fits the budget.
+
+    Args:
+        items: The items to pack.
+        cost: The cost of an item.
+        budget: The most each group can cost. Items that cost more are put in a group on their own.
+
+    Returns:
+        The groups of items.
+    """
+    groups: list[list[T]] = []
+    total = budget + 1
+    for item in items:
+        item_cost = cost(item)
+        if total + item_cost > budget:
+            groups.append([])
+            total = 0
+        groups[-1].append(item)
+        total += item_cost
+    return groups
+
+
+def _split_text(text: str, size: int) -> list[str]:
+    """Split the text into parts of at most `size` characters, preferring to split between lines."""
+    parts: list[str] = []
+    part = ""
+    for line in text.splitlines(keepends=True):
+        while len(line) > size:
+            if part:
+                parts.append(part)
+                part = ""
+            parts.append(line[:size])
+            line = line[size:]  # noqa: PLW2901
+        if len(part) + len(line) > size:
+            parts.append(part)
+            part = ""
+        part += line
+    if part:
+        parts.append(part)
+    return parts
+
+
+class _Template:
+    """A prompt whose list of items, under the given key, has to fit in a token budget."""
+
+    def __init__(self, prompt: str, key: str, prompt_data: "StringDict", budget: int, count: "Tokenizer") -> None:
+        self.prompt = prompt
+        self.key = key
+        self.prompt_data = prompt_data
+        self.count = count
+        self._costs: dict[t.Any, int] = {}
+        self._base = count(templates.render(prompt, self.data([])))
+        self.budget = budget - self._base
+        if self.budget <= 0:
+            raise errors.TokenBudgetError(self._base, budget)
+
+    def data(self, items: list[t.Any]) -> "StringDict":
+        return self.prompt_data | {self.key: items}
+
+    def cost(self, item: t.Any) -> int:
+        """The tokens the item adds to the rendered prompt, counted once per item."""
+        if (cost := self._costs.get(item)) is None:
+            cost = self._costs[item] = self.count(templates.render(self.prompt, self.data([item]))) - self._base
+        return cost
+
+    def tokens(self, items: "Sequence[t.Any]") -> int:
+        """The tokens of the prompt rendered with the items."""
+        return self._base + sum(map(self.cost, items))
+
+    def split(self, item: FileItem) -> list[FileItem]:
+        """Split a file whose contents do not fit the budget on their own into parts that do.
+
+        The parts start at the size the room left by their label would hold at `BYTES_PER_TOKEN`, and are made
+        smaller until they all fit, as the tokenizer may count more tokens.
+        """
+        if self.cost(item) <= self.budget:
+            return [item]
+        name, contents = item
+        size = max((self.budget - self.cost((f"{name} (part 1 of 1)", ""))) * BYTES_PER_TOKEN, 1)
+        while True:
+            parts = _split_text(contents, size)
+            labelled: list[FileItem] = [
+                (f"{name} (part {i} of {len(parts)})", part) for i, part in enumerate(parts, start=1)
+            ]
+            if size == 1 or all(self.cost(part) <= self.budget for part in labelled):
+                break
+            size //= 2
+        log.info("Splitting %s into %s parts to fit the token budget", name, len(parts))
+        return labelled
+
+    def pack(self, items: "Sequence[t.Any]") -> list[list[t.Any]]:
+        return pack(items, self.cost, self.budget)
+
+
+def _run_all(  # noqa: PLR0913
+    config: "ClmConfig",
+    template: _Template,
+    groups: list[list[t.Any]],
+    *,
+    options: "StringDict | None",
+    concurrency: int,
+    description: str,
+) -> list[str]:
+    """Run the prompt on each group of items concurrently, returning the text of each response in order."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    from cli_llm._history import tool_initializer
+
+    with (
+        progress() as bar,
+        ThreadPoolExecutor(
+            max_workers=concurrency, thread_name_prefix="clm-map", initializer=tool_initializer()
+        ) as executor,
+    ):
+        task = bar.add_task(description, total=len(groups))
+
+        def complete(group: list[t.Any]) -> str:
+            text = run(config, template.prompt, template.data(group), options=options).text()
+            bar.advance(task)
+            return text
+
+        return list(executor.map(complete, groups))
+
+
+def map_reduce(  # noqa: PLR0913
+    config: "ClmConfig",
+    map_prompt: str,
+    reduce_prompt: str,
+    items: "Sequence[FileItem]",
+    *,
+    prompt_data: "StringDict | None" = None,
+    chunk_tokens: int | None = None,
+    concurrency: int | None = None,
+    options: "StringDict | None" = None,
+) -> "Response":
+    """Run the LLM over items that may not fit in a single prompt.
+
+    Args:
+        config: The LLM configuration object.
+        map_prompt: The prompt run on each chunk of items, which are available to it as `files`, a list of
+            `(name, contents)` pairs.
+        reduce_prompt: The prompt that combines the results of the map prompt, which are available to it as
+            `results`, a list of strings.
+        items: The `(name, contents)` pairs to run the map prompt over, e.g. from `helpers.gather_file_contents`.
+        prompt_data: Extra data to render both prompts with.
+        chunk_tokens: The most tokens each prompt should use. Defaults to `map_reduce_chunk_tokens` from the config.
+            Either is capped by the context size of the model, if it is configured in `ll_model_context_tokens`.
+        concurrency: The most prompts to have in flight at once. Defaults to `max_concurrency` from the config.
+        options: Options passed on to the model, e.g. `temperature`.
+
+    Returns:
+        The response to the final reduce prompt, which can be streamed like any other response.
+
+    Raises:
+        TokenBudgetError: If either prompt leaves no room for items, or the results can not be reduced to fit the
+            budget.
+    """
+    prompt_data = prompt_data or {}
+    model_id = config.model().model_id
+    budget = chunk_budget(config, model_id, chunk_tokens)
+    concurrency = concurrency or config.max_concurrency
+
+    mapper = _Template(map_prompt, "files", prompt_data, budget, get_tokenizer(model_id))
+    chunks = mapper.pack([part for item in items for part in mapper.split(item)])
+    log.info("Mapping %s items in %s chunks", len(items), len(chunks))
+    results = _run_all(config, mapper, chunks, options=options, concurrency=concurrency, description="Mapping chunks")
+
+    return reduce_results(
+        config,
+        reduce_prompt,
+        results,
+        prompt_data=prompt_data,
+        chunk_tokens=budget,
+        concurrency=concurrency,
+        options=options,
+    )
+
+
+def reduce_results(  # noqa: PLR0913
+    config: "ClmConfig",
+    reduce_prompt: str,
+    results: list[str],
+    *,
+    prompt_data: "StringDict | None" = None,
+    chunk_tokens: int | None = None,
+    concurrency: int | None = None,
+    options: "StringDict | None" = None,
+) -> "Response":
+    """Combine results, e.g. the per-file digests from `helpers.digest_file_contents`, that may not fit in one prompt.
+
+    Args:
+        config: The LLM configuration object.
+        reduce_prompt: The prompt that combines the results, which are available to it as `results`.
+        results: The results to combine.
+        prompt_data: Extra data to render the prompt with.
+        chunk_tokens: The most tokens each prompt should use. Defaults to `map_reduce_chunk_tokens` from the config.
+            Either is capped by the context size of the model, if it is configured in `ll_model_context_tokens`.
+        concurrency: The most prompts to have in flight at once. Defaults to `max_concurrency` from the config.
+        options: Options passed on to the model, e.g. `temperature`.
+
+    Returns:
+        The response to the final reduce prompt.
+
+    Raises:
+        TokenBudgetError: If the results can not be reduced to fit the budget, as each is too large to be combined
+            with another.
+    """
+    prompt_data = prompt_data or {}
+    model_id = config.model().model_id
+    budget = chunk_budget(config, model_id, chunk_tokens)
+    concurrency = concurrency or config.max_concurrency
+
+    reducer = _Template(reduce_prompt, "results", prompt_data, budget, get_tokenizer(model_id))
+    # Once no two results fit together, reducing them again would not shrink them any further.
+    while 1 < len(groups := reducer.pack(results)) < len(results):
+        log.info("Reducing %s results in %s groups", len(results), len(groups))
+        results = _run_all(
+            config, reducer, groups, options=options, concurrency=concurrency, description="Reducing results"
+        )
+    if (needed := reducer.tokens(results)) > budget:
+        raise errors.TokenBudgetError(needed, budget, results=True)
+
+    return run(config, reduce_prompt, reducer.data(results), options=options)
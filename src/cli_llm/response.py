@@ -1,24 +1,156 @@
-"""Module for encapsulating the llm.Response class."""
+"""Module for encapsulating the llm.Response and llm.AsyncResponse classes."""
 
+import contextlib
+import os
+import time
 import typing as t
+from dataclasses import dataclass
 from pathlib import Path
 
-from cli_llm._logging import console, spinner
+from cli_llm._files import atomic_write_text, atomic_writer
+from cli_llm._logging import spinner, status
+from cli_llm._stream import StreamWriter
+from cli_llm._timings import timings
 
 if t.TYPE_CHECKING:
+    from collections.abc import AsyncIterable, AsyncIterator, Callable, Iterable, Iterator
+
     import llm
+    from llm.models import AsyncResponse as LlmAsyncResponse
+
+    from cli_llm._response_cache import AsyncCachedResponse, CachedResponse
+
+    type _Cached = CachedResponse | AsyncCachedResponse
+
+
+def _write_text(filepath: str | Path, contents: str) -> None:
+    if not contents.endswith(os.linesep):
+        contents += os.linesep
+    atomic_write_text(Path(filepath), contents)
+
+
+@contextlib.contextmanager
+def _chunk_writer(filepath: str | Path, *, tee: bool) -> t.Iterator[t.Callable[[str], None]]:
+    """Write chunks to the file as they arrive, replacing it once they have all been written.
+
+    A trailing newline is added if the last chunk does not end with one. The file is left untouched if writing fails
+    or is interrupted.
+    """
+    last = ""
+
+    def write(chunk: str) -> None:
+        nonlocal last
+        if not chunk:
+            return
+        f.write(chunk)
+        if terminal is not None:
+            terminal.write(chunk)
+        last = chunk
+
+    terminal = StreamWriter() if tee else None
+    feedback = terminal or status(f"Writing response from LLM to {Path(filepath).name}...")
+    with feedback, atomic_writer(Path(filepath)) as f:
+        yield write
+        if not last.endswith(os.linesep):
+            f.write(os.linesep)
+
+
+def tokens_per_second(
+    output_tokens: int | None, latency: float | None, time_to_first_token: float | None
+) -> float | None:
+    """The output tokens generated per second after the first token arrived, if known."""
+    if output_tokens is None or latency is None:
+        return None
+    generating = latency - (time_to_first_token or 0.0)
+    return output_tokens / generating if generating > 0 else None
+
+
+@dataclass
+class ResponseMetrics:
+    """Latency and throughput of a response, recorded as it is received.
+
+    Times are in seconds from when the response is first iterated, which is when the model is actually prompted.
+    Token counts are only known when the model reports its usage.
+    """
+
+    prompt_chars: int = 0
+    prompt_tokens: int | None = None
+    time_to_first_token: float | None = None
+    latency: float | None = None
+    chunks: int = 0
+    output_chars: int = 0
+    output_tokens: int | None = None
+    error: str | None = None
+
+    @property
+    def tokens_per_second(self) -> float | None:
+        """The output tokens generated per second after the first token arrived, if known."""
+        return tokens_per_second(self.output_tokens, self.latency, self.time_to_first_token)
+
+
+def _record_chunk(metrics: ResponseMetrics, chunk: str, start: float) -> None:
+    if chunk and metrics.time_to_first_token is None:
+        metrics.time_to_first_token = time.perf_counter() - start
+    metrics.chunks += 1
+    metrics.output_chars += len(chunk)
+
+
+def waiting_for_model_stream(response: "Iterable[str]") -> "Iterator[str]":
+    """Iterate over the response, named so that profiles attribute the time spent waiting for the model to it."""
+    yield from response
+
+
+async def async_waiting_for_model_stream(response: "AsyncIterable[str]") -> "AsyncIterator[str]":
+    """Iterate over the response, named so that profiles attribute the time spent waiting for the model to it."""
+    async for chunk in response:
+        yield chunk
+
+
+type OnFinish = Callable[[ResponseMetrics], None] | None
+
+
+def _record_finish(
+    metrics: ResponseMetrics,
+    start: float,
+    response: "llm.Response | LlmAsyncResponse | _Cached",
+    on_finish: OnFinish,
+) -> None:
+    metrics.latency = time.perf_counter() - start
+    metrics.prompt_tokens = response.input_tokens
+    metrics.output_tokens = response.output_tokens
+    first_token = metrics.time_to_first_token or metrics.latency
+    timings.record("first token", first_token)
+    timings.record("completion", metrics.latency - first_token)
+    if on_finish is not None:
+        on_finish(metrics)
+
+
+def _record_error(metrics: ResponseMetrics, error: Exception, on_finish: OnFinish) -> None:
+    metrics.error = type(error).__name__
+    if on_finish is not None:
+        on_finish(metrics)
 
 
 class Response:
     """Response from the LLM."""
 
-    def __init__(self, response: "llm.Response") -> None:
-        """Initialise with the "underlying llm Response object."""
+    def __init__(
+        self, response: "llm.Response | CachedResponse", *, prompt_chars: int = 0, on_finish: OnFinish = None
+    ) -> None:
+        """Initialise with the underlying llm Response object, or a response served from the cache.
+
+        Args:
+            response: The underlying response.
+            prompt_chars: The length of the rendered prompt, recorded in the metrics.
+            on_finish: Called with the metrics once the whole response has been received, or receiving it failed.
+        """
         self._response = response
+        self.metrics = ResponseMetrics(prompt_chars=prompt_chars)
+        self._on_finish = on_finish
 
     @property
-    def response(self) -> "llm.Response":
-        """Returns the underlying llm Response object."""
+    def response(self) -> "llm.Response | CachedResponse":
+        """Returns the underlying llm Response object, or the response served from the cache."""
         return self._response
 
     def __repr__(self) -> str:
@@ -28,27 +160,137 @@ class Response:
     @spinner("Fetching response from LLM...")
     def text(self) -> str:
         """Returns the full text response from the LLM."""
-        return str(self._response.text())
+        return "".join(self)
 
     def __iter__(self) -> t.Iterator[str]:
-        """Iterate over this class instance's underlying llm Response object's iterator."""
-        return iter(self._response)
+        """Iterate over this class instance's underlying llm Response object's iterator, recording the metrics."""
+        if self.metrics.latency is not None:
+            yield from self._response
+            return
+        start = time.perf_counter()
+        try:
+            for chunk in waiting_for_model_stream(self._response):
+                _record_chunk(self.metrics, chunk, start)
+                yield chunk
+        except Exception as e:
+            _record_error(self.metrics, e, self._on_finish)
+            raise
+        _record_finish(self.metrics, start, self._response, self._on_finish)
 
-    def stream(self) -> None:
-        """Stream the AI response to the terminal."""
-        for chunk in self:
-            console.print(chunk, end="")
+    def stream(self, *, markdown: bool = False) -> None:
+        """Stream the AI response to the terminal.
+
+        Args:
+            markdown: Whether to render the response as Markdown.
+        """
+        with StreamWriter(markdown=markdown) as writer:
+            for chunk in self:
+                writer.write(chunk)
 
     @spinner("Fetching JSON response from LLM...")
     def json(self) -> t.Any:
         """Return LLM response as a JSON, if applicable."""
+        for _ in self:
+            pass
         return self._response.json()
 
-    def write_to_file(self, filepath: str | Path) -> None:
-        """Writes the full text response from the LLM to a given file path."""
-        import os
+    def write_to_file(self, filepath: str | Path, *, stream: bool = True, tee: bool = False) -> None:
+        """Writes the full text response from the LLM to a given file path.
+
+        The file is only replaced once the whole response has been written, so it is left untouched if the response
+        fails or is interrupted.
+
+        Args:
+            filepath: The file to write to.
+            stream: Whether to write the response as it arrives, rather than holding all of it in memory first.
+            tee: Whether to also print the response to the terminal as it arrives, when streaming.
+        """
+        if not stream:
+            _write_text(filepath, self.text())
+            return
+        with _chunk_writer(filepath, tee=tee) as write:
+            for chunk in self:
+                write(chunk)
+
+
+class AsyncResponse:
+    """Asynchronous response from the LLM."""
+
+    def __init__(
+        self, response: "LlmAsyncResponse | AsyncCachedResponse", *, prompt_chars: int = 0, on_finish: OnFinish = None
+    ) -> None:
+        """Initialise with the underlying llm AsyncResponse object, or a response served from the cache.
+
+        Args:
+            response: The underlying response.
+            prompt_chars: The length of the rendered prompt, recorded in the metrics.
+            on_finish: Called with the metrics once the whole response has been received, or receiving it failed.
+        """
+        self._response = response
+        self.metrics = ResponseMetrics(prompt_chars=prompt_chars)
+        self._on_finish = on_finish
+
+    @property
+    def response(self) -> "LlmAsyncResponse | AsyncCachedResponse":
+        """Returns the underlying llm AsyncResponse object, or the response served from the cache."""
+        return self._response
+
+    def __repr__(self) -> str:
+        """String representation of this class instance."""
+        return repr(self._response)
+
+    @spinner("Fetching response from LLM...")
+    async def text(self) -> str:
+        """Returns the full text response from the LLM."""
+        return "".join([chunk async for chunk in self])
+
+    async def __aiter__(self) -> t.AsyncIterator[str]:
+        """Iterate over this class instance's underlying llm AsyncResponse object's iterator, recording the metrics."""
+        if self.metrics.latency is not None:
+            async for chunk in self._response:
+                yield chunk
+            return
+        start = time.perf_counter()
+        try:
+            async for chunk in async_waiting_for_model_stream(self._response):
+                _record_chunk(self.metrics, chunk, start)
+                yield chunk
+        except Exception as e:
+            _record_error(self.metrics, e, self._on_finish)
+            raise
+        _record_finish(self.metrics, start, self._response, self._on_finish)
+
+    async def stream(self, *, markdown: bool = False) -> None:
+        """Stream the AI response to the terminal.
+
+        Args:
+            markdown: Whether to render the response as Markdown.
+        """
+        with StreamWriter(markdown=markdown) as writer:
+            async for chunk in self:
+                writer.write(chunk)
+
+    @spinner("Fetching JSON response from LLM...")
+    async def json(self) -> t.Any:
+        """Return LLM response as a JSON, if applicable."""
+        async for _ in self:
+            pass
+        return await self._response.json()
+
+    async def write_to_file(self, filepath: str | Path, *, stream: bool = True, tee: bool = False) -> None:
+        """Writes the full text response from the LLM to a given file path.
+
+        The file is only replaced once the whole response has been written, so it is left untouched if the response
+        fails or is interrupted.
 
-        contents = self.text()
-        if not contents.endswith(os.linesep):
-            contents += os.linesep
-        Path(filepath).write_text(contents)
+        Args:
+            filepath: The file to write to.
+            stream: Whether to write the response as it arrives, rather than holding all of it in memory first.
+            tee: Whether to also print the response to the terminal as it arrives, when streaming.
+        """
+        if not stream:
+            _write_text(filepath, await self.text())
+            return
+        with _chunk_writer(filepath, tee=tee) as write:
+            async for chunk in self:
+                write(chunk)
@@ -1,14 +1,19 @@
 """Module for running LLM tools."""
 
+from functools import partial
 from typing import TYPE_CHECKING
 
-import jinja2
-
-from cli_llm._logging import ClmLogger
-from cli_llm.response import Response
+from cli_llm import errors, templates
+from cli_llm._logging import ClmLogger, spinner
+from cli_llm._timings import timings
+from cli_llm.response import AsyncResponse, Response
 
 if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from cli_llm._response_cache import CachedResponse, ResponseCache
     from cli_llm.config import ClmConfig
+    from cli_llm.response import OnFinish
     from cli_llm.types import StringDict
 
 log = ClmLogger()
@@ -17,26 +22,187 @@ log = ClmLogger()
 def _render(prompt: str, prompt_data: "StringDict") -> str:
     """Render the prompt with the given data."""
     log.info("Rendering the prompt.")
-    rendered_prompt = jinja2.Template(prompt).render(**prompt_data)
+    with timings.phase("render"):
+        rendered_prompt = templates.render(prompt, prompt_data)
     log.debug("Prompt: %s", rendered_prompt)
     return rendered_prompt
 
 
-def run(config: "ClmConfig", prompt: str, prompt_data: "StringDict") -> Response:
+def _prepare(config: "ClmConfig", prompt: str, prompt_data: "StringDict") -> tuple["StringDict", str]:
+    """Render the prompt with the given data, as configured.
+
+    On a dry run, iterators in the data are read into lists first, so that they can be itemised once rendered.
+
+    Returns:
+        The prompt data and the rendered prompt.
+    """
+    if config.template_bytecode_cache:
+        templates.enable_bytecode_cache(config.cache_dir / templates.TEMPLATE_BYTECODE_DIR)
+    if config.dry_run:
+        from cli_llm._dry_run import materialize
+
+        prompt_data = materialize(prompt_data)
+    return prompt_data, _render(prompt, prompt_data)
+
+
+def _preflight(
+    config: "ClmConfig", model_id: str, prompt: str, prompt_data: "StringDict", rendered_prompt: str
+) -> None:
+    """Check the prompt fits in the context of the model, if its size is configured.
+
+    On a dry run the tokens of the prompt are reported instead, and the tool is stopped before it can use a response.
+
+    Raises:
+        DryRunComplete: On a dry run, once the prompt has been reported.
+        PromptTooLargeError: If the prompt does not fit.
+    """
+    from cli_llm.tokens import get_tokenizer
+
+    context = config.context_tokens(model_id)
+    count = get_tokenizer(model_id)
+    if config.dry_run:
+        from cli_llm._dry_run import sections, summary, table
+
+        tokens = count(rendered_prompt)
+        log.print(table(model_id, sections(prompt, prompt_data, rendered_prompt, count), tokens))
+        log.print(summary(tokens, context))
+        raise errors.DryRunComplete(model_id)
+    if context is not None and (tokens := count(rendered_prompt)) > context:
+        raise errors.PromptTooLargeError(tokens, context, model_id)
+
+
+def _cache_lookup(
+    config: "ClmConfig", model_id: str, options: "StringDict", rendered_prompt: str
+) -> tuple["ResponseCache | None", str, "CachedResponse | None"]:
+    """The response cache, if enabled, the key of the prompt and the cached response to serve, if any."""
+    cache = config.response_store()
+    if cache is None:
+        return None, "", None
+    key = cache.key(model_id, options, rendered_prompt)
+    if config.response_cache_refresh:
+        return cache, key, None
+    cached = cache.get(key)
+    if cached is not None:
+        log.info("Using the cached response: %s", key)
+    return cache, key, cached
+
+
+def _history_recorder(config: "ClmConfig", model_id: str, *, cached: bool) -> "OnFinish":
+    """Records the metrics of the run in the history, if enabled, once the response has been received."""
+    history = config.history_store()
+    if history is None:
+        return None
+    from cli_llm._history import current_tool
+
+    return partial(history.record_metrics, tool=current_tool(), model_id=model_id, cached=cached)
+
+
+def run(
+    config: "ClmConfig", prompt: str, prompt_data: "StringDict", *, options: "StringDict | None" = None
+) -> Response:
     """Run the LLM.
 
     Args:
         config: The LLM configuration object.
         prompt: The prompt to render with the given data.
         prompt_data: The data to render the prompt with.
+        options: Options passed on to the model, e.g. `temperature`.
 
     Returns:
         The response from the LLM.
     """
-    rendered_prompt = _render(prompt, prompt_data)
+    options = options or {}
+    prompt_data, rendered_prompt = _prepare(config, prompt, prompt_data)
 
     log.info("Getting the model: %s", config.ll_model)
-    model = config.model()
+    with timings.phase("model resolution"):
+        model = config.model()
+
+    _preflight(config, model.model_id, prompt, prompt_data, rendered_prompt)
+
+    cache, key, cached = _cache_lookup(config, model.model_id, options, rendered_prompt)
+    on_finish = _history_recorder(config, model.model_id, cached=cached is not None)
+    if cached is not None:
+        log.print(f"Using the cached response from {model}\n")
+        return Response(cached, prompt_chars=len(rendered_prompt), on_finish=on_finish)
 
+    config.rate_limiter.wait()
     log.print(f"Prompting {model}\n")
-    return Response(model.prompt(rendered_prompt))
+    response = model.prompt(rendered_prompt, **options)
+    if cache is not None:
+        cache.store_on_done(key, response)
+    return Response(response, prompt_chars=len(rendered_prompt), on_finish=on_finish)
+
+
+async def arun(
+    config: "ClmConfig", prompt: str, prompt_data: "StringDict", *, options: "StringDict | None" = None
+) -> AsyncResponse:
+    """Run the async variant of the LLM.
+
+    Args:
+        config: The LLM configuration object.
+        prompt: The prompt to render with the given data.
+        prompt_data: The data to render the prompt with.
+        options: Options passed on to the model, e.g. `temperature`.
+
+    Returns:
+        The response from the LLM.
+    """
+    from cli_llm._response_cache import AsyncCachedResponse
+
+    options = options or {}
+    prompt_data, rendered_prompt = _prepare(config, prompt, prompt_data)
+
+    log.info("Getting the async model: %s", config.ll_model)
+    with timings.phase("model resolution"):
+        model = config.async_model()
+
+    _preflight(config, model.model_id, prompt, prompt_data, rendered_prompt)
+
+    cache, key, cached = _cache_lookup(config, model.model_id, options, rendered_prompt)
+    on_finish = _history_recorder(config, model.model_id, cached=cached is not None)
+    if cached is not None:
+        log.print(f"Using the cached response from {model}\n")
+        return AsyncResponse(AsyncCachedResponse(cached), prompt_chars=len(rendered_prompt), on_finish=on_finish)
+
+    await config.rate_limiter.async_wait()
+    log.print(f"Prompting {model}\n")
+    response = model.prompt(rendered_prompt, **options)
+    if cache is not None:
+        await cache.astore_on_done(key, response)
+    return AsyncResponse(response, prompt_chars=len(rendered_prompt), on_finish=on_finish)
+
+
+@spinner("Fetching responses from LLM...")
+async def arun_many(
+    config: "ClmConfig",
+    prompt: str,
+    prompt_data: "Iterable[StringDict]",
+    *,
+    options: "StringDict | None" = None,
+    concurrency: int | None = None,
+) -> list[AsyncResponse]:
+    """Run the async variant of the LLM on the prompt rendered with each of the given data.
+
+    Args:
+        config: The LLM configuration object.
+        prompt: The prompt to render with each of the given data.
+        prompt_data: The data to render each prompt with.
+        options: Options passed on to the model, e.g. `temperature`.
+        concurrency: The most prompts to have in flight at once, defaults to `max_concurrency` from the config.
+
+    Returns:
+        The fully received responses from the LLM, in the same order as the data.
+    """
+    import asyncio
+
+    semaphore = asyncio.Semaphore(concurrency or config.max_concurrency)
+
+    async def complete(data: "StringDict") -> AsyncResponse:
+        async with semaphore:
+            response = await arun(config, prompt, data, options=options)
+            async for _ in response:
+                pass
+            return response
+
+    return list(await asyncio.gather(*(complete(data) for data in prompt_data)))
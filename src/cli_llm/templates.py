@@ -0,0 +1,88 @@
+"""Module for rendering prompt templates.
+
+Every prompt is rendered by one shared `jinja2.Environment`, so a prompt is only parsed and compiled the first time
+it is rendered in a process. Compiled templates are kept in a least recently used cache keyed on a hash of the
+template source. The compiled bytecode can also be kept on disk, so later processes can skip compiling too.
+
+Tools can customise the environment once, e.g. to register a filter:
+
+```python
+from cli_llm.templates import get_environment
+
+get_environment().filters["shout"] = str.upper
+```
+"""
+
+import hashlib
+import typing as t
+from functools import cache
+
+from cli_llm._logging import ClmLogger
+
+if t.TYPE_CHECKING:
+    from pathlib import Path
+
+    import jinja2
+    from jinja2.utils import LRUCache
+
+    from cli_llm.types import StringDict
+
+log = ClmLogger()
+
+TEMPLATE_CACHE_SIZE = 400
+"""The number of compiled templates kept in memory."""
+
+TEMPLATE_BYTECODE_DIR = "templates"
+
+
+@cache
+def _sources() -> "LRUCache":
+    """The template sources by hash, for the environment's loader to look up."""
+    from jinja2.utils import LRUCache
+
+    return LRUCache(TEMPLATE_CACHE_SIZE)
+
+
+@cache
+def get_environment() -> "jinja2.Environment":
+    """The environment used to render every prompt."""
+    import jinja2
+
+    # Prompts are not HTML, so they are rendered as is, the same as `jinja2.Template` does.
+    return jinja2.Environment(  # noqa: S701
+        loader=jinja2.FunctionLoader(_sources().get),
+        cache_size=TEMPLATE_CACHE_SIZE,
+        # Templates are looked up by a hash of their source, so they can never be out of date.
+        auto_reload=False,
+    )
+
+
+def reset_environment() -> None:
+    """Forget the environment and the templates compiled by this process."""
+    get_environment.cache_clear()
+    _sources.cache_clear()
+
+
+def enable_bytecode_cache(directory: "Path") -> None:
+    """Keep the bytecode of compiled templates in the given directory, for use by later processes."""
+    import jinja2
+
+    environment = get_environment()
+    if isinstance(
+        environment.bytecode_cache, jinja2.FileSystemBytecodeCache
+    ) and environment.bytecode_cache.directory == str(directory):
+        return
+    directory.mkdir(parents=True, exist_ok=True)
+    environment.bytecode_cache = jinja2.FileSystemBytecodeCache(str(directory))
+
+
+def get_template(source: str) -> "jinja2.Template":
+    """Get the compiled template for the given source, compiling it if it has not been seen recently."""
+    name = hashlib.sha256(source.encode()).hexdigest()
+    _sources()[name] = source
+    return get_environment().get_template(name)
+
+
+def render(source: str, data: "StringDict") -> str:
+    """Render the template source with the given data."""
+    return get_template(source).render(**data)
@@ -0,0 +1,182 @@
+"""Module for counting the tokens of prompts, to keep them within the context of the model.
+
+Tokens are counted by the tokenizer registered for the model, falling back to an estimate from the UTF-8 length of
+the text, which is fast and close enough for budgeting. A tool can register an exact tokenizer for the models it uses:
+
+```python
+import tiktoken
+
+from cli_llm.tokens import register_tokenizer
+
+encoding = tiktoken.get_encoding("o200k_base")
+register_tokenizer("gpt-4o*", lambda text: len(encoding.encode(text)))
+```
+"""
+
+import fnmatch
+import typing as t
+
+from cli_llm import errors, templates
+from cli_llm._logging import ClmLogger
+
+if t.TYPE_CHECKING:
+    from collections.abc import Callable, Sequence
+
+    from cli_llm.config import ClmConfig
+    from cli_llm.map_reduce import FileItem
+    from cli_llm.types import StringDict
+
+log = ClmLogger()
+
+BYTES_PER_TOKEN = 4
+"""The average number of UTF-8 bytes per token assumed by the fallback tokenizer."""
+
+RESPONSE_TOKENS = 1024
+"""The tokens of the context left for the response by default when fitting files into a prompt."""
+
+type Tokenizer = Callable[[str], int]
+"""Counts the tokens in a text."""
+
+
+def count_bytes(text: str) -> int:
+    """Estimate the tokens in the text from its length in UTF-8 bytes."""
+    return -(-len(text.encode()) // BYTES_PER_TOKEN)
+
+
+_tokenizers: "dict[str, Tokenizer]" = {}
+
+
+def register_tokenizer(pattern: str, tokenizer: "Tokenizer") -> None:
+    """Count the tokens for the models whose ids match the glob pattern with the tokenizer.
+
+    Later registrations take precedence over earlier ones whose patterns also match.
+    """
+    _tokenizers.pop(pattern, None)
+    _tokenizers[pattern] = tokenizer
+
+
+def unregister_tokenizer(pattern: str) -> None:
+    """Forget the tokenizer registered for the pattern, if any."""
+    _tokenizers.pop(pattern, None)
+
+
+def get_tokenizer(model_id: str) -> "Tokenizer":
+    """The tokenizer registered for the model, or `count_bytes` if there is none."""
+    for pattern, tokenizer in reversed(_tokenizers.items()):
+        if fnmatch.fnmatchcase(model_id, pattern):
+            return tokenizer
+    return count_bytes
+
+
+def chunk_budget(config: "ClmConfig", model_id: str, chunk_tokens: int | None = None) -> int:
+    """The most tokens each of many prompts should use, e.g. the chunks of a map-reduce.
+
+    Args:
+        config: The LLM configuration object.
+        model_id: The id of the model the prompts are sent to.
+        chunk_tokens: The most tokens wanted. Defaults to `map_reduce_chunk_tokens` from the config.
+
+    Returns:
+        The tokens wanted, capped by the context size of the model, if it is configured, less room for the response
+        of up to `RESPONSE_TOKENS` and half the context.
+    """
+    budget = chunk_tokens or config.map_reduce_chunk_tokens
+    context = config.context_tokens(model_id)
+    if context is None:
+        return budget
+    return min(budget, context - min(RESPONSE_TOKENS, context // 2))
+
+
+def _truncate_to_fit(item: "FileItem", fits: "Callable[[FileItem], bool]") -> "FileItem | None":
+    """Cut the contents of the file, between lines where possible, to the longest prefix that fits."""
+    from cli_llm.helpers import TRUNCATION_MARKER
+
+    name, contents = item
+
+    def cut(length: int) -> "FileItem":
+        kept = contents[:length]
+        omitted = len(contents.encode()) - len(kept.encode())
+        return name, kept + TRUNCATION_MARKER.format(omitted=omitted)
+
+    low, high = 0, len(contents)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if fits(cut(middle)):
+            low = middle
+        else:
+            high = middle - 1
+    if low == 0:
+        return None
+    line_end = contents.rfind("\n", 0, low) + 1
+    return cut(line_end or low)
+
+
+def fit_files(  # noqa: PLR0913
+    config: "ClmConfig",
+    prompt: str,
+    files: "Sequence[FileItem]",
+    *,
+    prompt_data: "StringDict | None" = None,
+    key: str = "files",
+    budget: int | None = None,
+    priority: "Callable[[FileItem], t.Any] | None" = None,
+    response_tokens: int = RESPONSE_TOKENS,
+) -> "list[FileItem]":
+    """Keep the files that fit in one prompt, in order of priority, truncating the first file that does not fit.
+
+    Files are added in order of priority while they fit. The first file that does not fit is truncated to fill the
+    rest of the budget, marking where it was cut, if any of it fits. No other file is truncated, the rest are left
+    out unless a smaller file still fits whole.
+
+    Args:
+        config: The LLM configuration object.
+        prompt: The prompt the files are rendered into.
+        files: The `(path, contents)` pairs, e.g. from `helpers.gather_file_contents`.
+        prompt_data: The rest of the data the prompt is rendered with.
+        key: The name the files are rendered as.
+        budget: The most tokens the rendered prompt can use. Defaults to the context size of the model, from
+            `ll_model_context_tokens`, less `response_tokens`, or `map_reduce_chunk_tokens` if that is not configured.
+        priority: The priority of a file, highest first. Defaults to keeping the files in order.
+        response_tokens: The tokens of the context left for the response.
+
+    Returns:
+        The files that fit, in their original order.
+
+    Raises:
+        TokenBudgetError: If the prompt without any files does not fit the budget.
+    """
+    model_id = config.model().model_id
+    if budget is None:
+        context = config.context_tokens(model_id)
+        budget = config.map_reduce_chunk_tokens if context is None else context - response_tokens
+    count = get_tokenizer(model_id)
+    data = prompt_data or {}
+
+    def tokens(items: "list[FileItem]") -> int:
+        return count(templates.render(prompt, data | {key: items}))
+
+    base = tokens([])
+    if base >= budget:
+        raise errors.TokenBudgetError(base, budget)
+
+    used = base
+    kept: dict[int, FileItem] = {}
+    cut = False
+    order = sorted(range(len(files)), key=lambda i: priority(files[i]), reverse=True) if priority else range(len(files))
+    for i in order:
+        room = budget - used
+        cost = tokens([files[i]]) - base
+        if cost <= room:
+            kept[i] = files[i]
+            used += cost
+            continue
+        if cut:
+            continue
+        cut = True
+        if truncated := _truncate_to_fit(files[i], lambda item: tokens([item]) - base <= room):  # noqa: B023
+            kept[i] = truncated
+            used += tokens([truncated]) - base
+            log.info("Truncating %s to fit the %s token budget", truncated[0], budget)
+    if len(kept) < len(files):
+        log.info("Leaving out %s of %s files to fit the %s token budget", len(files) - len(kept), len(files), budget)
+    return [kept[i] for i in sorted(kept)]
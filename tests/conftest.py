@@ -1,11 +1,17 @@
+import asyncio
+import zlib
 from pathlib import Path
 
 import llm
 import pytest
 from click.testing import CliRunner
+from llm.models import AsyncModel, EmbeddingModel
 from llm.plugins import pm
 from pydantic import Field
 
+from cli_llm._logging import ClmLogger
+from cli_llm._models import clear_memo
+
 
 # Using the mock model defined in llm's tests.
 class MockModel(llm.Model):
@@ -17,6 +23,7 @@ class MockModel(llm.Model):
     def __init__(self):
         self.history = []
         self._queue = []
+        self.usage = None
 
     def enqueue(self, messages):
         assert isinstance(messages, list)
@@ -31,6 +38,53 @@ class MockModel(llm.Model):
                 break
             except IndexError:
                 break
+        if self.usage is not None:
+            response.set_usage(input=self.usage[0], output=self.usage[1])
+
+
+class AsyncMockModel(AsyncModel):
+    model_id = "mock"
+
+    def __init__(self):
+        self.history = []
+        self._queue = []
+        self.in_flight = 0
+        self.most_in_flight = 0
+
+    def enqueue(self, messages):
+        assert isinstance(messages, list)
+        self._queue.append(messages)
+
+    async def execute(self, prompt, stream, response, conversation):
+        self.history.append((prompt, stream, response, conversation))
+        self.in_flight += 1
+        self.most_in_flight = max(self.most_in_flight, self.in_flight)
+        try:
+            messages = self._queue.pop(0) if self._queue else []
+            for message in messages:
+                await asyncio.sleep(0)
+                yield message
+        finally:
+            self.in_flight -= 1
+
+
+class MockEmbeddingModel(EmbeddingModel):
+    """Embeds the words of each text as counts in a few buckets, so texts sharing words are similar."""
+
+    model_id = "mock-embed"
+    dimensions = 16
+
+    def __init__(self):
+        self.batches = []
+
+    def embed_batch(self, items):
+        items = list(items)
+        self.batches.append(items)
+        for item in items:
+            vector = [0.0] * self.dimensions
+            for word in item.lower().split():
+                vector[zlib.crc32(word.strip(".,:()").encode()) % self.dimensions] += 1
+            yield vector
 
 
 @pytest.fixture
@@ -38,20 +92,59 @@ def mock_model():
     return MockModel()
 
 
+@pytest.fixture
+def async_mock_model():
+    return AsyncMockModel()
+
+
+@pytest.fixture
+def mock_embedding_model():
+    return MockEmbeddingModel()
+
+
 @pytest.fixture(autouse=True)
-def register_embed_demo_model(mock_model):
+def register_embed_demo_model(mock_model, async_mock_model, mock_embedding_model):
     class MockModelsPlugin:
         __name__ = "MockModelsPlugin"
 
         @llm.hookimpl
         def register_models(self, register):
-            register(mock_model)
+            register(mock_model, async_mock_model)
+
+        @llm.hookimpl
+        def register_embedding_models(self, register):
+            register(mock_embedding_model)
 
     pm.register(MockModelsPlugin(), name="undo-mock-models-plugin")
     try:
         yield
     finally:
         pm.unregister(name="undo-mock-models-plugin")
+        clear_memo()
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache_dir(tmp_path_factory, monkeypatch):
+    cache_dir = tmp_path_factory.mktemp("cache")
+    monkeypatch.setenv("CACHE_DIR", str(cache_dir))
+    return cache_dir
+
+
+@pytest.fixture(autouse=True)
+def reset_verbosity():
+    """Reset the shared logger after each test, as `clm -q` leaves it quiet for the tests after it."""
+    yield
+    ClmLogger().set_verbosity(verbose=0, quiet=False)
+
+
+@pytest.fixture
+def debug_logging():
+    log = ClmLogger()
+    log.set_verbosity(verbose=2, quiet=False)
+    try:
+        yield log
+    finally:
+        log.set_verbosity(verbose=0, quiet=False)
 
 
 PYPROJECT_TOML = {"tool": {"cli-llm": {"ll_model": "mock", "tools_dir": "tools"}}}
@@ -94,3 +187,10 @@ def example_project(request, temp_fs_factory):
 
     with temp_fs.chdir():
         yield CliRunner(mix_stderr=False)
+
+
+@pytest.fixture(autouse=True)
+def isolated_run_history(tmp_path_factory, monkeypatch):
+    history_file = tmp_path_factory.mktemp("data") / "history.sqlite3"
+    monkeypatch.setenv("RUN_HISTORY_FILE", str(history_file))
+    return history_file
@@ -0,0 +1,290 @@
+import threading
+from pathlib import Path
+
+import click
+import pytest
+from click.testing import CliRunner
+from logot import Logot, logged
+
+from cli_llm._batch import BatchRunner, BatchSummary, expand_inputs
+from cli_llm.cli import cli
+from tests.conftest import PYPROJECT_TOML
+
+TOOLS = {
+    "echo.py": """
+import click
+
+@click.command()
+@click.argument("path")
+@click.option("--upper", is_flag=True)
+def tool(path, upper):
+    click.echo(path.upper() if upper else path)
+""",
+    "flaky.py": """
+import click
+
+attempts = {}
+
+@click.command()
+@click.argument("failures", type=int)
+@click.argument("path")
+def tool(failures, path):
+    attempts[path] = attempts.get(path, 0) + 1
+    if attempts[path] <= failures:
+        raise ConnectionError("try again")
+    click.echo(f"{path} after {attempts[path]}")
+""",
+    "broken.py": """
+import click
+
+from cli_llm import errors
+
+@click.command()
+@click.argument("path")
+def tool(path):
+    if path == "b.txt":
+        raise errors.CliLlmError(f"broken on {path}")
+""",
+    "interrupts.py": """
+import click
+
+@click.command()
+@click.argument("path")
+def tool(path):
+    if path == "a.txt":
+        raise KeyboardInterrupt
+    click.echo(path)
+""",
+    "exits.py": """
+import click
+
+@click.command()
+@click.argument("path")
+@click.pass_context
+def tool(ctx, path):
+    ctx.exit(0 if path == "a.txt" else 3)
+""",
+}
+
+
+@pytest.fixture
+def batch_project(request, temp_fs_factory):
+    temp_fs = temp_fs_factory.mktemp(request.node.name)
+    temp_fs.gen(
+        {
+            "pyproject.toml": PYPROJECT_TOML,
+            "tools": TOOLS | {"example.py": Path("tests/example.py").read_text()},
+            "a.txt": "",
+            "b.txt": "",
+            "docs": {"c.md": "", "nested": {"d.md": ""}},
+            "inputs.txt": "# The inputs\nb.txt\n\na.txt\nb.txt\n",
+        }
+    )
+    with temp_fs.chdir():
+        yield CliRunner(mix_stderr=False)
+
+
+@pytest.mark.usefixtures("batch_project")
+@pytest.mark.parametrize(
+    ("values", "expected"),
+    [
+        (["*.txt"], ["a.txt", "b.txt", "inputs.txt"]),
+        (["docs/**/*.md"], ["docs/c.md", "docs/nested/d.md"]),
+        (["@inputs.txt"], ["b.txt", "a.txt"]),
+        (["b.txt", "*.txt"], ["b.txt", "a.txt", "inputs.txt"]),
+        (["missing*"], []),
+    ],
+)
+def test_expand_inputs(values, expected):
+    assert expand_inputs(values) == expected
+
+
+def test_batch(batch_project):
+    result = batch_project.invoke(cli, ["batch", "echo", "-i", "[ab].txt", "--upper"])
+
+    assert result.exit_code == 0
+    assert sorted(result.stdout.splitlines()) == ["A.TXT", "B.TXT"]
+    assert "2 succeeded, 0 failed" in result.stderr
+
+
+def test_batch_placeholder(batch_project):
+    result = batch_project.invoke(cli, ["batch", "-i", "a.txt", "echo", "--", "prefix-{}"])
+
+    assert result.exit_code == 0
+    assert result.stdout == "prefix-a.txt\n"
+
+
+def test_batch_inputs_from_stdin(batch_project):
+    result = batch_project.invoke(cli, ["batch", "echo", "-i", "@-"], input="a.txt\n")
+
+    assert result.exit_code == 0
+    assert result.stdout == "a.txt\n"
+
+
+def test_batch_uses_the_config(batch_project, mock_model):
+    for _ in range(2):
+        mock_model.enqueue(["hello"])
+
+    result = batch_project.invoke(cli, ["-q", "batch", "example", "summarise", "-i", "[ab].txt", "--", "--test", "{}"])
+
+    assert result.exit_code == 0
+    assert sorted(result.stdout.splitlines()) == ["hellotest: a.txt", "hellotest: b.txt"]
+
+
+def test_batch_dry_run(batch_project, mock_model):
+    result = batch_project.invoke(
+        cli, ["--dry-run", "batch", "example", "summarise", "-i", "[ab].txt", "--", "--test", "{}"]
+    )
+
+    assert result.exit_code == 0
+    assert result.stdout == ""
+    assert "2 succeeded, 0 failed" in result.stderr
+    assert mock_model.history == []
+
+
+def test_batch_rpm_limits_the_model_requests(batch_project, monkeypatch):
+    configs = []
+
+    def run(runner, inputs):
+        configs.append(runner.ctx.obj)
+        return BatchSummary(len(inputs), 0)
+
+    monkeypatch.setattr(BatchRunner, "run", run)
+
+    result = batch_project.invoke(cli, ["batch", "--rpm", "30", "echo", "-i", "a.txt"])
+
+    assert result.exit_code == 0
+    [config] = configs
+    assert config.rate_limiter.interval == 2  # noqa: PLR2004
+
+
+def test_batch_retries_transient_errors(batch_project, logot: Logot):
+    result = batch_project.invoke(cli, ["batch", "--backoff", "0", "flaky", "-i", "a.txt", "2"])
+
+    assert result.exit_code == 0
+    assert result.stdout == "a.txt after 3\n"
+    logot.assert_logged(logged.warning("Retrying a.txt in 0.0s after a transient error: ConnectionError: try again"))
+
+
+def test_batch_gives_up_after_retries(batch_project, logot: Logot):
+    result = batch_project.invoke(cli, ["batch", "--backoff", "0", "--retries", "1", "flaky", "-i", "a.txt", "5"])
+
+    assert result.exit_code == 1
+    assert "0 succeeded, 1 failed" in result.stderr
+    logot.assert_logged(logged.error("Failed on a.txt after 2 attempt(s): ConnectionError: try again"))
+
+
+@pytest.mark.parametrize(
+    ("tool", "error"),
+    [
+        ("broken", "Failed on b.txt after 1 attempt(s): CliLlmError: broken on b.txt"),
+        ("exits", "Failed on b.txt after 1 attempt(s): The tool exited with code 3"),
+        ("echo --bad", "Failed on a.txt after 1 attempt(s): No such option: --bad"),
+    ],
+)
+def test_batch_does_not_retry_permanent_errors(batch_project, logot: Logot, tool, error):
+    name, *args = tool.split()
+    result = batch_project.invoke(cli, ["batch", name, "-i", "[ab].txt", *args])
+
+    assert result.exit_code == 1
+    logot.assert_logged(logged.error(error))
+
+
+def test_batch_does_not_retry_unknown_models(batch_project, logot: Logot):
+    result = batch_project.invoke(
+        cli, ["-m", "fake", "batch", "example", "summarise", "-i", "a.txt", "--", "--test", "{}"]
+    )
+
+    assert result.exit_code == 1
+    logot.assert_logged(logged.error("Failed on a.txt after 1 attempt(s): UnknownModelError: 'Unknown model: fake'"))
+
+
+@pytest.mark.usefixtures("debug_logging")
+def test_batch_interrupted(batch_project, logot: Logot):
+    result = batch_project.invoke(cli, ["batch", "-j", "1", "interrupts", "-i", "[ab].txt"])
+
+    assert result.exit_code == 1
+    assert "Aborted!" in result.stderr
+    logot.assert_logged(logged.warning("Interrupted, leaving %s of 2 inputs unfinished"))
+
+
+def test_output_is_held_back_until_the_input_finishes(capsys):
+    a_started = threading.Event()
+    b_finished = threading.Event()
+
+    def process(item):
+        if item == "a":
+            click.echo("a started, ", nl=False)
+            a_started.set()
+            b_finished.wait(5)
+            click.echo("a finished", err=True)
+        else:
+            a_started.wait(5)
+            click.echo("b")
+            b_finished.set()
+
+    runner = BatchRunner(
+        click.Context(click.Command("tool")),
+        "tool",
+        click.Command("tool"),
+        [],
+        concurrency=2,
+        retries=0,
+        backoff=0,
+    )
+    runner.process = process  # type: ignore[method-assign]
+    summary = runner.run(["a", "b"])
+
+    assert summary.succeeded == 2  # noqa: PLR2004
+    captured = capsys.readouterr()
+    assert sorted(captured.out.splitlines()) == ["a started, ", "b"]
+    assert "a finished" in captured.err
+
+
+def test_interrupt_cancels_the_queued_inputs():
+    release = threading.Event()
+    started = []
+
+    def process(item):
+        started.append(item)
+        if item == "a":
+            raise KeyboardInterrupt
+        release.wait(5)
+
+    runner = BatchRunner(
+        click.Context(click.Command("tool")),
+        "tool",
+        click.Command("tool"),
+        [],
+        concurrency=1,
+        retries=0,
+        backoff=0,
+    )
+    runner.process = process  # type: ignore[method-assign]
+    try:
+        summary = runner.run(["a", "b", "c", "d"])
+    finally:
+        release.set()
+
+    assert (summary.processed, summary.unfinished) == (0, 4)
+    assert set(started) <= {"a", "b"}
+
+
+def test_batch_without_inputs(batch_project):
+    result = batch_project.invoke(cli, ["batch", "echo", "-i", "missing*"])
+
+    assert result.exit_code == 2  # noqa: PLR2004
+    assert "No inputs matched: missing*" in result.stderr
+
+
+def test_batch_unknown_tool(batch_project):
+    result = batch_project.invoke(cli, ["batch", "fake", "-i", "a.txt"])
+
+    assert result.exit_code == 2  # noqa: PLR2004
+    assert "Unrecognized tool command `fake`" in result.stderr
+
+
+def test_summary_throughput():
+    assert BatchSummary(10, 30).per_minute == 20  # noqa: PLR2004
+    assert BatchSummary(10, 30, unfinished=5).per_minute == 10  # noqa: PLR2004
+    assert BatchSummary(0, 0).per_minute == 0
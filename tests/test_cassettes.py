@@ -0,0 +1,180 @@
+import asyncio
+import json
+
+import llm
+import pytest
+from llm.models import AsyncKeyModel, KeyModel
+from llm.plugins import pm
+from logot import Logot, logged
+
+from cli_llm import _cassettes, errors
+from cli_llm._cassettes import (
+    AsyncRecordingModel,
+    AsyncReplayModel,
+    Cassette,
+    RecordingModel,
+    ReplayModel,
+    cassette_key,
+    with_cassettes,
+)
+from cli_llm.config import ClmConfig
+
+
+@pytest.fixture(autouse=True)
+def replay_plugin():
+    if pm.get_plugin("cli_llm_replay") is None:
+        pm.register(_cassettes, name="cli_llm_replay")
+
+
+class FakeTime:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps: list[float] = []
+
+    def perf_counter(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    fake = FakeTime()
+    monkeypatch.setattr(_cassettes, "time", fake)
+    return fake.sleeps
+
+
+def _cassette(tmp_path, prompt, chunks, **options):
+    model = ReplayModel(tmp_path)
+    key = cassette_key(model.prompt(prompt, **options).prompt)
+    Cassette("gpt", prompt, "", options, chunks, input_tokens=3, output_tokens=len(chunks)).save(
+        tmp_path / f"{key}.json"
+    )
+
+
+def test_record_and_replay(tmp_path, mock_model, sleeps):
+    mock_model.enqueue(["Hello", " world"])
+    mock_model.usage = (2, 5)
+    recording = RecordingModel(llm.get_model("mock"), tmp_path)
+
+    assert recording.prompt("Say hello", max_tokens=10).text() == "Hello world"
+
+    [path] = tmp_path.iterdir()
+    cassette = Cassette.load(path)
+    assert cassette.model_id == "mock"
+    assert cassette.prompt == "Say hello"
+    assert cassette.options == {"max_tokens": 10}
+    assert [chunk for _, chunk in cassette.chunks] == ["Hello", " world"]
+    assert (cassette.input_tokens, cassette.output_tokens) == (2, 5)
+
+    response = ReplayModel(tmp_path, speed=0).prompt("Say hello", max_tokens=10)
+    assert response.text() == "Hello world"
+    assert (response.input_tokens, response.output_tokens) == (2, 5)
+    assert sleeps == []
+
+
+def test_recording_describes_the_model(tmp_path, mock_model):
+    recording = RecordingModel(mock_model, tmp_path)
+
+    assert str(recording) == "MockModel: mock (recording)"
+    assert recording.model_id == "mock"
+    assert recording.Options is mock_model.Options
+
+
+def test_recording_a_key_model(tmp_path):
+    class Keyed(KeyModel):
+        model_id = "keyed"
+        needs_key = "keyed"
+        key = "secret"
+
+        def execute(self, prompt, stream, response, conversation, key):  # noqa: ARG002
+            yield key
+
+    assert RecordingModel(Keyed(), tmp_path).prompt("Hi").text() == "secret"
+    assert len(list(tmp_path.iterdir())) == 1
+
+
+@pytest.mark.usefixtures("debug_logging")
+def test_recording_failures_are_logged(tmp_path, mock_model, logot: Logot):
+    mock_model.enqueue(["Hello"])
+    (tmp_path / "file").touch()
+
+    assert RecordingModel(mock_model, tmp_path / "file").prompt("Hi").text() == "Hello"
+    logot.assert_logged(logged.warning("Could not save the cassette %s"))
+
+
+def test_replay_keeps_the_recorded_timing(tmp_path, sleeps):
+    _cassette(tmp_path, "Hi", [(0.5, "a"), (0.25, "b"), (0.0, "c")], temperature=0.2)
+
+    assert ReplayModel(tmp_path, speed=2).prompt("Hi", temperature=0.2).text() == "abc"
+    assert sleeps == [1.0, 0.5]
+
+
+def test_replay_without_a_cassette(tmp_path):
+    with pytest.raises(errors.CassetteNotFoundError, match="record one with `--record DIR`"):
+        ReplayModel(tmp_path).prompt("Hi").text()
+
+    with pytest.raises(errors.CassetteNotFoundError, match="needs a directory of cassettes"):
+        ReplayModel().prompt("Hi").text()
+
+
+def test_replay_of_an_unsupported_cassette(tmp_path):
+    _cassette(tmp_path, "Hi", [(0.0, "a")])
+    [path] = tmp_path.iterdir()
+    path.write_text(json.dumps({**json.loads(path.read_text()), "format": 0}))
+
+    with pytest.raises(errors.CassetteNotFoundError, match="unsupported format 0"):
+        ReplayModel(tmp_path).prompt("Hi").text()
+
+
+def test_async_record_and_replay(tmp_path, async_mock_model):
+    async_mock_model.enqueue(["Hello", " world"])
+    recording = AsyncRecordingModel(llm.get_async_model("mock"), tmp_path)
+
+    async def text(model, prompt):
+        return await model.prompt(prompt).text()
+
+    assert str(recording) == "AsyncMockModel (async): mock (recording)"
+    assert asyncio.run(text(recording, "Hi")) == "Hello world"
+    assert asyncio.run(text(AsyncReplayModel(tmp_path, speed=0), "Hi")) == "Hello world"
+
+
+def test_async_recording_a_key_model(tmp_path):
+    class Keyed(AsyncKeyModel):
+        model_id = "keyed"
+        needs_key = "keyed"
+        key = "secret"
+
+        async def execute(self, prompt, stream, response, conversation, key):  # noqa: ARG002
+            yield key
+
+    async def text():
+        return await AsyncRecordingModel(Keyed(), tmp_path).prompt("Hi").text()
+
+    assert asyncio.run(text()) == "secret"
+
+
+def test_with_cassettes(tmp_path, mock_model, async_mock_model):
+    plain = with_cassettes(mock_model, record_dir=None, replay_dir=None, replay_speed=1)
+    recording = with_cassettes(mock_model, record_dir=tmp_path, replay_dir=None, replay_speed=1)
+    async_recording = with_cassettes(async_mock_model, record_dir=tmp_path, replay_dir=None, replay_speed=1)
+    replay = with_cassettes(ReplayModel(), record_dir=tmp_path, replay_dir=tmp_path, replay_speed=0.5)
+
+    assert plain is mock_model
+    assert isinstance(recording, RecordingModel)
+    assert isinstance(async_recording, AsyncRecordingModel)
+    assert isinstance(replay, ReplayModel)
+    assert (replay.directory, replay.speed) == (tmp_path, 0.5)
+
+
+def test_config_replays_the_cassettes(tmp_path):
+    config = ClmConfig(ll_model="replay", replay_dir=tmp_path, replay_speed=0)
+
+    model = config.model()
+    async_model = config.async_model()
+
+    assert isinstance(model, ReplayModel)
+    assert isinstance(async_model, AsyncReplayModel)
+    assert model.directory == async_model.directory == tmp_path
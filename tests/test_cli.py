@@ -1,3 +1,4 @@
+import re
 from pathlib import Path
 
 from logot import Logot, logged
@@ -20,6 +21,72 @@ def test_run_tool_with_printing(fake_project):
     assert result.stderr == "Prompting MockModel: mock\n\n"
 
 
+def test_run_tool_with_transcript(fake_project):
+    result = fake_project.invoke(cli, ["--transcript", "out.txt", "run", "example", "summarise", "--test", "value1"])
+
+    assert result.exit_code == 0
+    assert Path("out.txt").read_text() == "Prompting MockModel: mock\n\n"
+
+
+def test_run_tool_with_dry_run(fake_project):
+    result = fake_project.invoke(cli, ["--dry-run", "run", "example", "summarise", "--test", "value1"])
+
+    assert result.exit_code == 0
+    assert "Dry run of mock" in result.stderr
+    assert "Prompting" not in result.stderr
+
+
+def test_run_tool_with_timings(fake_project):
+    result = fake_project.invoke(cli, ["--timings", "run", "example", "summarise", "--test", "value1"])
+
+    assert result.exit_code == 0
+    assert "Timings" in result.stderr
+    for phase in ("config load", "tool discovery", "render", "model resolution", "first token", "completion"):
+        assert re.search(rf"{phase}\s+│ 1 ", result.stderr)
+
+
+def test_run_tool_with_profile(fake_project, isolated_cache_dir):
+    result = fake_project.invoke(cli, ["--profile", "cprofile", "run", "example", "summarise", "--test", "value1"])
+
+    assert result.exit_code == 0
+    assert "Wrote the profile to" in result.stderr
+    collapsed, pstats = sorted((isolated_cache_dir / "profiles").glob("example-*"))
+    assert collapsed.suffix == ".collapsed"
+    assert pstats.suffix == ".pstats"
+
+
+def test_record_and_replay_a_tool_run(fake_project, mock_model):
+    mock_model.enqueue(["Recorded ", "response\n"])
+    recorded = fake_project.invoke(cli, ["--record", "cassettes", "run", "example", "summarise", "--test", "value1"])
+
+    replayed = fake_project.invoke(
+        cli, ["--replay", "cassettes", "--replay-speed", "0", "run", "example", "summarise", "--test", "value1"]
+    )
+
+    assert recorded.exit_code == replayed.exit_code == 0
+    assert recorded.stderr == "Prompting MockModel: mock (recording)\n\n"
+    assert replayed.stderr == "Prompting ReplayModel: replay\n\n"
+    assert replayed.stdout == recorded.stdout == "Recorded response\ntest: value1\n"
+    assert len(list(Path("cassettes").iterdir())) == 1
+
+
+def test_stats(fake_project):
+    fake_project.invoke(cli, ["run", "example", "summarise", "--test", "value1"])
+
+    result = fake_project.invoke(cli, ["stats", "--prometheus", "stats.prom"])
+
+    assert result.exit_code == 0
+    assert "Run history" in result.stderr
+    assert 'clm_runs{tool="example summarise",model="mock"} 1' in Path("stats.prom").read_text()
+
+
+def test_stats_without_runs(fake_project):
+    result = fake_project.invoke(cli, ["stats", "--by", "day", "--tool", "fake", "--model", "mock", "--days", "1"])
+
+    assert result.exit_code == 0
+    assert result.stderr == "No runs have been recorded\n"
+
+
 def test_run_tool_with_info(fake_project, logot: Logot):
     fake_project.invoke(cli, ["-v", "run", "example", "summarise", "--test", "value1"])
 
@@ -1,9 +1,19 @@
+import json
+from dataclasses import replace
 from pathlib import Path
 
+import click
 import pytest
+from click.shell_completion import ShellComplete
+from click.testing import CliRunner
+from logot import logged
 
 from cli_llm import errors
-from cli_llm._cli_utils import load_tool_script
+from cli_llm._cli_utils import ToolGatherer
+from cli_llm._discovery import inspect_tool_script, load_tool_script
+from cli_llm._manifest import MANIFEST_FILE, ToolManifest, ToolStatus
+from cli_llm.cli import cli
+from cli_llm.config import ClmConfig
 
 
 def test_module_loads_correctly():
@@ -15,3 +25,128 @@ def test_module_loads_correctly():
 def test_file_not_found():
     with pytest.raises(errors.InvalidModuleError, match="fake"):
         load_tool_script(Path("tests") / "fake.py")
+
+
+def test_listing_reuses_the_manifest(fake_project, logot):
+    fake_project.invoke(cli, ["run", "--help"])
+    load_tool_script.cache_clear()
+    result = fake_project.invoke(cli, ["-vv", "run", "--help"])
+
+    assert result.exit_code == 0
+    assert "The sub root of this example command." in result.output
+    logot.assert_logged(logged.warning("The module `no_attr` does not have an attribute `tool`"))
+    logot.assert_not_logged(logged.info("Loading tool from: %s/example.py"))
+
+
+def test_listing_retries_failed_imports(fake_project, logot):
+    fake_project.invoke(cli, ["run", "--help"])
+    load_tool_script.cache_clear()
+    fake_project.invoke(cli, ["-vv", "run", "--help"])
+
+    logot.assert_logged(logged.info("Loading tool from: %s/bad_module.py"))
+    logot.assert_logged(logged.warning("Failed to get the tool script from `bad_module` due to: division by zero"))
+
+
+def test_listing_reimports_changed_scripts(fake_project, logot):
+    fake_project.invoke(cli, ["run", "--help"])
+    Path("tools/skip.py").write_text('import click\n\n\n@click.command()\ndef tool():\n    """Now a tool."""\n')
+    load_tool_script.cache_clear()
+    result = fake_project.invoke(cli, ["-vv", "run", "--help"])
+
+    assert "Now a tool." in result.output
+    logot.assert_logged(logged.info("Loading tool from: %s/skip.py"))
+
+
+def test_listing_drops_removed_scripts(fake_project, isolated_cache_dir):
+    fake_project.invoke(cli, ["run", "--help"])
+    Path("tools/skip.py").unlink()
+    fake_project.invoke(cli, ["run", "--help"])
+
+    manifest = json.loads((isolated_cache_dir / MANIFEST_FILE).read_text())
+    assert not any(path.endswith("skip.py") for path in manifest["entries"])
+
+
+def test_listing_hides_hidden_tools(fake_project):
+    Path("tools/hidden.py").write_text("import click\n\n\n@click.command(hidden=True)\ndef tool():\n    pass\n")
+    result = fake_project.invoke(cli, ["run", "--help"])
+
+    assert "hidden" not in result.output
+    assert "example" in result.output
+
+
+def test_listing_without_tools(named_temp_fs):
+    named_temp_fs.gen({"pyproject.toml": {"tool": {"cli-llm": {"ll_model": "mock", "tools_dir": "tools"}}}})
+    (named_temp_fs / "tools").mkdir()
+
+    with named_temp_fs.chdir():
+        result = CliRunner(mix_stderr=False).invoke(cli, ["run", "--help"])
+
+    assert result.exit_code == 0
+    assert "Commands" not in result.output
+
+
+@pytest.mark.usefixtures("fake_project")
+def test_shell_completion_uses_the_manifest():
+    completions = ShellComplete(cli, {}, "clm", "_CLM_COMPLETE").get_completions(["run"], "ex")
+
+    assert [(item.value, item.help) for item in completions] == [("example", "The sub root of this example command.")]
+
+
+class TestToolManifest:
+    def test_unreadable_manifest_is_ignored(self, tmp_path):
+        path = tmp_path / MANIFEST_FILE
+        path.write_text("not json")
+
+        manifest = ToolManifest.load(path)
+
+        assert manifest.lookup(path, path.stat(), "import") is None
+
+    def test_unknown_format_is_ignored(self, tmp_path):
+        path = tmp_path / MANIFEST_FILE
+        path.write_text(json.dumps({"format": -1, "entries": {str(path): {}}}))
+
+        manifest = ToolManifest.load(path)
+
+        assert manifest.lookup(path, path.stat(), "import") is None
+
+    def test_version_change_invalidates_entries(self, tmp_path):
+        script = tmp_path / "skip.py"
+        script.write_text("tool = None")
+        entry = replace(inspect_tool_script("skip", script), version="0.0.0")
+        manifest = ToolManifest(tmp_path / MANIFEST_FILE)
+        manifest.update(entry)
+
+        assert manifest.lookup(script, script.stat(), "import") is None
+
+    def test_round_trip(self, tmp_path):
+        script = tmp_path / "skip.py"
+        script.write_text("tool = None")
+        manifest = ToolManifest(tmp_path / "nested" / MANIFEST_FILE)
+        manifest.update(inspect_tool_script("skip", script))
+        manifest.save()
+
+        entry = ToolManifest.load(tmp_path / "nested" / MANIFEST_FILE).lookup(script, script.stat(), "import")
+
+        assert entry is not None
+        assert entry.status is ToolStatus.SKIPPED
+
+    def test_write_failure_is_not_fatal(self, tmp_path):
+        script = tmp_path / "skip.py"
+        script.write_text("tool = None")
+        manifest = ToolManifest(script / MANIFEST_FILE)
+        manifest.update(inspect_tool_script("skip", script))
+
+        manifest.save()
+
+        assert not (script / MANIFEST_FILE).exists()
+
+
+@pytest.mark.usefixtures("fake_project")
+def test_list_commands_inspects_tools_once_per_context(logot):
+    gatherer = ToolGatherer()
+    ctx = click.Context(gatherer, obj=ClmConfig())
+
+    assert gatherer.list_commands(ctx) == ["example"]
+    assert gatherer.list_commands(ctx) == ["example"]
+    logot.assert_logged(logged.warning("The module `no_attr` does not have an attribute `tool`"))
+    logot.assert_not_logged(logged.warning("The module `no_attr` does not have an attribute `tool`"))
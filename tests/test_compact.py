@@ -0,0 +1,198 @@
+from pathlib import Path
+
+import pytest
+from logot import Logot, logged
+
+from cli_llm.compact import (
+    DUPLICATE_MARKER,
+    Compaction,
+    CompactionStats,
+    Compactor,
+    collapse_blank_lines,
+    python_signatures,
+    strip_license_header,
+    strip_python_comments,
+)
+
+PYTHON = '''"""A module.
+
+With more detail.
+"""
+
+import os  # for paths
+
+
+class Thing:
+    """A thing.
+
+    At length.
+    """
+
+    size = 1
+
+    def grow(self, by: int = 1) -> int:
+        """Grow the thing."""
+        # The thing grows.
+        self.size += by
+        return self.size
+
+
+class Empty:
+    pass
+
+
+async def fetch(url):
+    return url
+'''
+
+
+def test_collapse_blank_lines():
+    assert collapse_blank_lines("\n\na  \n\n\n\nb\t\n\n") == "a\n\nb\n"
+    assert collapse_blank_lines(" \n\n") == ""
+
+
+def test_strip_python_comments():
+    text = "#!/usr/bin/env python\nx = 1  # one\n    # alone\ny = '# not a comment'\n"
+
+    assert strip_python_comments(text) == "#!/usr/bin/env python\nx = 1\ny = '# not a comment'\n"
+
+
+def test_strip_python_comments_of_untokenizable_source():
+    assert strip_python_comments("x = (  # open\n") == "x = (  # open\n"
+
+
+def test_python_signatures():
+    assert python_signatures(PYTHON) == (
+        '"""A module."""\n'
+        "import os\n\n"
+        "class Thing:\n"
+        '    """A thing."""\n'
+        "    size = 1\n\n"
+        "    def grow(self, by: int=1) -> int:\n"
+        '        """Grow the thing."""\n'
+        "        ...\n\n"
+        "class Empty:\n"
+        "    pass\n\n"
+        "async def fetch(url):\n"
+        "    ...\n"
+    )
+
+
+def test_python_signatures_of_invalid_source():
+    assert python_signatures("def broken(:\n") is None
+
+
+@pytest.mark.parametrize(
+    ("text", "expected"),
+    [
+        ("# Copyright 2024 Someone\n# MIT License\n\nimport os\n", "import os\n"),
+        ("#!/bin/sh\n# SPDX-License-Identifier: MIT\necho hi\n", "#!/bin/sh\necho hi\n"),
+        ("/*\n * Licensed under the Apache License\n */\nint x;\n", "int x;\n"),
+        ("<!-- Copyright Someone -->\n<p>hi</p>\n", "<p>hi</p>\n"),
+        ("# Helpers for paths.\nimport os\n", "# Helpers for paths.\nimport os\n"),
+        ("import os\n# Copyright Someone\n", "import os\n# Copyright Someone\n"),
+    ],
+)
+def test_strip_license_header(text, expected):
+    assert strip_license_header(text) == expected
+
+
+@pytest.mark.parametrize(
+    ("name", "text", "expected"),
+    [
+        ("a.js", 'let a = "// kept"; // gone\n  // gone\n/* gone */ let b = 1;\n', 'let a = "// kept";\n let b = 1;\n'),
+        ("a.css", "/* gone */\na { color: red; } /* gone */\n", "a { color: red; }\n"),
+        ("a.css", "a { background: url(//example.com); }\n", "a { background: url(//example.com); }\n"),
+        ("a.js", 'url.replace(/\\/\\//g, "/"); // gone\n', 'url.replace(/\\/\\//g, "/");\n'),
+        ("a.ts", "const re = /[/]*/, half = a / b; // gone\n", "const re = /[/]*/, half = a / b;\n"),
+        (
+            "a.scss",
+            "a { background: url(http://example.com/x.png); } // gone\n",
+            "a { background: url(http://example.com/x.png); }\n",
+        ),
+        ("a.yaml", "# gone\nkey: value # kept\n", "key: value # kept\n"),
+        (
+            "a.yaml",
+            "run: |\n  # kept\n\n  echo hi\n# gone\nkey: >-\n  # kept\n",
+            "run: |\n  # kept\n\n  echo hi\nkey: >-\n  # kept\n",
+        ),
+        ("a.toml", '# gone\nkey = """\n# kept\n"""\n', 'key = """\n# kept\n"""\n'),
+        ("a.sh", "# gone\ncat <<'EOF'\n# kept\nEOF\n# gone\n", "cat <<'EOF'\n# kept\nEOF\n"),
+        ("Makefile", "# gone\nall:\n\techo hi\n", "all:\n\techo hi\n"),
+        ("a.html", "<!-- gone -->\n<p>hi<!-- gone --></p>\n", "<p>hi</p>\n"),
+        ("a.txt", "# kept\n\n\n\ntext\n", "# kept\n\ntext\n"),
+    ],
+)
+def test_minify_strips_comments_by_language(name, text, expected):
+    assert Compaction().minify(Path(name), text) == expected
+
+
+def test_minify_keeps_comments():
+    text = "# Copyright Someone\nx = 1  # one\n"
+
+    assert Compaction(comments=False).minify(Path("a.py"), text) == "x = 1  # one\n"
+    assert Compaction(comments=False, license_headers=False).minify(Path("a.py"), text) == text
+
+
+def test_minify_keeps_blank_lines():
+    assert Compaction(blank_lines=False).minify(Path("a.txt"), "a\n\n\nb\n") == "a\n\n\nb\n"
+
+
+def test_minify_to_signatures():
+    compaction = Compaction(signatures=True)
+
+    assert compaction.minify(Path("a.py"), PYTHON) == python_signatures(PYTHON)
+    assert compaction.minify(Path("a.py"), "def f():\n    return 1  # one\n", complete=False) == (
+        "def f():\n    return 1\n"
+    )
+    assert compaction.minify(Path("a.js"), "function f() { return 1; }\n") == "function f() { return 1; }\n"
+
+
+def test_keeps():
+    compaction = Compaction()
+
+    assert compaction.keeps(Path("src/main.py"))
+    assert not compaction.keeps(Path("poetry.lock"))
+    assert not compaction.keeps(Path("static/app.min.js"))
+    assert not compaction.keeps(Path("LICENSE.txt"))
+    assert Compaction(drop=()).keeps(Path("poetry.lock"))
+
+
+def test_compactor_dedupes_identical_files():
+    compactor = Compactor(Compaction())
+
+    assert compactor.compact(Path("a.py"), "x = 1  # one\n") == "x = 1\n"
+    assert compactor.compact(Path("b.py"), "x = 1  # one\n") == DUPLICATE_MARKER.format(path=Path("a.py"))
+    assert compactor.compact(Path("a.py"), "x = 1  # one\n") == "x = 1\n"
+    assert compactor.compact(Path("c.py"), "") == ""
+    assert compactor.compact(Path("d.py"), "") == ""
+    assert compactor.stats.duplicates == 1
+
+
+def test_compactor_without_dedupe():
+    compactor = Compactor(Compaction(dedupe=False))
+
+    assert compactor.compact(Path("a.py"), "x = 1\n") == compactor.compact(Path("b.py"), "x = 1\n") == "x = 1\n"
+
+
+def test_compactor_stats():
+    compactor = Compactor(Compaction())
+
+    assert not compactor.keeps(Path("uv.lock"))
+    assert compactor.keeps(Path("a.py"))
+    compactor.compact(Path("a.py"), "x = 1\n\n\n\n# a comment\n")
+
+    assert compactor.stats == CompactionStats(
+        files=1, dropped=1, duplicates=0, bytes_before=21, bytes_after=6, tokens_before=6, tokens_after=2
+    )
+
+
+@pytest.mark.usefixtures("debug_logging")
+def test_report(logot: Logot):
+    CompactionStats(files=2, dropped=1, bytes_before=80, bytes_after=40, tokens_before=20, tokens_after=10).report()
+
+    logot.assert_logged(
+        logged.info(
+            "Compacted 2 files from 80 to 40 bytes, saving about 10 tokens, leaving out 1 files and 0 duplicates"
+        )
+    )
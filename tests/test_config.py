@@ -3,7 +3,9 @@ from pathlib import Path
 
 import pytest
 from click.testing import CliRunner
+from logot import Logot, logged
 
+from cli_llm import errors
 from cli_llm.cli import cli
 from cli_llm.config import ClmConfig
 
@@ -59,3 +61,91 @@ def test_frozen_fields():
 
     with pytest.raises(ValueError, match="Field is frozen"):
         config.ll_model = ""
+
+
+def test_cache_dir_expands_user():
+    config = ClmConfig(cache_dir=Path("~/cache"))
+
+    assert config.cache_dir == Path.home() / "cache"
+
+
+@pytest.fixture
+def tools_tree(named_temp_fs):
+    named_temp_fs.gen(
+        {
+            "top.py": "",
+            "notes.txt": "",
+            "nested": {"deeper": {"deep.py": ""}, "middle.py": ""},
+            ".venv": {"venv_tool.py": ""},
+            "node_modules": {"pkg": {"node_tool.py": ""}},
+            "__pycache__": {"cached.py": ""},
+            "scratch": {"scratch_tool.py": ""},
+        }
+    )
+    return named_temp_fs
+
+
+def test_tool_files_prunes_default_excludes(tools_tree):
+    config = ClmConfig(tools_dir=tools_tree)
+
+    assert list(config.tool_files) == ["deep", "middle", "scratch_tool", "top"]
+
+
+def test_tool_files_prunes_configured_excludes(tools_tree):
+    config = ClmConfig(tools_dir=tools_tree, tools_exclude=["scratch", "nested/deeper"])
+
+    assert list(config.tool_files) == ["middle", "top"]
+
+
+@pytest.mark.parametrize(("depth", "expected"), [(0, ["top"]), (1, ["middle", "scratch_tool", "top"])])
+def test_tool_files_max_depth(tools_tree, depth, expected):
+    config = ClmConfig(tools_dir=tools_tree, tools_max_depth=depth)
+
+    assert list(config.tool_files) == expected
+
+
+def test_tool_files_is_lazy_and_memoized(tools_tree):
+    config = ClmConfig(tools_dir=tools_tree)
+    (tools_tree / "late.py").write_text("")
+
+    assert "late" in config.tool_files
+    (tools_tree / "later.py").write_text("")
+    assert "later" not in config.tool_files
+
+
+@pytest.mark.usefixtures("debug_logging")
+def test_tool_files_missing_directory(named_temp_fs, logot: Logot):
+    config = ClmConfig(tools_dir=named_temp_fs / "missing")
+
+    assert config.tool_files == {}
+    logot.assert_logged(logged.info("Unable to search %s due to: %s"))
+
+
+@pytest.fixture
+def colliding_tools(named_temp_fs):
+    named_temp_fs.gen({"one": {"tool.py": ""}, "two": {"tool.py": ""}})
+    return [named_temp_fs / "one", named_temp_fs / "two"]
+
+
+@pytest.mark.parametrize(("policy", "winner"), [("first", "one"), ("last", "two")])
+@pytest.mark.usefixtures("debug_logging")
+def test_tool_collisions(colliding_tools, logot: Logot, policy, winner):
+    config = ClmConfig(tools_dir=colliding_tools, tool_collisions=policy)
+
+    assert config.tool_files["tool"].parent.name == winner
+    logot.assert_logged(logged.warning(f"The tool `tool` is defined by both %s and %s, using the {policy}"))
+
+
+def test_tool_collisions_error(colliding_tools):
+    config = ClmConfig(tools_dir=colliding_tools, tool_collisions="error")
+
+    with pytest.raises(errors.ToolNameCollisionError, match="The tool `tool` is defined by both"):
+        _ = config.tool_files
+
+
+def test_context_tokens():
+    config = ClmConfig(ll_model_context_tokens={"llama3*": 8192, "llama3.2": 131072})
+
+    assert config.context_tokens("llama3.2") == 131072  # noqa: PLR2004
+    assert config.context_tokens("llama3.1:8b") == 8192  # noqa: PLR2004
+    assert config.context_tokens("gpt-4o") is None
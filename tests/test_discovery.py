@@ -0,0 +1,157 @@
+from pathlib import Path
+
+import pytest
+from click.testing import CliRunner
+from logot import Logot, logged
+
+from cli_llm import _discovery, errors
+from cli_llm._discovery import discover_tools, parse_tool_script
+from cli_llm._manifest import ToolStatus
+from cli_llm.cli import cli
+
+GROUP_WITH_SUBCOMMAND = '''
+import click
+
+
+@click.group()
+def cli():
+    """Group docstring."""
+
+
+@cli.command()
+def sub():
+    """Sub docstring."""
+
+
+tool = cli
+'''
+
+
+@pytest.mark.parametrize(
+    ("source", "status", "help_"),
+    [
+        (Path("tests/example.py").read_text(), ToolStatus.VALID, "The sub root of this example command."),
+        (
+            "import click\n@click.command(help='From help')\ndef tool():\n    '''Docstring.'''",
+            ToolStatus.VALID,
+            "From help",
+        ),
+        ("import click\n@click.command(short_help='Short', help='Long')\ndef tool(): ...", ToolStatus.VALID, "Short"),
+        ("import click as c\n@c.command\ndef tool():\n    '''Bare.'''", ToolStatus.VALID, "Bare."),
+        ("from click import group\n@group()\nasync def tool(): ...", ToolStatus.VALID, ""),
+        ("from click import command as cmd\n@cmd()\ndef tool(): ...", ToolStatus.VALID, ""),
+        ("from click import echo, command\n@command()\ndef tool(): ...", ToolStatus.VALID, ""),
+        ("import click\ntool = click.Group(help='Built')", ToolStatus.VALID, "Built"),
+        ("from click import Command\ntool: Command = Command('x')", ToolStatus.VALID, ""),
+        ("import click\ndef f(): ...\ntool = click.command(help='Wrapped')(f)", ToolStatus.VALID, "Wrapped"),
+        (GROUP_WITH_SUBCOMMAND, ToolStatus.VALID, "Group docstring."),
+        ("tool = None", ToolStatus.SKIPPED, ""),
+        ("", ToolStatus.MISSING, ""),
+        ("1/0", ToolStatus.MISSING, ""),
+        ("import typer\napp = typer.Typer()\n@app.command()\ndef tool(): ...", ToolStatus.INVALID_TYPE, ""),
+        ("def tool(): ...", ToolStatus.INVALID_TYPE, ""),
+        ("class tool: ...", ToolStatus.INVALID_TYPE, ""),
+        ("tool = 1", ToolStatus.INVALID_TYPE, ""),
+        ("tool = [1]", ToolStatus.INVALID_TYPE, ""),
+        ("from elsewhere import make\ntool = make()", ToolStatus.UNRESOLVED, ""),
+        ("import click\ntool = None\n@click.command()\ndef tool(): ...", ToolStatus.VALID, ""),
+        ("import click\n@click.command()\ndef tool(): ...\ntool = None", ToolStatus.SKIPPED, ""),
+        ("def (:", ToolStatus.FAILED, ""),
+    ],
+)
+def test_parse_tool_script(tmp_path, source, status, help_):
+    script = tmp_path / "script.py"
+    script.write_text(source)
+
+    entry = parse_tool_script("script", script)
+
+    assert entry.status is status
+    assert entry.help == help_
+    assert entry.engine == "static"
+
+
+def test_parse_hidden_tool(tmp_path):
+    script = tmp_path / "script.py"
+    script.write_text("import click\n@click.command(hidden=True)\ndef tool(): ...")
+
+    assert parse_tool_script("script", script).hidden
+
+
+def test_parse_never_executes_the_script(tmp_path):
+    script = tmp_path / "script.py"
+    script.write_text(f"from pathlib import Path\nPath({str(tmp_path / 'ran')!r}).touch()\ntool = None")
+
+    parse_tool_script("script", script)
+
+    assert not (tmp_path / "ran").exists()
+
+
+def test_discover_tools_in_parallel(tmp_path, monkeypatch):
+    monkeypatch.setattr(_discovery, "PARALLEL_THRESHOLD", 2)
+    tool_files = {}
+    for name in ["a", "b", "c", "d", "e"]:
+        tool_files[name] = tmp_path / f"{name}.py"
+        tool_files[name].write_text(f"import click\n@click.command()\ndef tool():\n    '''Tool {name}.'''")
+
+    entries = discover_tools(tool_files, engine="static")
+
+    assert [(name, entry.help) for name, entry in entries.items()] == [(n, f"Tool {n}.") for n in "abcde"]
+
+
+@pytest.fixture
+def static_project(request, temp_fs_factory):
+    temp_fs = temp_fs_factory.mktemp(request.node.name)
+
+    temp_fs.gen(
+        {
+            "pyproject.toml": {"tool": {"cli-llm": {"ll_model": "mock", "tools_dir": "tools", "discovery": "static"}}},
+            "tools": {
+                "example.py": Path("tests/example.py").read_text(),
+                "bad_type.py": "tool = 1",
+                "skip.py": "tool = None",
+                "no_attr.py": "",
+                "bad_module.py": "1/0",
+                "dynamic.py": "tool = make_tool()",
+                "syntax.py": "def (:",
+            },
+        }
+    )
+
+    with temp_fs.chdir():
+        yield CliRunner(mix_stderr=False)
+
+
+def test_static_listing_does_not_import(static_project, logot: Logot):
+    result = static_project.invoke(cli, ["-vv", "run", "--help"])
+
+    assert result.exit_code == 0
+    assert "The sub root of this example command." in result.output
+    logot.assert_logged(
+        logged.warning("Failed to get the tool script from `syntax` due to: %s")
+        & logged.warning("The attribute `tool` in the module `dynamic` could not be statically resolved%s")
+        & logged.warning("The module `bad_module` does not have an attribute `tool`")
+    )
+    logot.assert_not_logged(logged.info("Loading tool from: %s"))
+
+
+def test_static_discovery_imports_the_tool_being_run(static_project):
+    result = static_project.invoke(cli, ["-q", "run", "example", "summarise", "--test", "value1"])
+
+    assert result.exit_code == 0
+    assert result.output == "test: value1\n"
+
+
+def test_running_an_invalid_tool(static_project):
+    result = static_project.invoke(cli, ["run", "bad_type"])
+
+    assert isinstance(result.exception, errors.InvalidToolCommandError)
+    assert str(result.exception) == "The attribute `tool` in the module `bad_type` is not of type `click.Command`"
+
+
+def test_switching_engine_rediscovers(fake_project, logot: Logot):
+    fake_project.invoke(cli, ["run", "--help"])
+    Path("pyproject.toml").write_text(Path("pyproject.toml").read_text() + 'discovery = "static"\n')
+    result = fake_project.invoke(cli, ["-vv", "run", "--help"])
+
+    assert "example" in result.output
+    logot.assert_logged(logged.warning("The module `bad_module` does not have an attribute `tool`"))
@@ -0,0 +1,78 @@
+import io
+
+from rich.console import Console
+
+from cli_llm._dry_run import TOP_FILES, Section, sections, summary, table
+from cli_llm.templates import render
+
+
+def _words(text):
+    return len(text.split())
+
+
+def _sections(prompt, prompt_data):
+    return sections(prompt, prompt_data, render(prompt, prompt_data), _words)
+
+
+def _render_table(*args):
+    output = io.StringIO()
+    Console(file=output, width=100).print(table(*args))
+    return output.getvalue()
+
+
+def test_sections_of_each_item():
+    prompt = "Review this {{ lang }} {% for name, text in files %}{{ name }} {{ text }} {% endfor %}{{ count }}"
+    files = [("a.py", "one"), ("b.py", "two three four")]
+
+    found = _sections(prompt, {"lang": "python code", "files": files, "count": 2})
+
+    assert found == [
+        Section("template", 3),
+        Section("lang", 2),
+        Section("files", 6),
+        Section("b.py", 3, nested=True),
+        Section("a.py", 1, nested=True),
+    ]
+
+
+def test_sections_lists_the_largest_files():
+    files = [(f"{i}.py", " ".join(["word"] * i)) for i in range(TOP_FILES + 2)]
+
+    found = _sections("{% for name, text in files %}{{ text }} {% endfor %}", {"files": files})
+
+    assert [section.name for section in found[2:]] == [f"{i}.py" for i in range(TOP_FILES + 1, 1, -1)] + [
+        "2 more files"
+    ]
+    assert found[-1].tokens == 1
+
+
+def test_sections_of_items_the_prompt_needs_are_part_of_the_template():
+    found = _sections("{{ items[0].name }} {{ other }}", {"items": [{"name": "x y"}], "other": "z"})
+
+    assert found == [Section("template", 2), Section("other", 1)]
+
+
+def test_sections_counted_twice_leave_no_template():
+    found = _sections("{% if a and b %}x y z{% endif %}", {"a": "1", "b": "2"})
+
+    assert found == [Section("template", 0), Section("a", 3), Section("b", 3)]
+
+
+def test_table():
+    output = _render_table("mock", [Section("template", 3), Section("files", 1), Section("a.py", 1, nested=True)], 4)
+
+    assert "Dry run of mock" in output
+    assert "75%" in output
+    assert "│   a.py " in output
+
+
+def test_table_without_tokens():
+    output = _render_table("mock", [Section("template", 0)], 0)
+
+    assert " - " in output
+
+
+def test_summary():
+    assert summary(4, None) == "The prompt uses about 4 tokens, no context size is configured for the model"
+    assert summary(4, 4) == "The prompt uses about 4 tokens, which fits in the 4 token context of the model"
+    assert summary(5, 4) == "The prompt uses about 5 tokens, which does not fit in the 4 token context of the model"
@@ -1,6 +1,9 @@
+from pathlib import Path
+
 import pytest
 
 from cli_llm.cli import cli
+from tests.test_git import git
 
 
 @pytest.mark.parametrize(
@@ -9,10 +12,42 @@ from cli_llm.cli import cli
         ("improve", ("test.txt",)),
         ("improve", ("test.txt", "--prompt", "correct-python")),
         ("readme", ("examples/", "--pattern", "*.py", "-l", "python")),
+        ("readme", ("examples/", "--pattern", "*.py", "--compact")),
+        ("readme", ("examples/", "--pattern", "*.py", "--signatures")),
         ("summarise", ("examples/", "--pattern", "*.py", "-l", "python")),
+        ("summarise", ("examples/", "--pattern", "*.py", "--compact")),
     ],
 )
 def test_example_folder(tool, params, example_project):
     result = example_project.invoke(cli, ["run", tool, *params])
 
     assert result.exit_code == 0
+
+
+def test_dry_run_leaves_the_output_untouched(example_project, mock_model):
+    Path("README.md").write_text("The original README")
+
+    result = example_project.invoke(cli, ["--dry-run", "run", "readme", "examples/", "-o", "README.md"])
+
+    assert result.exit_code == 0
+    assert "Dry run of mock" in result.stderr
+    assert Path("README.md").read_text() == "The original README"
+    assert mock_model.history == []
+
+
+def test_review_example(example_project, mock_model):
+    git(Path(), "init", "-q")
+    git(Path(), "add", "-A")
+    git(Path(), "commit", "-q", "-m", "first")
+
+    nothing = example_project.invoke(cli, ["run", "review"])
+    Path("test.txt").write_text("changed")
+    mock_model.enqueue(["Looks good"])
+    reviewed = example_project.invoke(cli, ["--diff", "run", "review"])
+
+    assert nothing.exit_code == reviewed.exit_code == 0
+    assert nothing.stdout == "There are no changes to review.\n"
+    assert "Looks good" in reviewed.stderr
+    [(prompt, *_)] = mock_model.history
+    assert "the diffs of some files" in prompt.prompt
+    assert "+changed" in prompt.prompt
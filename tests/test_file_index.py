@@ -0,0 +1,93 @@
+import os
+import time
+
+import pytest
+from logot import Logot, logged
+
+from cli_llm._file_index import FILE_INDEX_FILE, RACY_NANOSECONDS, FileIndex, hash_file, prompt_hash, stat
+from cli_llm.config import ClmConfig
+
+
+@pytest.fixture
+def index(tmp_path) -> FileIndex:
+    return FileIndex(tmp_path / "cache" / FILE_INDEX_FILE)
+
+
+def _old_file(path, contents):
+    path.write_text(contents)
+    past = time.time_ns() - 2 * RACY_NANOSECONDS
+    os.utime(path, ns=(past, past))
+    return path
+
+
+def test_config_file_index(isolated_cache_dir):
+    assert ClmConfig().file_index().path == isolated_cache_dir / FILE_INDEX_FILE
+
+
+def test_hash_file(tmp_path, monkeypatch):
+    monkeypatch.setattr("cli_llm._file_index.HASH_BLOCK_BYTES", 2)
+    path = tmp_path / "a.txt"
+    path.write_text("hello")
+
+    assert hash_file(path) == "2cf24dba5fb0a30e26e83b2ac5b9e29e1b161e5c1fa7425e73043362938b9824"
+    assert stat(path) == (5, path.stat().st_mtime_ns)
+    assert stat(tmp_path / "missing") is None
+
+
+@pytest.mark.usefixtures("debug_logging")
+def test_unreadable_files_are_not_hashed(tmp_path, logot: Logot):
+    assert hash_file(tmp_path) is None
+    logot.assert_logged(logged.info("Unable to hash %s due to: %s"))
+
+
+def test_prompt_hash_depends_on_every_input():
+    key = prompt_hash("prompt", {"lang": "python"}, {})
+
+    assert key == prompt_hash("prompt", {"lang": "python"}, {})
+    assert key != prompt_hash("prompt!", {"lang": "python"}, {})
+    assert key != prompt_hash("prompt", {"lang": "rust"}, {})
+    assert key != prompt_hash("prompt", {"lang": "python"}, {"temperature": 0.5})
+
+
+def test_known_hashes_are_those_of_unchanged_files(tmp_path, index):
+    a = _old_file(tmp_path / "a.txt", "a")
+    b = _old_file(tmp_path / "b.txt", "b")
+    index.update([(a, stat(a), "hash-a"), (b, stat(b), "hash-b")])
+    _old_file(b, "changed")
+
+    assert index.known_hashes({a: stat(a), b: stat(b), tmp_path / "c.txt": (1, 1)}) == {a: "hash-a"}
+
+
+def test_recently_modified_files_are_not_indexed(tmp_path, index):
+    a = tmp_path / "a.txt"
+    a.write_text("a")
+
+    index.update([(a, stat(a), "hash-a")])
+
+    assert index.known_hashes({a: stat(a)}) == {}
+
+
+def test_digests(index):
+    index.set_digest("hash-a", "mock", "prompt", "digest of a")
+    index.set_digest("hash-a", "other", "prompt", "other model")
+    index.set_digest("hash-b", "mock", "other prompt", "other prompt")
+
+    assert index.digests(["hash-a", "hash-b", "hash-c"], "mock", "prompt") == {"hash-a": "digest of a"}
+
+
+@pytest.mark.usefixtures("debug_logging")
+def test_database_errors_are_logged(tmp_path, logot: Logot):
+    index = FileIndex(tmp_path)
+    a = tmp_path / "a.txt"
+
+    index.update([(a, (1, 1), "hash-a")])
+    assert index.known_hashes({a: (1, 1)}) == {}
+    index.set_digest("hash-a", "mock", "prompt", "digest")
+    assert index.digests(["hash-a"], "mock", "prompt") == {}
+
+    logot.assert_logged(
+        logged.warning("Failed to write to the file index due to: %s")
+        >> logged.warning("Failed to read from the file index due to: %s")
+        >> logged.warning("Failed to write to the file index due to: %s")
+        >> logged.warning("Failed to read from the file index due to: %s")
+    )
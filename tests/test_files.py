@@ -0,0 +1,41 @@
+import pytest
+
+from cli_llm._files import atomic_write_text, atomic_writer
+
+
+def test_atomic_write_text(tmp_path):
+    path = tmp_path / "nested" / "file.txt"
+
+    atomic_write_text(path, "contents")
+
+    assert path.read_text() == "contents"
+    assert list(path.parent.iterdir()) == [path]
+
+
+def test_atomic_writer_keeps_permissions(tmp_path):
+    path = tmp_path / "script.sh"
+    path.write_text("old")
+    path.chmod(0o750)
+
+    with atomic_writer(path) as f:
+        f.write("new")
+
+    assert path.read_text() == "new"
+    assert path.stat().st_mode & 0o777 == 0o750  # noqa: PLR2004
+
+
+def test_atomic_writer_leaves_the_file_on_error(tmp_path):
+    path = tmp_path / "file.txt"
+    path.write_text("old")
+
+    def write():
+        with atomic_writer(path) as f:
+            f.write("new")
+            msg = "failed"
+            raise ValueError(msg)
+
+    with pytest.raises(ValueError, match="failed"):
+        write()
+
+    assert path.read_text() == "old"
+    assert list(tmp_path.iterdir()) == [path]
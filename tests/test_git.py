@@ -0,0 +1,107 @@
+import subprocess
+
+import pytest
+
+from cli_llm import errors
+from cli_llm._git import Revisions, changed_paths, diffs, new_file_diffs, read_blobs, repo_root
+
+
+def git(repo, *args):
+    subprocess.run(
+        ["git", "-c", "user.name=Test", "-c", "user.email=test@example.com", "-c", "commit.gpgsign=false", *args],
+        cwd=repo,
+        check=True,
+        capture_output=True,
+    )
+
+
+@pytest.fixture
+def repo(tmp_path):
+    git(tmp_path, "init", "-q")
+    (tmp_path / "a.txt").write_text("a\n")
+    (tmp_path / "old.txt").write_text("old\n")
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "b.py").write_text("b\n")
+    git(tmp_path, "add", "-A")
+    git(tmp_path, "commit", "-q", "-m", "first")
+    return tmp_path
+
+
+def test_revisions():
+    assert Revisions().diff_args() == ["HEAD"]
+    assert Revisions(since="main").diff_args() == ["main"]
+    assert Revisions(staged=True).diff_args() == ["--cached", "HEAD"]
+    assert Revisions(since="main", staged=True).diff_args() == ["--cached", "main"]
+    assert Revisions(at="topic").diff_args() == ["topic^", "topic"]
+    assert Revisions(since="main", at="topic").diff_args() == ["main", "topic"]
+    assert Revisions().in_working_tree
+    assert Revisions(at="topic").object_name("a.txt") == "topic:a.txt"
+    assert Revisions(staged=True).object_name("a.txt") == ":a.txt"
+
+    with pytest.raises(ValueError, match="either `staged` or `at`"):
+        Revisions(staged=True, at="topic")
+
+
+def test_git_errors(tmp_path, monkeypatch):
+    with pytest.raises(errors.GitError, match="`git rev-parse --show-toplevel` failed: fatal: not a git repository"):
+        repo_root(tmp_path)
+
+    def missing(*_, **__):
+        raise FileNotFoundError
+
+    monkeypatch.setattr(subprocess, "run", missing)
+    with pytest.raises(errors.GitError, match="git is not installed"):
+        repo_root(tmp_path)
+
+
+def test_changed_paths_and_diffs(repo):
+    (repo / "a.txt").write_text("changed\n")
+    (repo / "old.txt").unlink()
+    (repo / "src" / "b.py").chmod(0o755)
+    (repo / "new [1].txt").write_text("new\n")
+    git(repo, "add", "new [1].txt")
+    (repo / "untracked.txt").write_text("untracked\n")
+
+    assert repo_root(repo / "src") == repo.resolve()
+    assert changed_paths(repo, Revisions()) == ["a.txt", "new [1].txt", "src/b.py", "untracked.txt"]
+    assert changed_paths(repo, Revisions(staged=True)) == ["new [1].txt"]
+    assert changed_paths(repo / "src", Revisions()) == ["src/b.py"]
+    patches = diffs(repo, Revisions())
+    assert list(patches) == ["a.txt", "new [1].txt", "src/b.py"]
+    assert patches["a.txt"].startswith(b"diff --git a/a.txt b/a.txt\n")
+    assert patches["a.txt"].endswith(b"-a\n+changed\n")
+    assert patches["new [1].txt"].startswith(b"diff --git a/new [1].txt b/new [1].txt\n")
+    assert patches["src/b.py"].startswith(b"diff --git a/src/b.py b/src/b.py\nold mode 100644\nnew mode 100755")
+
+
+def test_diffs_of_quoted_paths(repo):
+    for name in ("caf\u00e9.txt", 'say "hi"\t.txt', "a b.txt"):
+        (repo / name).write_text("new\n")
+    git(repo, "add", "-A")
+
+    assert list(diffs(repo, Revisions(staged=True))) == ["a b.txt", "caf\u00e9.txt", 'say "hi"\t.txt']
+
+
+def test_new_file_diffs(repo):
+    (repo / "src" / "new file.py").write_text("new\n")
+    (repo / "src" / "empty.py").write_text("")
+
+    patches = new_file_diffs(repo, ["src/new file.py", "src/empty.py"])
+
+    assert list(patches) == ["src/new file.py", "src/empty.py"]
+    assert patches["src/new file.py"].startswith(b"diff --git a/src/new file.py b/src/new file.py\nnew file mode")
+    assert patches["src/new file.py"].endswith(b"+new\n")
+
+
+def test_read_blobs(repo):
+    (repo / "a.txt").write_text("staged\n")
+    git(repo, "add", "a.txt")
+
+    assert read_blobs(repo, []) == []
+    assert read_blobs(repo, ["HEAD:a.txt", ":a.txt", "HEAD:missing file", "HEAD:src", "HEAD:src/b.py"]) == [
+        b"a\n",
+        b"staged\n",
+        None,
+        None,
+        b"b\n",
+    ]
@@ -1,4 +1,15 @@
-from cli_llm import helpers
+import os
+import time
+from pathlib import Path
+
+import pytest
+from logot import Logot, logged
+
+from cli_llm import _file_index, errors, helpers
+from cli_llm._file_index import RACY_NANOSECONDS
+from cli_llm.compact import DUPLICATE_MARKER, Compaction
+from cli_llm.config import ClmConfig
+from tests.test_git import git
 
 
 class TestGatherFileContents:
@@ -22,6 +33,14 @@ class TestGatherFileContents:
         assert len(file_contents) == 1
         assert file_contents[0] == (named_temp_fs / "src" / "package" / "__init__.py", contents)
 
+    def test_gather_from_the_working_directory(self, named_temp_fs, monkeypatch):
+        named_temp_fs.gen({"src": {"a.py": "a"}, "b.txt": "b"})
+        monkeypatch.chdir(named_temp_fs)
+
+        file_contents = helpers.gather_file_contents(search_path=Path(), pattern="src/*.py")
+
+        assert file_contents == [(Path("src", "a.py"), "a")]
+
     def test_ignore_binary_files(self, named_temp_fs):
         contents = b"\r\x0fV\x00\x0c\x06\x8d\x00\x0f^\rO\x0f-\x0c\x9c\r&\x0b\xd1"
 
@@ -30,3 +49,357 @@ class TestGatherFileContents:
         file_contents = helpers.gather_file_contents(search_path=named_temp_fs, pattern="*")
 
         assert len(file_contents) == 0
+
+    def test_gather_in_a_deterministic_order(self, named_temp_fs):
+        named_temp_fs.gen({"b.py": "", "a": {"z.py": "", "c.py": ""}, "c.py": "", "d.txt": ""})
+
+        file_contents = helpers.gather_file_contents(search_path=named_temp_fs, pattern="*.py")
+
+        assert [path.relative_to(named_temp_fs).as_posix() for path, _ in file_contents] == [
+            "b.py",
+            "c.py",
+            "a/c.py",
+            "a/z.py",
+        ]
+
+    def test_gather_with_a_path_pattern(self, named_temp_fs):
+        named_temp_fs.gen({"src": {"a.py": "", "tests": {"b.py": ""}}, "tests": {"c.py": ""}})
+
+        file_contents = helpers.gather_file_contents(search_path=named_temp_fs, pattern="tests/*.py")
+
+        assert [path.name for path, _ in file_contents] == ["b.py", "c.py"]
+
+    def test_gather_with_multiple_patterns(self, named_temp_fs):
+        named_temp_fs.gen({"a.py": "", "b.md": "", "c.txt": "", "tests": {"d.py": ""}, "e.lock": "", "f.py.lock": ""})
+
+        file_contents = helpers.gather_file_contents(
+            search_path=named_temp_fs, pattern=["*.py", "*.md", "*.lock", "!tests", "!f.*"]
+        )
+
+        assert [path.name for path, _ in file_contents] == ["a.py", "b.md", "e.lock"]
+
+    def test_gather_with_only_excludes(self, named_temp_fs):
+        named_temp_fs.gen({"a.py": "", "b.md": ""})
+
+        file_contents = helpers.gather_file_contents(search_path=named_temp_fs, pattern=["!*.md"])
+
+        assert [path.name for path, _ in file_contents] == ["a.py"]
+
+    def test_gather_with_an_anchored_pattern(self, named_temp_fs):
+        named_temp_fs.gen({"a.py": "", "src": {"a.py": "", "b": {"c.py": ""}}})
+
+        file_contents = helpers.gather_file_contents(search_path=named_temp_fs, pattern=["/*.py", "/src/**/c.py"])
+
+        assert [path.relative_to(named_temp_fs).as_posix() for path, _ in file_contents] == ["a.py", "src/b/c.py"]
+
+    def test_gather_honours_ignore_files(self, named_temp_fs):
+        named_temp_fs.gen(
+            {
+                ".git": {"HEAD": "ref"},
+                ".gitignore": "*.log\n.venv/\nbuild\n",
+                "keep.log": "",
+                "a.log": "",
+                "a.py": "",
+                ".venv": {"lib.py": ""},
+                "build": {"out.py": ""},
+                "src": {".ignore": "!keep.log\ngenerated/\n", "keep.log": "", "generated": {"g.py": ""}, "b.py": ""},
+            }
+        )
+
+        file_contents = helpers.gather_file_contents(search_path=named_temp_fs, pattern="*", gitignore=True)
+
+        assert [path.relative_to(named_temp_fs).as_posix() for path, _ in file_contents] == [
+            ".gitignore",
+            "a.py",
+            "src/.ignore",
+            "src/b.py",
+            "src/keep.log",
+        ]
+        unfiltered = helpers.gather_file_contents(search_path=named_temp_fs, pattern="*.py")
+        assert len(unfiltered) == 5  # noqa: PLR2004
+
+    def test_gather_honours_ignore_files_above_the_search_path(self, named_temp_fs):
+        named_temp_fs.gen({".git": {}, ".gitignore": "/src/gen/\n", "src": {"gen": {"a.py": ""}, "b.py": ""}})
+
+        file_contents = helpers.gather_file_contents(search_path=named_temp_fs / "src", pattern="*.py", gitignore=True)
+
+        assert [path.name for path, _ in file_contents] == ["b.py"]
+
+    def test_ignored_directories_are_not_searched(self, named_temp_fs, monkeypatch):
+        named_temp_fs.gen({".gitignore": "node_modules\n", "node_modules": {"a.js": ""}, "b.js": ""})
+        searched = []
+        scandir = os.scandir
+
+        def spy(path):
+            searched.append(Path(path).name)
+            return scandir(path)
+
+        monkeypatch.setattr(os, "scandir", spy)
+
+        assert len(helpers.gather_file_contents(search_path=named_temp_fs, pattern="*.js", gitignore=True)) == 1
+        assert "node_modules" not in searched
+
+    def test_ignore_binary_files_without_reading_them(self, named_temp_fs, monkeypatch):
+        monkeypatch.setattr(helpers, "SNIFF_BYTES", 4)
+        named_temp_fs.gen({"nul.bin": b"ab\x00c" + b"x" * 100, "latin.txt": b"caf\xe9 au lait", "text.txt": "text"})
+
+        file_contents = helpers.gather_file_contents(search_path=named_temp_fs, pattern="*")
+
+        assert file_contents == [(named_temp_fs / "text.txt", "text")]
+
+    def test_truncate_long_files(self, named_temp_fs, monkeypatch):
+        monkeypatch.setattr(helpers, "SNIFF_BYTES", 2)
+        named_temp_fs.gen({"long.txt": "abcdéfgh", "short.txt": "abc"})
+
+        file_contents = helpers.gather_file_contents(search_path=named_temp_fs, pattern="*", max_file_bytes=5)
+
+        assert file_contents == [
+            (named_temp_fs / "long.txt", "abcd\n[... truncated, 5 more bytes ...]\n"),
+            (named_temp_fs / "short.txt", "abc"),
+        ]
+
+    @pytest.mark.usefixtures("debug_logging")
+    def test_stop_at_the_total_limit(self, named_temp_fs, logot: Logot):
+        named_temp_fs.gen({"a.txt": "aaaa", "b.txt": "bbbb", "c.txt": "cccc", "d.txt": "dddd"})
+
+        file_contents = helpers.gather_file_contents(search_path=named_temp_fs, pattern="*", max_total_bytes=6)
+
+        assert file_contents == [
+            (named_temp_fs / "a.txt", "aaaa"),
+            (named_temp_fs / "b.txt", "bb\n[... truncated, 2 more bytes ...]\n"),
+        ]
+        logot.assert_logged(logged.warning("Stopped gathering files after %s, having reached the limit of 6 bytes"))
+
+    def test_no_limits(self, named_temp_fs):
+        named_temp_fs.gen({"a.txt": "a" * (helpers.MAX_FILE_BYTES + 1)})
+
+        file_contents = helpers.gather_file_contents(search_path=named_temp_fs, pattern="*")
+
+        assert file_contents == [(named_temp_fs / "a.txt", "a" * (helpers.MAX_FILE_BYTES + 1))]
+
+    @pytest.mark.usefixtures("debug_logging")
+    def test_skip_unreadable_files(self, named_temp_fs, monkeypatch, logot: Logot):
+        named_temp_fs.gen({"a.txt": "a", "b.txt": "b"})
+        open_ = Path.open
+
+        def fail_on_a(path, *args, **kwargs):
+            if path.name == "a.txt":
+                raise PermissionError(path)
+            return open_(path, *args, **kwargs)
+
+        monkeypatch.setattr(Path, "open", fail_on_a)
+
+        file_contents = helpers.gather_file_contents(search_path=named_temp_fs, pattern="*")
+
+        assert file_contents == [(named_temp_fs / "b.txt", "b")]
+        logot.assert_logged(logged.info("Unable to read %s due to: %s"))
+
+    def test_iterate_while_reading(self, named_temp_fs, monkeypatch):
+        monkeypatch.setattr(helpers, "MAX_PENDING_READS", 2)
+        named_temp_fs.gen({f"{i}.txt": str(i) for i in range(5)})
+
+        contents = helpers.iter_file_contents(search_path=named_temp_fs, pattern="*.txt", workers=2)
+
+        assert next(contents) == (named_temp_fs / "0.txt", "0")
+        assert [text for _, text in contents] == ["1", "2", "3", "4"]
+
+    @pytest.mark.usefixtures("debug_logging")
+    def test_compact(self, named_temp_fs, logot: Logot):
+        named_temp_fs.gen({"a.py": "x = 1  # one\n\n\n", "b.py": "x = 1  # one\n\n\n", "poetry.lock": "[[package]]"})
+
+        file_contents = helpers.gather_file_contents(search_path=named_temp_fs, pattern="*", compact=Compaction())
+
+        assert file_contents == [
+            (named_temp_fs / "a.py", "x = 1\n"),
+            (named_temp_fs / "b.py", DUPLICATE_MARKER.format(path=named_temp_fs / "a.py")),
+        ]
+        logot.assert_logged(
+            logged.info(
+                "Compacted 2 files from 30 to %s bytes, saving about %s tokens, leaving out 1 files and 1 duplicates"
+            )
+        )
+
+    def test_compacted_files_count_towards_the_total_limit(self, named_temp_fs):
+        named_temp_fs.gen({"a.py": "# a comment\nx = 1\n", "b.py": "y = 2\n"})
+
+        file_contents = helpers.gather_file_contents(
+            search_path=named_temp_fs, pattern="*.py", max_total_bytes=12, compact=Compaction()
+        )
+
+        assert file_contents == [(named_temp_fs / "a.py", "x = 1\n"), (named_temp_fs / "b.py", "y = 2\n")]
+
+    def test_truncated_files_are_compacted_without_parsing(self, named_temp_fs):
+        named_temp_fs.gen({"a.py": "def f():\n    return 1  # one\n"})
+
+        file_contents = helpers.gather_file_contents(
+            search_path=named_temp_fs, pattern="*.py", max_file_bytes=27, compact=Compaction(signatures=True)
+        )
+
+        assert file_contents == [
+            (named_temp_fs / "a.py", "def f():\n    return 1\n\n[... truncated, 2 more bytes ...]\n")
+        ]
+
+
+class TestDigestFileContents:
+    PROMPT = "Digest:{% for f, contents in files %} {{contents}}{% endfor %}"
+
+    @pytest.fixture
+    def config(self):
+        return ClmConfig(ll_model="mock", max_concurrency=1)
+
+    def _digest(self, config, root, **kwargs):
+        return helpers.digest_file_contents(config, self.PROMPT, search_path=root, pattern="*.txt", **kwargs)
+
+    @pytest.mark.usefixtures("debug_logging")
+    def test_only_new_or_changed_files_are_digested(self, config, mock_model, named_temp_fs, logot: Logot):
+        named_temp_fs.gen({"a.txt": "a", "b.txt": "b", "c.bin": b"\x00", "d.txt": b"\x00"})
+        mock_model.enqueue(["digest a"])
+        mock_model.enqueue(["digest b"])
+
+        assert self._digest(config, named_temp_fs) == [
+            (named_temp_fs / "a.txt", "digest a"),
+            (named_temp_fs / "b.txt", "digest b"),
+        ]
+        assert [prompt.prompt for prompt, *_ in mock_model.history] == ["Digest: a", "Digest: b"]
+
+        (named_temp_fs / "b.txt").write_text("changed")
+        (named_temp_fs / "e.txt").write_text("a")
+        mock_model.enqueue(["digest changed"])
+
+        assert self._digest(config, named_temp_fs) == [
+            (named_temp_fs / "a.txt", "digest a"),
+            (named_temp_fs / "b.txt", "digest changed"),
+            (named_temp_fs / "e.txt", "digest a"),
+        ]
+        assert [prompt.prompt for prompt, *_ in mock_model.history][2:] == ["Digest: changed"]
+        logot.assert_logged(logged.info("Reusing the digests of %s files, digesting %s"))
+
+    def test_unchanged_files_are_not_read(self, config, mock_model, named_temp_fs, monkeypatch):
+        named_temp_fs.gen({"a.txt": "a"})
+        past = time.time_ns() - 2 * RACY_NANOSECONDS
+        os.utime(named_temp_fs / "a.txt", ns=(past, past))
+        mock_model.enqueue(["digest a"])
+        self._digest(config, named_temp_fs)
+
+        def fail(*_):
+            raise AssertionError
+
+        monkeypatch.setattr(_file_index, "hash_file", fail)
+        monkeypatch.setattr(helpers, "hash_file", fail)
+        monkeypatch.setattr(helpers, "_read_text", fail)
+
+        assert self._digest(config, named_temp_fs) == [(named_temp_fs / "a.txt", "digest a")]
+
+    def test_digests_depend_on_the_prompt_data(self, config, mock_model, named_temp_fs):
+        named_temp_fs.gen({"a.txt": "a"})
+        mock_model.enqueue(["first"])
+        mock_model.enqueue(["second"])
+
+        assert self._digest(config, named_temp_fs, prompt_data={"lang": "en"}) == [(named_temp_fs / "a.txt", "first")]
+        assert self._digest(config, named_temp_fs, prompt_data={"lang": "fr"}) == [(named_temp_fs / "a.txt", "second")]
+
+    def test_compact(self, config, mock_model, named_temp_fs):
+        named_temp_fs.gen({"a.txt": "a\n\n\n", "LICENSE.txt": "MIT"})
+        mock_model.enqueue(["compacted"])
+        mock_model.enqueue(["license"])
+        mock_model.enqueue(["as is"])
+
+        assert self._digest(config, named_temp_fs, compact=Compaction()) == [(named_temp_fs / "a.txt", "compacted")]
+        assert dict(self._digest(config, named_temp_fs))[named_temp_fs / "a.txt"] == "as is"
+        assert [prompt.prompt for prompt, *_ in mock_model.history] == ["Digest: a\n", "Digest: MIT", "Digest: a\n\n\n"]
+
+    def test_dry_run_stores_no_digests(self, mock_model, named_temp_fs):
+        named_temp_fs.gen({"a.txt": "a"})
+        mock_model.enqueue(["digest a"])
+
+        with pytest.raises(errors.DryRunComplete):
+            self._digest(ClmConfig(ll_model="mock", max_concurrency=1, dry_run=True), named_temp_fs)
+
+        assert self._digest(ClmConfig(ll_model="mock", max_concurrency=1), named_temp_fs) == [
+            (named_temp_fs / "a.txt", "digest a")
+        ]
+        assert [prompt.prompt for prompt, *_ in mock_model.history] == ["Digest: a"]
+
+    def test_large_files_are_truncated(self, config, mock_model, named_temp_fs):
+        named_temp_fs.gen({"a.txt": "abcdef"})
+
+        self._digest(config, named_temp_fs, max_file_bytes=2)
+
+        [(prompt, *_)] = mock_model.history
+        assert prompt.prompt == "Digest: ab" + helpers.TRUNCATION_MARKER.format(omitted=4)
+
+
+class TestChangedFileContents:
+    @pytest.fixture
+    def repo(self, named_temp_fs):
+        git(named_temp_fs, "init", "-q")
+        named_temp_fs.gen(
+            {"a.py": "a\n", "b.txt": "b\n", "untouched.py": "", "src": {"c.py": "c\n", "tests": {"d.py": "d\n"}}}
+        )
+        git(named_temp_fs, "add", "-A")
+        git(named_temp_fs, "commit", "-q", "-m", "first")
+        for name in ("a.py", "b.txt", "src/c.py", "src/tests/d.py"):
+            (named_temp_fs / name).write_text(f"changed {name}\n")
+        return named_temp_fs
+
+    def test_only_changed_files_are_read(self, repo, monkeypatch):
+        read = []
+        read_text = helpers._read_text  # noqa: SLF001
+
+        def spy(path, limit):
+            read.append(path.name)
+            return read_text(path, limit)
+
+        monkeypatch.setattr(helpers, "_read_text", spy)
+
+        contents = helpers.changed_file_contents(ClmConfig(), search_path=repo, pattern=["*.py", "!tests"])
+
+        assert contents == [(repo / "a.py", "changed a.py\n"), (repo / "src" / "c.py", "changed src/c.py\n")]
+        assert sorted(read) == ["a.py", "c.py"]
+
+    def test_changed_files_under_the_search_path(self, repo):
+        contents = helpers.changed_file_contents(ClmConfig(), search_path=repo / "src", pattern="tests/*.py")
+
+        assert contents == [(repo / "src" / "tests" / "d.py", "changed src/tests/d.py\n")]
+
+    def test_staged_changes_are_read_from_the_index(self, repo):
+        git(repo, "add", "b.txt")
+        (repo / "b.txt").write_text("unstaged\n")
+
+        contents = helpers.changed_file_contents(ClmConfig(git_staged=True), search_path=repo)
+
+        assert contents == [(repo / "b.txt", "changed b.txt\n")]
+
+    def test_changes_at_a_commit_are_read_from_it(self, repo):
+        (repo / "e.bin").write_bytes(b"\x00")
+        (repo / "f.txt").write_bytes(b"caf\xe9")
+        git(repo, "add", "-A")
+        git(repo, "commit", "-q", "-m", "second")
+        (repo / "a.py").write_text("after the commit\n")
+
+        contents = helpers.changed_file_contents(ClmConfig(), search_path=repo, at="HEAD", max_file_bytes=8)
+
+        assert contents[0] == (repo / "a.py", "changed " + helpers.TRUNCATION_MARKER.format(omitted=5))
+        assert [path.name for path, _ in contents] == ["a.py", "b.txt", "c.py", "d.py"]
+
+    def test_diffs_instead_of_contents(self, repo):
+        config = ClmConfig(git_diff=True, git_since="HEAD")
+
+        [(path, diff)] = helpers.changed_file_contents(config, search_path=repo, pattern="/a.py")
+
+        assert path == repo / "a.py"
+        assert diff.startswith("diff --git a/a.py b/a.py\n")
+        assert diff.endswith("-a\n+changed a.py\n")
+
+    def test_new_files_are_changed(self, repo):
+        (repo / "src" / "new.py").write_text("new\n")
+        (repo / "ignored.py").write_text("ignored\n")
+        (repo / ".gitignore").write_text("ignored.py\n")
+
+        contents = helpers.changed_file_contents(ClmConfig(), search_path=repo, pattern="*.py")
+        [(path, diff)] = helpers.changed_file_contents(ClmConfig(git_diff=True), search_path=repo, pattern="new.py")
+
+        assert [path.name for path, _ in contents] == ["a.py", "c.py", "new.py", "d.py"]
+        assert path == repo / "src" / "new.py"
+        assert diff.startswith("diff --git a/src/new.py b/src/new.py\nnew file mode")
+        assert diff.endswith("+new\n")
@@ -0,0 +1,126 @@
+import click
+import pytest
+from click.testing import CliRunner
+from logot import Logot, logged
+
+from cli_llm._history import RunHistory, RunRecord, current_tool, get_history
+from cli_llm.config import ClmConfig
+from cli_llm.response import ResponseMetrics
+from cli_llm.run import run
+
+
+def _record(finished_at=1.0, tool="tool", model_id="mock", **kwargs):
+    values = {
+        "cached": False,
+        "error": None,
+        "prompt_chars": 10,
+        "prompt_tokens": None,
+        "output_chars": 20,
+        "output_tokens": None,
+        "time_to_first_token": 0.5,
+        "latency": 1.0,
+    }
+    return RunRecord(finished_at, tool, model_id, **(values | kwargs))
+
+
+@pytest.fixture
+def history(tmp_path):
+    history = RunHistory(tmp_path / "data" / "history.sqlite3")
+    yield history
+    history.close()
+
+
+def test_runs_are_written_in_the_background(history):
+    records = [_record(1.0, cached=True), _record(2.0, tool=None, error="ValueError", latency=None)]
+    for record in records:
+        history.record(record)
+
+    assert history.query() == records
+
+
+def test_query_filters(history):
+    records = [_record(1.0), _record(2.0, tool="other"), _record(3.0, model_id="other"), _record(4.0)]
+    for record in records:
+        history.record(record)
+
+    assert history.query(since=2.0) == records[1:]
+    assert history.query(tool="tool") == [records[0], records[2], records[3]]
+    assert history.query(tool="tool", model_id="mock", since=2.0) == [records[3]]
+
+
+def test_query_without_history(history):
+    assert history.query() == []
+
+
+def test_close_writes_queued_runs(history):
+    history.record(_record())
+    history.close()
+    history.close()
+
+    assert RunHistory(history.path).query() == [_record()]
+
+
+@pytest.mark.usefixtures("debug_logging")
+def test_write_errors_are_logged(tmp_path, logot: Logot):
+    (tmp_path / "history.sqlite3").mkdir()
+    history = RunHistory(tmp_path / "history.sqlite3")
+
+    history.record(_record())
+    history.close()
+
+    logot.assert_logged(logged.warning("Could not record 1 run(s) in the history: %s"))
+
+
+def test_record_metrics(history):
+    metrics = ResponseMetrics(prompt_chars=5, time_to_first_token=1.0, latency=3.0, output_tokens=4, error="Boom")
+
+    history.record_metrics(metrics, tool="example", model_id="mock", cached=True)
+
+    (record,) = history.query()
+    assert record.tool == "example"
+    assert record.cached
+    assert record.error == "Boom"
+    assert record.tokens_per_second == 2.0  # noqa: PLR2004
+
+
+def test_history_is_shared(tmp_path):
+    assert get_history(tmp_path / "history.sqlite3") is get_history(tmp_path / "history.sqlite3")
+
+
+def test_current_tool():
+    tools = []
+
+    @click.group()
+    def clm():
+        pass
+
+    @clm.group()
+    def run_group():
+        pass
+
+    @run_group.group()
+    def example():
+        pass
+
+    @example.command()
+    def summarise():
+        tools.append(current_tool())
+
+    result = CliRunner().invoke(clm, ["run-group", "example", "summarise"])
+
+    assert result.exit_code == 0
+    assert tools == ["example summarise"]
+    assert current_tool() is None
+
+
+def test_runs_are_recorded(mock_model, isolated_run_history):
+    mock_model.enqueue(["hello"])
+
+    run(ClmConfig(ll_model="mock"), "prompt", {}).text()
+    run(ClmConfig(ll_model="mock", run_history=False), "prompt", {}).text()
+
+    (record,) = get_history(isolated_run_history).query()
+    assert record.model_id == "mock"
+    assert record.tool is None
+    assert record.prompt_chars == len("prompt")
+    assert record.output_chars == len("hello")
@@ -0,0 +1,114 @@
+import re
+
+import pytest
+from logot import Logot, logged
+
+from cli_llm._ignore import IgnoreRules, ancestor_rules, is_ignored, translate
+
+
+@pytest.mark.parametrize(
+    ("pattern", "matches", "misses"),
+    [
+        ("*.py", ["a.py", ".py"], ["a/b.py", "a.pyc"]),
+        ("a?c", ["abc"], ["a/c", "ac"]),
+        ("**/build", ["build", "a/b/build"], ["abuild"]),
+        ("docs/**", ["docs/a", "docs/a/b"], ["docs", "a/docs/b"]),
+        ("a/**/b", ["a/b", "a/x/b", "a/x/y/b"], ["a/xb"]),
+        ("[ab].txt", ["a.txt", "b.txt"], ["c.txt"]),
+        ("[!ab].txt", ["c.txt"], ["a.txt"]),
+        ("[]a].txt", ["].txt", "a.txt"], ["b.txt"]),
+        ("[a", ["[a"], ["a"]),
+        (r"\*.txt", ["*.txt"], ["a.txt"]),
+        ("a+b(c)", ["a+b(c)"], ["aab(c)"]),
+    ],
+)
+def test_translate(pattern, matches, misses):
+    regex = re.compile(translate(pattern))
+
+    assert [path for path in matches if regex.fullmatch(path)] == matches
+    assert [path for path in misses if regex.fullmatch(path)] == []
+
+
+def test_rules_match_at_any_depth_unless_anchored():
+    rules = IgnoreRules.parse(["# comment", "", "*.log", "/top", "sub/dir"])
+
+    assert rules.match("a.log", is_dir=False)
+    assert rules.match("a/b/a.log", is_dir=False)
+    assert rules.match("top", is_dir=True)
+    assert rules.match("a/top", is_dir=True) is None
+    assert rules.match("sub/dir", is_dir=True)
+    assert rules.match("a/sub/dir", is_dir=True) is None
+
+
+def test_the_last_matching_rule_wins():
+    rules = IgnoreRules.parse(["*.log", "!keep.log", "keep.log.*"])
+
+    assert rules.match("a.log", is_dir=False)
+    assert rules.match("keep.log", is_dir=False) is False
+    assert rules.match("keep.log.1", is_dir=False)
+    assert rules.match("a.txt", is_dir=False) is None
+
+
+def test_directory_rules_only_match_directories():
+    rules = IgnoreRules.parse(["build/"])
+
+    assert rules.match("build", is_dir=True)
+    assert rules.match("build", is_dir=False) is None
+    assert IgnoreRules.parse([]).match("build", is_dir=True) is None
+
+
+def test_escapes_and_trailing_spaces():
+    rules = IgnoreRules.parse([r"\#hash", r"\!bang", "space\\ ", "trailing   "])
+
+    assert rules.match("#hash", is_dir=False)
+    assert rules.match("!bang", is_dir=False)
+    assert rules.match("space ", is_dir=False)
+    assert rules.match("trailing", is_dir=False)
+
+
+def test_nested_rules_apply_below_their_directory():
+    rules = [IgnoreRules.parse(["*.tmp", "!sub/*.tmp"]), IgnoreRules.parse(["/local", "!a.tmp"], base="sub/")]
+
+    assert is_ignored(rules, "b.tmp", is_dir=False)
+    assert not is_ignored(rules, "sub/b.tmp", is_dir=False)
+    assert not is_ignored(rules, "sub/x/a.tmp", is_dir=False)
+    assert is_ignored(rules, "sub/local", is_dir=True)
+    assert not is_ignored(rules, "local", is_dir=True)
+    assert not is_ignored(rules, "other", is_dir=False)
+
+
+def test_rules_above_the_root_match_with_its_prefix():
+    rules = IgnoreRules.parse(["/src/generated", "docs/*.md"], prefix="src/")
+
+    assert rules.match("generated", is_dir=True)
+    assert rules.match("docs/a.md", is_dir=False) is None
+
+
+def test_ancestor_rules(named_temp_fs):
+    named_temp_fs.gen(
+        {".git": {}, ".gitignore": "/src/gen\n", "src": {".ignore": "*.bak\n", "pkg": {".gitignore": "x\n"}}}
+    )
+
+    rules = ancestor_rules(named_temp_fs / "src" / "pkg", [".gitignore", ".ignore"])
+
+    assert [rule.prefix for rule in rules] == ["src/pkg/", "pkg/"]
+    assert is_ignored(rules, "a.bak", is_dir=False)
+
+
+def test_ancestor_rules_stop_at_the_repository_of_the_root(named_temp_fs):
+    named_temp_fs.gen({".git": {}, ".gitignore": "*\n", "nested": {".git": {}, ".gitignore": "*.log\n", "src": {}}})
+
+    assert ancestor_rules(named_temp_fs / "nested", [".gitignore"]) == []
+    assert [rule.prefix for rule in ancestor_rules(named_temp_fs / "nested" / "src", [".gitignore"])] == ["src/"]
+
+
+def test_ancestor_rules_outside_a_repository(named_temp_fs):
+    named_temp_fs.gen({".gitignore": "*\n", "src": {}})
+
+    assert ancestor_rules(named_temp_fs / "src", [".gitignore"]) == []
+
+
+@pytest.mark.usefixtures("debug_logging")
+def test_unreadable_ignore_files_are_logged(tmp_path, logot: Logot):
+    assert IgnoreRules.load(tmp_path / ".gitignore") is None
+    logot.assert_logged(logged.info("Unable to read the ignore file %s due to: %s"))
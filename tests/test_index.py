@@ -0,0 +1,243 @@
+import contextlib
+import sys
+from pathlib import Path
+
+import llm
+import numpy as np
+import pytest
+
+from cli_llm import errors
+from cli_llm._files import atomic_binary_writer
+from cli_llm.cli import cli
+from cli_llm.config import ClmConfig
+from cli_llm.index import CHUNKS_FILE, INDEX_DIR, VECTORS_FILE, Chunk, Index, retrieve, split_lines
+
+FILES = [
+    ("cats.md", "Cats purr and chase mice.\nCats sleep all day.\n"),
+    ("dogs.md", "Dogs bark at the postman.\nDogs fetch sticks.\n"),
+    ("fish.md", "Fish swim in the sea.\n"),
+]
+
+
+@pytest.fixture
+def index(tmp_path) -> Index:
+    return Index(tmp_path / "index")
+
+
+def test_split_lines_keeps_whole_lines():
+    text = "one\ntwo\nthree\nfour\n"
+
+    assert split_lines("a.txt", text, 9) == [
+        Chunk("a.txt", 1, 2, "one\ntwo\n"),
+        Chunk("a.txt", 3, 3, "three\n"),
+        Chunk("a.txt", 4, 4, "four\n"),
+    ]
+
+
+def test_split_lines_splits_long_lines():
+    assert split_lines("a.txt", "abcdefgh\nij", 3) == [
+        Chunk("a.txt", 1, 1, "abc"),
+        Chunk("a.txt", 1, 1, "def"),
+        Chunk("a.txt", 1, 1, "gh\n"),
+        Chunk("a.txt", 2, 2, "ij"),
+    ]
+
+
+def test_split_lines_by_tokens():
+    def words(text):
+        return len(text.split())
+
+    assert split_lines("a.txt", "a b\nc\nd e f g h\n", 3, words) == [
+        Chunk("a.txt", 1, 2, "a b\nc\n"),
+        Chunk("a.txt", 3, 3, "d e f "),
+        Chunk("a.txt", 3, 3, "g h\n"),
+    ]
+
+
+def test_split_lines_empty_text():
+    assert split_lines("a.txt", "", 10) == []
+
+
+def test_chunk_label():
+    assert Chunk("src/main.py", 10, 42, "").label == "src/main.py:10-42"
+
+
+def test_build_and_query(index, mock_embedding_model):
+    stats = index.build(FILES, mock_embedding_model, chunk_tokens=100, batch_size=2)
+
+    assert (stats.files, stats.embedded, stats.reused, stats.removed) == (3, 3, 0, 0)
+    assert [len(batch) for batch in mock_embedding_model.batches] == [2, 1]
+    assert (
+        index.directory / VECTORS_FILE.format(generation=1)
+    ).stat().st_size == 3 * mock_embedding_model.dimensions * 4
+
+    hits = index.query("Cats sleep", k=2)
+
+    assert [hit.chunk.label for hit in hits] == ["cats.md:1-2", hits[1].chunk.label]
+    assert hits[0].score > hits[1].score
+    assert hits[0].chunk.text == FILES[0][1]
+
+
+def test_query_k_larger_than_the_index(index, mock_embedding_model):
+    index.build(FILES, mock_embedding_model, chunk_tokens=100)
+
+    assert len(index.query("Fish", k=10)) == len(FILES)
+
+
+def test_query_vectors_are_normalised(index, mock_embedding_model):
+    index.build(FILES, mock_embedding_model, chunk_tokens=100)
+
+    [hit] = index.query("Fish swim in the sea.", k=1)
+
+    assert hit.chunk.path == "fish.md"
+    assert hit.score == pytest.approx(1)
+
+
+def test_query_without_words_scores_zero(index, mock_embedding_model):
+    index.build(FILES, mock_embedding_model, chunk_tokens=100)
+
+    assert {hit.score for hit in index.query("", k=3)} == {0}
+
+
+def test_rebuild_only_embeds_changed_files(index, mock_embedding_model):
+    index.build(FILES, mock_embedding_model, chunk_tokens=100)
+    mock_embedding_model.batches.clear()
+
+    changed = [FILES[0], ("dogs.md", "Dogs dig holes.\n"), ("birds.md", "Birds sing.\n")]
+    stats = index.build(changed, mock_embedding_model, chunk_tokens=100)
+
+    assert (stats.files, stats.embedded, stats.reused, stats.removed) == (3, 2, 1, 1)
+    assert mock_embedding_model.batches == [["Dogs dig holes.\n", "Birds sing.\n"]]
+    assert index.query("Dogs dig holes.", k=1)[0].chunk.path == "dogs.md"
+    assert index.query("Cats purr and chase mice. Cats sleep all day.", k=1)[0].score == pytest.approx(1)
+    assert {hit.chunk.path for hit in index.query("anything", k=10)} == {"cats.md", "dogs.md", "birds.md"}
+
+
+def test_rebuild_unchanged_embeds_nothing(index, mock_embedding_model):
+    index.build(FILES, mock_embedding_model, chunk_tokens=100)
+    mock_embedding_model.batches.clear()
+
+    stats = index.build(FILES, mock_embedding_model, chunk_tokens=100)
+
+    assert (stats.embedded, stats.reused) == (0, 3)
+    assert mock_embedding_model.batches == []
+    assert index.query("Fish swim in the sea.", k=1)[0].score == pytest.approx(1)
+
+
+def test_interrupted_build_leaves_the_index_as_it_was(index, mock_embedding_model, monkeypatch):
+    index.build(FILES, mock_embedding_model, chunk_tokens=100)
+
+    @contextlib.contextmanager
+    def interrupted(path):
+        with atomic_binary_writer(path) as f:
+            yield f
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr("cli_llm.index.atomic_binary_writer", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        index.build(FILES[:1], mock_embedding_model, chunk_tokens=100)
+
+    assert {hit.chunk.path for hit in index.query("anything", k=10)} == {"cats.md", "dogs.md", "fish.md"}
+    monkeypatch.undo()
+    index.build(FILES[:1], mock_embedding_model, chunk_tokens=100)
+    assert [path.name for path in index.directory.glob("*.f32")] == [VECTORS_FILE.format(generation=2)]
+
+
+def test_changing_the_chunk_size_embeds_everything_again(index, mock_embedding_model):
+    index.build(FILES, mock_embedding_model, chunk_tokens=100)
+
+    stats = index.build(FILES, mock_embedding_model, chunk_tokens=7)
+
+    assert (stats.embedded, stats.reused, stats.removed) == (5, 0, 0)
+
+
+def test_build_without_files(index, mock_embedding_model):
+    index.build(FILES, mock_embedding_model, chunk_tokens=100)
+
+    stats = index.build([], mock_embedding_model, chunk_tokens=100)
+
+    assert (stats.files, stats.embedded, stats.removed) == (0, 0, 3)
+    assert index.query("Fish") == []
+
+
+def test_query_before_building(index):
+    with pytest.raises(errors.IndexNotFoundError, match="`default` has not been built"):
+        index.query("Fish")
+
+    assert not index.directory.exists()
+
+
+def test_query_interrupted_build(index):
+    with index._connect():  # noqa: SLF001
+        pass
+
+    with pytest.raises(errors.IndexNotFoundError):
+        index.query("Fish")
+
+
+def test_numpy_is_needed(index, mock_embedding_model, monkeypatch):
+    monkeypatch.setitem(sys.modules, "numpy", None)
+
+    with pytest.raises(errors.MissingDependencyError, match=r"pip install cli-llm\[index\]"):
+        index.build(FILES, mock_embedding_model, chunk_tokens=100)
+
+
+def test_retrieve(isolated_cache_dir, mock_embedding_model):
+    config = ClmConfig()
+    index = Index.from_config(config, "docs")
+    index.build(FILES, mock_embedding_model, chunk_tokens=100)
+
+    assert index.directory == isolated_cache_dir / INDEX_DIR / "docs"
+    assert retrieve(config, "Fish swim", k=1, name="docs") == [("fish.md:1-1", FILES[2][1])]
+
+
+def test_config_embedding(monkeypatch):
+    assert ClmConfig(embedding_model="mock-embed").embedding().model_id == "mock-embed"
+
+    monkeypatch.setattr(llm, "get_default_embedding_model", lambda: "mock-embed")
+    assert ClmConfig().embedding().model_id == "mock-embed"
+
+    monkeypatch.setattr(llm, "get_default_embedding_model", lambda: None)
+    with pytest.raises(errors.NoEmbeddingModelError):
+        ClmConfig().embedding()
+
+
+def test_index_cli(fake_project, isolated_cache_dir, monkeypatch):
+    monkeypatch.setenv("EMBEDDING_MODEL", "mock-embed")
+    docs = Path("docs")
+    docs.mkdir()
+    for name, text in FILES:
+        (docs / name).write_text(text)
+
+    built = fake_project.invoke(cli, ["index", "build", "docs", "-p", "*.md", "--name", "docs", "--batch-size", "2"])
+
+    assert built.exit_code == 0, built.output
+    assert built.stderr == "Indexed 3 files: embedded 3 chunks, reused 0 chunks and removed 0 files\n"
+    assert (isolated_cache_dir / INDEX_DIR / "docs" / CHUNKS_FILE).exists()
+
+    queried = fake_project.invoke(
+        cli, ["index", "query", "Fish swim in the sea.", "-k", "1", "--name", "docs", "--text"]
+    )
+
+    assert queried.exit_code == 0, queried.output
+    assert queried.stderr == f"1.000 {Path('docs/fish.md')}:1-1\n{FILES[2][1]}"
+
+    labels = fake_project.invoke(cli, ["index", "query", "Fish swim in the sea.", "-k", "2", "--name", "docs"])
+
+    assert labels.stderr.splitlines()[0] == f"1.000 {Path('docs/fish.md')}:1-1"
+    assert len(labels.stderr.splitlines()) == 2  # noqa: PLR2004
+
+
+def test_index_cli_query_before_building(fake_project):
+    result = fake_project.invoke(cli, ["index", "query", "Fish"])
+
+    assert result.exit_code == 1
+    assert isinstance(result.exception, errors.IndexNotFoundError)
+
+
+def test_vectors_are_float32(index, mock_embedding_model):
+    index.build(FILES, mock_embedding_model, chunk_tokens=100)
+
+    vectors = np.fromfile(index.directory / VECTORS_FILE.format(generation=1), dtype=np.float32).reshape(3, -1)
+
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1)
@@ -0,0 +1,116 @@
+import asyncio
+import io
+import sys
+
+import pytest
+from rich.console import Console
+
+from cli_llm import _logging
+
+
+def test_console_is_created_on_first_use(monkeypatch):
+    monkeypatch.delattr(_logging, "console", raising=False)
+
+    console = _logging.console
+
+    assert isinstance(console, Console)
+    assert _logging.get_console() is console
+
+
+def test_missing_attribute():
+    with pytest.raises(AttributeError, match="has no attribute 'fake'"):
+        _ = _logging.fake
+
+
+def test_tracebacks_are_rendered_with_rich(monkeypatch):
+    console = Console(record=True, width=100)
+    monkeypatch.setattr(_logging, "console", console)
+    monkeypatch.setattr(sys, "excepthook", sys.excepthook)
+
+    _logging.install_tracebacks()
+    try:
+        1 / 0  # noqa: B018
+    except ZeroDivisionError:
+        sys.excepthook(*sys.exc_info())
+
+    output = console.export_text()
+    assert "Traceback" in output
+    assert "ZeroDivisionError" in output
+
+
+@pytest.fixture
+def status_messages(monkeypatch):
+    console = Console(record=True, force_terminal=True)
+    monkeypatch.setattr(_logging, "console", console)
+    messages = []
+    status = console.status
+
+    def recording_status(message, *args, **kwargs):
+        messages.append(message)
+        return status(message, *args, **kwargs)
+
+    monkeypatch.setattr(console, "status", recording_status)
+    return messages
+
+
+def test_nested_spinners_only_show_the_outer_one(status_messages):
+    @_logging.spinner("inner")
+    def inner():
+        return 1
+
+    @_logging.spinner("outer")
+    def outer():
+        return inner() + 1
+
+    assert outer() == 2  # noqa: PLR2004
+    assert status_messages == ["outer"]
+
+
+def test_spinner_on_coroutine_function(status_messages):
+    @_logging.spinner("waiting")
+    async def wait(value):
+        await asyncio.sleep(0)
+        return value
+
+    async def main():
+        return await asyncio.gather(wait(1), wait(2))
+
+    assert asyncio.run(main()) == [1, 2]
+    assert status_messages == ["waiting"]
+
+
+def test_transcript_records_the_console():
+    console = Console(file=io.StringIO(), width=20)
+
+    with _logging.Transcript(console) as transcript:
+        console.print("[bold]Hello[/bold]", "world")
+        console.out("[raw] ", end="")
+        console.out("text that is longer than the console")
+        with console.status("not recorded"):
+            console.print("printed")
+    console.print("after")
+
+    assert transcript.text().splitlines()[:2] == ["Hello world", "[raw] text that is longer than the console"]
+    assert "printed" in transcript.text()
+    assert "not recorded" not in transcript.text()
+    assert "after" not in transcript.text()
+
+
+def test_transcript_is_bounded():
+    console = Console(file=io.StringIO())
+
+    with _logging.Transcript(console, max_lines=3) as transcript:
+        for i in range(10):
+            console.print(f"line {i}")
+
+    assert transcript.text() == "line 7\nline 8\nline 9\n"
+
+
+def test_transcript_save(tmp_path):
+    transcript = _logging.Transcript(Console(file=io.StringIO()))
+    transcript.write("some ")
+    transcript.write("text")
+
+    transcript.save(tmp_path / "transcript.txt")
+
+    assert (tmp_path / "transcript.txt").read_text() == "some text"
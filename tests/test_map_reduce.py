@@ -0,0 +1,206 @@
+import click
+import pytest
+from click.testing import CliRunner
+from logot import Logot, logged
+
+from cli_llm import errors, map_reduce, reduce_results
+from cli_llm._history import get_history
+from cli_llm.config import ClmConfig
+from cli_llm.map_reduce import _split_text, _Template, pack
+from cli_llm.tokens import count_bytes, register_tokenizer, unregister_tokenizer
+
+MAP_PROMPT = "Summarise:{% for f, contents in files %}\n{{f}}: {{contents}}{% endfor %}"
+REDUCE_PROMPT = "Combine:{% for summary in results %}\n{{summary}}{% endfor %}"
+
+
+@pytest.fixture
+def config() -> ClmConfig:
+    return ClmConfig(ll_model="mock")
+
+
+def _prompts(mock_model, prefix):
+    return [prompt.prompt for prompt, *_ in mock_model.history if prompt.prompt.startswith(prefix)]
+
+
+def test_map_reduce(mock_model, config):
+    items = [(f"file{i}.py", "x" * 40) for i in range(6)]
+    for _ in range(3):
+        mock_model.enqueue(["summary"])
+    mock_model.enqueue(["final", " answer"])
+
+    response = map_reduce(config, MAP_PROMPT, REDUCE_PROMPT, items, chunk_tokens=30)
+
+    assert list(response) == ["final", " answer"]
+    map_prompts = _prompts(mock_model, "Summarise:")
+    assert len(map_prompts) == 3  # noqa: PLR2004
+    assert all(count_bytes(prompt) <= 30 for prompt in map_prompts)  # noqa: PLR2004
+    assert sorted(name for prompt in map_prompts for name in prompt.split() if name.endswith(".py:")) == [
+        f"file{i}.py:" for i in range(6)
+    ]
+    assert _prompts(mock_model, "Combine:") == ["Combine:\nsummary\nsummary\nsummary"]
+
+
+@pytest.mark.usefixtures("debug_logging")
+def test_map_reduce_is_hierarchical(mock_model, config, logot: Logot):
+    items = [(f"file{i}.py", "x" * 40) for i in range(6)]
+    for _ in range(6):
+        mock_model.enqueue(["a long summary of the chunk"])
+    for _ in range(3):
+        mock_model.enqueue(["short"])
+    mock_model.enqueue(["final"])
+
+    response = map_reduce(config, MAP_PROMPT, REDUCE_PROMPT, items, chunk_tokens=20, prompt_data={"lang": "python"})
+
+    assert response.text() == "final"
+    reduce_prompts = _prompts(mock_model, "Combine:")
+    assert reduce_prompts[-1] == "Combine:\nshort\nshort\nshort"
+    assert len(reduce_prompts) == 4  # noqa: PLR2004
+    logot.assert_logged(logged.info("Reducing 6 results in 3 groups"))
+
+
+def test_map_reduce_records_the_tool(mock_model, config, isolated_run_history):
+    items = [(f"file{i}.py", "x" * 40) for i in range(6)]
+    for _ in range(4):
+        mock_model.enqueue(["summary"])
+
+    @click.group()
+    def clm():
+        pass
+
+    @clm.group()
+    def run():
+        pass
+
+    @run.command()
+    def summarise():
+        map_reduce(config, MAP_PROMPT, REDUCE_PROMPT, items, chunk_tokens=30).text()
+
+    result = CliRunner().invoke(clm, ["run", "summarise"])
+
+    assert result.exit_code == 0
+    assert [record.tool for record in get_history(isolated_run_history).query()] == ["summarise"] * 4
+
+
+def test_map_reduce_raises_on_results_too_large_to_reduce(mock_model, config):
+    items = [("a.py", "x" * 40), ("b.py", "y" * 40)]
+    for _ in range(2):
+        mock_model.enqueue(["z" * 100])
+
+    with pytest.raises(errors.TokenBudgetError, match="can not be reduced to fit the 20 budget"):
+        map_reduce(config, MAP_PROMPT, REDUCE_PROMPT, items, chunk_tokens=20)
+
+    assert _prompts(mock_model, "Combine:") == []
+
+
+def test_reduce_results_raises_on_a_result_too_large():
+    with pytest.raises(errors.TokenBudgetError, match="The results need about 28 tokens"):
+        reduce_results(ClmConfig(ll_model="mock"), REDUCE_PROMPT, ["z" * 100], chunk_tokens=20)
+
+
+def test_item_costs_are_counted_once():
+    rendered = []
+
+    def count(text):
+        rendered.append(text)
+        return len(text)
+
+    template = _Template(MAP_PROMPT, "files", {}, 100, count)
+    item = ("a.py", "x" * 10)
+
+    assert template.split(item) == [item]
+    assert template.pack([item, item]) == [[item, item]]
+    assert len(rendered) == 2  # noqa: PLR2004
+
+
+def test_map_reduce_splits_large_files(mock_model, config):
+    contents = "".join(f"line {i}\n" for i in range(40))
+
+    map_reduce(config, MAP_PROMPT, REDUCE_PROMPT, [("big.py", contents)], chunk_tokens=40).text()
+
+    map_prompts = sorted(_prompts(mock_model, "Summarise:"))
+    assert len(map_prompts) > 1
+    assert all(count_bytes(prompt) <= 40 for prompt in map_prompts)  # noqa: PLR2004
+    assert all(f"big.py (part {i} of {len(map_prompts)}):" in prompt for i, prompt in enumerate(map_prompts, 1))
+    assert "".join(prompt.split(":", 2)[2][1:] for prompt in map_prompts) == contents
+
+
+def test_map_reduce_uses_the_config(mock_model):
+    config = ClmConfig(ll_model="mock", map_reduce_chunk_tokens=1000, max_concurrency=1)
+
+    map_reduce(config, MAP_PROMPT, REDUCE_PROMPT, [("a.py", "a"), ("b.py", "b")]).text()
+
+    assert _prompts(mock_model, "Summarise:") == ["Summarise:\na.py: a\nb.py: b"]
+
+
+def test_map_reduce_fits_the_context(mock_model):
+    config = ClmConfig(ll_model="mock", ll_model_context_tokens={"mock": 60})
+    items = [(f"file{i}.py", "x" * 40) for i in range(4)]
+
+    map_reduce(config, MAP_PROMPT, REDUCE_PROMPT, items).text()
+
+    # Half of the context is left for the response.
+    assert all(count_bytes(prompt) <= 30 for prompt in _prompts(mock_model, "Summarise:"))  # noqa: PLR2004
+
+
+def test_map_reduce_counts_with_the_tokenizer_of_the_model(mock_model, config):
+    register_tokenizer("mock", len)
+    try:
+        map_reduce(config, MAP_PROMPT, REDUCE_PROMPT, [("big.py", "ab\n" * 40)], chunk_tokens=40).text()
+    finally:
+        unregister_tokenizer("mock")
+
+    map_prompts = _prompts(mock_model, "Summarise:")
+    assert len(map_prompts) > 1
+    assert all(len(prompt) <= 40 for prompt in map_prompts)  # noqa: PLR2004
+
+
+def test_map_reduce_splits_until_the_parts_fit(mock_model, config):
+    register_tokenizer("mock", lambda text: 2 * len(text))
+    try:
+        map_reduce(config, MAP_PROMPT, REDUCE_PROMPT, [("a", "x" * 50)], chunk_tokens=100).text()
+    finally:
+        unregister_tokenizer("mock")
+
+    map_prompts = sorted(_prompts(mock_model, "Summarise:"))
+    assert [len(prompt.rsplit(" ", 1)[1]) for prompt in map_prompts] == [22, 22, 6]
+    assert all(2 * len(prompt) <= 100 for prompt in map_prompts)  # noqa: PLR2004
+
+
+def test_prompt_larger_than_budget(config):
+    with pytest.raises(errors.TokenBudgetError, match="needs about 3 tokens, leaving none of the 3 budget"):
+        map_reduce(config, MAP_PROMPT, REDUCE_PROMPT, [], chunk_tokens=3)
+
+
+@pytest.mark.parametrize(
+    ("costs", "budget", "expected"),
+    [
+        ([], 10, []),
+        ([3, 3, 3, 3], 10, [[3, 3, 3], [3]]),
+        ([5, 20, 5], 10, [[5], [20], [5]]),
+        ([10, 1], 10, [[10], [1]]),
+    ],
+)
+def test_pack(costs, budget, expected):
+    assert pack(costs, lambda cost: cost, budget) == expected
+
+
+@pytest.mark.parametrize(
+    ("text", "size", "expected"),
+    [
+        ("ab\ncd\nef\n", 6, ["ab\ncd\n", "ef\n"]),
+        ("abcdefgh\nij\n", 3, ["abc", "def", "gh\n", "ij\n"]),
+        ("ab\ncdefgh", 3, ["ab\n", "cde", "fgh"]),
+        ("", 3, []),
+    ],
+)
+def test_split_text(text, size, expected):
+    assert _split_text(text, size) == expected
+
+
+def test_reduce_results(mock_model, config):
+    mock_model.enqueue(["combined"])
+
+    response = reduce_results(config, REDUCE_PROMPT, ["a", "b"], prompt_data={"lang": "python"})
+
+    assert response.text() == "combined"
+    assert _prompts(mock_model, "Combine:") == ["Combine:\na\nb"]
@@ -0,0 +1,237 @@
+import json
+import time
+
+import llm
+import pytest
+from llm.models import AsyncModel
+from llm.plugins import pm
+
+from cli_llm import _models
+from cli_llm._models import MODEL_REGISTRY_FILE, ModelRegistry, clear_memo
+from cli_llm.cli import cli
+
+
+class OtherModel(llm.Model):
+    model_id = "other"
+
+    def execute(self, _prompt, _stream, _response, _conversation):  # pragma: no cover
+        yield ""
+
+
+class BuiltModel(llm.Model):
+    def __init__(self, model_id):
+        self.model_id = model_id
+
+    def execute(self, _prompt, _stream, _response, _conversation):  # pragma: no cover
+        yield ""
+
+
+class AsyncBuiltModel(AsyncModel):
+    def __init__(self, model_id):
+        self.model_id = model_id
+
+    async def execute(self, _prompt, _stream, _response, _conversation):  # pragma: no cover
+        yield ""
+
+
+@pytest.fixture
+def built_plugin():
+    class BuiltModelsPlugin:
+        __name__ = "BuiltModelsPlugin"
+
+        @llm.hookimpl
+        def register_models(self, register):
+            register(BuiltModel("built"), AsyncBuiltModel("built"), aliases=["built-alias"])
+
+    pm.register(BuiltModelsPlugin(), name="built-models-plugin")
+    try:
+        yield
+    finally:
+        pm.unregister(name="built-models-plugin")
+
+
+@pytest.fixture
+def other_plugin():
+    class OtherModelsPlugin:
+        __name__ = "OtherModelsPlugin"
+
+        def __init__(self):
+            self.calls = 0
+
+        @llm.hookimpl
+        def register_models(self, register):
+            self.calls += 1
+            register(OtherModel(), aliases=["other-alias"])
+
+    plugin = OtherModelsPlugin()
+    pm.register(plugin, name="other-models-plugin")
+    try:
+        yield plugin
+    finally:
+        pm.unregister(name="other-models-plugin")
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return ModelRegistry(tmp_path / MODEL_REGISTRY_FILE, ttl=60)
+
+
+def test_resolve_records_the_plugin(registry, mock_model):
+    assert registry.resolve("mock") is mock_model
+
+    records = json.loads(registry.path.read_text())["records"]
+    assert records["mock"]["plugin"] == "undo-mock-models-plugin"
+
+
+def test_resolve_is_memoised(registry, other_plugin):
+    registry.resolve("other")
+    registry.resolve("other")
+
+    assert other_plugin.calls == 1
+
+
+def test_cached_resolve_only_asks_the_recorded_plugin(registry, mock_model, other_plugin):
+    registry.resolve("mock")
+    clear_memo()
+    calls = other_plugin.calls
+
+    assert registry.resolve("mock") is mock_model
+    assert other_plugin.calls == calls
+
+
+@pytest.mark.usefixtures("built_plugin")
+def test_recorded_model_is_built_without_asking_any_plugin(registry, monkeypatch):
+    registry.resolve("built-alias")
+    registry.resolve("built", async_=True)
+    clear_memo()
+
+    def registrations(*_):
+        pytest.fail("register_models was called")
+
+    monkeypatch.setattr(_models, "_registrations", registrations)
+    fresh = ModelRegistry(registry.path, ttl=60)
+    model = fresh.resolve("built-alias")
+    async_model = fresh.resolve("built", async_=True)
+
+    assert type(model) is BuiltModel
+    assert model.model_id == "built"
+    assert type(async_model) is AsyncBuiltModel
+
+
+@pytest.mark.usefixtures("built_plugin")
+@pytest.mark.parametrize("factory", ["tests.missing:BuiltModel", "tests.test_models:OtherModel"])
+def test_model_that_can_not_be_built_is_rediscovered(registry, factory):
+    registry.resolve("built")
+    clear_memo()
+    data = json.loads(registry.path.read_text())
+    data["records"]["built"]["model_factory"] = factory
+    registry.path.write_text(json.dumps(data))
+
+    assert type(registry.resolve("built")) is BuiltModel
+    assert json.loads(registry.path.read_text())["records"]["built"]["model_factory"] == (
+        "tests.test_models:BuiltModel"
+    )
+
+
+@pytest.mark.usefixtures("other_plugin")
+def test_models_that_can_not_be_rebuilt_are_not_recorded_as_buildable(registry):
+    registry.resolve("other")
+
+    record = json.loads(registry.path.read_text())["records"]["other"]
+    assert record["model_factory"] is None
+    assert record["async_model_factory"] is None
+
+
+def test_resolve_alias(registry, other_plugin):
+    assert registry.resolve("other-alias").model_id == "other"
+    clear_memo()
+    assert registry.resolve("other-alias").model_id == "other"
+    assert other_plugin.calls == 2  # noqa: PLR2004
+
+
+def test_expired_record_is_rediscovered(tmp_path, other_plugin):
+    registry = ModelRegistry(tmp_path / MODEL_REGISTRY_FILE, ttl=60)
+    registry.resolve("mock")
+    clear_memo()
+    calls = other_plugin.calls
+
+    ModelRegistry(registry.path, ttl=-1).resolve("mock")
+
+    assert other_plugin.calls == calls + 1
+
+
+def test_out_of_date_record_is_rediscovered(registry, mock_model, other_plugin):
+    registry.resolve("mock")
+    clear_memo()
+    data = json.loads(registry.path.read_text())
+    data["records"]["mock"]["model_class"] = "somewhere.Else"
+    registry.path.write_text(json.dumps(data))
+    calls = other_plugin.calls
+
+    assert registry.resolve("mock") is mock_model
+    assert other_plugin.calls == calls + 1
+
+
+def test_resolve_async_variant(registry, mock_model, async_mock_model):
+    assert registry.resolve("mock", async_=True) is async_mock_model
+    assert registry.resolve("mock") is mock_model
+
+
+@pytest.mark.usefixtures("other_plugin")
+def test_async_variant_missing(registry):
+    with pytest.raises(llm.UnknownModelError, match="Unknown async model \\(sync model exists\\): other"):
+        registry.resolve("other", async_=True)
+
+
+@pytest.mark.usefixtures("other_plugin")
+def test_record_without_the_async_variant(registry):
+    registry.resolve("other")
+    clear_memo()
+
+    with pytest.raises(llm.UnknownModelError, match="Unknown async model"):
+        registry.resolve("other", async_=True)
+
+
+def test_unknown_model(registry):
+    with pytest.raises(llm.UnknownModelError, match="Unknown model: fake"):
+        registry.resolve("fake")
+
+
+def test_user_alias_falls_back_to_llm(registry, mock_model, tmp_path, monkeypatch):
+    monkeypatch.setenv("LLM_USER_PATH", str(tmp_path))
+    (tmp_path / "aliases.json").write_text(json.dumps({"my-alias": "mock"}))
+
+    assert registry.resolve("my-alias") is mock_model
+    assert "my-alias" in json.loads(registry.path.read_text())["records"]
+
+
+@pytest.mark.parametrize("contents", ["not json", json.dumps({"format": -1, "records": {}})])
+def test_unreadable_registry_is_ignored(registry, mock_model, contents):
+    registry.path.write_text(contents)
+
+    assert registry.resolve("mock") is mock_model
+
+
+def test_write_failure_is_not_fatal(tmp_path, mock_model):
+    registry = ModelRegistry(tmp_path, ttl=60)
+
+    assert registry.resolve("mock") is mock_model
+
+
+def test_zero_ttl_does_not_persist(tmp_path):
+    registry = ModelRegistry(tmp_path / MODEL_REGISTRY_FILE, ttl=0)
+
+    registry.resolve("mock")
+
+    assert not registry.path.exists()
+
+
+@pytest.mark.usefixtures("other_plugin")
+def test_refresh_command(fake_project, isolated_cache_dir):
+    result = fake_project.invoke(cli, ["models", "refresh"])
+
+    assert result.exit_code == 0
+    assert "Recorded the plugins serving" in result.stderr
+    records = json.loads((isolated_cache_dir / MODEL_REGISTRY_FILE).read_text())["records"]
+    assert {"mock", "other", "other-alias"} <= records.keys()
+    assert records["other"]["resolved_at"] <= time.time()
@@ -0,0 +1,150 @@
+import pstats
+import threading
+import time
+import typing as t
+
+import pytest
+from logot import Logot, logged
+
+from cli_llm import _profile
+from cli_llm._profile import CallGraphProfiler, SamplingProfiler, collapse, frame_label, profile, write_profile
+from cli_llm.response import waiting_for_model_stream
+
+if t.TYPE_CHECKING:
+    import cProfile
+
+
+def busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def recurse(depth):
+    if depth:
+        recurse(depth - 1)
+    busy(0.01)
+
+
+def test_frame_label():
+    assert frame_label(("/src/cli_llm/run.py", 10, "run")) == "run (run.py:10)"
+    assert frame_label(("~", 0, "<built-in method time.sleep>")) == "<built-in method time.sleep>"
+    assert frame_label(("/a;b.py", 1, "f")) == "f (a:b.py:1)"
+
+
+def test_collapse():
+    key = ("/cli.py", 1, "cli")
+    stacks = {(key,): 0.5, (key, ("/run.py", 2, "run")): 0.25, (key, ("/x.py", 3, "tiny")): 1e-9}
+
+    assert collapse(stacks) == "cli (cli.py:1) 500000\ncli (cli.py:1);run (run.py:2) 250000\n"
+
+
+def test_call_graph_profiler_reconstructs_the_stacks():
+    profiler = CallGraphProfiler()
+    profiler.enable()
+    recurse(2)
+    profiler.disable()
+
+    stacks = profiler.stacks()
+
+    names = {tuple(key[2] for key in stack) for stack in stacks}
+    assert any(stack[-2:] == ("recurse", "busy") for stack in names)
+    assert all(stack.count("recurse") <= 1 for stack in names)
+    assert sum(stacks.values()) == pytest.approx(0.03, abs=0.015)
+
+
+def test_call_graph_profiler_prunes_the_smallest_stacks(monkeypatch):
+    monkeypatch.setattr(_profile, "MIN_FRACTION", 0.9)
+    profiler = CallGraphProfiler()
+    profiler.enable()
+    recurse(0)
+    profiler.disable()
+
+    assert not any(stack[-1][2] == "busy" for stack in profiler.stacks())
+
+
+def test_sampling_profiler():
+    profiler = SamplingProfiler(interval=0.001)
+    profiler.enable()
+    recurse(2)
+    busy(0.05)
+    profiler.disable()
+
+    stacks = profiler.stacks()
+    profiler.create_stats()
+
+    assert any(stack[-1][2] == "busy" for stack in stacks)
+    assert sum(stacks.values()) == pytest.approx(0.08, abs=0.03)
+    calls = {key[2]: entry for key, entry in profiler.stats.items()}
+    assert calls["busy"][0] > 1
+    assert calls["busy"][2] == pytest.approx(calls["busy"][3])
+    assert calls["recurse"][3] <= calls["test_sampling_profiler"][3]
+    pstats.Stats(t.cast("cProfile.Profile", profiler))
+
+
+def test_sampling_profiler_of_a_finished_thread():
+    profiler = SamplingProfiler(interval=0.001)
+    thread = threading.Thread(target=profiler.enable)
+    thread.start()
+    thread.join()
+    time.sleep(0.01)
+    profiler.disable()
+
+    assert profiler.stacks() == {}
+
+
+def test_waiting_for_the_model_is_attributed_to_its_own_frame():
+    def model_stream():
+        for _ in range(3):
+            busy(0.01)
+            yield "chunk"
+
+    profiler = CallGraphProfiler()
+    profiler.enable()
+    assert "".join(waiting_for_model_stream(model_stream())) == "chunk" * 3
+    profiler.disable()
+
+    assert ";waiting_for_model_stream (response.py:" in collapse(profiler.stacks())
+
+
+def test_write_profile(tmp_path):
+    profiler = CallGraphProfiler()
+    profiler.enable()
+    busy(0.01)
+    profiler.disable()
+
+    paths = write_profile(profiler, tmp_path / "profiles", "example")
+
+    assert paths is not None
+    pstats_path, collapsed_path = paths
+    assert pstats_path.name.startswith("example-")
+    assert pstats_path.suffix == ".pstats"
+    assert collapsed_path.with_suffix(".pstats") == pstats_path
+    assert "busy (test_profile.py:" in collapsed_path.read_text()
+    assert "busy" in {key[2] for key in pstats.Stats(str(pstats_path)).stats}  # type: ignore[attr-defined]
+
+
+def test_write_profile_without_samples(tmp_path):
+    profiler = SamplingProfiler()
+    profiler.disable()
+
+    assert write_profile(profiler, tmp_path, "example") is None
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.usefixtures("debug_logging")
+def test_profile(tmp_path, capsys):
+    with profile("cprofile", tmp_path, "example"):
+        busy(0.01)
+
+    assert "Wrote the profile to" in capsys.readouterr().err
+    assert len(list(tmp_path.glob("example-*"))) == 2  # noqa: PLR2004
+
+
+@pytest.mark.usefixtures("debug_logging")
+def test_profile_too_short(tmp_path, logot: Logot):
+    with profile("sampling", tmp_path, "example"):
+        pass
+
+    logot.assert_logged(logged.warning("Nothing was profiled, the run was too short to take any samples"))
+    assert list(tmp_path.iterdir()) == []
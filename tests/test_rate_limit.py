@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+
+from cli_llm._rate_limit import RateLimiter
+
+
+def test_rate_limiter_spaces_out_requests():
+    now = [0.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+
+    limiter = RateLimiter(120, clock=lambda: now[0], sleep=sleep)
+    for _ in range(3):
+        limiter.wait()
+    now[0] = 5.0
+    limiter.wait()
+
+    assert sleeps == [0.5, 1.0]
+
+
+def test_rate_limiter_without_limit():
+    limiter = RateLimiter(None, sleep=lambda _: pytest.fail("Should not wait"))
+
+    limiter.wait()
+    asyncio.run(limiter.async_wait())
+
+
+def test_rate_limiter_async(monkeypatch):
+    sleeps = []
+
+    async def sleep(seconds):
+        sleeps.append(seconds)
+
+    monkeypatch.setattr(asyncio, "sleep", sleep)
+    limiter = RateLimiter(60, clock=lambda: 0.0)
+
+    async def requests():
+        for _ in range(3):
+            await limiter.async_wait()
+
+    asyncio.run(requests())
+
+    assert sleeps == [1.0, 2.0]
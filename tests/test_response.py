@@ -1,9 +1,12 @@
+import asyncio
+from types import SimpleNamespace
+
 import llm
 import pytest
 from rich.console import Console
 
-from cli_llm import _logging
-from cli_llm.response import Response
+from cli_llm import _logging, response
+from cli_llm.response import AsyncResponse, Response, ResponseMetrics
 
 
 @pytest.fixture
@@ -51,6 +54,96 @@ def test_response_interface(mock_model):
     assert repr(response) == repr(core_response)
 
 
+@pytest.fixture
+def fake_clock(monkeypatch):
+    """Each reading of the clock is a second after the last."""
+    times = iter(range(100))
+    monkeypatch.setattr(response, "time", SimpleNamespace(perf_counter=lambda: float(next(times))))
+
+
+@pytest.mark.usefixtures("fake_clock")
+def test_metrics(mock_model):
+    mock_model.enqueue(["", "hello", "world"])
+    mock_model.usage = (3, 4)
+    model = llm.get_model("mock")
+
+    result = Response(model.prompt("prompt"), prompt_chars=6)
+    assert result.metrics.latency is None
+    result.text()
+    list(result)
+
+    assert result.metrics == ResponseMetrics(
+        prompt_chars=6,
+        prompt_tokens=3,
+        time_to_first_token=1.0,
+        latency=2.0,
+        chunks=3,
+        output_chars=10,
+        output_tokens=4,
+    )
+    assert result.metrics.tokens_per_second == 4.0  # noqa: PLR2004
+
+
+@pytest.mark.usefixtures("fake_clock")
+def test_metrics_from_json(mock_model):
+    mock_model.enqueue(["{}"])
+    model = llm.get_model("mock")
+
+    result = Response(model.prompt(""))
+    result.json()
+
+    assert result.metrics.chunks == 1
+    assert result.metrics.output_tokens is None
+
+
+def test_metrics_on_error(mock_model, monkeypatch):
+    def fail(*_, **__):
+        msg = "Boom"
+        raise ValueError(msg)
+        yield
+
+    monkeypatch.setattr(mock_model, "execute", fail)
+    finished: list[ResponseMetrics] = []
+
+    result = Response(llm.get_model("mock").prompt(""), on_finish=finished.append)
+    with pytest.raises(ValueError, match="Boom"):
+        result.text()
+
+    assert finished == [result.metrics]
+    assert result.metrics.error == "ValueError"
+    assert result.metrics.latency is None
+
+
+def test_async_metrics_on_error(async_mock_model, monkeypatch):
+    async def fail(*_, **__):
+        msg = "Boom"
+        raise ValueError(msg)
+        yield
+
+    monkeypatch.setattr(async_mock_model, "execute", fail)
+    finished: list[ResponseMetrics] = []
+
+    result = AsyncResponse(llm.get_async_model("mock").prompt(""), on_finish=finished.append)
+    with pytest.raises(ValueError, match="Boom"):
+        asyncio.run(result.text())
+
+    assert finished == [result.metrics]
+    assert result.metrics.error == "ValueError"
+
+
+@pytest.mark.parametrize(
+    ("metrics", "expected"),
+    [
+        (ResponseMetrics(), None),
+        (ResponseMetrics(output_tokens=10), None),
+        (ResponseMetrics(output_tokens=10, latency=3.0), 10 / 3),
+        (ResponseMetrics(output_tokens=10, latency=1.0, time_to_first_token=1.0), None),
+    ],
+)
+def test_tokens_per_second(metrics, expected):
+    assert metrics.tokens_per_second == expected
+
+
 def test_stream(mock_model, capsys):
     mock_model.enqueue(["helloworld"])
     model = llm.get_model("mock")
@@ -61,6 +154,18 @@ def test_stream(mock_model, capsys):
     assert "helloworld" in capsys.readouterr()
 
 
+def test_stream_markdown(mock_model, patched_console):
+    mock_model.enqueue(["# Title\n\n", "Some ", "*text*"])
+    model = llm.get_model("mock")
+
+    response = Response(model.prompt(""))
+    response.stream(markdown=True)
+
+    output = patched_console.export_text()
+    assert "Title" in output
+    assert "Some text" in output
+
+
 def test_write_to_file(mock_model, named_temp_fs):
     mock_model.enqueue(["helloworld"])
     model = llm.get_model("mock")
@@ -83,3 +188,129 @@ def test_write_to_file_has_newline(mock_model, named_temp_fs):
     response.write_to_file(test_file)
 
     assert test_file.read_text() == "helloworld\n"
+
+
+@pytest.fixture
+def async_response(async_mock_model):
+    async_mock_model.enqueue(["hello", "world"])
+    return AsyncResponse(llm.get_async_model("mock").prompt(""))
+
+
+def test_async_text(async_response, patched_console):
+    with patched_console.capture() as capture:
+        result = asyncio.run(async_response.text())
+
+    assert "Fetching response from LLM..." in capture.get()
+    assert result == "helloworld"
+
+
+def test_async_json(async_response, patched_console):
+    with patched_console.capture() as capture:
+        result = asyncio.run(async_response.json())
+
+    assert "Fetching JSON response from LLM..." in capture.get()
+    assert result is None
+
+
+def test_async_response_interface(async_response):
+    assert isinstance(async_response.response, llm.AsyncResponse)
+    assert repr(async_response) == repr(async_response.response)
+
+
+def test_async_iteration(async_response):
+    async def chunks():
+        return [chunk async for chunk in async_response]
+
+    assert asyncio.run(chunks()) == ["hello", "world"]
+
+
+@pytest.mark.usefixtures("fake_clock")
+def test_async_metrics(async_response):
+    async def receive():
+        await async_response.json()
+        return [chunk async for chunk in async_response]
+
+    assert asyncio.run(receive()) == ["hello", "world"]
+    assert async_response.metrics == ResponseMetrics(time_to_first_token=1.0, latency=2.0, chunks=2, output_chars=10)
+
+
+def test_async_stream(async_response, capsys):
+    asyncio.run(async_response.stream())
+
+    assert "helloworld" in capsys.readouterr().err
+
+
+def test_async_stream_markdown(async_response, patched_console):
+    asyncio.run(async_response.stream(markdown=True))
+
+    assert "helloworld" in patched_console.export_text()
+
+
+def test_async_write_to_file(async_response, named_temp_fs):
+    test_file = named_temp_fs / "test.txt"
+
+    asyncio.run(async_response.write_to_file(test_file))
+
+    assert test_file.read_text() == "helloworld\n"
+
+
+def test_write_to_file_without_streaming(mock_model, named_temp_fs):
+    mock_model.enqueue(["hello", "world"])
+    response = Response(llm.get_model("mock").prompt(""))
+
+    test_file = named_temp_fs / "test.txt"
+    response.write_to_file(test_file, stream=False)
+
+    assert test_file.read_text() == "helloworld\n"
+
+
+def test_write_to_file_tee(mock_model, named_temp_fs, patched_console):
+    mock_model.enqueue(["hello", "", "world"])
+    response = Response(llm.get_model("mock").prompt(""))
+
+    test_file = named_temp_fs / "test.txt"
+    with patched_console.capture() as capture:
+        response.write_to_file(test_file, tee=True)
+
+    assert capture.get() == "helloworld"
+    assert test_file.read_text() == "helloworld\n"
+
+
+def test_write_to_file_shows_a_spinner(mock_model, named_temp_fs, patched_console):
+    mock_model.enqueue(["hello"])
+    response = Response(llm.get_model("mock").prompt(""))
+
+    test_file = named_temp_fs / "test.txt"
+    with patched_console.capture() as capture:
+        response.write_to_file(test_file)
+
+    assert "Writing response from LLM to test.txt..." in capture.get()
+
+
+@pytest.mark.parametrize("error", [RuntimeError, KeyboardInterrupt])
+def test_interrupted_write_leaves_the_file_untouched(mock_model, named_temp_fs, monkeypatch, error):
+    def execute(*_, **__):
+        yield "partial"
+        raise error
+
+    monkeypatch.setattr(mock_model, "execute", execute)
+    response = Response(llm.get_model("mock").prompt(""))
+    test_file = named_temp_fs / "test.txt"
+    test_file.write_text("original")
+
+    with pytest.raises(error):
+        response.write_to_file(test_file)
+
+    assert test_file.read_text() == "original"
+    assert list(named_temp_fs.iterdir()) == [test_file]
+
+
+@pytest.mark.parametrize("stream", [True, False])
+def test_async_write_to_file_modes(async_mock_model, named_temp_fs, stream):
+    async_mock_model.enqueue(["hello\n"])
+    response = AsyncResponse(llm.get_async_model("mock").prompt(""))
+    test_file = named_temp_fs / "test.txt"
+
+    asyncio.run(response.write_to_file(test_file, stream=stream))
+
+    assert test_file.read_text() == "hello\n"
@@ -0,0 +1,196 @@
+import asyncio
+import time
+
+import pytest
+from logot import Logot, logged
+
+from cli_llm._response_cache import RESPONSE_CACHE_FILE, AsyncCachedResponse, CachedResponse, ResponseCache
+from cli_llm.cli import cli
+from cli_llm.config import ClmConfig
+from cli_llm.response import Response
+from cli_llm.run import run
+
+
+@pytest.fixture
+def cache(tmp_path) -> ResponseCache:
+    return ResponseCache(tmp_path / RESPONSE_CACHE_FILE, ttl=60, max_bytes=1000)
+
+
+@pytest.fixture
+def cached_config() -> ClmConfig:
+    return ClmConfig(ll_model="mock", response_cache=True)
+
+
+def test_cache_disabled_by_default():
+    assert ClmConfig(ll_model="mock").response_store() is None
+
+
+def test_config_response_store(cached_config, isolated_cache_dir):
+    store = cached_config.response_store()
+
+    assert store is not None
+    assert store.path == isolated_cache_dir / RESPONSE_CACHE_FILE
+
+
+def test_key_depends_on_every_input():
+    key = ResponseCache.key("mock", {}, "hello")
+
+    assert key == ResponseCache.key("mock", {}, "hello")
+    assert key != ResponseCache.key("other", {}, "hello")
+    assert key != ResponseCache.key("mock", {"temperature": 0.5}, "hello")
+    assert key != ResponseCache.key("mock", {}, "hello!")
+    assert ResponseCache.key("mock", {"a": 1, "b": 2}, "") == ResponseCache.key("mock", {"b": 2, "a": 1}, "")
+
+
+def test_set_and_get(cache):
+    cache.set("key", "mock", "hello", {"raw": [1, 2]})
+
+    cached = cache.get("key")
+
+    assert cached is not None
+    assert cached.model_id == "mock"
+    assert cached.text() == "hello"
+    assert cached.json() == {"raw": [1, 2]}
+    assert cache.get("missing") is None
+
+
+def test_expired_responses_are_not_served(cache, monkeypatch):
+    now = time.time()
+    cache.set("key", "mock", "hello")
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+
+    assert cache.get("key") is None
+
+
+def test_expired_responses_are_removed(cache, monkeypatch):
+    now = time.time()
+    cache.set("old", "mock", "hello")
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    cache.set("new", "mock", "world")
+    monkeypatch.setattr(time, "time", lambda: now)
+
+    assert cache.get("old") is None
+    assert cache.get("new") is not None
+
+
+def test_least_recently_used_responses_are_evicted(cache):
+    cache.set("first", "mock", "a" * 400)
+    cache.set("second", "mock", "b" * 400)
+    assert cache.get("first") is not None
+
+    cache.set("third", "mock", "c" * 400)
+
+    assert cache.get("first") is not None
+    assert cache.get("second") is None
+    assert cache.get("third") is not None
+
+
+@pytest.mark.usefixtures("debug_logging")
+def test_unusable_cache_is_a_miss(tmp_path, logot: Logot):
+    path = tmp_path / RESPONSE_CACHE_FILE
+    path.write_text("not a database")
+    cache = ResponseCache(path, ttl=60, max_bytes=1000)
+
+    cache.set("key", "mock", "hello")
+    assert cache.get("key") is None
+
+    logot.assert_logged(
+        logged.warning("Failed to write to the response cache due to: %s")
+        >> logged.warning("Failed to read from the response cache due to: %s")
+    )
+
+
+def test_cached_response():
+    cached = CachedResponse("mock", "hello")
+
+    assert list(cached) == ["hello"]
+    assert list(CachedResponse("mock", "")) == []
+    assert repr(cached) == "<CachedResponse model_id='mock' text='hello'>"
+
+
+def test_async_cached_response():
+    cached = AsyncCachedResponse(CachedResponse("mock", "hello", {"raw": True}))
+
+    async def chunks():
+        return [chunk async for chunk in cached]
+
+    assert asyncio.run(chunks()) == ["hello"]
+    assert asyncio.run(cached.text()) == "hello"
+    assert asyncio.run(cached.json()) == {"raw": True}
+    assert repr(cached) == "<AsyncCachedResponse model_id='mock' text='hello'>"
+
+
+def test_run_uses_the_cache(mock_model, cached_config):
+    mock_model.enqueue(["hello", "world"])
+
+    first = run(cached_config, "{{test}}", {"test": "value"})
+    assert list(first) == ["hello", "world"]
+
+    second = run(cached_config, "{{test}}", {"test": "value"})
+
+    assert isinstance(second.response, CachedResponse)
+    assert second.text() == "helloworld"
+    assert len(mock_model.history) == 1
+
+
+def test_run_misses_on_different_inputs(mock_model, cached_config):
+    mock_model.enqueue(["hello"])
+    mock_model.enqueue(["world"])
+    mock_model.enqueue(["again"])
+    max_tokens = 5
+
+    assert run(cached_config, "{{test}}", {"test": "value"}).text() == "hello"
+    assert run(cached_config, "{{test}}", {"test": "other"}).text() == "world"
+    assert run(cached_config, "{{test}}", {"test": "value"}, options={"max_tokens": max_tokens}).text() == "again"
+    assert mock_model.history[-1][0].options.max_tokens == max_tokens
+
+
+def test_run_does_not_cache_incomplete_responses(mock_model, cached_config):
+    mock_model.enqueue(["hello"])
+
+    run(cached_config, "prompt", {})
+
+    assert not isinstance(run(cached_config, "prompt", {}).response, CachedResponse)
+
+
+def test_run_refreshes_the_cache(mock_model):
+    mock_model.enqueue(["hello"])
+    mock_model.enqueue(["world"])
+    run(ClmConfig(ll_model="mock", response_cache=True), "prompt", {}).text()
+
+    refreshed = run(ClmConfig(ll_model="mock", response_cache=True, response_cache_refresh=True), "prompt", {})
+    assert refreshed.text() == "world"
+
+    assert run(ClmConfig(ll_model="mock", response_cache=True), "prompt", {}).text() == "world"
+
+
+def test_cached_response_through_wrapper(tmp_path):
+    response = Response(CachedResponse("mock", "hello", {"raw": True}))
+    output = tmp_path / "output.txt"
+
+    response.write_to_file(output)
+
+    assert response.json() == {"raw": True}
+    assert output.read_text() == "hello\n"
+
+
+@pytest.mark.parametrize(
+    ("flags", "expected"),
+    [
+        ([], "Prompting MockModel: mock\n\n"),
+        (["--cache"], "Using the cached response from MockModel: mock\n\n"),
+        (["--no-cache"], "Prompting MockModel: mock\n\n"),
+        (["--refresh"], "Prompting MockModel: mock\n\n"),
+        (["--no-cache", "--refresh"], "Prompting MockModel: mock\n\n"),
+    ],
+)
+def test_cli_cache_flags(fake_project, mock_model, flags, expected):
+    mock_model.enqueue(["hello"])
+    mock_model.enqueue(["world"])
+    args = ["run", "example", "summarise", "--test", "value1"]
+    fake_project.invoke(cli, ["--cache", *args])
+
+    result = fake_project.invoke(cli, [*flags, *args])
+
+    assert result.exit_code == 0
+    assert result.stderr == expected
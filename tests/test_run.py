@@ -1,10 +1,14 @@
+import asyncio
+from pathlib import Path
 from typing import TYPE_CHECKING
 
 import llm
 import pytest
+from logot import Logot, logged
 
+from cli_llm import errors, helpers
 from cli_llm.config import ClmConfig
-from cli_llm.run import _render, run
+from cli_llm.run import _render, arun, arun_many, run
 
 if TYPE_CHECKING:
     from conftest import MockModel
@@ -32,9 +36,146 @@ def test_example_run(mock_model, mock_config):
     response = run(mock_config, "test", {})
 
     assert response.text() == "helloworld"
+    assert response.metrics.prompt_chars == len("test")
 
 
 def test_render_prompt():
     prompt = _render("{{test}}", {"test": "hello"})
 
     assert prompt == "hello"
+
+
+def test_example_arun(async_mock_model, mock_config):
+    async_mock_model.enqueue(["hello", "world"])
+
+    response = asyncio.run(arun(mock_config, "{{test}}", {"test": "value"}))
+
+    assert asyncio.run(response.text()) == "helloworld"
+    assert async_mock_model.history[0][0].prompt == "value"
+    assert response.metrics.prompt_chars == len("value")
+
+
+@pytest.mark.usefixtures("debug_logging")
+def test_arun_logging(async_mock_model, mock_config, logot: Logot):
+    async_mock_model.enqueue(["hello"])
+
+    asyncio.run(arun(mock_config, "{{test}}", {"test": "value"}))
+
+    logot.assert_logged(logged.info("Rendering the prompt.") >> logged.info("Getting the async model: mock"))
+
+
+def test_arun_uses_the_cache(async_mock_model):
+    config = ClmConfig(ll_model="mock", response_cache=True, template_bytecode_cache=True)
+    async_mock_model.enqueue(["hello"])
+
+    async def prompt_twice():
+        first = await arun(config, "prompt", {})
+        assert await first.text() == "hello"
+        second = await arun(config, "prompt", {})
+        return await second.text()
+
+    assert asyncio.run(prompt_twice()) == "hello"
+    assert len(async_mock_model.history) == 1
+
+
+@pytest.mark.parametrize(("concurrency", "expected"), [(2, 2), (None, 4)])
+def test_arun_many_is_bounded(async_mock_model, mock_config, concurrency, expected):
+    data = [{"test": str(i)} for i in range(8)]
+    for i in range(8):
+        async_mock_model.enqueue([f"response {i}", "!"])
+
+    responses = asyncio.run(arun_many(mock_config, "{{test}}", data, concurrency=concurrency))
+
+    assert async_mock_model.most_in_flight == expected
+    assert sorted(prompt.prompt for prompt, *_ in async_mock_model.history) == sorted(d["test"] for d in data)
+    assert [asyncio.run(response.text()) for response in responses] == [f"response {i}!" for i in range(8)]
+
+
+def test_requests_are_rate_limited(mock_model):
+    config = ClmConfig(ll_model="mock", requests_per_minute=30)
+    sleeps: list[float] = []
+    config.rate_limiter._clock = lambda: 0.0  # noqa: SLF001
+    config.rate_limiter._sleep = sleeps.append  # noqa: SLF001
+
+    for _ in range(3):
+        run(config, "Summarise {{ text }}", {"text": "a"}).text()
+
+    assert len(mock_model.history) == 3  # noqa: PLR2004
+    assert sleeps == [2.0, 4.0]
+
+
+def test_async_requests_are_rate_limited(async_mock_model, monkeypatch):
+    config = ClmConfig(ll_model="mock", requests_per_minute=60)
+    sleeps = []
+
+    async def sleep(seconds):
+        sleeps.append(seconds)
+
+    monkeypatch.setattr(asyncio, "sleep", sleep)
+
+    async def requests():
+        for _ in range(2):
+            await (await arun(config, "Summarise {{ text }}", {"text": "a"})).text()
+
+    asyncio.run(requests())
+
+    assert len(async_mock_model.history) == 2  # noqa: PLR2004
+    assert len(sleeps) == 1
+    assert 0 < sleeps[0] <= 1
+
+
+def test_dry_run_does_not_prompt(mock_model, capsys):
+    config = ClmConfig(ll_model="mock", dry_run=True, ll_model_context_tokens={"mock": 100})
+
+    with pytest.raises(errors.DryRunComplete, match="reported the prompt for mock"):
+        run(config, "Summarise {{ text }}", {"text": "a" * 40})
+
+    assert mock_model.history == []
+    output = capsys.readouterr().err
+    assert "Dry run of mock" in output
+    assert "13 tokens, which fits in the 100 token context" in output
+
+
+def test_dry_run_lists_files_read_as_the_prompt_is_rendered(mock_model, named_temp_fs, monkeypatch, capsys):
+    named_temp_fs.gen({"a.py": "a" * 40, "b.py": "b" * 80})
+    monkeypatch.chdir(named_temp_fs)
+    config = ClmConfig(ll_model="mock", dry_run=True)
+    files = helpers.iter_file_contents(search_path=Path(), pattern="*.py")
+
+    with pytest.raises(errors.DryRunComplete):
+        run(config, "{% for name, text in files %}{{ name }}: {{ text }}\n{% endfor %}", {"files": files})
+
+    rows = [line.split("│")[1:3] for line in capsys.readouterr().err.splitlines() if "│" in line]
+    assert [[cell.strip() for cell in row] for row in rows] == [
+        ["template", "0"],
+        ["files", "34"],
+        ["b.py", "20"],
+        ["a.py", "10"],
+    ]
+    assert mock_model.history == []
+
+
+def test_async_dry_run_does_not_prompt(async_mock_model, capsys):
+    config = ClmConfig(ll_model="mock", dry_run=True)
+
+    with pytest.raises(errors.DryRunComplete):
+        asyncio.run(arun(config, "Summarise {{ text }}", {"text": "a" * 40}))
+
+    assert async_mock_model.history == []
+    assert "no context size is configured" in capsys.readouterr().err
+
+
+def test_prompt_larger_than_the_context(mock_model):
+    config = ClmConfig(ll_model="mock", ll_model_context_tokens={"mo*": 10})
+
+    with pytest.raises(errors.PromptTooLargeError, match="about 13 tokens, more than the 10 token context of mock"):
+        run(config, "Summarise {{ text }}", {"text": "a" * 40})
+
+    assert mock_model.history == []
+
+
+def test_prompt_within_the_context(mock_model):
+    config = ClmConfig(ll_model="mock", ll_model_context_tokens={"mock": 13})
+    mock_model.enqueue(["done"])
+
+    assert run(config, "Summarise {{ text }}", {"text": "a" * 40}).text() == "done"
@@ -0,0 +1,69 @@
+"""Startup benchmarks, guarding the cost of `clm` commands that do not need the heavy dependencies."""
+
+import subprocess
+import sys
+
+import pytest
+
+import cli_llm
+
+STARTUP_BUDGET_MS = 100
+
+HEAVY_MODULES = ("llm", "jinja2", "pydantic_settings", "rich.console", "rich.logging", "rich.traceback")
+
+RUN_CLI = """
+import sys
+from cli_llm.cli import cli
+
+try:
+    cli({args!r})
+except SystemExit:
+    pass
+print(*sys.modules, sep="\\n", file=sys.stdout)
+"""
+
+
+def _run_cli(*args: str, cwd=None) -> subprocess.CompletedProcess[str]:
+    return subprocess.run(  # noqa: PLW1510
+        [sys.executable, "-X", "importtime", "-c", RUN_CLI.format(args=list(args))],
+        capture_output=True,
+        text=True,
+        cwd=cwd,
+    )
+
+
+def _cumulative_import_ms(importtime: str, module: str) -> float:
+    for line in importtime.splitlines():
+        if line.startswith("import time:") and line.rsplit("|", 1)[-1].strip() == module:
+            return int(line.split("|")[1]) / 1000
+    pytest.fail(f"{module} was not imported")
+
+
+def test_help_import_budget():
+    result = _run_cli("--help")
+
+    assert "Welcome to the CLI-llm tool!" in result.stdout
+    assert _cumulative_import_ms(result.stderr, "cli_llm.cli") < STARTUP_BUDGET_MS
+
+
+@pytest.mark.parametrize("args", [("--help",), ("run", "--help"), ("batch", "--help"), ("new", "fake")])
+def test_commands_do_not_import_heavy_modules(args, tmp_path):
+    # Listing tools needs the config and creating a tool renders a template, but neither needs anything else.
+    needed = {"run": "pydantic_settings", "new": "jinja2"}.get(args[0])
+    heavy_modules = set(HEAVY_MODULES) - {needed}
+
+    result = _run_cli(*args, cwd=tmp_path)
+
+    imported = set(result.stdout.splitlines())
+    assert not imported.intersection(heavy_modules)
+
+
+def test_lazy_attribute():
+    from cli_llm.config import ClmConfig
+
+    assert cli_llm.ClmConfig is ClmConfig
+
+
+def test_missing_attribute():
+    with pytest.raises(AttributeError, match="has no attribute 'fake'"):
+        _ = cli_llm.fake
@@ -0,0 +1,88 @@
+import datetime as dt
+
+import pytest
+
+from cli_llm._stats import percentile, prometheus, summarise, table, write_prometheus
+from tests.test_history import _record
+
+
+@pytest.mark.parametrize(
+    ("values", "fraction", "expected"),
+    [
+        ([], 0.5, None),
+        ([3.0], 0.95, 3.0),
+        ([4.0, 1.0, 3.0, 2.0], 0.5, 2.5),
+        ([1.0, 2.0, 3.0, 4.0, 5.0], 0.95, 4.8),
+        ([1.0, 2.0], 1.0, 2.0),
+    ],
+)
+def test_percentile(values, fraction, expected):
+    assert percentile(values, fraction) == pytest.approx(expected)
+
+
+@pytest.fixture
+def records():
+    day = dt.datetime(2024, 5, 1, 12).timestamp()  # noqa: DTZ001
+    return [
+        _record(day, tool="b", latency=1.0, output_tokens=5),
+        _record(day, tool="a", latency=2.0, cached=True),
+        _record(day + 24 * 60 * 60, tool="a", latency=4.0, error="ValueError"),
+        _record(day, tool=None, latency=None, time_to_first_token=None),
+    ]
+
+
+def test_summarise(records):
+    groups = summarise(records, ["tool", "model"])
+
+    assert list(groups) == [("-", "mock"), ("a", "mock"), ("b", "mock")]
+    assert groups["a", "mock"].runs == 2  # noqa: PLR2004
+    assert groups["a", "mock"].errors == 1
+    assert groups["a", "mock"].cache_hits == 1
+    assert groups["a", "mock"].latencies == [2.0, 4.0]
+    assert groups["b", "mock"].tokens_per_second == [10.0]
+    assert groups["-", "mock"].latencies == []
+
+
+def test_summarise_by_day(records):
+    groups = summarise(records, ["day"])
+
+    assert {key: stats.runs for key, stats in groups.items()} == {("2024-05-01",): 3, ("2024-05-02",): 1}
+
+
+def test_table(records):
+    result = table(summarise(records, ["tool"]), ["tool"])
+
+    assert [column.header for column in result.columns][:4] == ["tool", "runs", "errors", "cached"]
+    assert list(result.columns[4].cells) == ["-", "3.00s", "1.00s"]
+    assert [column.header for column in result.columns][-2:] == ["tok/s p50", "tok/s p95"]
+    assert list(result.columns[-1].cells) == ["-", "-", "10.0"]
+
+
+def test_prometheus(records):
+    text = prometheus(summarise(records, ["tool"]), ["tool"])
+
+    assert 'clm_runs{tool="a"} 2\n' in text
+    assert 'clm_run_cache_hits{tool="a"} 1\n' in text
+    assert 'clm_run_latency_seconds{tool="a",quantile="0.5"} 3.0\n' in text
+    assert 'clm_run_latency_seconds{tool="-",quantile="0.5"}' not in text
+    assert "# TYPE clm_run_time_to_first_token_seconds gauge\n" in text
+    assert 'clm_run_output_tokens_per_second{tool="b",quantile="0.95"} 10.0\n' in text
+    assert "counter" not in text
+
+
+def test_prometheus_escapes_labels():
+    text = prometheus(summarise([_record(tool='say "hi"\\\n')], ["tool"]), ["tool"])
+
+    assert 'clm_runs{tool="say \\"hi\\"\\\\\\n"} 1\n' in text
+
+
+def test_prometheus_without_groups():
+    assert "clm_runs 1\n" in prometheus(summarise([_record()], []), [])
+
+
+def test_write_prometheus_leaves_out_the_day(records, tmp_path):
+    write_prometheus(tmp_path / "clm.prom", records, ["day", "tool"])
+
+    text = (tmp_path / "clm.prom").read_text()
+    assert 'clm_runs{tool="a"} 2\n' in text
+    assert "day=" not in text
@@ -0,0 +1,126 @@
+import io
+import threading
+
+import pytest
+from rich.console import Console
+
+from cli_llm import _logging
+from cli_llm._stream import StreamWriter, split_finished_blocks
+
+
+@pytest.fixture
+def console():
+    return Console(file=io.StringIO(), record=True, width=80)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_chunks_are_coalesced(console, monkeypatch):
+    writes = []
+    out = console.out
+
+    def record(text, **kwargs):
+        writes.append(text)
+        out(text, **kwargs)
+
+    monkeypatch.setattr(console, "out", record)
+    clock = FakeClock()
+
+    with StreamWriter(console, max_delay=1, max_chars=10, clock=clock) as writer:
+        for chunk in ["a", "b", "", "c"]:
+            writer.write(chunk)
+        clock.now = 1
+        writer.write("d")
+        writer.write("0123456789")
+        writer.write("e")
+
+    assert writes == ["abcd", "0123456789", "e"]
+    assert console.file.getvalue() == "abcd0123456789e"
+
+
+def test_buffer_is_written_when_the_model_pauses(console, monkeypatch):
+    written = threading.Event()
+    out = console.out
+
+    def record(text, **kwargs):
+        out(text, **kwargs)
+        written.set()
+
+    monkeypatch.setattr(console, "out", record)
+
+    with StreamWriter(console, max_delay=0.01, clock=FakeClock()) as writer:
+        writer.write("a")
+        writer.write("b")
+
+        assert written.wait(5)
+        assert console.file.getvalue() == "ab"
+
+
+def test_markup_is_not_interpreted(console):
+    with StreamWriter(console) as writer:
+        writer.write("[bold]not markup[/bold] :smile:")
+
+    assert console.export_text() == "[bold]not markup[/bold] :smile:"
+
+
+def test_flush_without_anything_buffered(console):
+    writer = StreamWriter(console)
+
+    writer.flush()
+
+    assert console.file.getvalue() == ""
+
+
+def test_markdown(console):
+    text = "# Title\n\nSome *text*\n\n```python\nx = 1\n\ny = 2\n```\n\n- item"
+    with StreamWriter(console, markdown=True, max_delay=0) as writer:
+        for character in text:
+            writer.write(character)
+
+    output = console.export_text()
+    assert "Title" in output
+    assert "*" not in output
+    assert "x = 1" in output
+    assert "y = 2" in output
+    assert "• item" in output
+
+
+def test_markdown_only_renders_the_trailing_block_live(console, monkeypatch):
+    updates = []
+    writer = StreamWriter(console, markdown=True, max_delay=0)
+    with writer:
+        assert writer._live is not None  # noqa: SLF001
+        monkeypatch.setattr(writer._live, "update", lambda renderable, **_: updates.append(renderable.markup))  # noqa: SLF001
+        for chunk in ["First", " block\n\nSecond", " block"]:
+            writer.write(chunk)
+
+    assert updates == ["First", "Second", "Second block"]
+
+
+def test_markdown_without_the_live_display(console):
+    with _logging.status("busy"), StreamWriter(console, markdown=True, max_delay=0) as writer:
+        writer.write("Some text\n\nMore")
+
+    assert [line.rstrip() for line in console.export_text().splitlines()] == ["Some text", "", "More"]
+
+
+@pytest.mark.parametrize(
+    ("text", "expected"),
+    [
+        ("", ("", "")),
+        ("One\n\nTwo", ("One\n\n", "Two")),
+        ("One\n\nTwo\n\n", ("One\n\nTwo\n\n", "")),
+        ("One\n", ("", "One\n")),
+        ("```\na\n\nb", ("", "```\na\n\nb")),
+        ("```\na\n\nb\n```\n\nc", ("```\na\n\nb\n```\n\n", "c")),
+        ("~~~\na\n~~~\n \nc", ("~~~\na\n~~~\n \n", "c")),
+    ],
+)
+def test_split_finished_blocks(text, expected):
+    assert split_finished_blocks(text) == expected
@@ -0,0 +1,73 @@
+import jinja2
+import pytest
+
+from cli_llm import templates
+from cli_llm.config import ClmConfig
+from cli_llm.run import run
+
+
+@pytest.fixture(autouse=True)
+def fresh_environment():
+    templates.reset_environment()
+    try:
+        yield
+    finally:
+        templates.reset_environment()
+
+
+def test_render():
+    assert templates.render("{{test}}", {"test": "hello"}) == "hello"
+
+
+def test_render_matches_plain_jinja():
+    source = "{% for f in files %}\n{{ f }}\n{% endfor %}\n"
+    data = {"files": ["a", "b"]}
+
+    assert templates.render(source, data) == jinja2.Template(source).render(**data)
+
+
+def test_templates_are_only_compiled_once(monkeypatch):
+    environment = templates.get_environment()
+    compiled = []
+    original = environment.compile
+
+    def compile_(*args, **kwargs):
+        compiled.append(args)
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(environment, "compile", compile_)
+
+    first = templates.get_template("{{test}}")
+    second = templates.get_template("{{test}}")
+    third = templates.get_template("{{other}}")
+
+    assert first is second
+    assert third is not first
+    assert [args[1] for args in compiled] == [first.name, third.name]
+
+
+def test_registered_filters_are_available():
+    templates.get_environment().filters["shout"] = str.upper
+
+    assert templates.render("{{test | shout}}", {"test": "hello"}) == "HELLO"
+
+
+def test_bytecode_cache(tmp_path):
+    templates.enable_bytecode_cache(tmp_path)
+    templates.enable_bytecode_cache(tmp_path)
+
+    assert templates.render("{{test}}", {"test": "hello"}) == "hello"
+    assert len(list(tmp_path.iterdir())) == 1
+
+    templates.reset_environment()
+    templates.enable_bytecode_cache(tmp_path)
+
+    assert templates.render("{{test}}", {"test": "again"}) == "again"
+
+
+def test_run_uses_the_bytecode_cache(mock_model, isolated_cache_dir):
+    mock_model.enqueue(["hello"])
+
+    run(ClmConfig(ll_model="mock", template_bytecode_cache=True), "{{test}}", {"test": "value"}).text()
+
+    assert list((isolated_cache_dir / templates.TEMPLATE_BYTECODE_DIR).iterdir())
@@ -0,0 +1,42 @@
+import io
+
+import pytest
+from rich.console import Console
+
+from cli_llm import _logging
+from cli_llm._timings import Timings
+
+
+@pytest.fixture
+def console(monkeypatch):
+    console = Console(file=io.StringIO(), width=100)
+    monkeypatch.setattr(_logging, "console", console)
+    return console
+
+
+def test_nothing_is_timed_until_started():
+    timings = Timings()
+
+    with timings.phase("render"):
+        pass
+    timings.record("render", 1.0)
+
+    assert not timings.enabled
+    assert timings._phases == {}  # noqa: SLF001
+
+
+def test_finish_reports_the_phases(console):
+    timings = Timings()
+    timings.start()
+
+    with timings.phase("render"):
+        pass
+    timings.record("render", 1.0)
+    timings.record("custom", 2.0)
+    timings.finish()
+
+    output = console.file.getvalue()
+    assert not timings.enabled
+    assert "│ render           │ 2    │ 1.0" in output
+    assert "│ config load      │ 0    │ 0.000" in output
+    assert output.index("completion") < output.index("custom") < output.index("total")
@@ -0,0 +1,136 @@
+import pytest
+from logot import Logot, logged
+
+from cli_llm import errors
+from cli_llm.config import ClmConfig
+from cli_llm.tokens import count_bytes, fit_files, get_tokenizer, register_tokenizer, unregister_tokenizer
+
+PROMPT = "Files:{% for name, text in files %}\n{{ name }}\n{{ text }}{% endfor %}"
+
+
+@pytest.fixture
+def config() -> ClmConfig:
+    return ClmConfig(ll_model="mock")
+
+
+@pytest.fixture
+def words():
+    """Count each word as a token, for the mock model."""
+    register_tokenizer("mo*", lambda text: len(text.split()))
+    try:
+        yield
+    finally:
+        unregister_tokenizer("mo*")
+
+
+def test_count_bytes():
+    assert count_bytes("") == 0
+    assert count_bytes("abcd") == 1
+    assert count_bytes("abcde") == 2  # noqa: PLR2004
+    assert count_bytes("éé") == 1
+
+
+def test_get_tokenizer_falls_back_to_bytes():
+    assert get_tokenizer("mock") is count_bytes
+
+
+def test_later_tokenizers_take_precedence():
+    def first(text):
+        return len(text)
+
+    def second(text):
+        return 2 * len(text)
+
+    register_tokenizer("gpt-*", first)
+    register_tokenizer("gpt-4*", second)
+    try:
+        assert get_tokenizer("gpt-4o") is second
+        assert get_tokenizer("gpt-3.5") is first
+
+        register_tokenizer("gpt-*", first)
+        assert get_tokenizer("gpt-4o") is first
+    finally:
+        unregister_tokenizer("gpt-*")
+        unregister_tokenizer("gpt-4*")
+
+    assert get_tokenizer("gpt-4o") is count_bytes
+
+
+@pytest.mark.usefixtures("words")
+def test_fit_files_keeps_files_that_fit(config):
+    files = [("a", "one two"), ("b", "three"), ("c", "four five six")]
+
+    assert fit_files(config, PROMPT, files, budget=100) == files
+    # The prompt alone is 1 token, and each file its name and words.
+    assert fit_files(config, PROMPT, files, budget=7) == files[:2]
+
+
+@pytest.mark.usefixtures("words")
+@pytest.mark.usefixtures("debug_logging")
+def test_fit_files_truncates_the_first_file_that_does_not_fit(config, logot: Logot):
+    files = [("a", "one\ntwo\n"), ("b", "1\n2\n3\n4\n5\n6\n7\n8\n9\n10\n"), ("c", "x y z")]
+
+    fitted = fit_files(config, PROMPT, files, budget=14)
+
+    assert fitted == [files[0], ("b", "1\n2\n3\n\n[... truncated, 15 more bytes ...]\n")]
+    logot.assert_logged(logged.info("Truncating %s to fit the %s token budget"))
+    logot.assert_logged(logged.info("Leaving out %s of %s files to fit the %s token budget"))
+
+
+@pytest.mark.usefixtures("words")
+def test_fit_files_truncates_only_one_file(config):
+    files = [("a", "1\n" + " ".join(map(str, range(20))) + "\n"), ("b", "x " * 30)]
+
+    assert fit_files(config, PROMPT, files, budget=17) == [("a", "1\n\n[... truncated, 50 more bytes ...]\n")]
+
+
+@pytest.mark.usefixtures("words")
+def test_fit_files_truncates_within_a_line(config):
+    fitted = fit_files(config, PROMPT, [("a", "1 2 3 4 5 6 7 8 9 10")], budget=10)
+
+    assert fitted == [("a", "1 2 \n[... truncated, 16 more bytes ...]\n")]
+
+
+@pytest.mark.usefixtures("words")
+def test_fit_files_skips_files_too_large_to_truncate_for_smaller_ones(config):
+    files = [("a", "1 2 3"), ("b", "1 2 3 4 5 6 7 8 9 10"), ("c", "x")]
+
+    assert fit_files(config, PROMPT, files, budget=8) == [files[0], files[2]]
+
+
+@pytest.mark.usefixtures("words")
+def test_fit_files_by_priority(config):
+    files = [("a", "1 2 3"), ("b", "1"), ("c", "1 2")]
+
+    fitted = fit_files(config, PROMPT, files, budget=6, priority=lambda file: file[0])
+
+    assert fitted == [files[1], files[2]]
+
+
+@pytest.mark.usefixtures("words")
+def test_fit_files_with_prompt_data(config):
+    prompt = "{{ task }} {% for name, text in sources %}{{ text }} {% endfor %}"
+    files = [("a", "one two"), ("b", "three")]
+
+    assert fit_files(config, prompt, files, prompt_data={"task": "a b c"}, key="sources", budget=5) == files[:1]
+
+
+@pytest.mark.usefixtures("words")
+def test_fit_files_budget_from_the_context_size():
+    config = ClmConfig(ll_model="mock", ll_model_context_tokens={"mock": 1030})
+    files = [("a", "1 2"), ("b", "1 2")]
+
+    assert fit_files(config, PROMPT, files) == files[:1]
+    assert fit_files(config, PROMPT, files, response_tokens=1000) == files
+
+
+def test_fit_files_budget_defaults_to_the_map_reduce_budget():
+    config = ClmConfig(ll_model="mock", map_reduce_chunk_tokens=6)
+    files = [("a", "1234"), ("b", "12345678")]
+
+    assert fit_files(config, PROMPT, files) == files[:1]
+
+
+def test_fit_files_prompt_too_large(config):
+    with pytest.raises(errors.TokenBudgetError, match="needs about 2 tokens, leaving none of the 2 budget"):
+        fit_files(config, PROMPT, [("a", "b")], budget=2)